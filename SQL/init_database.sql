@@ -922,6 +922,8 @@ ALTER TABLE `device_main`
   ADD KEY `idx_user_id` (`user_id`),
   ADD KEY `idx_device_status` (`device_status`),
   ADD KEY `idx_is_online` (`is_online`),
+  ADD KEY `idx_last_seen` (`last_seen`),
+  ADD KEY `idx_created_at` (`created_at`),
   ADD KEY `idx_mac_address` (`mac_address`),
   ADD KEY `idx_school_id` (`school_id`);
 
@@ -437,6 +437,38 @@ CREATE TABLE IF NOT EXISTS `pbl_ai_chat_messages` (
   KEY `idx_sequence` (`session_id`, `sequence_number`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='PBL-AI对话消息表（结构化存储，用于数据分析）';
 
+-- ----------------------------
+-- Table structure for pbl_ai_chat_question_clusters
+-- AI对话问题聚类表：按单元增量聚合相似提问（SimHash指纹），用于热门问题统计
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `pbl_ai_chat_question_clusters` (
+  `id` BIGINT(20) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `unit_uuid` VARCHAR(36) NOT NULL COMMENT '单元UUID',
+  
+  -- SimHash指纹（64位，按16位分为4段用于近似查找）
+  `fingerprint` BIGINT(20) NOT NULL COMMENT '问题SimHash指纹',
+  `band_0` INT(11) NOT NULL COMMENT '指纹第1段（0-15位）',
+  `band_1` INT(11) NOT NULL COMMENT '指纹第2段（16-31位）',
+  `band_2` INT(11) NOT NULL COMMENT '指纹第3段（32-47位）',
+  `band_3` INT(11) NOT NULL COMMENT '指纹第4段（48-63位）',
+  
+  -- 聚类内容和统计
+  `representative_question` TEXT NOT NULL COMMENT '代表问题（首次出现的原文）',
+  `ask_count` INT(11) NOT NULL DEFAULT 0 COMMENT '提问次数',
+  `last_asked_at` DATETIME DEFAULT NULL COMMENT '最近提问时间',
+  
+  -- 通用字段
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  PRIMARY KEY (`id`),
+  KEY `idx_unit_ask_count` (`unit_uuid`, `ask_count`),
+  KEY `idx_unit_band_0` (`unit_uuid`, `band_0`),
+  KEY `idx_unit_band_1` (`unit_uuid`, `band_1`),
+  KEY `idx_unit_band_2` (`unit_uuid`, `band_2`),
+  KEY `idx_unit_band_3` (`unit_uuid`, `band_3`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='PBL-AI对话问题聚类表（热门问题统计）';
+
 -- ----------------------------
 -- Table structure for pbl_learning_logs
 -- ----------------------------
@@ -1238,7 +1270,8 @@ CREATE TABLE IF NOT EXISTS `pbl_video_play_progress` (
   `pause_count` INT DEFAULT 0 COMMENT '暂停次数',
   `pause_duration` INT DEFAULT 0 COMMENT '累计暂停时长（秒）',
   `replay_count` INT DEFAULT 0 COMMENT '重播次数',
-  `watched_ranges` TEXT DEFAULT NULL COMMENT '已观看的时间段（JSON）',
+  `watched_ranges` TEXT DEFAULT NULL COMMENT '已观看的时间段（JSON，旧格式）',
+  `watched_intervals` BLOB DEFAULT NULL COMMENT '已观看的时间段（二进制区间集合，秒级）',
   `completion_rate` DECIMAL(5,2) DEFAULT 0.00 COMMENT '完成度（百分比）',
   `is_completed` TINYINT(1) DEFAULT 0 COMMENT '是否观看完成',
   `ip_address` VARCHAR(45) DEFAULT NULL COMMENT '客户端IP地址',
@@ -1281,6 +1314,34 @@ CREATE TABLE IF NOT EXISTS `pbl_video_play_events` (
   KEY `idx_timestamp` (`timestamp`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='视频播放事件表';
 
+-- ----------------------------
+-- Table structure for pbl_video_user_stats
+-- 视频观看统计表：按视频和学生汇总，播放进度写入时增量更新，统计和排行榜直接读取
+-- ----------------------------
+CREATE TABLE IF NOT EXISTS `pbl_video_user_stats` (
+  `id` BIGINT(20) NOT NULL AUTO_INCREMENT COMMENT '记录ID',
+  `resource_id` BIGINT(20) NOT NULL COMMENT '视频资源ID',
+  `user_id` INT(11) NOT NULL COMMENT '用户ID（学生）',
+  `session_count` INT DEFAULT 0 COMMENT '播放会话数',
+  `completed_count` INT DEFAULT 0 COMMENT '观看完成的会话数',
+  `total_play_duration` INT DEFAULT 0 COMMENT '累计播放时长（秒）',
+  `total_real_watch_duration` INT DEFAULT 0 COMMENT '累计真实观看时长（秒）',
+  `total_completion_rate` DECIMAL(10,2) DEFAULT 0.00 COMMENT '各会话完成度之和（用于计算平均值）',
+  `max_completion_rate` DECIMAL(5,2) DEFAULT 0.00 COMMENT '各会话达到过的最高完成度（百分比）',
+  `total_seek_count` INT DEFAULT 0 COMMENT '累计拖动次数',
+  `total_pause_count` INT DEFAULT 0 COMMENT '累计暂停次数',
+  `last_position` INT DEFAULT 0 COMMENT '最近一次会话的播放位置（秒），用于流失点统计',
+  `first_watch_time` TIMESTAMP NULL DEFAULT NULL COMMENT '首次观看时间',
+  `last_watch_time` TIMESTAMP NULL DEFAULT NULL COMMENT '最近观看时间',
+  `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_resource_user` (`resource_id`, `user_id`),
+  KEY `idx_resource_real_watch` (`resource_id`, `total_real_watch_duration`),
+  KEY `idx_user_id` (`user_id`),
+  CONSTRAINT `fk_vus_resource` FOREIGN KEY (`resource_id`) REFERENCES `pbl_resources` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='视频观看统计表（按视频和学生汇总）';
+
 -- ==========================================
 -- 学校管理增强
 -- ==========================================
@@ -1780,6 +1841,11 @@ CREATE TABLE IF NOT EXISTS `pbl_learning_assistant_conversations` (
   `helpful_count` INT(11) DEFAULT 0 COMMENT '有帮助的回复数',
   `avg_response_time` INT(11) DEFAULT NULL COMMENT '平均响应时间(ms)',
   
+  -- 对话记忆（滚动摘要）
+  `summary` TEXT DEFAULT NULL COMMENT '较早对话的滚动摘要',
+  `summary_message_id` BIGINT(20) DEFAULT NULL COMMENT '摘要已覆盖到的最后一条消息ID',
+  `summary_updated_at` DATETIME DEFAULT NULL COMMENT '摘要更新时间',
+  
   -- 教师关注
   `teacher_reviewed` TINYINT(1) DEFAULT 0 COMMENT '教师是否已查看',
   `teacher_flagged` TINYINT(1) DEFAULT 0 COMMENT '教师是否标记关注',
@@ -1854,6 +1920,7 @@ CREATE TABLE IF NOT EXISTS `pbl_learning_assistant_messages` (
   KEY `idx_was_helpful` (`was_helpful`),
   KEY `idx_teacher_corrected` (`teacher_corrected`),
   KEY `idx_conv_role_created` (`conversation_id`, `role`, `created_at`),
+  KEY `idx_conv_created` (`conversation_id`, `created_at`),
   CONSTRAINT `fk_pbl_message_conversation` 
     FOREIGN KEY (`conversation_id`) 
     REFERENCES `pbl_learning_assistant_conversations`(`id`) 
@@ -2035,7 +2102,7 @@ SELECT
         WHEN table_name IN ('pbl_classes', 'pbl_class_members', 'pbl_class_teachers', 'pbl_class_courses', 'pbl_groups', 'pbl_group_members', 'pbl_group_device_authorizations') THEN 'Class & Group Management'
         WHEN table_name IN ('pbl_learning_records', 'pbl_task_progress', 'pbl_learning_progress', 'pbl_learning_logs', 'pbl_feedback_templates') THEN 'Learning Management'
         WHEN table_name IN ('pbl_channel_school_relations') THEN 'Channel Management'
-        WHEN table_name IN ('pbl_video_watch_records', 'pbl_video_user_permissions', 'pbl_video_play_progress', 'pbl_video_play_events') THEN 'Video Management'
+        WHEN table_name IN ('pbl_video_watch_records', 'pbl_video_user_permissions', 'pbl_video_play_progress', 'pbl_video_play_events', 'pbl_video_user_stats') THEN 'Video Management'
         WHEN table_name IN ('pbl_assessments', 'pbl_assessment_templates') THEN 'Assessment System'
         WHEN table_name IN ('pbl_ethics_cases', 'pbl_ethics_activities') THEN 'Ethics Education'
         WHEN table_name IN ('pbl_student_portfolios', 'pbl_parent_relations', 'pbl_external_experts', 'pbl_social_activities') THEN 'Home-School-Society'
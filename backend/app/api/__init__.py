@@ -2,7 +2,7 @@ from fastapi import APIRouter
 from app.api import (
     auth, devices, users, products, dashboard, firmware, 
     user_management, courses, device_groups,
-    device_pbl_authorizations, system_config
+    device_pbl_authorizations, device_stream, system_config
 )
 from app.api.pbl import pbl_router
 from app.api.ai import router as ai_router
@@ -11,8 +11,9 @@ api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["认证"])
 api_router.include_router(products.router, prefix="/products", tags=["产品管理"])
-# 注意：device_pbl_authorizations 必须在 devices 之前注册，避免被 devices 的 /{device_uuid} 路由捕获
+# 注意：device_pbl_authorizations、device_stream 必须在 devices 之前注册，避免被 devices 的 /{device_uuid} 路由捕获
 api_router.include_router(device_pbl_authorizations.router, prefix="/devices")
+api_router.include_router(device_stream.router, prefix="/devices")
 api_router.include_router(devices.router, prefix="/devices", tags=["设备管理"])
 api_router.include_router(users.router, prefix="/users", tags=["用户管理"])
 api_router.include_router(dashboard.router, prefix="/dashboard", tags=["仪表盘"])
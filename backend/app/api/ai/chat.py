@@ -8,12 +8,11 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 
 from app.core.database import get_db
-from app.models.agent import Agent
 from app.models.plugin import Plugin
-from app.models.llm_model import LLMModel
 from app.models.device import Device
 from app.api.auth import get_current_user
 from app.models.user import User
+from app.services.ai_config_registry import ai_config_registry
 from app.services.llm_service import create_llm_service
 from app.services.plugin_service import PluginService
 
@@ -110,7 +109,7 @@ async def chat_with_agent(
     """
     
     # 1. 获取智能体
-    agent = db.query(Agent).filter(Agent.uuid == request.agent_uuid).first()
+    agent = ai_config_registry.get_agent(request.agent_uuid)
     if not agent:
         raise HTTPException(status_code=404, detail="智能体不存在")
     
@@ -123,7 +122,7 @@ async def chat_with_agent(
     plugins = []
     if agent.plugin_ids:
         try:
-            plugin_ids = agent.plugin_ids if isinstance(agent.plugin_ids, list) else eval(agent.plugin_ids)
+            plugin_ids = list(agent.plugin_ids) if isinstance(agent.plugin_ids, (list, tuple)) else eval(agent.plugin_ids)
             plugins = db.query(Plugin).filter(
                 Plugin.id.in_(plugin_ids),
                 Plugin.is_active == 1
@@ -132,19 +131,8 @@ async def chat_with_agent(
             print(f"解析插件 ID 失败: {e}")
     
     # 3. 获取智能体关联的大模型
-    llm_model = None
-    if agent.llm_model_id:
-        llm_model = db.query(LLMModel).filter(
-            LLMModel.id == agent.llm_model_id,
-            LLMModel.is_active == 1
-        ).first()
-    
     # 如果没有配置模型，使用默认模型
-    if not llm_model:
-        llm_model = db.query(LLMModel).filter(
-            LLMModel.is_default == 1,
-            LLMModel.is_active == 1
-        ).first()
+    llm_model = ai_config_registry.resolve_agent_llm_model(agent)
     
     if not llm_model:
         raise HTTPException(status_code=400, detail="未配置可用的大模型")
@@ -158,7 +146,7 @@ async def chat_with_agent(
     knowledge_context = ""
     
     try:
-        from app.models.knowledge_base import KnowledgeBase, AgentKnowledgeBase
+        from app.models.knowledge_base import KnowledgeBase
         from app.models.document import Document, DocumentChunk
         from app.services.embedding_service import get_embedding_service
         import numpy as np
@@ -166,11 +154,8 @@ async def chat_with_agent(
         
         logger = logging.getLogger(__name__)
         
-        # 查询智能体关联的知识库
-        kb_associations = db.query(AgentKnowledgeBase).filter(
-            AgentKnowledgeBase.agent_id == agent.id,
-            AgentKnowledgeBase.is_enabled == 1
-        ).order_by(AgentKnowledgeBase.priority.desc()).all()
+        # 智能体关联的知识库（已按优先级降序）
+        kb_associations = agent.knowledge_bases
         
         if kb_associations:
             logger.info(f"[知识库检索] 智能体 {agent.name} 关联了 {len(kb_associations)} 个知识库")
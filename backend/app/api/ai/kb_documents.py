@@ -6,9 +6,10 @@ from fastapi import APIRouter, Depends, Query, UploadFile, File, HTTPException,
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 import hashlib
+import uuid
 import os
 import asyncio
 import logging
@@ -33,7 +34,6 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # 文件存储根目录（支持环境变量配置，兼容不同容器的工作目录）
-import os
 UPLOAD_DIR = Path(os.getenv('KNOWLEDGE_BASE_STORAGE', 'data/knowledge-bases'))
 # 如果是相对路径，转换为绝对路径（基于backend目录）
 if not UPLOAD_DIR.is_absolute():
@@ -45,11 +45,19 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 # 文件大小限制（100KB）- 防止消耗过多系统资源
 MAX_FILE_SIZE = 100 * 1024
 
+# 读取上传文件的块大小（字节）
+UPLOAD_READ_BLOCK_SIZE = 64 * 1024
+
 
 # ============================================================================
 # 辅助函数
 # ============================================================================
 
+def get_file_path(file_url: str) -> Path:
+    """文档文件在本地磁盘上的路径"""
+    return UPLOAD_DIR / file_url
+
+
 def check_kb_write_permission(user: User, kb: KnowledgeBase, db: Session) -> bool:
     """检查用户对知识库的写入权限（简化版）"""
     # 导入权限检查函数
@@ -57,50 +65,64 @@ def check_kb_write_permission(user: User, kb: KnowledgeBase, db: Session) -> boo
     return check_kb_permission(user, kb, 'write', db)
 
 
-def calculate_file_hash(content: bytes) -> str:
-    """计算文件MD5哈希"""
-    return hashlib.md5(content).hexdigest()
-
-
-def save_file_to_disk(kb_uuid: str, doc_uuid: str, file_content: bytes, file_type: str) -> str:
+async def read_upload_limited(file: UploadFile, max_size: int) -> bytes:
     """
-    保存文件到本地磁盘
+    分块读取上传文件，超过大小限制时立即停止读取
     
-    Returns:
-        str: 文件相对路径
+    Raises:
+        ValueError: 文件超过大小限制
     """
-    # 创建知识库目录
-    kb_dir = UPLOAD_DIR / kb_uuid
-    kb_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 文件路径
-    filename = f"{doc_uuid}.{file_type}"
-    file_path = kb_dir / filename
-    
-    # 写入文件
-    with open(file_path, 'wb') as f:
-        f.write(file_content)
-    
-    # 返回相对路径
-    return f"{kb_uuid}/{filename}"
+    parts = []
+    size = 0
+    while True:
+        block = await file.read(UPLOAD_READ_BLOCK_SIZE)
+        if not block:
+            break
+        size += len(block)
+        if size > max_size:
+            raise ValueError(f"文件大小超过限制（最大{max_size // 1024}KB）")
+        parts.append(block)
+    return b''.join(parts)
 
 
-def read_file_from_disk(file_url: str) -> bytes:
-    """从本地磁盘读取文件"""
-    file_path = UPLOAD_DIR / file_url
-    if not file_path.exists():
-        raise FileNotFoundError(f"文件不存在: {file_url}")
+async def spool_upload_to_disk(file: UploadFile, dest_path: Path, max_size: int) -> Tuple[int, str]:
+    """
+    分块把上传文件写入磁盘，同时计算文件大小和MD5哈希
+    
+    文件内容不会整体加载到内存；超过大小限制时删除已写入的部分。
+    
+    Returns:
+        tuple: (文件大小, MD5哈希)
     
-    with open(file_path, 'rb') as f:
-        return f.read()
+    Raises:
+        ValueError: 文件超过大小限制
+    """
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        with open(dest_path, 'wb') as f:
+            while True:
+                block = await file.read(UPLOAD_READ_BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_size:
+                    raise ValueError(f"文件大小超过限制（最大{max_size // 1024}KB）")
+                md5.update(block)
+                f.write(block)
+    except Exception:
+        dest_path.unlink(missing_ok=True)
+        raise
+    return size, md5.hexdigest()
 
 
-def parse_text_file(file_content: bytes, file_type: str) -> str:
+def parse_text_file(file_path: Path, file_type: str) -> str:
     """
-    解析文本文件（使用增强的编码检测）
+    从磁盘解析文本文件（使用增强的编码检测，分块读取）
     
     Args:
-        file_content: 文件内容（bytes）
+        file_path: 文件路径
         file_type: 文件类型（txt/md）
     
     Returns:
@@ -114,7 +136,7 @@ def parse_text_file(file_content: bytes, file_type: str) -> str:
     try:
         # 使用文档解析器的增强编码处理
         parser = get_parser(file_type)
-        text = parser.parse(file_content)
+        text = parser.parse_file(file_path)
         return text
     except ValueError as e:
         # 编码错误，抛出明确的错误信息
@@ -198,13 +220,13 @@ async def preview_document_chunks(
     if file_ext not in ['txt', 'md']:
         return error_response(message="只支持TXT和Markdown格式", code=400)
     
-    # 读取文件
-    file_content = await file.read()
+    # 读取文件（分块读取，超过限制立即停止）
+    try:
+        file_content = await read_upload_limited(file, MAX_FILE_SIZE)
+    except ValueError as e:
+        return error_response(message=str(e), code=400)
     file_size = len(file_content)
     
-    if file_size > MAX_FILE_SIZE:
-        return error_response(message=f"文件大小超过限制（最大100KB）", code=400)
-    
     if file_size == 0:
         return error_response(message="文件内容为空", code=400)
     
@@ -335,79 +357,83 @@ async def upload_document(
     if file_ext not in ['txt', 'md']:
         return error_response(message="只支持TXT和Markdown格式", code=400)
     
-    # 读取文件内容
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    # 检查文件大小
-    if file_size > MAX_FILE_SIZE:
-        return error_response(message=f"文件大小超过限制（最大100KB）", code=400)
-    
-    if file_size == 0:
-        return error_response(message="文件内容为空", code=400)
-    
-    # 转换 auto_embedding（Form接收的是字符串）
-    auto_embedding_bool = auto_embedding.lower() in ('true', '1', 'yes', 'on') if isinstance(auto_embedding, str) else bool(auto_embedding)
-    
-    # 计算文件哈希
-    file_hash = calculate_file_hash(file_content)
-    
-    # 检查重复
-    existing_doc = db.query(Document).filter(
-        Document.knowledge_base_id == kb.id,
-        Document.file_hash == file_hash,
-        Document.deleted_at.is_(None)
-    ).first()
-    
-    if existing_doc:
-        return error_response(message=f"文档已存在：{existing_doc.title}", code=400)
-    
-    # 解析文件内容
+    # 分块写入临时文件，同时计算大小和哈希（不把整个文件读入内存）
+    kb_dir = UPLOAD_DIR / kb.uuid
+    temp_path = kb_dir / f".upload-{uuid.uuid4().hex}.part"
     try:
-        content = parse_text_file(file_content, file_ext)
+        file_size, file_hash = await spool_upload_to_disk(file, temp_path, MAX_FILE_SIZE)
+    except ValueError as e:
+        return error_response(message=str(e), code=400)
     except Exception as e:
-        return error_response(message=f"文件解析失败: {str(e)}", code=400)
-    
-    # 准备切分参数的metadata
-    import json
-    split_config = {
-        'split_mode': split_mode,
-        'chunk_size': chunk_size if split_mode == 'custom' and chunk_size else None,
-        'chunk_overlap': chunk_overlap if split_mode == 'custom' and chunk_overlap else None
-    }
-    
-    # 创建文档记录
-    doc = Document(
-        knowledge_base_id=kb.id,
-        title=title or file.filename,
-        content=content,
-        file_type=file_ext,
-        file_size=file_size,
-        file_hash=file_hash,
-        author=author,
-        language='zh',
-        uploader_id=current_user.id,
-        embedding_status='pending' if auto_embedding_bool else 'completed',
-        meta_data=split_config  # 保存切分配置
-    )
-    
-    # 处理标签
-    if tags:
-        try:
-            doc.tags = json.loads(tags) if isinstance(tags, str) else tags
-        except:
-            doc.tags = []
-    
-    db.add(doc)
-    db.flush()  # 获取doc.id
+        return error_response(message=f"文件保存失败: {str(e)}", code=500)
     
-    # 保存文件到磁盘
     try:
-        file_url = save_file_to_disk(kb.uuid, doc.uuid, file_content, file_ext)
-        doc.file_url = file_url
-    except Exception as e:
-        db.rollback()
-        return error_response(message=f"文件保存失败: {str(e)}", code=500)
+        if file_size == 0:
+            return error_response(message="文件内容为空", code=400)
+        
+        # 转换 auto_embedding（Form接收的是字符串）
+        auto_embedding_bool = auto_embedding.lower() in ('true', '1', 'yes', 'on') if isinstance(auto_embedding, str) else bool(auto_embedding)
+        
+        # 检查重复
+        existing_doc = db.query(Document).filter(
+            Document.knowledge_base_id == kb.id,
+            Document.file_hash == file_hash,
+            Document.deleted_at.is_(None)
+        ).first()
+        
+        if existing_doc:
+            return error_response(message=f"文档已存在：{existing_doc.title}", code=400)
+        
+        # 解析文件内容
+        try:
+            content = parse_text_file(temp_path, file_ext)
+        except Exception as e:
+            return error_response(message=f"文件解析失败: {str(e)}", code=400)
+        
+        # 准备切分参数的metadata
+        import json
+        split_config = {
+            'split_mode': split_mode,
+            'chunk_size': chunk_size if split_mode == 'custom' and chunk_size else None,
+            'chunk_overlap': chunk_overlap if split_mode == 'custom' and chunk_overlap else None
+        }
+        
+        # 创建文档记录
+        doc = Document(
+            knowledge_base_id=kb.id,
+            title=title or file.filename,
+            content=content,
+            file_type=file_ext,
+            file_size=file_size,
+            file_hash=file_hash,
+            author=author,
+            language='zh',
+            uploader_id=current_user.id,
+            embedding_status='pending' if auto_embedding_bool else 'completed',
+            meta_data=split_config  # 保存切分配置
+        )
+        
+        # 处理标签
+        if tags:
+            try:
+                doc.tags = json.loads(tags) if isinstance(tags, str) else tags
+            except:
+                doc.tags = []
+        
+        db.add(doc)
+        db.flush()  # 获取doc.id
+        
+        # 把临时文件移动到正式位置
+        try:
+            filename = f"{doc.uuid}.{file_ext}"
+            os.replace(temp_path, kb_dir / filename)
+            doc.file_url = f"{kb.uuid}/{filename}"
+        except Exception as e:
+            db.rollback()
+            return error_response(message=f"文件保存失败: {str(e)}", code=500)
+    finally:
+        # 出错提前返回时清理临时文件（成功时已被移走）
+        temp_path.unlink(missing_ok=True)
     
     # 更新知识库统计
     kb.document_count = (kb.document_count or 0) + 1
@@ -830,18 +856,17 @@ async def download_document(
     if not check_kb_permission(current_user, kb, 'read', db):
         raise HTTPException(status_code=403, detail="无权下载该文档")
     
-    # 读取文件
-    try:
-        file_content = read_file_from_disk(doc.file_url)
-    except FileNotFoundError:
+    # 检查文件
+    file_path = get_file_path(doc.file_url)
+    if not file_path.exists():
         raise HTTPException(status_code=404, detail="文件不存在")
     
-    # 返回文件下载
-    from io import BytesIO
+    # 返回文件下载（分块读取）
+    from app.utils.document_parser import iter_file_blocks
     media_type = 'text/markdown' if doc.file_type == 'md' else 'text/plain'
     
     return StreamingResponse(
-        BytesIO(file_content),
+        iter_file_blocks(file_path),
         media_type=media_type,
         headers={
             'Content-Disposition': f'attachment; filename={doc.title}'
@@ -16,36 +16,12 @@ from app.models.knowledge_base import KnowledgeBase
 from app.models.document import Document, DocumentChunk
 from app.schemas.document_schema import KnowledgeSearchRequest, KnowledgeSearchResponse, SearchResultItem
 from app.services.embedding_service import get_embedding_service
+from app.services.kb_permission_index import get_accessible_kb_ids
 from app.utils.timezone import get_beijing_time_naive
 
 router = APIRouter()
 
 
-def get_accessible_kb_ids(user: User, db: Session) -> List[int]:
-    """获取用户可访问的知识库ID列表"""
-    from app.api.ai.knowledge_bases import check_kb_permission
-    
-    # 平台管理员可访问所有
-    if user.role == 'platform_admin':
-        kbs = db.query(KnowledgeBase.id).filter(
-            KnowledgeBase.deleted_at.is_(None)
-        ).all()
-        return [kb_id for kb_id, in kbs]
-    
-    accessible_ids = []
-    
-    # 查询所有知识库（简化版，实际应该更智能）
-    all_kbs = db.query(KnowledgeBase).filter(
-        KnowledgeBase.deleted_at.is_(None)
-    ).all()
-    
-    for kb in all_kbs:
-        if check_kb_permission(user, kb, 'read', db):
-            accessible_ids.append(kb.id)
-    
-    return accessible_ids
-
-
 async def vector_search(
     query: str,
     kb_ids: List[int],
@@ -17,6 +17,7 @@ from app.models.course_model import Course
 from app.models.agent import Agent
 from app.models.knowledge_base import KnowledgeBase, AgentKnowledgeBase, KBPermission, KBSharing
 from app.models.document import Document
+from app.services.ai_config_registry import ai_config_registry
 from app.schemas.knowledge_base_schema import (
     KnowledgeBaseCreate, KnowledgeBaseUpdate, KnowledgeBaseResponse, 
     KnowledgeBaseListResponse, KnowledgeBaseStatistics,
@@ -889,6 +890,7 @@ async def remove_agent_knowledge_base(
         AgentKnowledgeBase.agent_id == agent.id,
         AgentKnowledgeBase.knowledge_base_id == kb.id
     ).delete()
+    ai_config_registry.invalidate(db)
     
     db.commit()
     
@@ -10,6 +10,7 @@ from sqlalchemy import or_
 from app.core.database import get_db
 from app.models.llm_model import LLMModel
 from app.models.llm_provider import LLMProvider
+from app.services.ai_config_registry import ai_config_registry
 from app.api.auth import get_current_user
 from app.models.user import User
 from app.core.response import success_response
@@ -140,6 +141,7 @@ def create_llm_model(
     # 如果设置为默认模型，取消其他模型的默认状态
     if model_data.is_default == 1:
         db.query(LLMModel).filter(LLMModel.is_default == 1).update({"is_default": 0})
+        ai_config_registry.invalidate(db)
     
     # 创建新模型
     db_model = LLMModel(**model_data.model_dump())
@@ -305,6 +307,7 @@ def update_llm_model(
             LLMModel.id != model_id,
             LLMModel.is_default == 1
         ).update({"is_default": 0})
+        ai_config_registry.invalidate(db)
     
     # 更新模型
     for key, value in update_data.items():
@@ -365,6 +368,7 @@ def set_default_llm_model(
     
     # 取消其他模型的默认状态
     db.query(LLMModel).filter(LLMModel.is_default == 1).update({"is_default": 0})
+    ai_config_registry.invalidate(db)
     
     # 设置当前模型为默认
     db_model.is_default = 1
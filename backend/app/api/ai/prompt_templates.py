@@ -9,6 +9,7 @@ from app.core.database import get_db
 from app.api.auth import get_current_user
 from app.models.user import User
 from app.models.prompt_template import PromptTemplate
+from app.services.ai_config_registry import ai_config_registry
 from app.schemas.prompt_template import (
     PromptTemplateCreate,
     PromptTemplateUpdate,
@@ -91,14 +92,10 @@ def get_prompt_template(
     - 只能查看系统模板或自己创建的模板
     - **template_uuid**: 模板UUID
     """
-    template = db.query(PromptTemplate).filter(
-        PromptTemplate.uuid == template_uuid,
-        PromptTemplate.is_deleted == 0,
-        (PromptTemplate.is_system == True) | 
-        (PromptTemplate.user_id == current_user.id)
-    ).first()
+    template = ai_config_registry.get_prompt_template(template_uuid)
     
-    if not template:
+    if (not template or template.is_deleted != 0
+            or not (template.is_system or template.user_id == current_user.id)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="模板不存在或无权访问"
@@ -20,6 +20,7 @@ from app.core.security import (
     create_access_token, create_refresh_token, verify_token,
     verify_internal_api_key
 )
+from app.core.principal_cache import get_principal
 from app.core.response import success_response
 from app.core.constants import (
     PASSWORD_RESET_TOKEN_EXPIRE_MINUTES,
@@ -266,7 +267,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = get_principal(db, int(user_id))
     if user is None:
         raise credentials_exception
     
@@ -363,7 +364,7 @@ async def verify_internal_or_user(
             payload = verify_token(token)
             user_id: str = payload.get("sub")
             if user_id:
-                user = db.query(User).filter(User.id == int(user_id)).first()
+                user = get_principal(db, int(user_id))
                 if user:
                     logger.info(f"✅ JWT认证通过: user_id={user_id}")
                     return user
@@ -0,0 +1,127 @@
+"""
+设备实时数据推送API（Server-Sent Events）
+一个连接订阅多台设备，连接建立时推送全部设备的当前数据，之后推送变化量
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List
+import asyncio
+import json
+import logging
+
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
+from app.models.device import Device
+from app.api.auth import verify_internal_or_user
+from app.api.devices import can_access_device
+from app.services.device_telemetry_hub import device_telemetry_hub, TelemetrySubscriber
+from app.services.sensor_latest_store import sensor_latest_store, build_device_info, parse_sensor_value
+from app.utils.timezone import format_datetime_beijing
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["设备实时数据"])
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _build_snapshot(devices: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """全部订阅设备的当前数据（传感器最新值未命中时查询数据库）"""
+    snapshot = {}
+    with SessionLocal() as db:
+        for device in devices:
+            readings = sensor_latest_store.get_latest(db, device["uuid"], device["info"])
+            snapshot[device["uuid"]] = {
+                "name": device["info"]["name"],
+                "is_online": device["is_online"],
+                "last_seen": device["last_seen"],
+                "sensors": {
+                    reading.sensor_name: {
+                        "value": parse_sensor_value(reading.sensor_value),
+                        "unit": reading.sensor_unit,
+                        "sensor_type": reading.sensor_type,
+                        "timestamp": format_datetime_beijing(reading.timestamp)
+                    }
+                    for reading in readings
+                }
+            }
+    return snapshot
+
+
+@router.get("/stream")
+async def stream_device_telemetry(
+    request: Request,
+    devices: str = Query(..., description="订阅的设备UUID，多个用逗号分隔"),
+    user_or_internal = Depends(verify_internal_or_user),
+    db: Session = Depends(get_db)
+):
+    """订阅设备实时数据 - 支持JWT和内部API密钥认证
+
+    返回 text/event-stream：
+    - event: snapshot  连接建立时全部设备的当前数据
+      {"devices": {"<uuid>": {"name", "is_online", "last_seen", "sensors": {"temperature": {"value", "unit", "sensor_type", "timestamp"}}}}}
+    - event: telemetry  设备数据变化（只包含有变化的设备和传感器，多次变化合并为最新值）
+      {"devices": {"<uuid>": {"sensors": {...}, "is_online", "last_seen"}}}
+    - 没有变化时定期发送注释行保持连接
+    """
+    device_uuids = list(dict.fromkeys(u.strip() for u in devices.split(",") if u.strip()))
+    if not device_uuids:
+        raise HTTPException(status_code=400, detail="请指定要订阅的设备")
+    if len(device_uuids) > settings.device_telemetry_max_devices:
+        raise HTTPException(
+            status_code=400,
+            detail=f"一个连接最多订阅 {settings.device_telemetry_max_devices} 台设备"
+        )
+
+    rows = db.query(Device).filter(Device.uuid.in_(device_uuids)).all()
+    found = {row.uuid for row in rows}
+    missing = [u for u in device_uuids if u not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"设备不存在: {', '.join(missing)}")
+
+    # 数据权限检查：内部API调用跳过权限检查，用户请求需要验证每台设备的权限
+    if user_or_internal != "internal":
+        denied = [row.uuid for row in rows if not can_access_device(row, user_or_internal, db)]
+        if denied:
+            raise HTTPException(status_code=403, detail=f"无权访问设备: {', '.join(denied)}")
+
+    subscribed = [
+        {
+            "uuid": row.uuid,
+            "info": build_device_info(row),
+            "is_online": bool(row.is_online),
+            "last_seen": format_datetime_beijing(row.last_seen)
+        }
+        for row in rows
+    ]
+    # 推送期间不占用数据库连接
+    db.close()
+
+    async def event_stream():
+        subscriber = TelemetrySubscriber(device_uuids, asyncio.get_running_loop())
+        # 先订阅再读取当前数据，避免两者之间的变化丢失
+        device_telemetry_hub.subscribe(subscriber)
+        try:
+            # 读取 Redis 和数据库是同步调用，在线程池中执行，不阻塞事件循环
+            snapshot = await run_in_threadpool(_build_snapshot, subscribed)
+            yield _sse("snapshot", {"devices": snapshot})
+            while not await request.is_disconnected():
+                batch = await subscriber.next_batch(timeout=settings.device_telemetry_keepalive)
+                if batch is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse("telemetry", {"devices": batch})
+                # 发送后等待一段时间，期间的变化合并到下一次推送
+                await asyncio.sleep(settings.device_telemetry_push_interval)
+        finally:
+            device_telemetry_hub.unsubscribe(subscriber)
+
+    logger.info(f"📡 设备实时数据订阅: {len(device_uuids)} 台设备")
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
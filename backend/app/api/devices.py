@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import text
 from typing import List, Optional
@@ -9,7 +10,6 @@ from datetime import datetime
 from app.core.database import get_db
 from app.models.device import Device
 from app.models.product import Product
-from app.models.device_sensor import DeviceSensor
 from app.models.user import User
 from app.models.device_binding_history import DeviceBindingHistory
 from sqlalchemy import or_, func, desc, func, desc
@@ -20,9 +20,16 @@ from app.schemas.device import (
     DeviceMacRegister, DeviceMacRegisterResponse
 )
 from app.services.device_product_service import DeviceProductService
+from app.services.device_telemetry_hub import device_telemetry_hub
+from app.services.sensor_latest_store import (
+    sensor_latest_store, build_device_info, parse_sensor_value, get_product_sensor_types
+)
 from app.api.auth import get_current_user, verify_internal_or_user
 from app.core.constants import ErrorMessages, SuccessMessages
 from app.core.response import success_response
+from app.core.pagination import (
+    keyset_condition, split_page, cached_count, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -177,6 +184,7 @@ def create_device(
 
 @router.get("", response_model=List[DeviceList])
 def get_devices(
+    response: Response,
     skip: int = Query(0, ge=0, description="跳过的记录数"),
     limit: int = Query(100, ge=1, le=1000, description="返回的记录数"),
     page: Optional[int] = Query(None, ge=1, description="页码（从1开始）"),
@@ -189,6 +197,8 @@ def get_devices(
     has_error: Optional[bool] = Query(None, description="是否有故障（error_count>0）"),
     search: Optional[str] = Query(None, description="搜索关键词"),
     exclude_grouped: Optional[bool] = Query(None, description="排除已在设备组中的设备"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页响应头 X-Next-Cursor，传入后忽略skip）"),
+    include_total: bool = Query(False, description="是否在响应头 X-Total-Count 中返回总数（缓存值）"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -278,13 +288,28 @@ def get_devices(
         # 排除这些设备
         query = query.filter(~Device.id.in_(grouped_device_ids))
     
-    # 分页
-    devices = query.offset(skip).limit(limit).all()
+    # 总数使用缓存，翻页时不重复执行 COUNT(*)
+    if include_total:
+        count_key = ("devices", current_user.id, product_id, is_online, is_active, search, bool(exclude_grouped))
+        response.headers[TOTAL_COUNT_HEADER] = str(cached_count(count_key, query.count))
+    
+    # 按 (created_at, id) 倒序分页：传入游标时从上一页末尾继续，否则兼容 skip/limit
+    query = query.order_by(Device.created_at.desc(), Device.id.desc())
+    if cursor:
+        try:
+            query = query.filter(keyset_condition(Device.created_at, Device.id, cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        query = query.offset(skip)
+    
+    devices, next_cursor = split_page(query.limit(limit + 1).all(), limit, "created_at")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     return devices
 
 from datetime import timezone, timedelta
-from app.core.config import settings
 
 # 北京时区常量 (UTC+8)
 BEIJING_TZ = timezone(timedelta(hours=8))
@@ -294,44 +319,6 @@ def get_beijing_now():
     from datetime import datetime
     return datetime.now(BEIJING_TZ).replace(tzinfo=None)
 
-def check_and_update_device_offline_status(device: Device, db: Session) -> bool:
-    """
-    检查设备是否超时并自动更新为离线状态
-    
-    Args:
-        device: 设备对象
-        db: 数据库会话
-        
-    Returns:
-        bool: 如果设备状态被更新为离线，返回True；否则返回False
-    """
-    # 如果设备已经标记为离线，不需要检查
-    if not device.is_online:
-        return False
-    
-    # 如果没有最后在线时间，无法判断，保持原状态
-    if not device.last_seen:
-        return False
-    
-    # 计算超时时间（分钟转秒）
-    timeout_seconds = settings.device_offline_timeout_minutes * 60
-    
-    # 计算时间差
-    now = get_beijing_now()
-    time_diff = (now - device.last_seen).total_seconds()
-    
-    # 如果超过超时时间，设置为离线
-    if time_diff > timeout_seconds:
-        device.is_online = False
-        db.commit()
-        logger.debug(
-            f"设备 {device.uuid} ({device.name}) 超时离线: "
-            f"最后在线时间 {device.last_seen}, 已超时 {int(time_diff/60)} 分钟"
-        )
-        return True
-    
-    return False
-
 def format_datetime_beijing(dt):
     """格式化datetime对象为北京时间（UTC+8）
     
@@ -353,12 +340,22 @@ def format_datetime_beijing(dt):
 
 @router.get("/with-product-info", response_model=List[DeviceWithProductInfo])
 def get_devices_with_product_info(
+    response: Response,
     skip: int = Query(0, ge=0, description="跳过的记录数"),
     limit: int = Query(100, ge=1, le=1000, description="返回的记录数"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页响应头 X-Next-Cursor，传入后忽略skip）"),
+    include_total: bool = Query(False, description="是否在响应头 X-Total-Count 中返回总数（缓存值）"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """获取包含产品信息的设备列表 - 数据权限控制：管理员可以看到所有设备，学生可以看到授权设备"""
+    cursor_condition = None
+    if cursor:
+        try:
+            cursor_condition = keyset_condition(Device.created_at, Device.id, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         # 使用ORM的joinedload预加载产品信息和用户信息，避免N+1查询问题
         query = db.query(Device).options(joinedload(Device.product), joinedload(Device.user))
@@ -407,20 +404,25 @@ def get_devices_with_product_info(
             # 普通用户只能看到自己注册的设备
             query = query.filter(Device.user_id == current_user.id)
         
-        devices = (
-            query
-            .order_by(Device.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        # 总数使用缓存，翻页时不重复执行 COUNT(*)
+        if include_total:
+            count_key = ("devices_with_product", current_user.id)
+            response.headers[TOTAL_COUNT_HEADER] = str(cached_count(count_key, query.count))
+        
+        # 按 (created_at, id) 倒序分页：传入游标时从上一页末尾继续，否则兼容 skip/limit
+        query = query.order_by(Device.created_at.desc(), Device.id.desc())
+        if cursor_condition is not None:
+            query = query.filter(cursor_condition)
+        else:
+            query = query.offset(skip)
+        
+        devices, next_cursor = split_page(query.limit(limit + 1).all(), limit, "created_at")
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         # 构造响应数据
         result = []
         for device in devices:
-            # 检查设备是否超时，自动更新为离线状态
-            check_and_update_device_offline_status(device, db)
-            
             # 安全地获取设备状态（如果是枚举，转换为字符串）
             device_status_value = None
             if device.device_status:
@@ -509,9 +511,6 @@ def get_device(
             detail="无权访问该设备"
         )
     
-    # 检查设备是否超时，自动更新为离线状态
-    check_and_update_device_offline_status(device, db)
-    
     return device
 
 @router.put("/{device_uuid}", response_model=DeviceResponse)
@@ -1216,10 +1215,8 @@ async def get_device_config(
     # 权限校验已移除 - 允许任何人访问设备配置
     logger.info(f"🔓 访问设备配置（无权限校验）: device_uuid={device_uuid}")
 
-    # 直接从 device_sensors 表获取最新数据（按时间倒序，limit 条）
-    sensor_rows = db.query(DeviceSensor).filter(
-        DeviceSensor.device_uuid == device_uuid
-    ).order_by(DeviceSensor.timestamp.desc()).limit(limit).all()
+    # 从传感器最新值存储获取数据（按时间倒序，limit 条）
+    sensor_rows = sensor_latest_store.get_latest(db, device_uuid, build_device_info(device))[:limit]
 
     if sensor_rows:
         data_list = []
@@ -1444,6 +1441,22 @@ async def upload_device_data(
     db.commit()
     db.refresh(device)
     
+    # 同步发布到 Redis，在线程池中执行，不阻塞事件循环
+    await run_in_threadpool(
+        device_telemetry_hub.publish,
+        device.uuid,
+        sensors={
+            name: {
+                "value": str(sensor["value"]),
+                "unit": sensor["unit"] or "",
+                "sensor_type": "",
+                "timestamp": sensor["timestamp"]
+            }
+            for name, sensor in sensor_data_dict.items()
+        },
+        last_seen=current_time
+    )
+    
     logger.info(
         f"✅ 设备数据上传成功 - 设备: {device.name} ({data.device_id}), "
         f"传感器数量: {len(sensor_data_dict)}, "
@@ -1764,44 +1777,16 @@ async def get_device_realtime_data(
     # 统一时区（数据库存北京时间）
     beijing_tz = timezone(timedelta(hours=8))
     
-    def _parse_sensor_value(value: str):
-        """尝试将字符串转成数字/布尔，便于前端展示"""
-        if value is None:
-            return None
-        v = str(value).strip()
-        if v.lower() in ["true", "false"]:
-            return v.lower() == "true"
-        try:
-            if "." in v:
-                return float(v)
-            return int(v)
-        except ValueError:
-            return value
-    
-    # 解析产品传感器配置（用于按配置键映射）
-    import json
-    product_sensor_types = None
-    if device.product and device.product.sensor_types:
-        sensor_types_raw = device.product.sensor_types
-        if isinstance(sensor_types_raw, str):
-            try:
-                product_sensor_types = json.loads(sensor_types_raw)
-            except Exception as e:
-                logger.error(f"❌ 解析产品传感器配置失败: {e}")
-                product_sensor_types = {}
-        else:
-            product_sensor_types = sensor_types_raw
-        logger.info(f"🔍 产品传感器配置键: {list(product_sensor_types.keys()) if product_sensor_types else []}")
-    else:
+    # 产品传感器配置（用于按配置键映射，解析结果按产品缓存）
+    product_sensor_types = get_product_sensor_types(device.product)
+    if not product_sensor_types:
         logger.warning("⚠️ 设备没有关联产品或产品没有传感器配置")
     
     # 表对 device_uuid + sensor_name 有唯一约束，一个传感器只保留一条最新数据
-    # 因此直接全量按时间倒序抓取该设备的所有传感器记录
-    sensor_rows = db.query(DeviceSensor).filter(
-        DeviceSensor.device_uuid == device_uuid
-    ).order_by(DeviceSensor.timestamp.desc()).all()
+    # 最新值存储中保存了该设备全部传感器的最新值（按时间倒序）
+    sensor_rows = sensor_latest_store.get_latest(db, device_uuid, build_device_info(device))
     
-    logger.info(f"🔍 从 device_sensors 取到 {len(sensor_rows)} 条数据 (device_uuid={device_uuid}, requested_limit={limit})")
+    logger.debug(f"🔍 取到 {len(sensor_rows)} 条传感器最新值 (device_uuid={device_uuid}, requested_limit={limit})")
     
     if not sensor_rows:
         return success_response(data={
@@ -1820,7 +1805,7 @@ async def get_device_realtime_data(
     latest_timestamp = None
     
     for row in sensor_rows:
-        value = _parse_sensor_value(row.sensor_value)
+        value = parse_sensor_value(row.sensor_value)
         row_time = row.timestamp
         if row_time and row_time.tzinfo is None:
             row_time = row_time.replace(tzinfo=beijing_tz)
@@ -1856,14 +1841,14 @@ async def get_device_realtime_data(
                 if (row.sensor_type or "").upper() == cfg_type and data_field and row.sensor_name == data_field:
                     mapped_latest[key] = raw_latest_map.get(row.sensor_name)
                     break
-        logger.info(f"✅ 按产品配置映射后的字段: {mapped_latest}")
+        logger.debug(f"✅ 按产品配置映射后的字段: {mapped_latest}")
     
     latest_payload = {
         "timestamp": latest_timestamp.isoformat() if latest_timestamp else None,
         "data": mapped_latest if mapped_latest is not None else raw_latest_map
     }
     
-    logger.info(f"✅ 最新数据字段: {list(latest_payload['data'].keys())}, 时间: {latest_timestamp}")
+    logger.debug(f"✅ 最新数据字段: {list(latest_payload['data'].keys())}, 时间: {latest_timestamp}")
     
     return success_response(data={
         "device_uuid": device_uuid,
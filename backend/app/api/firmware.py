@@ -1,12 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, and_
 from typing import List, Optional
 import logging
 from datetime import datetime
-import hashlib
-import os
-import shutil
 
 from app.core.database import get_db
 from app.core.config import settings
@@ -18,6 +16,11 @@ from app.schemas.firmware import (
 )
 from app.api.auth import get_current_user
 from app.core.response import success_response
+from app.services.firmware_distribution_service import (
+    FIRMWARE_DIR, build_firmware_url, save_firmware_upload, remove_firmware_file,
+    get_firmware_file_info, get_product_manifest, etag_matches, parse_range_header, iter_file_range,
+    parse_version, compare_version_keys
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -33,31 +36,7 @@ def compare_versions(version1: str, version2: str) -> int:
     比较两个版本号
     返回值: 1 表示 version1 > version2, -1 表示 version1 < version2, 0 表示相等
     """
-    def normalize_version(v):
-        return [int(x) for x in v.split('.')]
-    
-    try:
-        v1_parts = normalize_version(version1)
-        v2_parts = normalize_version(version2)
-        
-        # 补齐长度
-        max_len = max(len(v1_parts), len(v2_parts))
-        v1_parts.extend([0] * (max_len - len(v1_parts)))
-        v2_parts.extend([0] * (max_len - len(v2_parts)))
-        
-        for i in range(max_len):
-            if v1_parts[i] > v2_parts[i]:
-                return 1
-            elif v1_parts[i] < v2_parts[i]:
-                return -1
-        return 0
-    except ValueError:
-        # 如果版本号格式不正确，按字符串比较
-        if version1 > version2:
-            return 1
-        elif version1 < version2:
-            return -1
-        return 0
+    return compare_version_keys(parse_version(version1), parse_version(version2))
 
 @router.post("/check", response_model=OTACheckResponse)
 def check_firmware_update(
@@ -70,23 +49,8 @@ def check_firmware_update(
     logger.info(f"OTA检测请求: 产品={request.product_code}, 产品版本={request.product_version}, 固件版本={request.firmware_version}")
     
     try:
-        # 查找该产品的最新激活固件版本（优先使用is_latest标记）
-        latest_firmware = db.query(Firmware).filter(
-            and_(
-                Firmware.product_code == request.product_code,
-                Firmware.is_active == True,
-                Firmware.is_latest == True
-            )
-        ).first()
-        
-        # 如果没有标记为最新的版本，则按创建时间查找最新的
-        if not latest_firmware:
-            latest_firmware = db.query(Firmware).filter(
-                and_(
-                    Firmware.product_code == request.product_code,
-                    Firmware.is_active == True
-                )
-            ).order_by(desc(Firmware.created_at)).first()
+        # 读取产品的最新固件清单（缓存，固件变更时失效）
+        latest_firmware = get_product_manifest(db, request.product_code)
         
         if not latest_firmware:
             logger.warning(f"未找到产品 {request.product_code} 的固件版本")
@@ -96,20 +60,22 @@ def check_firmware_update(
                 latest_version=None
             )
         
-        # 比较版本号
-        version_comparison = compare_versions(latest_firmware.version, request.firmware_version)
+        # 比较版本号（清单中的最新版本已预先解析）
+        version_comparison = compare_version_keys(
+            latest_firmware["version_key"], parse_version(request.firmware_version)
+        )
         
         if version_comparison > 0:
             # 有新版本
-            logger.info(f"发现新版本: {latest_firmware.version} > {request.firmware_version}")
+            logger.info(f"发现新版本: {latest_firmware['version']} > {request.firmware_version}")
             return OTACheckResponse(
                 has_update=True,
-                firmware_url=latest_firmware.firmware_url,
-                latest_version=latest_firmware.version,
-                file_size=latest_firmware.file_size,
-                file_hash=latest_firmware.file_hash,
-                description=latest_firmware.description,
-                release_notes=latest_firmware.release_notes
+                firmware_url=latest_firmware["firmware_url"],
+                latest_version=latest_firmware["version"],
+                file_size=latest_firmware["file_size"],
+                file_hash=latest_firmware["file_hash"],
+                description=latest_firmware["description"],
+                release_notes=latest_firmware["release_notes"]
             )
         else:
             # 没有新版本
@@ -117,7 +83,7 @@ def check_firmware_update(
             return OTACheckResponse(
                 has_update=False,
                 firmware_url=None,
-                latest_version=latest_firmware.version
+                latest_version=latest_firmware["version"]
             )
             
     except Exception as e:
@@ -157,25 +123,13 @@ async def upload_firmware(
                 detail="只支持 .bin 格式的固件文件"
             )
         
-        # 创建上传目录
-        upload_dir = os.path.join("static", "firmware")
-        os.makedirs(upload_dir, exist_ok=True)
-        
         # 生成文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{product_code}_{version}_{timestamp}.bin" if product_code and version else f"{timestamp}_{file.filename}"
-        file_path = os.path.join(upload_dir, filename)
-        
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_path = FIRMWARE_DIR / filename
         
-        # 计算文件哈希
-        with open(file_path, "rb") as f:
-            file_hash = hashlib.sha256(f.read()).hexdigest()
-        
-        # 获取文件大小
-        file_size = os.path.getsize(file_path)
+        # 分块保存文件，同时计算大小和SHA-256（不把整个固件读入内存）
+        file_size, file_hash = await save_firmware_upload(file, file_path)
         
         # 如果设置为最新版本，先将其他版本设为非最新
         if is_latest and product_code:
@@ -187,7 +141,7 @@ async def upload_firmware(
         firmware_data = {
             "product_code": product_code or "UNKNOWN",
             "version": version or "1.0.0",
-            "firmware_url": f"{settings.get_firmware_base_url}/static/firmware/{filename}",
+            "firmware_url": build_firmware_url(filename),
             "file_size": file_size,
             "file_hash": file_hash,
             "description": description or f"固件文件 {filename}",
@@ -207,8 +161,8 @@ async def upload_firmware(
         
     except Exception as e:
         # 如果出错，删除已上传的文件
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
+        if 'file_path' in locals():
+            remove_firmware_file(file_path)
         
         logger.error(f"上传固件文件失败: {str(e)}")
         raise HTTPException(
@@ -216,6 +170,59 @@ async def upload_firmware(
             detail=f"上传固件文件失败: {str(e)}"
         )
 
+@router.api_route("/download/{filename}", methods=["GET", "HEAD"], summary="下载固件文件")
+def download_firmware(filename: str, request: Request):
+    """
+    下载固件文件 - 供ESP32设备调用
+    
+    支持断点续传（Range / If-Range）和条件请求（If-None-Match），ETag为文件的SHA-256
+    """
+    info = get_firmware_file_info(filename)
+    if not info:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="固件文件不存在"
+        )
+    
+    headers = {
+        "ETag": info.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={settings.firmware_download_max_age}"
+    }
+    
+    if etag_matches(request.headers.get("if-none-match"), info.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # If-Range 与当前ETag不一致时（文件已变化）忽略Range，返回完整文件
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != info.etag:
+        range_header = None
+    
+    try:
+        byte_range = parse_range_header(range_header, info.size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{info.size}"
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+    
+    status_code = status.HTTP_200_OK
+    start, end = 0, info.size - 1
+    if byte_range:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type="application/octet-stream")
+    
+    return StreamingResponse(
+        iter_file_range(info.path, start, end) if info.size else iter(()),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/octet-stream"
+    )
+
 @router.post("/", response_model=FirmwareResponse, summary="创建固件版本")
 def create_firmware(
     firmware: FirmwareCreate,
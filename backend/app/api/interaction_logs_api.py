@@ -106,6 +106,7 @@ async def get_interaction_logs(
     status: Optional[str] = Query(None, description="状态"),
     limit: int = Query(100, le=1000, description="限制数量"),
     offset: int = Query(0, ge=0, description="偏移量"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页的 next_cursor，传入后忽略offset）"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -123,7 +124,8 @@ async def get_interaction_logs(
             interaction_type=interaction_type,
             status=status,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
         
         return success_response(
@@ -134,11 +136,14 @@ async def get_interaction_logs(
                 "pagination": {
                     "limit": limit,
                     "offset": offset,
-                    "has_more": result['total'] > offset + limit
+                    "next_cursor": result.get('next_cursor'),
+                    "has_more": result.get('next_cursor') is not None
                 }
             }
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询日志失败: {str(e)}")
 
@@ -196,6 +201,7 @@ async def get_device_logs(
     interaction_type: Optional[str] = Query(None, description="交互类型"),
     status: Optional[str] = Query(None, description="状态"),
     limit: int = Query(100, le=1000, description="限制数量"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页的 next_cursor）"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -216,7 +222,8 @@ async def get_device_logs(
             interaction_type=interaction_type,
             status=status,
             limit=limit,
-            offset=0
+            offset=0,
+            cursor=cursor
         )
         
         return success_response(
@@ -224,6 +231,7 @@ async def get_device_logs(
                 "device_id": device_id,
                 "logs": result['logs'],
                 "total": result['total'],
+                "next_cursor": result.get('next_cursor'),
                 "from_cache": result.get('from_cache', False),
                 "time_range": {
                     "start_time": start_time.isoformat(),
@@ -233,6 +241,8 @@ async def get_device_logs(
             }
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取设备日志失败: {str(e)}")
 
@@ -13,6 +13,7 @@ from app.core.deps import get_db, get_current_user
 from app.core.response import success_response
 from app.models.ai_chat import AIChatSession, AIChatMessage
 from app.models.user import User
+from app.services.pbl.question_cluster_service import QuestionClusterService
 from app.schemas.ai_chat import (
     AIChatSessionCreate,
     AIChatSessionResponse,
@@ -156,6 +157,8 @@ def create_chat_message(
     session.message_count += 1
     if message_data.message_type == 'user':
         session.user_message_count += 1
+        # 增量更新单元问题聚类
+        QuestionClusterService.record_question(db, session.unit_uuid, message.content, message.sent_at)
     elif message_data.message_type == 'ai':
         session.ai_message_count += 1
     
@@ -208,6 +211,7 @@ def create_chat_messages_batch(
         
         if msg_data.get('type') == 'user':
             user_count += 1
+            QuestionClusterService.record_question(db, session.unit_uuid, message.content, message.sent_at)
         elif msg_data.get('type') == 'ai':
             ai_count += 1
     
@@ -341,29 +345,8 @@ def get_unit_popular_questions(
     - 分析学生常见问题
     - 优化课程内容
     """
-    # 查询热门问题
-    popular_questions = db.query(
-        AIChatMessage.content,
-        func.count(AIChatMessage.id).label('ask_count')
-    ).filter(
-        AIChatMessage.unit_uuid == unit_uuid,
-        AIChatMessage.message_type == 'user',
-        AIChatMessage.content_length > 5  # 过滤过短的消息
-    ).group_by(
-        AIChatMessage.content
-    ).having(
-        func.count(AIChatMessage.id) >= 2  # 至少被问过2次
-    ).order_by(
-        desc('ask_count')
-    ).limit(limit).all()
-    
-    questions_data = [
-        {
-            "question": q.content,
-            "ask_count": q.ask_count
-        }
-        for q in popular_questions
-    ]
+    # 从问题聚类表读取（相似问题已合并计数）
+    questions_data = QuestionClusterService.get_popular_questions(db, unit_uuid, limit=limit)
     
     return success_response(data=questions_data)
 
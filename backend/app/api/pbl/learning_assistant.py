@@ -233,7 +233,10 @@ def get_conversation_messages(
     
     messages = db.query(LearningAssistantMessage).filter(
         LearningAssistantMessage.conversation_id == conversation.id
-    ).order_by(LearningAssistantMessage.created_at.asc()).all()
+    ).order_by(
+        LearningAssistantMessage.created_at.asc(),
+        LearningAssistantMessage.id.asc()
+    ).all()
     
     return success_response(data={
         'conversation': conversation.to_dict(),
@@ -17,8 +17,9 @@
      * 平台管理员：可以查看任何用户的详细统计
 
 3. 整体统计查询（仅平台管理员）：
-   - GET /stats/video/{resource_uuid} - 获取视频整体观看统计
-   - GET /stats/ranking/{resource_uuid} - 获取学生观看排行榜
+   - GET /stats/video/{resource_uuid} - 获取视频整体观看统计（可按班级）
+   - GET /stats/ranking/{resource_uuid} - 获取学生观看排行榜（可按班级）
+   - GET /stats/heatmap/{resource_uuid} - 获取视频观看热力图（可按班级）
    
 4. 会话信息查询：
    - GET /session/{session_id} - 获取播放会话信息
@@ -36,7 +37,7 @@ from pydantic import BaseModel
 from ...db.session import SessionLocal
 from ...core.response import success_response, error_response
 from ...core.deps import get_db, get_current_user_or_admin
-from ...models.pbl import PBLResource
+from ...models.pbl import PBLResource, PBLClass
 from ...services.pbl.video_progress_service import video_progress_service
 
 router = APIRouter()
@@ -502,16 +503,18 @@ def get_user_watch_stats(
 @router.get("/stats/video/{resource_uuid}")
 def get_video_watch_stats(
     resource_uuid: str,
+    class_uuid: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_or_admin)
 ):
     """
-    获取视频整体观看统计（所有学生）
+    获取视频整体观看统计（所有学生或某个班级）
     
     只有平台管理员可以查看
     
     Args:
         resource_uuid: 资源UUID
+        class_uuid: 班级UUID（可选，只统计该班级的学生）
         
     Returns:
         视频观看统计信息
@@ -536,11 +539,23 @@ def get_video_watch_stats(
             status_code=status.HTTP_404_NOT_FOUND
         )
     
+    class_id = None
+    if class_uuid:
+        pbl_class = db.query(PBLClass).filter(PBLClass.uuid == class_uuid).first()
+        if not pbl_class:
+            return error_response(
+                message="班级不存在",
+                code=404,
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        class_id = pbl_class.id
+    
     try:
         # 获取视频观看统计
         stats = video_progress_service.get_video_watch_stats(
             db=db,
-            resource_id=resource.id
+            resource_id=resource.id,
+            class_id=class_id
         )
         
         return success_response(
@@ -560,6 +575,7 @@ def get_video_watch_stats(
 def get_students_ranking(
     resource_uuid: str,
     limit: int = 20,
+    class_uuid: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_or_admin)
 ):
@@ -571,6 +587,7 @@ def get_students_ranking(
     Args:
         resource_uuid: 资源UUID
         limit: 返回数量（默认20）
+        class_uuid: 班级UUID（可选，只统计该班级的学生）
         
     Returns:
         学生排行榜列表
@@ -595,12 +612,24 @@ def get_students_ranking(
             status_code=status.HTTP_404_NOT_FOUND
         )
     
+    class_id = None
+    if class_uuid:
+        pbl_class = db.query(PBLClass).filter(PBLClass.uuid == class_uuid).first()
+        if not pbl_class:
+            return error_response(
+                message="班级不存在",
+                code=404,
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        class_id = pbl_class.id
+    
     try:
         # 获取排行榜
         ranking = video_progress_service.get_students_ranking(
             db=db,
             resource_id=resource.id,
-            limit=limit
+            limit=limit,
+            class_id=class_id
         )
         
         return success_response(
@@ -619,6 +648,79 @@ def get_students_ranking(
         )
 
 
+@router.get("/stats/heatmap/{resource_uuid}")
+def get_video_heatmap(
+    resource_uuid: str,
+    bucket_size: int = 10,
+    class_uuid: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user_or_admin)
+):
+    """
+    获取视频观看热力图（每个时间段的平均观看人数）
+    
+    只有平台管理员可以查看
+    
+    Args:
+        resource_uuid: 资源UUID
+        bucket_size: 时间段宽度（秒，默认10）
+        class_uuid: 班级UUID（可选，只统计该班级的学生）
+        
+    Returns:
+        热力图数据
+    """
+    # 权限检查：只有平台管理员可以查看
+    if not hasattr(current_user, 'role') or current_user.role != 'platform_admin':
+        return error_response(
+            message="无权限查看热力图，仅平台管理员可查看",
+            code=403,
+            status_code=status.HTTP_403_FORBIDDEN
+        )
+    
+    # 查询资源
+    resource = db.query(PBLResource).filter(
+        PBLResource.uuid == resource_uuid
+    ).first()
+    
+    if not resource:
+        return error_response(
+            message="视频资源不存在",
+            code=404,
+            status_code=status.HTTP_404_NOT_FOUND
+        )
+    
+    class_id = None
+    if class_uuid:
+        pbl_class = db.query(PBLClass).filter(PBLClass.uuid == class_uuid).first()
+        if not pbl_class:
+            return error_response(
+                message="班级不存在",
+                code=404,
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        class_id = pbl_class.id
+    
+    try:
+        heatmap = video_progress_service.get_video_heatmap(
+            db=db,
+            resource_id=resource.id,
+            bucket_size=bucket_size,
+            class_id=class_id
+        )
+        
+        return success_response(
+            data=heatmap,
+            message="获取视频观看热力图成功"
+        )
+        
+    except Exception as e:
+        return error_response(
+            message=f"获取视频观看热力图失败: {str(e)}",
+            code=500,
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @router.get("/session/{session_id}")
 def get_session_info(
     session_id: str,
@@ -24,6 +24,7 @@ from app.schemas.system_config import (
 from app.core.deps import get_current_user
 from app.models.user import User
 from app.core.response import success_response
+from app.core.cache import get_all_cache_stats
 
 router = APIRouter()
 
@@ -464,3 +465,21 @@ async def update_policies_config(
     
     # 返回更新后的配置
     return await get_policies_config(db)
+
+
+# ==================== 缓存监控接口 ====================
+
+@router.get("/cache-stats")
+async def get_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取进程内缓存的命中率统计（仅平台管理员）
+    """
+    if not is_platform_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有平台管理员可以查看缓存统计"
+        )
+    
+    return success_response(data=get_all_cache_stats())
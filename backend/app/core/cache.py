@@ -0,0 +1,195 @@
+"""
+进程内缓存模块
+提供带TTL和容量上限的线程安全缓存，并统一登记命中率统计
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 缓存未命中标记（区分“未命中”与“缓存值为None”）
+MISSING = object()
+
+# 会话中待提交后执行的失效回调
+_SESSION_INFO_KEY = "cache_after_commit_callbacks"
+
+# 已创建的缓存实例（用于统一输出统计信息）
+_registry: Dict[str, "TTLCache"] = {}
+_registry_lock = threading.Lock()
+
+
+class TTLCache:
+    """带过期时间的LRU缓存
+
+    - 每个条目有独立的过期时间，过期后视为未命中
+    - 超过 maxsize 时淘汰最久未使用的条目
+    - 记录命中/未命中次数，便于观察缓存效果
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 10000):
+        """
+        Args:
+            name: 缓存名称（用于统计输出）
+            ttl: 默认过期时间（秒）
+            maxsize: 最大条目数
+        """
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        with _registry_lock:
+            _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """读取缓存，未命中或已过期返回 default"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除单个条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate) -> int:
+        """删除满足条件的条目（predicate 接收 key），返回删除数量"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class SingleFlight:
+    """合并同一key的并发加载
+
+    同一时刻只有第一个调用者执行加载函数，其余调用者等待并共享同一结果（或异常），
+    用于缓存未命中时避免大量请求同时访问下游服务
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, loader: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        执行或等待加载
+
+        Args:
+            key: 加载的key
+            loader: 加载函数
+            timeout: 等待其他调用者加载结果的超时时间（秒）
+
+        Raises:
+            concurrent.futures.TimeoutError: 等待超时
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            return future.result(timeout)
+
+        try:
+            result = loader()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+def get_all_cache_stats() -> List[Dict[str, Any]]:
+    """获取所有已登记缓存的统计信息"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return [cache.stats() for cache in caches]
+
+
+def run_after_commit(session: Optional[Session], callback: Callable[[], None]) -> None:
+    """登记一个在会话事务提交后执行的回调（通常用于缓存失效）
+
+    在 flush 阶段失效缓存后，事务提交前并发请求仍可能读到旧数据并写回缓存，
+    提交后再执行一次失效可避免旧数据在缓存中停留到过期
+    """
+    if session is None:
+        return
+    session.info.setdefault(_SESSION_INFO_KEY, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_session_commit(session):
+    """事务提交后执行登记的回调"""
+    callbacks = session.info.pop(_SESSION_INFO_KEY, None)
+    if not callbacks:
+        return
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"提交后缓存回调执行失败: {e}", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_session_rollback(session):
+    """回滚时丢弃登记的回调（数据未变化）"""
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -23,6 +23,7 @@ class Settings(BaseSettings):
     # 服务器配置
     server_base_url: str = "http://localhost:8000"  # 服务器基础URL，用于生成固件下载链接等
     firmware_base_url: Optional[str] = None  # 固件下载基础URL（可选，默认使用server_base_url）
+    firmware_download_max_age: int = 86400  # 固件下载的浏览器/代理缓存时间（秒），固件文件上传后内容不变
     
     # JWT配置（必须从环境变量读取）
     secret_key: str
@@ -62,6 +63,31 @@ class Settings(BaseSettings):
     aliyun_access_key_id: Optional[str] = None
     aliyun_access_key_secret: Optional[str] = None
     aliyun_vod_region_id: str = "cn-beijing"  # 默认北京区域
+    aliyun_vod_play_auth_timeout: int = 3000  # 播放凭证有效期（秒）
+    aliyun_vod_play_auth_cache_ratio: float = 0.5  # 播放凭证缓存时间占有效期的比例
+    aliyun_vod_video_info_cache_ttl: int = 3600  # 视频信息缓存时间（秒）
+    aliyun_vod_request_timeout: float = 10.0  # 等待VOD接口响应的超时时间（秒）
+    aliyun_vod_max_workers: int = 8  # 调用VOD接口的最大并发数
+    aliyun_vod_fake_client: bool = False  # 使用本地模拟客户端（测试/开发环境）
+    
+    # 视频播放进度写缓冲
+    video_progress_flush_interval: float = 5.0  # 批量写入间隔（秒）
+    video_progress_max_sessions: int = 50000  # 内存中最多保留的播放会话数
+    video_progress_session_idle_timeout: int = 1800  # 会话多久未上报后移出内存（秒）
+    video_progress_max_pending_events: int = 100000  # 内存中最多保留的待写播放事件数（数据库不可用时）
+    
+    # AI学习助手后台任务（标题生成、学生档案更新、审核日志）
+    learning_assistant_job_queue: str = "local"  # local：backend进程内线程池；celery：提交到Celery队列
+    learning_assistant_job_workers: int = 2  # 本地执行的线程数
+    learning_assistant_job_max_retries: int = 3  # 失败重试次数（本地执行）
+    learning_assistant_job_retry_delay: float = 5.0  # 首次重试间隔（秒），之后逐次翻倍
+    learning_assistant_job_max_pending: int = 1000  # 本地未完成任务数上限（含等待重试的），超出时丢弃新任务
+    
+    # AI学习助手对话记忆：摘要 + 最近几轮原文 + 知识库参考，总长度受token预算限制
+    learning_assistant_prompt_token_budget: int = 6000  # 发送给LLM的提示词token上限（估算值）
+    learning_assistant_recent_turns: int = 3  # 原文保留的最近对话轮数
+    learning_assistant_summary_batch_turns: int = 3  # 未摘要的较早对话累计多少轮后合并进摘要
+    learning_assistant_summary_max_tokens: int = 500  # 摘要的token上限
     
     # 交互日志配置
     log_batch_size: int = 1000  # 批量写入大小
@@ -74,9 +100,30 @@ class Settings(BaseSettings):
     cache_recent_logs_ttl: int = 300  # 最近日志缓存时间（秒）
     cache_stats_ttl: int = 3600  # 统计数据缓存时间（秒）
     cache_device_status_ttl: int = 60  # 设备状态缓存时间（秒）
+    principal_cache_ttl: int = 30  # 认证用户缓存时间（秒），0表示禁用
+    principal_cache_max_size: int = 10000  # 认证用户缓存最大条目数
+    kb_access_cache_ttl: int = 300  # 知识库权限索引缓存时间（秒）
+    kb_access_cache_max_size: int = 10000  # 知识库权限索引缓存最大条目数
+    token_index_cache_ttl: int = 600  # 文档Token前缀计数索引缓存时间（秒）
+    token_index_cache_max_size: int = 16  # 文档Token前缀计数索引缓存最大文档数
+    token_counter_encoding: str = ""  # Token计数使用的tiktoken编码（如cl100k_base），留空按字符估算
+    list_count_cache_ttl: int = 60  # 列表总数缓存时间（秒）
+    list_count_cache_max_size: int = 10000  # 列表总数缓存最大条目数
+    firmware_manifest_cache_ttl: int = 300  # 产品最新固件清单缓存时间（秒），固件变更时立即失效
+    firmware_manifest_cache_max_size: int = 1000  # 产品最新固件清单缓存最大产品数
+    ai_config_registry_ttl: int = 300  # AI配置快照（智能体、大模型、提示词模板）最长保留时间（秒），接口修改时立即失效
+    sensor_latest_cache_ttl: int = 86400  # 传感器最新值在Redis中的保留时间（秒），每次上报时刷新
+    sensor_latest_local_ttl: float = 2.0  # Redis不可用时传感器最新值的进程内缓存时间（秒）
     
     # 设备离线超时配置
     device_offline_timeout_minutes: int = 5  # 设备离线超时时间（分钟），超过此时间未收到数据则自动设置为离线
+    device_liveness_sweep_enabled: bool = True  # 是否启用设备在线状态后台巡检
+    device_liveness_sweep_interval: int = 30  # 设备在线状态巡检间隔（秒）
+    
+    # 设备实时数据推送配置（/api/devices/stream）
+    device_telemetry_push_interval: float = 0.5  # 同一连接两次推送的最小间隔（秒），期间的变化合并推送
+    device_telemetry_keepalive: int = 15  # 没有变化时发送保活注释的间隔（秒）
+    device_telemetry_max_devices: int = 100  # 一个连接最多订阅的设备数
     
     # 性能配置
     max_concurrent_writes: int = 10  # 最大并发写入数
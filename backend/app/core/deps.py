@@ -10,6 +10,7 @@ from jose import JWTError
 
 from app.core.database import get_db as _get_db
 from app.core.security import verify_token, verify_internal_api_key
+from app.core.principal_cache import get_principal
 from app.models.user import User
 import logging
 
@@ -60,7 +61,7 @@ async def get_current_user(
         raise credentials_exception
     
     # 查询用户
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = get_principal(db, int(user_id))
     if user is None:
         raise credentials_exception
     
@@ -109,7 +110,7 @@ async def get_current_admin(
         raise credentials_exception
     
     # 查询管理员
-    admin = db.query(Admin).filter(Admin.id == int(admin_id)).first()
+    admin = get_principal(db, int(admin_id))
     if admin is None:
         raise credentials_exception
     
@@ -165,7 +166,7 @@ async def get_current_user_flexible(
     # 根据角色查询不同的表
     if user_role in ['platform_admin', 'school_admin', 'teacher']:
         # 从Admin表查询
-        user = db.query(Admin).filter(Admin.id == int(user_id)).first()
+        user = get_principal(db, int(user_id))
         if user is None:
             raise credentials_exception
         
@@ -178,7 +179,7 @@ async def get_current_user_flexible(
             )
     else:
         # 从User表查询
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = get_principal(db, int(user_id))
         if user is None:
             raise credentials_exception
         
@@ -303,7 +304,7 @@ async def get_current_teacher(
         raise credentials_exception
     
     # 查询教师用户
-    teacher = db.query(Admin).filter(Admin.id == int(user_id)).first()
+    teacher = get_principal(db, int(user_id))
     if teacher is None:
         raise credentials_exception
     
@@ -365,7 +366,7 @@ async def get_current_user_or_admin(
     # 根据角色查询不同的表
     if user_role in ['platform_admin', 'school_admin', 'channel_manager', 'channel_partner', 'teacher']:
         # 从Admin表查询
-        user = db.query(Admin).filter(Admin.id == int(user_id)).first()
+        user = get_principal(db, int(user_id))
         if user is None:
             raise credentials_exception
         
@@ -378,7 +379,7 @@ async def get_current_user_or_admin(
             )
     else:
         # 从User表查询
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = get_principal(db, int(user_id))
         if user is None:
             raise credentials_exception
         
@@ -427,7 +428,7 @@ async def get_current_channel_partner(
         raise credentials_exception
     
     # 查询渠道商用户
-    channel_partner = db.query(Admin).filter(Admin.id == int(user_id)).first()
+    channel_partner = get_principal(db, int(user_id))
     if channel_partner is None:
         raise credentials_exception
     
@@ -484,7 +485,7 @@ async def get_current_channel_manager(
         raise credentials_exception
     
     # 查询渠道管理员用户
-    channel_manager = db.query(Admin).filter(Admin.id == int(user_id)).first()
+    channel_manager = get_principal(db, int(user_id))
     if channel_manager is None:
         raise credentials_exception
     
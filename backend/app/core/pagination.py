@@ -0,0 +1,131 @@
+"""
+游标（keyset）分页工具
+按 (排序列, id) 定位下一页，避免 OFFSET 深翻页时扫描并丢弃前面的所有行
+
+- 游标是对上一页最后一行排序键的不透明编码（URL安全的base64 + 签名），
+  客户端原样回传即可，不应解析或拼接
+- 列表总数通过 cached_count 缓存，翻页时不再每次执行 COUNT(*)
+"""
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+from datetime import datetime
+import base64
+import hashlib
+import hmac
+import json
+
+from sqlalchemy import and_, or_
+
+from app.core.cache import TTLCache, MISSING
+from app.core.config import settings
+
+# 下一页游标的响应头
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# 列表总数的响应头（缓存值，可能略有滞后）
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+_SIGNATURE_SIZE = 8
+
+list_count_cache = TTLCache(
+    "list_count",
+    ttl=settings.list_count_cache_ttl,
+    maxsize=settings.list_count_cache_max_size
+)
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(settings.secret_key.encode(), payload, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """
+    把上一页最后一行的排序键编码为游标
+
+    Args:
+        sort_value: 排序列的值（datetime 或其他可JSON序列化的值）
+        row_id: 行ID
+
+    Returns:
+        不透明的游标字符串
+    """
+    if isinstance(sort_value, datetime):
+        value = {"t": sort_value.isoformat()}
+    else:
+        value = {"v": sort_value}
+    payload = json.dumps([value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload + _sign(payload)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """
+    解析游标
+
+    Raises:
+        ValueError: 游标格式错误或签名不匹配
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload, signature = raw[:-_SIGNATURE_SIZE], raw[-_SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, _sign(payload)):
+            raise ValueError("签名不匹配")
+        value, row_id = json.loads(payload)
+        sort_value = datetime.fromisoformat(value["t"]) if "t" in value else value["v"]
+        return sort_value, int(row_id)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {e}")
+
+
+def keyset_condition(sort_column, id_column, cursor: str, descending: bool = True):
+    """
+    生成“位于游标之后”的过滤条件
+
+    Args:
+        sort_column: 排序列
+        id_column: ID列（排序列相同时的次级排序）
+        cursor: 游标
+        descending: 是否倒序
+
+    Returns:
+        SQLAlchemy 过滤表达式
+    """
+    sort_value, row_id = decode_cursor(cursor)
+    if descending:
+        return or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id)
+        )
+    return or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > row_id)
+    )
+
+
+def cached_count(key: Hashable, compute: Callable[[], int], ttl: Optional[float] = None) -> int:
+    """
+    获取缓存的列表总数
+
+    Args:
+        key: 缓存键（应包含影响结果的所有过滤条件）
+        compute: 未命中时执行的计数函数
+        ttl: 过期时间（秒），默认使用 LIST_COUNT_CACHE_TTL
+    """
+    total = list_count_cache.get(key)
+    if total is MISSING:
+        total = compute()
+        list_count_cache.set(key, total, ttl=ttl)
+    return total
+
+
+def split_page(rows: List[Any], limit: int, sort_attr: str, id_attr: str = "id") -> Tuple[List[Any], Optional[str]]:
+    """
+    切出本页结果并生成下一页游标
+
+    调用方应查询 limit + 1 行，多出的一行只用于判断是否还有下一页。
+
+    Returns:
+        (本页结果, 下一页游标；没有下一页时为None)
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_attr), getattr(last, id_attr))
@@ -0,0 +1,91 @@
+"""
+认证主体缓存模块
+缓存 get_current_user / get_current_admin 等依赖中按ID查询的用户对象，
+避免同一页面的多次API调用重复查询 core_users 表
+
+设计说明：
+- 缓存键为 (用户ID, 版本号)，用户被禁用、改角色、重置密码等任何更新都会提升版本号，
+  旧版本的缓存条目自然失效（即使并发请求在失效前读取了旧数据也不会被再次命中）
+- 缓存保存的是与会话无关的“游离”副本，取出时通过 merge(load=False) 挂载到当前会话，
+  不产生SQL查询，调用方仍可像原来一样修改并提交用户对象
+- 多进程部署时各进程缓存独立，TTL 控制跨进程失效的最大延迟
+"""
+import threading
+from typing import Dict, Optional
+import logging
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from app.core.cache import TTLCache, MISSING, run_after_commit
+from app.core.config import settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+principal_cache = TTLCache(
+    "principal",
+    ttl=settings.principal_cache_ttl,
+    maxsize=settings.principal_cache_max_size
+)
+
+# 每个用户的版本号（失效时递增）
+_versions: Dict[int, int] = {}
+_versions_lock = threading.Lock()
+
+
+def _snapshot(user: User) -> User:
+    """复制用户的列属性，生成不属于任何会话的游离对象"""
+    columns = {attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs}
+    copy = User(**columns)
+    make_transient_to_detached(copy)
+    return copy
+
+
+def get_principal(db: Session, user_id: int) -> Optional[User]:
+    """按ID获取用户（优先读取缓存）
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+
+    Returns:
+        Optional[User]: 挂载在当前会话上的用户对象，不存在时返回None
+    """
+    if settings.principal_cache_ttl <= 0:
+        return db.query(User).filter(User.id == user_id).first()
+
+    key = (user_id, _versions.get(user_id, 0))
+    cached = principal_cache.get(key)
+    if cached is not MISSING:
+        return db.merge(cached, load=False)
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is not None:
+        principal_cache.set(key, _snapshot(user))
+    return user
+
+
+def invalidate_principal(user_id: int) -> None:
+    """使指定用户的缓存失效"""
+    if user_id is None:
+        return
+    with _versions_lock:
+        version = _versions.get(user_id, 0)
+        _versions[user_id] = version + 1
+    principal_cache.invalidate((user_id, version))
+    logger.debug(f"认证主体缓存已失效: user_id={user_id}")
+
+
+def get_principal_cache_stats() -> dict:
+    """获取认证主体缓存的命中率统计"""
+    return principal_cache.stats()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _on_user_changed(mapper, connection, target):
+    """用户行被更新或删除时立即失效，并在事务提交后再失效一次"""
+    user_id = target.id
+    invalidate_principal(user_id)
+    run_after_commit(object_session(target), lambda: invalidate_principal(user_id))
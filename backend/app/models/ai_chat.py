@@ -100,3 +100,35 @@ class AIChatMessage(Base):
 
 
 
+
+
+class AIChatQuestionCluster(Base):
+    """AI对话问题聚类表（按单元聚合相似问题，用于热门问题统计）"""
+    __tablename__ = "pbl_ai_chat_question_clusters"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True, comment='主键ID')
+    unit_uuid = Column(String(36), nullable=False, comment='单元UUID')
+    
+    # SimHash指纹（64位，按16位分为4段用于近似查找）
+    fingerprint = Column(BigInteger, nullable=False, comment='问题SimHash指纹')
+    band_0 = Column(Integer, nullable=False, comment='指纹第1段（0-15位）')
+    band_1 = Column(Integer, nullable=False, comment='指纹第2段（16-31位）')
+    band_2 = Column(Integer, nullable=False, comment='指纹第3段（32-47位）')
+    band_3 = Column(Integer, nullable=False, comment='指纹第4段（48-63位）')
+    
+    # 聚类内容和统计
+    representative_question = Column(Text, nullable=False, comment='代表问题（首次出现的原文）')
+    ask_count = Column(Integer, default=0, nullable=False, comment='提问次数')
+    last_asked_at = Column(DateTime, comment='最近提问时间')
+    
+    # 通用字段
+    created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+    
+    __table_args__ = (
+        Index('idx_unit_ask_count', 'unit_uuid', 'ask_count'),
+        Index('idx_unit_band_0', 'unit_uuid', 'band_0'),
+        Index('idx_unit_band_1', 'unit_uuid', 'band_1'),
+        Index('idx_unit_band_2', 'unit_uuid', 'band_2'),
+        Index('idx_unit_band_3', 'unit_uuid', 'band_3'),
+    )
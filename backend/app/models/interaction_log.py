@@ -4,7 +4,7 @@
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, JSON, Index
 from sqlalchemy.sql import func
 
 from ..core.database import Base
@@ -14,6 +14,10 @@ class InteractionLog(Base):
     """交互日志表 - 时序数据优化"""
     
     __tablename__ = "aiot_interaction_logs"
+    __table_args__ = (
+        # 按设备倒序翻页（游标分页使用 (timestamp, id) 定位）
+        Index('idx_device_timestamp', 'device_id', 'timestamp'),
+    )
     
     # 主键
     id = Column(BigInteger, primary_key=True, autoincrement=True)
@@ -1,7 +1,7 @@
 """
 学习助手相关数据模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, JSON, DECIMAL, BigInteger
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, JSON, DECIMAL, BigInteger, Index
 from sqlalchemy.sql import func
 from app.db.base_class import Base
 
@@ -34,6 +34,11 @@ class LearningAssistantConversation(Base):
     helpful_count = Column(Integer, default=0)
     avg_response_time = Column(Integer)
     
+    # 对话记忆（滚动摘要，由后台任务更新）
+    summary = Column(Text)
+    summary_message_id = Column(BigInteger)  # 摘要已覆盖到的最后一条消息ID
+    summary_updated_at = Column(DateTime)
+    
     # 教师关注
     teacher_reviewed = Column(Integer, default=0)
     teacher_flagged = Column(Integer, default=0)
@@ -83,6 +88,10 @@ class LearningAssistantConversation(Base):
 class LearningAssistantMessage(Base):
     """学习助手消息表"""
     __tablename__ = "pbl_learning_assistant_messages"
+    __table_args__ = (
+        # 按会话倒序读取最近N条消息（(created_at, id) 定序）
+        Index('idx_conv_created', 'conversation_id', 'created_at'),
+    )
     
     id = Column(BigInteger, primary_key=True)
     uuid = Column(String(36), unique=True, nullable=False, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Enum, ForeignKey, DateTime, JSON, DECIMAL, BigInteger, Date
+from sqlalchemy import Column, Integer, String, Text, Enum, ForeignKey, DateTime, JSON, DECIMAL, BigInteger, Date, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -709,7 +709,8 @@ class PBLVideoPlayProgress(Base):
     replay_count = Column(Integer, default=0, comment='重播次数')
     
     # 播放范围
-    watched_ranges = Column(Text, comment='已观看的时间段（JSON数组）')
+    watched_ranges = Column(Text, comment='已观看的时间段（JSON数组，旧格式，只读）')
+    watched_intervals = Column(LargeBinary, comment='已观看的时间段（二进制区间集合，秒级）')
     
     # 完成度
     completion_rate = Column(DECIMAL(5, 2), default=0.00, comment='完成度（百分比）')
@@ -741,6 +742,38 @@ class PBLVideoPlayEvent(Base):
     timestamp = Column(DateTime, default=get_beijing_time_naive, nullable=False)
 
 
+class PBLVideoUserStats(Base):
+    """视频观看统计表（按视频和学生汇总，播放进度写入时增量更新）"""
+    __tablename__ = "pbl_video_user_stats"
+
+    id = Column(BigInteger, primary_key=True, index=True)
+    resource_id = Column(BigInteger, ForeignKey("pbl_resources.id"), nullable=False)
+    user_id = Column(Integer, nullable=False)  # Foreign Key to core_users
+    
+    # 会话统计
+    session_count = Column(Integer, default=0, comment='播放会话数')
+    completed_count = Column(Integer, default=0, comment='观看完成的会话数')
+    
+    # 时长统计
+    total_play_duration = Column(Integer, default=0, comment='累计播放时长（秒）')
+    total_real_watch_duration = Column(Integer, default=0, comment='累计真实观看时长（秒）')
+    
+    # 完成度统计
+    total_completion_rate = Column(DECIMAL(10, 2), default=0.00, comment='各会话完成度之和（用于计算平均值）')
+    max_completion_rate = Column(DECIMAL(5, 2), default=0.00, comment='各会话达到过的最高完成度（百分比）')
+    
+    # 播放行为统计
+    total_seek_count = Column(Integer, default=0, comment='累计拖动次数')
+    total_pause_count = Column(Integer, default=0, comment='累计暂停次数')
+    last_position = Column(Integer, default=0, comment='最近一次会话的播放位置（秒），用于流失点统计')
+    
+    # 时间
+    first_watch_time = Column(DateTime, comment='首次观看时间')
+    last_watch_time = Column(DateTime, comment='最近观看时间')
+    created_at = Column(DateTime, default=get_beijing_time_naive, nullable=False)
+    updated_at = Column(DateTime, default=get_beijing_time_naive, onupdate=get_beijing_time_naive, nullable=False)
+
+
 class PBLTemplateSchoolPermission(Base):
     """课程模板学校开放权限表"""
     __tablename__ = "pbl_template_school_permissions"
@@ -0,0 +1,310 @@
+"""
+AI配置注册表
+在进程内保存智能体、大模型、智能体知识库关联和提示词模板的只读快照，对话请求直接读取，不再逐项查询数据库
+
+- 快照整体加载、整体替换，读取时只比较版本号，不加锁
+- 管理员通过 api/ai 接口修改上述配置时（ORM 新增、修改、删除），版本号递增，
+  下次读取时重新加载；提交后再递增一次，防止提交前加载的旧数据被当作最新
+- 加载开始前记录版本号，加载期间发生修改时快照版本已过期，下次读取会再次加载
+- 快照超过 AI_CONFIG_REGISTRY_TTL 秒后也会重新加载（兜底直接修改数据库的情况）
+- 快照对象为不可变 dataclass，字段与对应模型同名；需要覆盖参数时使用 dataclasses.replace
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from decimal import Decimal
+import threading
+import time
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.core.cache import run_after_commit
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.agent import Agent
+from app.models.knowledge_base import AgentKnowledgeBase
+from app.models.llm_model import LLMModel
+from app.models.prompt_template import PromptTemplate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LLMModelConfig:
+    """大模型配置快照（可直接传给 LLMService）"""
+    id: int
+    uuid: str
+    name: str
+    display_name: str
+    provider: str
+    model_type: Optional[str]
+    api_base: Optional[str]
+    api_key: Optional[str]
+    api_version: Optional[str]
+    max_tokens: Optional[int]
+    temperature: Optional[Decimal]
+    top_p: Optional[Decimal]
+    enable_deep_thinking: int
+    frequency_penalty: Optional[Decimal]
+    presence_penalty: Optional[Decimal]
+    config: Optional[Dict[str, Any]]
+    is_active: int
+    is_default: int
+    is_deleted: int
+    sort_order: int
+
+
+@dataclass(frozen=True)
+class AgentKnowledgeBaseConfig:
+    """智能体关联的知识库（仅启用的关联）"""
+    knowledge_base_id: int
+    priority: int
+    top_k: Optional[int]
+    similarity_threshold: Optional[Decimal]
+    retrieval_mode: Optional[str]
+
+
+@dataclass(frozen=True)
+class AgentConfig:
+    """智能体配置快照"""
+    id: int
+    uuid: str
+    name: str
+    system_prompt: Optional[str]
+    plugin_ids: Any
+    llm_model_id: Optional[int]
+    user_id: int
+    is_active: int
+    is_system: int
+    is_deleted: int
+    knowledge_bases: Tuple[AgentKnowledgeBaseConfig, ...] = ()  # 按优先级降序
+
+
+@dataclass(frozen=True)
+class PromptTemplateConfig:
+    """提示词模板快照（字段与 PromptTemplateResponse 一致）"""
+    id: int
+    uuid: str
+    name: str
+    description: Optional[str]
+    content: str
+    category: Optional[str]
+    tags: Optional[List[str]]
+    difficulty: Optional[str]
+    suitable_for: Optional[str]
+    requires_plugin: bool
+    recommended_temperature: Optional[Decimal]
+    sort_order: int
+    is_active: bool
+    is_deleted: int
+    is_system: bool
+    user_id: Optional[int]
+    created_at: Any
+    updated_at: Any
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """某一版本的全部配置"""
+    version: int
+    loaded_at: float
+    agents: Dict[str, AgentConfig] = field(default_factory=dict)  # uuid -> 智能体
+    llm_models: Dict[int, LLMModelConfig] = field(default_factory=dict)  # id -> 模型
+    default_llm_model: Optional[LLMModelConfig] = None  # 激活的默认模型
+    fallback_llm_model: Optional[LLMModelConfig] = None  # 按排序的第一个激活模型
+    prompt_templates: Dict[str, PromptTemplateConfig] = field(default_factory=dict)  # uuid -> 模板
+
+
+def _copy_columns(row, config_cls):
+    """按快照类的字段从ORM对象复制列值"""
+    return config_cls(**{
+        name: getattr(row, name)
+        for name in config_cls.__dataclass_fields__
+        if name != 'knowledge_bases'
+    })
+
+
+def _load_snapshot(db: Session, version: int) -> ConfigSnapshot:
+    """从数据库加载全部配置"""
+    llm_models = {
+        row.id: _copy_columns(row, LLMModelConfig)
+        for row in db.query(LLMModel).order_by(LLMModel.id).all()
+    }
+
+    kb_by_agent: Dict[int, List[AgentKnowledgeBaseConfig]] = {}
+    for assoc in db.query(AgentKnowledgeBase).filter(
+        AgentKnowledgeBase.is_enabled == 1
+    ).order_by(AgentKnowledgeBase.priority.desc(), AgentKnowledgeBase.id).all():
+        kb_by_agent.setdefault(assoc.agent_id, []).append(AgentKnowledgeBaseConfig(
+            knowledge_base_id=assoc.knowledge_base_id,
+            priority=assoc.priority or 0,
+            top_k=assoc.top_k,
+            similarity_threshold=assoc.similarity_threshold,
+            retrieval_mode=assoc.retrieval_mode
+        ))
+
+    agents = {}
+    for row in db.query(Agent).order_by(Agent.id).all():
+        plugin_ids = row.plugin_ids
+        agents[row.uuid] = AgentConfig(
+            id=row.id,
+            uuid=row.uuid,
+            name=row.name,
+            system_prompt=row.system_prompt,
+            plugin_ids=tuple(plugin_ids) if isinstance(plugin_ids, list) else plugin_ids,
+            llm_model_id=row.llm_model_id,
+            user_id=row.user_id,
+            is_active=row.is_active,
+            is_system=row.is_system,
+            is_deleted=row.is_deleted,
+            knowledge_bases=tuple(kb_by_agent.get(row.id, ()))
+        )
+
+    active_models = [m for m in llm_models.values() if m.is_active == 1]
+    default_llm_model = next((m for m in active_models if m.is_default == 1), None)
+    fallback_llm_model = min(active_models, key=lambda m: (m.sort_order or 0, m.id), default=None)
+
+    prompt_templates = {
+        row.uuid: _copy_columns(row, PromptTemplateConfig)
+        for row in db.query(PromptTemplate).all()
+    }
+
+    return ConfigSnapshot(
+        version=version,
+        loaded_at=time.monotonic(),
+        agents=agents,
+        llm_models=llm_models,
+        default_llm_model=default_llm_model,
+        fallback_llm_model=fallback_llm_model,
+        prompt_templates=prompt_templates
+    )
+
+
+class AIConfigRegistry:
+    """AI配置注册表"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._version = 0
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._load_lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self.loads = 0
+
+    def snapshot(self) -> ConfigSnapshot:
+        """获取当前配置快照（版本未变化时不加锁、不查询数据库）"""
+        snapshot = self._snapshot
+        if snapshot is not None and self._is_fresh(snapshot):
+            return snapshot
+
+        with self._load_lock:
+            # 等待锁期间其他线程可能已完成加载
+            snapshot = self._snapshot
+            if snapshot is not None and self._is_fresh(snapshot):
+                return snapshot
+
+            version = self._version
+            db = SessionLocal()
+            try:
+                snapshot = _load_snapshot(db, version)
+            finally:
+                db.close()
+            self._snapshot = snapshot
+            self.loads += 1
+            logger.debug(f"AI配置快照已加载: 版本 {version}")
+            return snapshot
+
+    def _is_fresh(self, snapshot: ConfigSnapshot) -> bool:
+        return (
+            snapshot.version == self._version
+            and time.monotonic() - snapshot.loaded_at < self.ttl
+        )
+
+    def invalidate(self, db: Optional[Session] = None) -> None:
+        """
+        使当前快照失效
+
+        Args:
+            db: 修改配置所在的数据库会话；传入时提交后再失效一次
+        """
+        with self._version_lock:
+            self._version += 1
+        run_after_commit(db, self._bump_version)
+
+    def _bump_version(self) -> None:
+        with self._version_lock:
+            self._version += 1
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def get_agent(self, agent_uuid: str) -> Optional[AgentConfig]:
+        """按UUID获取智能体（包括已禁用、已删除的，由调用方判断）"""
+        return self.snapshot().agents.get(agent_uuid)
+
+    def get_llm_model(self, model_id: Optional[int], active_only: bool = True) -> Optional[LLMModelConfig]:
+        """按ID获取大模型"""
+        if model_id is None:
+            return None
+        model = self.snapshot().llm_models.get(model_id)
+        if model is None or (active_only and model.is_active != 1):
+            return None
+        return model
+
+    def find_llm_model(self, ref: str) -> Optional[LLMModelConfig]:
+        """按名称或UUID获取大模型（ID最小的一个）"""
+        for model in self.snapshot().llm_models.values():
+            if model.name == ref or model.uuid == ref:
+                return model
+        return None
+
+    def get_default_llm_model(self) -> Optional[LLMModelConfig]:
+        """获取激活的默认大模型"""
+        return self.snapshot().default_llm_model
+
+    def get_fallback_llm_model(self) -> Optional[LLMModelConfig]:
+        """获取默认大模型，没有时返回排序最靠前的激活模型"""
+        snapshot = self.snapshot()
+        return snapshot.default_llm_model or snapshot.fallback_llm_model
+
+    def resolve_agent_llm_model(self, agent: Optional[AgentConfig]) -> Optional[LLMModelConfig]:
+        """获取智能体使用的大模型（智能体配置的模型不可用时使用默认模型）"""
+        model = self.get_llm_model(agent.llm_model_id) if agent else None
+        return model or self.get_default_llm_model()
+
+    def get_prompt_template(self, template_uuid: str) -> Optional[PromptTemplateConfig]:
+        """按UUID获取提示词模板（包括已删除的，由调用方判断）"""
+        return self.snapshot().prompt_templates.get(template_uuid)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": self._version,
+            "snapshot_version": snapshot.version if snapshot else None,
+            "loads": self.loads,
+            "agents": len(snapshot.agents) if snapshot else 0,
+            "llm_models": len(snapshot.llm_models) if snapshot else 0,
+            "prompt_templates": len(snapshot.prompt_templates) if snapshot else 0
+        }
+
+
+ai_config_registry = AIConfigRegistry(ttl=settings.ai_config_registry_ttl)
+
+
+@event.listens_for(Agent, "after_insert")
+@event.listens_for(Agent, "after_update")
+@event.listens_for(Agent, "after_delete")
+@event.listens_for(LLMModel, "after_insert")
+@event.listens_for(LLMModel, "after_update")
+@event.listens_for(LLMModel, "after_delete")
+@event.listens_for(AgentKnowledgeBase, "after_insert")
+@event.listens_for(AgentKnowledgeBase, "after_update")
+@event.listens_for(AgentKnowledgeBase, "after_delete")
+@event.listens_for(PromptTemplate, "after_insert")
+@event.listens_for(PromptTemplate, "after_update")
+@event.listens_for(PromptTemplate, "after_delete")
+def _on_config_changed(mapper, connection, target):
+    """配置新增、修改或删除时使快照失效"""
+    ai_config_registry.invalidate(object_session(target))
@@ -0,0 +1,138 @@
+"""
+设备配置变更通知
+设备的控制端口配置、预设指令（device_settings）或传感器配置变化并提交后，发布到 Redis 频道 device:config，
+plugin-service 订阅该频道失效对应设备的别名缓存
+
+- 通过 Device 的 mapper 事件捕获全部修改途径（配置接口、注册、切换产品等），只在事务提交后发布
+- 提交后只把设备UUID放入待发布集合（同一设备合并），由后台线程发布，不在请求的事件循环中访问 Redis；
+  后台线程未启动时（脚本等）直接发布
+- 消息内容：{"device_uuid"}
+- Redis 不可用时不发布，订阅方的缓存按过期时间失效
+"""
+from typing import Optional, Set
+import json
+import threading
+import time
+import logging
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import object_session
+
+from app.core.cache import run_after_commit
+from app.core.config import settings
+from app.models.device import Device
+
+logger = logging.getLogger(__name__)
+
+# 设备配置变更发布频道（与 service/plugin-service/main.py 一致）
+DEVICE_CONFIG_CHANNEL = "device:config"
+
+# 变化时需要通知的字段
+_CONFIG_FIELDS = ("device_control_config", "device_settings", "device_sensor_config")
+
+# Redis 发布失败后暂停发布的时间（秒）
+REDIS_RETRY_INTERVAL = 30
+
+_redis = None
+_retry_at = 0.0
+
+
+def _get_redis():
+    global _redis
+    if time.monotonic() < _retry_at:
+        return None
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(
+            settings.redis_url,
+            decode_responses=True,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+    return _redis
+
+
+def _publish(device_uuid: str) -> None:
+    global _retry_at
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(DEVICE_CONFIG_CHANNEL, json.dumps({"device_uuid": device_uuid}))
+    except Exception as e:
+        _retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        logger.warning(f"发布设备配置变更失败，{REDIS_RETRY_INTERVAL} 秒内不再发布: {e}")
+
+
+class DeviceConfigPublisher:
+    """在后台线程中发布设备配置变更"""
+
+    def __init__(self):
+        self._pending: Set[str] = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def submit(self, device_uuid: str) -> None:
+        """登记待发布的设备；后台线程未启动时直接发布"""
+        with self._cond:
+            if self._thread is not None:
+                self._pending.add(device_uuid)
+                self._cond.notify()
+                return
+        _publish(device_uuid)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                device_uuids, self._pending = self._pending, set()
+            for device_uuid in device_uuids:
+                _publish(device_uuid)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="device-config-publisher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """发布完待发布的变更后停止"""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._cond.notify()
+        if thread:
+            thread.join(timeout)
+
+
+device_config_publisher = DeviceConfigPublisher()
+
+
+def publish_device_config_changed(device_uuid: Optional[str]) -> None:
+    """发布设备配置变更（事务提交后调用，不阻塞调用方）"""
+    if device_uuid:
+        device_config_publisher.submit(device_uuid)
+
+
+def _publish_after_commit(target: Device) -> None:
+    device_uuid = target.uuid
+    run_after_commit(object_session(target), lambda: publish_device_config_changed(device_uuid))
+
+
+@event.listens_for(Device, "after_update")
+def _on_device_updated(mapper, connection, target):
+    """配置字段变化时通知（在线状态、最后上报数据等更新不通知）"""
+    state = sa_inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _CONFIG_FIELDS):
+        _publish_after_commit(target)
+
+
+@event.listens_for(Device, "after_delete")
+def _on_device_deleted(mapper, connection, target):
+    _publish_after_commit(target)
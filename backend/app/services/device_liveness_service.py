@@ -0,0 +1,269 @@
+"""
+设备在线状态巡检服务
+后台定时把超时未上报的设备批量置为离线，读取设备的接口不再写数据库
+
+设计说明：
+- last_seen 由多个进程写入（独立部署的 mqtt-service、设备HTTP上报接口等），
+  因此以数据库为准：每轮只增量读取 last_seen 晚于水位线的设备（idx_last_seen 索引），
+  把它们的到期时间放入内存最小堆
+- 堆顶到期后再核对该设备最新的 last_seen（过时条目直接丢弃），
+  到期设备用一条 UPDATE 批量置为离线，并带上 is_online/last_seen 条件防止覆盖刚上报的设备
+- 上线/离线状态变化发布到 Redis 频道 device:presence
+- 多个 worker 时通过 Redis 锁选出一个执行巡检；Redis 不可用时各进程各自巡检（UPDATE 幂等）
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import heapq
+import json
+import os
+import socket
+import threading
+import logging
+
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.device import Device
+from app.utils.timezone import get_beijing_time_naive
+
+logger = logging.getLogger(__name__)
+
+# 状态变化发布频道
+PRESENCE_CHANNEL = "device:presence"
+
+# 巡检锁
+SWEEP_LOCK_KEY = "device:liveness:sweeper"
+
+# 增量读取的回看时间（秒），容忍各进程写入 last_seen 的时钟差和事务提交延迟
+WATERMARK_GRACE_SECONDS = 10
+
+# 单条 UPDATE 最多包含的设备数
+UPDATE_BATCH_SIZE = 1000
+
+
+class DeviceLivenessSweeper:
+    """设备在线状态巡检器"""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._last_seen: Dict[int, datetime] = {}  # 在线设备 -> 最新 last_seen
+        self._uuids: Dict[int, str] = {}
+        self._watermark: Optional[datetime] = None
+        self._is_leader = False
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._redis = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def timeout(self) -> timedelta:
+        return timedelta(minutes=settings.device_offline_timeout_minutes)
+
+    # ------------------------------------------------------------------
+    # Redis（可选）
+    # ------------------------------------------------------------------
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.redis_url,
+                decode_responses=True,
+                socket_timeout=2,
+                socket_connect_timeout=2
+            )
+        return self._redis
+
+    def _acquire_leadership(self) -> bool:
+        """获取或续期巡检锁"""
+        ttl = max(settings.device_liveness_sweep_interval * 3, 10)
+        try:
+            client = self._get_redis()
+            if client.set(SWEEP_LOCK_KEY, self._worker_id, nx=True, ex=ttl):
+                return True
+            if client.get(SWEEP_LOCK_KEY) == self._worker_id:
+                client.expire(SWEEP_LOCK_KEY, ttl)
+                return True
+            return False
+        except Exception as e:
+            logger.debug(f"巡检锁不可用，本进程直接巡检: {e}")
+            return True
+
+    def _release_leadership(self) -> None:
+        try:
+            client = self._get_redis()
+            if client.get(SWEEP_LOCK_KEY) == self._worker_id:
+                client.delete(SWEEP_LOCK_KEY)
+        except Exception:
+            pass
+
+    def _publish(self, events: List[Dict]) -> None:
+        """发布设备上线/离线事件"""
+        if not events:
+            return
+        try:
+            client = self._get_redis()
+            pipe = client.pipeline(transaction=False)
+            for event in events:
+                pipe.publish(PRESENCE_CHANNEL, json.dumps(event, ensure_ascii=False))
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"发布设备状态变化失败: {e}")
+
+    # ------------------------------------------------------------------
+    # 巡检
+    # ------------------------------------------------------------------
+
+    def _reset(self) -> None:
+        self._heap = []
+        self._last_seen = {}
+        self._uuids = {}
+        self._watermark = None
+
+    def _track(self, device_id: int, device_uuid: str, last_seen: datetime) -> bool:
+        """记录设备最新的 last_seen，返回是否为新上线的设备"""
+        previous = self._last_seen.get(device_id)
+        if previous is not None and previous >= last_seen:
+            return False
+        self._last_seen[device_id] = last_seen
+        self._uuids[device_id] = device_uuid
+        heapq.heappush(self._heap, (last_seen + self.timeout, device_id))
+        return previous is None
+
+    def _load_changes(self, db) -> List[Dict]:
+        """增量读取 last_seen 有变化的在线设备，返回上线事件"""
+        query = db.query(Device.id, Device.uuid, Device.last_seen).filter(
+            Device.is_online == True,
+            Device.last_seen.isnot(None)
+        )
+        initial = self._watermark is None
+        if not initial:
+            query = query.filter(
+                Device.last_seen > self._watermark - timedelta(seconds=WATERMARK_GRACE_SECONDS)
+            )
+
+        events = []
+        for device_id, device_uuid, last_seen in query.all():
+            if self._watermark is None or last_seen > self._watermark:
+                self._watermark = last_seen
+            if self._track(device_id, device_uuid, last_seen) and not initial:
+                events.append({
+                    "device_uuid": device_uuid,
+                    "is_online": True,
+                    "last_seen": last_seen.isoformat()
+                })
+
+        if self._watermark is None:
+            self._watermark = get_beijing_time_naive()
+        return events
+
+    def _pop_expired(self, now: datetime) -> List[int]:
+        """弹出已到期的设备（跳过已被更新的过时条目）"""
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, device_id = heapq.heappop(self._heap)
+            last_seen = self._last_seen.get(device_id)
+            if last_seen is None or last_seen + self.timeout != expires_at:
+                continue
+            expired.append(device_id)
+        return expired
+
+    def sweep(self) -> int:
+        """
+        执行一轮巡检
+
+        Returns:
+            本轮被置为离线的设备数
+        """
+        db = SessionLocal()
+        try:
+            events = self._load_changes(db)
+
+            now = get_beijing_time_naive()
+            cutoff = now - self.timeout
+            expired = self._pop_expired(now)
+
+            offline_ids: List[int] = []
+            for i in range(0, len(expired), UPDATE_BATCH_SIZE):
+                batch = expired[i:i + UPDATE_BATCH_SIZE]
+                conditions = (
+                    Device.id.in_(batch),
+                    Device.is_online == True,
+                    Device.last_seen <= cutoff
+                )
+                # 已被其他途径置为离线或刚刚重新上报的设备不在结果中
+                ids = [device_id for device_id, in db.query(Device.id).filter(*conditions).all()]
+                if ids:
+                    db.execute(
+                        update(Device)
+                        .where(*conditions)
+                        .values(is_online=False)
+                        .execution_options(synchronize_session=False)
+                    )
+                    offline_ids.extend(ids)
+            db.commit()
+
+            offline_set = set(offline_ids)
+            for device_id in expired:
+                last_seen = self._last_seen.pop(device_id)
+                device_uuid = self._uuids.pop(device_id)
+                if device_id in offline_set:
+                    events.append({
+                        "device_uuid": device_uuid,
+                        "is_online": False,
+                        "last_seen": last_seen.isoformat()
+                    })
+
+            self._publish(events)
+            if offline_ids:
+                logger.info(f"设备在线巡检: {len(offline_ids)} 台设备超时离线")
+            return len(offline_ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        interval = settings.device_liveness_sweep_interval
+        while not self._stop_event.is_set():
+            try:
+                is_leader = self._acquire_leadership()
+                if is_leader and not self._is_leader:
+                    # 刚成为巡检进程：重新加载全部在线设备
+                    self._reset()
+                self._is_leader = is_leader
+                if is_leader:
+                    self.sweep()
+            except Exception as e:
+                logger.error(f"设备在线巡检失败: {e}", exc_info=True)
+            self._stop_event.wait(interval)
+
+    def start(self) -> None:
+        """启动后台巡检线程"""
+        if not settings.device_liveness_sweep_enabled:
+            logger.info("设备在线巡检已禁用")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="device-liveness-sweeper", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"设备在线巡检已启动: 间隔 {settings.device_liveness_sweep_interval} 秒, "
+            f"超时 {settings.device_offline_timeout_minutes} 分钟"
+        )
+
+    def stop(self) -> None:
+        """停止后台巡检线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._is_leader:
+            self._release_leadership()
+            self._is_leader = False
+
+
+device_liveness_sweeper = DeviceLivenessSweeper()
@@ -0,0 +1,243 @@
+"""
+设备实时数据推送
+客户端通过 /api/devices/stream 订阅一组设备，设备上报数据时推送变化量，不再轮询 realtime-data / sensor-data
+
+- mqtt-service 写入传感器最新值后发布到 Redis 频道 device:telemetry，
+  设备在线巡检发布上线/离线到 device:presence（见 device_liveness_service）
+- 每个 worker 进程一个后台线程订阅这两个频道，按设备UUID分发给本进程的连接，多 worker 部署时各自转发
+- 每个连接只保存每台设备待推送的变化（同一传感器只保留最新值），发送速度跟不上时合并而不是排队，
+  内存占用只与订阅的设备和传感器数量有关；两次推送之间至少间隔 DEVICE_TELEMETRY_PUSH_INTERVAL 秒
+- Redis 不可用时本进程发布的数据（设备HTTP上报）直接分发给本进程的连接
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set
+from datetime import datetime
+import asyncio
+import json
+import threading
+import logging
+
+from app.core.config import settings
+from app.services.device_liveness_service import PRESENCE_CHANNEL
+from app.services.sensor_latest_store import parse_sensor_value
+from app.utils.timezone import format_datetime_beijing
+
+logger = logging.getLogger(__name__)
+
+# 传感器数据发布频道（mqtt-service 发布，消息格式见 service/mqtt-service/sensor_cache.py）
+TELEMETRY_CHANNEL = "device:telemetry"
+
+# Redis 订阅断开后的重连间隔（秒）
+RECONNECT_DELAY = 5
+
+
+def _format_time(value: Optional[str]) -> Optional[str]:
+    """把频道消息中不带时区的北京时间转为带 +08:00 的时间"""
+    if not value:
+        return None
+    try:
+        return format_datetime_beijing(datetime.fromisoformat(value))
+    except ValueError:
+        return value
+
+
+def format_sensor(sensor: Dict[str, Any]) -> Dict[str, Any]:
+    """推送给客户端的传感器值（与 sensor-data 接口一致）"""
+    return {
+        "value": parse_sensor_value(sensor.get("value")),
+        "unit": sensor.get("unit") or "",
+        "sensor_type": sensor.get("sensor_type") or "",
+        "timestamp": _format_time(sensor.get("timestamp"))
+    }
+
+
+class TelemetrySubscriber:
+    """一个推送连接：合并待推送的设备变化"""
+
+    def __init__(self, device_uuids: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.device_uuids = frozenset(device_uuids)
+        self.loop = loop
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._ready = asyncio.Event()
+        self.received = 0
+        self.sent = 0
+
+    def offer(self, events: List[Dict[str, Any]]) -> None:
+        """合并设备变化（在连接所在的事件循环中执行）"""
+        for event in events:
+            device_uuid = event["device_uuid"]
+            if device_uuid not in self.device_uuids:
+                continue
+            entry = self._pending.setdefault(device_uuid, {})
+            if event.get("sensors"):
+                sensors = entry.setdefault("sensors", {})
+                for name, sensor in event["sensors"].items():
+                    sensors[name] = format_sensor(sensor)
+            if "is_online" in event:
+                entry["is_online"] = event["is_online"]
+            if event.get("last_seen"):
+                entry["last_seen"] = _format_time(event["last_seen"])
+            self.received += 1
+        if self._pending:
+            self._ready.set()
+
+    async def next_batch(self, timeout: float) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        等待并取出待推送的变化
+
+        Returns:
+            设备UUID -> 变化；超时没有变化返回None
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        batch, self._pending = self._pending, {}
+        self.sent += len(batch)
+        return batch
+
+
+class DeviceTelemetryHub:
+    """设备实时数据分发"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[TelemetrySubscriber]] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.messages = 0
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.redis_url,
+                decode_responses=True,
+                socket_timeout=2,
+                socket_connect_timeout=2
+            )
+        return self._redis
+
+    # ------------------------------------------------------------------
+    # 订阅
+    # ------------------------------------------------------------------
+
+    def subscribe(self, subscriber: TelemetrySubscriber) -> None:
+        with self._lock:
+            for device_uuid in subscriber.device_uuids:
+                self._subscribers.setdefault(device_uuid, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: TelemetrySubscriber) -> None:
+        with self._lock:
+            for device_uuid in subscriber.device_uuids:
+                subscribers = self._subscribers.get(device_uuid)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[device_uuid]
+
+    # ------------------------------------------------------------------
+    # 发布与分发
+    # ------------------------------------------------------------------
+
+    def publish(
+        self,
+        device_uuid: str,
+        sensors: Optional[Dict[str, Dict[str, Any]]] = None,
+        last_seen: Optional[datetime] = None
+    ) -> None:
+        """
+        发布设备数据变化（设备通过 backend 上报时调用，提交后调用）
+
+        Args:
+            device_uuid: 设备UUID
+            sensors: 传感器名称 -> {"value", "unit", "sensor_type", "timestamp"}
+            last_seen: 最后在线时间
+        """
+        event = {
+            "device_uuid": device_uuid,
+            "sensors": sensors or {},
+            "is_online": True,
+            "last_seen": last_seen.isoformat() if last_seen else None
+        }
+        try:
+            self._get_redis().publish(TELEMETRY_CHANNEL, json.dumps(event, ensure_ascii=False))
+        except Exception as e:
+            logger.debug(f"发布设备数据失败，只推送给本进程的连接: {e}")
+            self.dispatch([event])
+
+    def dispatch(self, events: List[Dict[str, Any]]) -> None:
+        """把设备变化分发给订阅了对应设备的连接"""
+        by_subscriber: Dict[TelemetrySubscriber, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for event in events:
+                for subscriber in self._subscribers.get(event.get("device_uuid"), ()):
+                    by_subscriber.setdefault(subscriber, []).append(event)
+        for subscriber, subscriber_events in by_subscriber.items():
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, subscriber_events)
+            except RuntimeError:
+                # 事件循环已关闭
+                self.unsubscribe(subscriber)
+
+    # ------------------------------------------------------------------
+    # Redis 订阅线程
+    # ------------------------------------------------------------------
+
+    def _listen(self) -> None:
+        pubsub = self._get_redis().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(TELEMETRY_CHANNEL, PRESENCE_CHANNEL)
+        try:
+            while not self._stop_event.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                self.messages += 1
+                with self._lock:
+                    if not self._subscribers:
+                        continue
+                try:
+                    event = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                self.dispatch([event])
+        finally:
+            pubsub.close()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"设备实时数据订阅中断，{RECONNECT_DELAY} 秒后重连: {e}")
+                self._stop_event.wait(RECONNECT_DELAY)
+
+    def start(self) -> None:
+        """启动 Redis 订阅线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="device-telemetry-hub", daemon=True)
+        self._thread.start()
+        logger.info("设备实时数据推送已启动")
+
+    def stop(self) -> None:
+        """停止 Redis 订阅线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscribers = {s for subs in self._subscribers.values() for s in subs}
+            return {
+                "connections": len(subscribers),
+                "devices": len(self._subscribers),
+                "messages": self.messages
+            }
+
+
+device_telemetry_hub = DeviceTelemetryHub()
@@ -365,9 +365,9 @@ async def embed_document(
     """
     from app.models.document import Document, DocumentChunk
     from app.models.knowledge_base import KnowledgeBase
-    from app.utils.document_parser import parse_and_split_document
+    from app.utils.document_parser import iter_document_chunks
     from app.utils.timezone import get_beijing_time_naive
-    import time
+    import itertools
     
     # 获取文档
     doc = db.query(Document).filter(Document.id == document_id).first()
@@ -386,11 +386,10 @@ async def embed_document(
         doc.embedding_status = 'processing'
         db.commit()
         
-        # 读取文件内容
-        from app.api.ai.kb_documents import read_file_from_disk
+        # 文件路径
+        from app.api.ai.kb_documents import get_file_path
+        file_path = get_file_path(doc.file_url)
         logger.info(f"读取文档文件: {doc.file_url}")
-        file_content = read_file_from_disk(doc.file_url)
-        logger.info(f"文件读取成功，大小: {len(file_content)} bytes")
         
         # 获取切分参数
         chunk_size = kb.chunk_size or 500
@@ -407,30 +406,30 @@ async def embed_document(
         
         logger.info(f"切分参数: mode={split_mode}, size={chunk_size}, overlap={chunk_overlap}")
         
-        # 解析和切分文档
-        logger.info(f"[步骤1/4] 开始解析和切分文档 {doc.id}")
-        
-        try:
-            _, chunks_data = parse_and_split_document(
-                file_content,
-                doc.file_type,
-                chunk_size,
-                chunk_overlap,
-                split_mode
-            )
-        except Exception as parse_error:
-            logger.error(f"文档 {doc.id} 解析或切分失败: {str(parse_error)}", exc_info=True)
-            doc.embedding_status = 'failed'
-            doc.embedding_error = f"文档解析失败: {str(parse_error)}"
-            db.commit()
-            return
+        # 流式解析和切分文档：文本块边产生边分批送入向量化，不在内存中保留整个文档
+        logger.info(f"[步骤1/4] 开始流式解析和切分文档 {doc.id}")
+        chunk_iter = iter_document_chunks(
+            file_path,
+            doc.file_type,
+            chunk_size,
+            chunk_overlap,
+            split_mode
+        )
         
-        total_chunks = len(chunks_data)
-        logger.info(f"[步骤1/4] 文档 {doc.id} 切分完成: {total_chunks} 个文本块")
+        def next_batch():
+            try:
+                return list(itertools.islice(chunk_iter, batch_size))
+            except Exception as parse_error:
+                logger.error(f"文档 {doc.id} 解析或切分失败: {str(parse_error)}", exc_info=True)
+                doc.embedding_status = 'failed'
+                doc.embedding_error = f"文档解析失败: {str(parse_error)}"
+                db.commit()
+                return None
         
-        # 检查文本块数量，如果太多则警告
-        if total_chunks > 200:
-            logger.warning(f"文档 {doc.id} 文本块数量较多 ({total_chunks})，将使用批量处理")
+        # 先取出第一批，确认文档能正常解析后再清理旧数据
+        batch_chunks = next_batch()
+        if batch_chunks is None:
+            return
         
         # 删除旧的文本块
         logger.info(f"[步骤2/4] 清理旧的文本块记录...")
@@ -442,22 +441,23 @@ async def embed_document(
         logger.info(f"[步骤3/4] 初始化向量化服务...")
         if embedding_service is None:
             embedding_service = get_embedding_service()
-        logger.info(f"[步骤3/4] 向量化服务就绪，准备处理 {total_chunks} 个文本块")
+        logger.info("[步骤3/4] 向量化服务就绪")
         
-        # 批量向量化（分批处理，避免超时和内存问题）
-        chunk_objects = []
+        # 分批向量化（避免超时和内存问题）
+        embedded_count = 0
         failed_indices = []
+        batch_start = 0
+        batch_number = 0
         
-        for batch_start in range(0, total_chunks, batch_size):
-            batch_end = min(batch_start + batch_size, total_chunks)
-            batch_chunks = chunks_data[batch_start:batch_end]
+        while batch_chunks:
+            batch_number += 1
+            batch_end = batch_start + len(batch_chunks)
             
-            logger.info(f"文档 {doc.id}: 处理批次 {batch_start//batch_size + 1}/{(total_chunks + batch_size - 1)//batch_size} "
-                       f"({batch_start+1}-{batch_end}/{total_chunks})")
+            logger.info(f"文档 {doc.id}: 处理批次 {batch_number} ({batch_start+1}-{batch_end})")
             
             # 提取文本
             texts = [chunk['content'] for chunk in batch_chunks]
-            logger.info(f"批次 {batch_start//batch_size + 1}: 准备向量化 {len(texts)} 个文本块")
+            logger.info(f"批次 {batch_number}: 准备向量化 {len(texts)} 个文本块")
             
             # 向量化（带重试）
             max_retries = 3
@@ -465,9 +465,9 @@ async def embed_document(
             
             for attempt in range(max_retries):
                 try:
-                    logger.debug(f"批次 {batch_start//batch_size + 1}: 调用向量化API (尝试 {attempt + 1}/{max_retries})")
+                    logger.debug(f"批次 {batch_number}: 调用向量化API (尝试 {attempt + 1}/{max_retries})")
                     embeddings = await embedding_service.embed_texts(texts)
-                    logger.info(f"批次 {batch_start//batch_size + 1}: 向量化API调用成功，获得 {len(embeddings)} 个向量")
+                    logger.info(f"批次 {batch_number}: 向量化API调用成功，获得 {len(embeddings)} 个向量")
                     
                     # 创建文本块记录
                     for i, (chunk_data, embedding) in enumerate(zip(batch_chunks, embeddings)):
@@ -484,45 +484,61 @@ async def embed_document(
                             meta_data=chunk_data.get('metadata')
                         )
                         
-                        chunk_objects.append(chunk)
                         db.add(chunk)
                     
                     # 提交当前批次
                     db.commit()
-                    logger.info(f"文档 {doc.id}: 批次 {batch_start//batch_size + 1} 处理成功")
+                    # 已提交的对象不再保留引用，避免大文档占用内存
+                    embedded_count += len(batch_chunks)
+                    logger.info(f"文档 {doc.id}: 批次 {batch_number} 处理成功")
                     break  # 成功则跳出重试循环
                     
                 except Exception as batch_error:
+                    db.rollback()
                     if attempt < max_retries - 1:
-                        logger.warning(f"文档 {doc.id}: 批次 {batch_start//batch_size + 1} 失败，"
+                        logger.warning(f"文档 {doc.id}: 批次 {batch_number} 失败，"
                                       f"将在 {retry_delay} 秒后重试 (尝试 {attempt + 1}/{max_retries}): {str(batch_error)}")
                         await asyncio.sleep(retry_delay)
                         retry_delay *= 2  # 指数退避
                     else:
-                        logger.error(f"文档 {doc.id}: 批次 {batch_start//batch_size + 1} 多次重试失败: {str(batch_error)}")
+                        logger.error(f"文档 {doc.id}: 批次 {batch_number} 多次重试失败: {str(batch_error)}")
                         failed_indices.extend(range(batch_start, batch_end))
                         break
             
+            # 读取下一批
+            batch_start = batch_end
+            batch_chunks = next_batch()
+            if batch_chunks is None:
+                # 中途解析失败：删除已提交的部分文本块，文档不保留半份索引
+                db.query(DocumentChunk).filter(DocumentChunk.document_id == doc.id).delete()
+                doc.chunk_count = 0
+                db.commit()
+                logger.info(f"文档 {doc.id}: 已删除 {embedded_count} 个已写入的文本块")
+                return
+            
             # 批次间短暂延迟，避免API限流
-            if batch_end < total_chunks:
+            if batch_chunks:
                 await asyncio.sleep(0.5)
         
+        total_chunks = batch_start
+        logger.info(f"[步骤1/4] 文档 {doc.id} 切分完成: {total_chunks} 个文本块")
+        
         # 更新文档状态
         logger.info(f"[步骤4/4] 更新文档状态...")
         if not failed_indices:
             doc.embedding_status = 'completed'
-            doc.chunk_count = len(chunk_objects)
+            doc.chunk_count = embedded_count
             doc.embedded_at = get_beijing_time_naive()
             doc.embedding_error = None
-            logger.info(f"[步骤4/4] ✅ 文档 {doc.id} 向量化完成，共 {len(chunk_objects)} 个文本块")
+            logger.info(f"[步骤4/4] ✅ 文档 {doc.id} 向量化完成，共 {embedded_count} 个文本块")
         else:
             doc.embedding_status = 'failed'
-            doc.chunk_count = len(chunk_objects)
+            doc.chunk_count = embedded_count
             doc.embedding_error = f"部分文本块向量化失败: {len(failed_indices)} 个（{failed_indices[:10]}...）"
-            logger.error(f"[步骤4/4] ❌ 文档 {doc.id} 部分向量化失败，成功 {len(chunk_objects)}/{total_chunks}")
+            logger.error(f"[步骤4/4] ❌ 文档 {doc.id} 部分向量化失败，成功 {embedded_count}/{total_chunks}")
         
         # 更新知识库统计
-        kb.chunk_count = (kb.chunk_count or 0) + len(chunk_objects)
+        kb.chunk_count = (kb.chunk_count or 0) + embedded_count
         kb.last_updated_at = get_beijing_time_naive()
         
         db.commit()
@@ -0,0 +1,334 @@
+"""
+固件分发服务
+上传时边写入边计算SHA-256，下载支持断点续传（HTTP Range）和条件请求（ETag / If-None-Match），
+OTA检测读取按产品缓存的最新固件清单
+
+- 固件文件名包含上传时间戳，内容不会变化，因此以SHA-256作为强ETag；
+  哈希在上传时写入同名的 .sha256 文件，历史固件首次下载时补算一次
+- 设备在学校Wi-Fi下断线后可用 Range 从断点继续下载，不必从头开始
+- 最新固件清单在固件新增、修改、删除时失效（提交后再次失效，防止并发请求回填旧值），
+  清单中保存预先解析的版本号，OTA检测只需一次字典查找和一次元组比较
+"""
+from typing import Any, Dict, Iterator, Optional, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import os
+import logging
+
+from fastapi import UploadFile
+from sqlalchemy import event, desc
+from sqlalchemy.orm import Session, object_session
+
+from app.core.cache import TTLCache, MISSING, run_after_commit
+from app.core.config import settings
+from app.models.firmware import Firmware
+
+logger = logging.getLogger(__name__)
+
+# 固件存储目录（与 /static 挂载目录一致）
+FIRMWARE_DIR = Path("static") / "firmware"
+
+# 读写文件的分块大小
+FILE_BLOCK_SIZE = 64 * 1024
+
+# 哈希文件后缀
+HASH_FILE_SUFFIX = ".sha256"
+
+# 按产品缓存的最新固件清单
+firmware_manifest_cache = TTLCache(
+    "firmware_manifest",
+    ttl=settings.firmware_manifest_cache_ttl,
+    maxsize=settings.firmware_manifest_cache_max_size
+)
+
+# 固件文件元信息缓存（按文件名、修改时间、大小）
+firmware_file_cache = TTLCache("firmware_file", ttl=3600, maxsize=1000)
+
+
+@dataclass(frozen=True)
+class FirmwareFileInfo:
+    """固件文件元信息"""
+    path: Path
+    size: int
+    sha256: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+
+def build_firmware_url(filename: str) -> str:
+    """生成固件下载地址（支持断点续传的下载接口）"""
+    return f"{settings.get_firmware_base_url}/api/firmware/download/{filename}"
+
+
+def _hash_file_path(path: Path) -> Path:
+    return path.with_name(path.name + HASH_FILE_SUFFIX)
+
+
+async def save_firmware_upload(file: UploadFile, dest_path: Path) -> Tuple[int, str]:
+    """
+    分块把上传的固件写入磁盘，同时计算文件大小和SHA-256
+
+    文件内容不会整体加载到内存，哈希写入同名的 .sha256 文件供下载时作为ETag。
+
+    Returns:
+        tuple: (文件大小, SHA-256)
+    """
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                block = await file.read(FILE_BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                sha256.update(block)
+                f.write(block)
+        file_hash = sha256.hexdigest()
+        _hash_file_path(dest_path).write_text(file_hash)
+    except Exception:
+        remove_firmware_file(dest_path)
+        raise
+    return size, file_hash
+
+
+def remove_firmware_file(path: Path) -> None:
+    """删除固件文件及其哈希文件"""
+    path.unlink(missing_ok=True)
+    _hash_file_path(path).unlink(missing_ok=True)
+
+
+def _compute_file_hash(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(FILE_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def get_firmware_file_info(filename: str) -> Optional[FirmwareFileInfo]:
+    """
+    获取固件文件的大小和SHA-256
+
+    Args:
+        filename: 固件文件名（不含目录）
+
+    Returns:
+        文件元信息；文件名非法或文件不存在时返回None
+    """
+    if not filename or os.path.basename(filename) != filename or not filename.endswith(".bin"):
+        return None
+
+    path = FIRMWARE_DIR / filename
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+
+    key = (filename, stat.st_mtime_ns, stat.st_size)
+    info = firmware_file_cache.get(key)
+    if info is not MISSING:
+        return info
+
+    hash_path = _hash_file_path(path)
+    file_hash = None
+    try:
+        if hash_path.stat().st_mtime_ns >= stat.st_mtime_ns:
+            file_hash = hash_path.read_text().strip() or None
+    except OSError:
+        pass
+
+    if file_hash is None:
+        # 早期上传的固件没有哈希文件，补算一次
+        file_hash = _compute_file_hash(path)
+        try:
+            hash_path.write_text(file_hash)
+        except OSError as e:
+            logger.warning(f"写入固件哈希文件失败: {hash_path}, {e}")
+
+    info = FirmwareFileInfo(path=path, size=stat.st_size, sha256=file_hash)
+    firmware_file_cache.set(key, info)
+    return info
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 是否命中当前ETag（弱比较）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节区间的 Range 请求头
+
+    Args:
+        range_header: Range 请求头，如 "bytes=1024-" 或 "bytes=-512"
+        file_size: 文件大小
+
+    Returns:
+        (起始位置, 结束位置)，结束位置包含在内；无Range或为多区间请求时返回None（返回完整文件）
+
+    Raises:
+        ValueError: 区间无法满足（应返回416）
+    """
+    if not range_header:
+        return None
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start_text, sep, end_text = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_text == "":
+            # 后缀区间：最后N个字节
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError("无效的Range")
+            start, end = max(0, file_size - suffix), file_size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else file_size - 1
+            end = min(end, file_size - 1)
+    except ValueError:
+        raise ValueError("无效的Range")
+
+    if start < 0 or start >= file_size or start > end:
+        raise ValueError("Range超出文件范围")
+    return start, end
+
+
+def iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """分块读取文件的 [start, end] 区间"""
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            block = f.read(min(FILE_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+# ----------------------------------------------------------------------
+# 版本号
+# ----------------------------------------------------------------------
+
+# 版本比较键：(数字段元组，格式不正确时为None, 原始版本号)
+VersionKey = Tuple[Optional[Tuple[int, ...]], str]
+
+
+@lru_cache(maxsize=4096)
+def parse_version(version: str) -> VersionKey:
+    """
+    解析版本号为比较键（设备上报的版本号种类很少，解析结果缓存复用）
+
+    "1.2" 与 "1.2.0" 的数字段相同（去掉末尾的0，等价于补齐长度后比较）
+    """
+    try:
+        parts = [int(x) for x in version.split('.')]
+    except ValueError:
+        return None, version
+    while parts and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts), version
+
+
+def compare_version_keys(key1: VersionKey, key2: VersionKey) -> int:
+    """
+    比较两个版本比较键
+
+    两个版本号都是数字格式时按数字段比较，否则按原始字符串比较
+
+    Returns:
+        1 表示 key1 > key2, -1 表示 key1 < key2, 0 表示相等
+    """
+    if key1[0] is not None and key2[0] is not None:
+        a, b = key1[0], key2[0]
+    else:
+        a, b = key1[1], key2[1]
+    return (a > b) - (a < b)
+
+
+# ----------------------------------------------------------------------
+# 最新固件清单
+# ----------------------------------------------------------------------
+
+def _load_manifest(db: Session, product_code: str) -> Optional[Dict[str, Any]]:
+    # 优先使用is_latest标记，没有时按创建时间取最新的激活版本
+    firmware = db.query(Firmware).filter(
+        Firmware.product_code == product_code,
+        Firmware.is_active == True,
+        Firmware.is_latest == True
+    ).first()
+    if not firmware:
+        firmware = db.query(Firmware).filter(
+            Firmware.product_code == product_code,
+            Firmware.is_active == True
+        ).order_by(desc(Firmware.created_at)).first()
+    if not firmware:
+        return None
+    return {
+        "id": firmware.id,
+        "version": firmware.version,
+        "version_key": parse_version(firmware.version),
+        "firmware_url": firmware.firmware_url,
+        "file_size": firmware.file_size,
+        "file_hash": firmware.file_hash,
+        "description": firmware.description,
+        "release_notes": firmware.release_notes
+    }
+
+
+def get_product_manifest(db: Session, product_code: str) -> Optional[Dict[str, Any]]:
+    """
+    获取产品的最新固件清单（缓存）
+
+    Returns:
+        最新激活固件的信息；产品没有可用固件时返回None
+    """
+    manifest = firmware_manifest_cache.get(product_code)
+    if manifest is MISSING:
+        manifest = _load_manifest(db, product_code)
+        firmware_manifest_cache.set(product_code, manifest)
+    return manifest
+
+
+def invalidate_product_manifest(product_code: Optional[str]) -> None:
+    """使产品的最新固件清单失效"""
+    if product_code:
+        firmware_manifest_cache.invalidate(product_code)
+
+
+def _invalidate_for(target: Firmware) -> None:
+    product_code = target.product_code
+
+    def invalidate():
+        invalidate_product_manifest(product_code)
+
+    invalidate()
+    run_after_commit(object_session(target), invalidate)
+
+
+@event.listens_for(Firmware, "after_insert")
+@event.listens_for(Firmware, "after_update")
+@event.listens_for(Firmware, "after_delete")
+def _on_firmware_changed(mapper, connection, target):
+    """固件新增、修改或删除时失效该产品的清单"""
+    _invalidate_for(target)
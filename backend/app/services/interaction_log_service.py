@@ -25,12 +25,19 @@ from sqlalchemy.dialects.postgresql import insert
 
 from ..core.database import get_async_session
 from ..core.config import settings
+from ..core.cache import MISSING
+from ..core.pagination import keyset_condition, split_page, list_count_cache
 from ..models.interaction_log import InteractionLog
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+def _truncate_to_minute(dt: Optional[datetime]) -> Optional[datetime]:
+    """时间取整到分钟（用于总数缓存键）"""
+    return dt.replace(second=0, microsecond=0) if dt else None
+
+
 @dataclass
 class LogEntry:
     """日志条目数据类"""
@@ -238,17 +245,29 @@ class InteractionLogService:
         interaction_type: Optional[str] = None,
         status: Optional[str] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
-        """获取设备日志（带缓存优化）"""
+        """
+        获取设备日志（带缓存优化）
+        
+        按 (timestamp, id) 倒序分页：传入 cursor 时从上一页末尾继续（忽略offset），
+        返回的 next_cursor 用于请求下一页。总数按筛选条件缓存，翻页时不重复计数。
         
-        # 尝试从缓存获取最近日志
-        if not start_time and not end_time and limit <= 100:
+        Raises:
+            ValueError: 游标无效
+        """
+        
+        # 只有无筛选条件的第一页才使用最近日志缓存
+        is_first_page = not offset and not cursor
+        has_filters = start_time or end_time or interaction_type or status
+        if is_first_page and not has_filters and limit <= 100:
             cached_logs = await self.cache.get_recent_logs(device_id)
             if cached_logs:
                 return {
                     'logs': cached_logs[:limit],
                     'total': len(cached_logs),
+                    'next_cursor': None,
                     'from_cache': True
                 }
         
@@ -266,16 +285,28 @@ class InteractionLogService:
             if status:
                 query = query.where(InteractionLog.status == status)
             
-            # 获取总数
-            count_query = select(func.count()).select_from(query.subquery())
-            total = await session.scalar(count_query)
+            # 获取总数（按筛选条件缓存；时间范围取整到分钟，滚动时间窗口也能命中）
+            count_key = (
+                "interaction_logs", device_id,
+                _truncate_to_minute(start_time), _truncate_to_minute(end_time),
+                interaction_type, status
+            )
+            total = list_count_cache.get(count_key)
+            if total is MISSING:
+                count_query = select(func.count()).select_from(query.subquery())
+                total = await session.scalar(count_query)
+                list_count_cache.set(count_key, total)
             
             # 分页查询
-            query = query.order_by(InteractionLog.timestamp.desc())
-            query = query.offset(offset).limit(limit)
+            query = query.order_by(InteractionLog.timestamp.desc(), InteractionLog.id.desc())
+            if cursor:
+                query = query.where(keyset_condition(InteractionLog.timestamp, InteractionLog.id, cursor))
+            else:
+                query = query.offset(offset)
+            query = query.limit(limit + 1)
             
             result = await session.execute(query)
-            logs = result.scalars().all()
+            logs, next_cursor = split_page(result.scalars().all(), limit, 'timestamp')
             
             # 转换为字典格式
             log_dicts = [
@@ -297,12 +328,13 @@ class InteractionLogService:
             ]
             
             # 缓存最近的日志
-            if not start_time and not end_time:
+            if is_first_page and not has_filters:
                 await self.cache.cache_recent_logs(device_id, log_dicts)
             
             return {
                 'logs': log_dicts,
                 'total': total,
+                'next_cursor': next_cursor,
                 'from_cache': False
             }
     
@@ -0,0 +1,121 @@
+"""
+知识库权限索引
+按用户缓存可访问的知识库ID集合，避免每次检索都加载全部知识库逐个做权限判断
+
+权限规则与 app.api.ai.knowledge_bases.check_kb_permission 保持一致：
+- 平台管理员：可访问所有未删除的知识库
+- 系统知识库（system）：仅平台管理员可访问
+- 其他类型（personal 及兼容的 school/course/agent）：仅所有者可访问
+"""
+from typing import List, Optional
+import logging
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.core.cache import TTLCache, MISSING, run_after_commit
+from app.core.config import settings
+from app.models.knowledge_base import KnowledgeBase
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 平台管理员共享的缓存键（可访问全部知识库）
+ALL_KB_KEY = "__all__"
+
+# 影响访问权限的字段，只有这些字段变化时才需要失效
+_PERMISSION_FIELDS = ("owner_id", "scope_type", "deleted_at")
+
+kb_access_cache = TTLCache(
+    "kb_access",
+    ttl=settings.kb_access_cache_ttl,
+    maxsize=settings.kb_access_cache_max_size
+)
+
+
+def _cache_key(user: User):
+    return ALL_KB_KEY if user.role == 'platform_admin' else user.id
+
+
+def _query_accessible_kb_ids(user: User, db: Session) -> List[int]:
+    """单次查询计算用户可访问的知识库ID"""
+    query = db.query(KnowledgeBase.id).filter(KnowledgeBase.deleted_at.is_(None))
+    if user.role != 'platform_admin':
+        query = query.filter(
+            KnowledgeBase.owner_id == user.id,
+            KnowledgeBase.scope_type != 'system'
+        )
+    return [kb_id for kb_id, in query.all()]
+
+
+def get_accessible_kb_ids(user: User, db: Session) -> List[int]:
+    """获取用户可访问的知识库ID列表（带缓存）
+
+    Args:
+        user: 当前用户
+        db: 数据库会话
+
+    Returns:
+        List[int]: 知识库ID列表
+    """
+    key = _cache_key(user)
+    cached = kb_access_cache.get(key)
+    if cached is not MISSING:
+        return list(cached)
+
+    kb_ids = _query_accessible_kb_ids(user, db)
+    kb_access_cache.set(key, tuple(kb_ids))
+    return kb_ids
+
+
+def invalidate_kb_access(owner_id: Optional[int] = None) -> None:
+    """使知识库权限缓存失效
+
+    Args:
+        owner_id: 知识库所有者ID；为None时清空全部缓存
+    """
+    if owner_id is None:
+        kb_access_cache.clear()
+        return
+    kb_access_cache.invalidate(owner_id)
+    kb_access_cache.invalidate(ALL_KB_KEY)
+
+
+def _changed_owner_ids(target: KnowledgeBase, check_fields: bool) -> Optional[set]:
+    """返回受影响的所有者ID集合；权限相关字段未变化时返回None"""
+    state = sa_inspect(target)
+    owner_ids = {target.owner_id}
+    changed = not check_fields
+    for field in _PERMISSION_FIELDS:
+        history = state.attrs[field].history
+        if history.has_changes():
+            changed = True
+            if field == "owner_id":
+                owner_ids.update(v for v in history.deleted if v is not None)
+    return owner_ids if changed else None
+
+
+def _invalidate_for(target: KnowledgeBase, check_fields: bool) -> None:
+    owner_ids = _changed_owner_ids(target, check_fields)
+    if owner_ids is None:
+        return
+
+    def invalidate():
+        for owner_id in owner_ids:
+            invalidate_kb_access(owner_id)
+
+    invalidate()
+    run_after_commit(object_session(target), invalidate)
+
+
+@event.listens_for(KnowledgeBase, "after_insert")
+@event.listens_for(KnowledgeBase, "after_delete")
+def _on_kb_created_or_deleted(mapper, connection, target):
+    """知识库新建或物理删除时失效"""
+    _invalidate_for(target, check_fields=False)
+
+
+@event.listens_for(KnowledgeBase, "after_update")
+def _on_kb_updated(mapper, connection, target):
+    """知识库所有者、类型变化或软删除时失效（文档计数等更新不影响权限）"""
+    _invalidate_for(target, check_fields=True)
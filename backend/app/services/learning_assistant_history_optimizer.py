@@ -1,16 +1,18 @@
 """
 学习助手对话历史优化器
-策略：只保留最近N个用户问题，不保留AI回复
 
-优点：
-1. 极大节省Token（85%+）
-2. 知识库内容权重大幅提升（从20%提升到64%）
-3. 避免历史AI回复的错误影响
-4. 保留问题脉络，便于理解学生学习轨迹
+提示词组装（build_messages）：系统提示 + 知识库参考 + 较早对话的滚动摘要 + 最近几轮原文 + 本次提问
+- 较早的对话由后台任务合并为摘要（learning_assistant_jobs.update_conversation_summary），
+  每轮只读取摘要之后的少量消息，提示词长度不随对话变长而增长
+- 总长度受token预算限制，超出时依次裁剪：最早的对话原文 → 摘要 → 知识库参考
+
+旧策略（optimize_history）：只保留最近N个用户问题，不保留AI回复
 """
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
 
+from app.utils.token_counter import estimate_token_count, estimate_token_counts, truncate_to_tokens
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,19 +21,77 @@ class ConversationHistoryOptimizer:
     
     def __init__(
         self,
-        recent_user_questions: int = 5  # 保留最近N个用户问题
+        recent_user_questions: int = 5,  # 保留最近N个用户问题
+        token_budget: int = 6000  # 提示词token上限
     ):
         """
         初始化优化器
         
         Args:
-            recent_user_questions: 保留最近N个用户问题（不包含AI回复）
+            recent_user_questions: 保留最近N个用户问题（不包含AI回复，用于 optimize_history）
                 - 推荐值：5个（平衡记忆和成本）
                 - 保守值：3个（最省Token）
                 - 激进值：8个（更长的问题脉络）
+            token_budget: build_messages 组装的提示词token上限（估算值）
         """
         self.recent_user_questions = recent_user_questions
-        logger.info(f"💡 对话历史优化器已初始化: 保留最近{recent_user_questions}个用户问题")
+        self.token_budget = token_budget
+        logger.info(f"💡 对话历史优化器已初始化: 提示词预算{token_budget} tokens")
+    
+    def build_messages(
+        self,
+        system_context: str,
+        question: str,
+        history=None,
+        summary: Optional[str] = None,
+        knowledge_context: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        组装发送给LLM的消息，总token数不超过预算
+        
+        保留优先级：系统提示和本次提问 > 知识库参考 > 对话摘要 > 最近的对话原文（从新到旧）
+        
+        Args:
+            system_context: 系统提示词（含学生状态和学习场景）
+            question: 本次提问
+            history: 摘要之后的对话消息（ORM对象或字典，按时间升序）
+            summary: 较早对话的滚动摘要
+            knowledge_context: 知识库检索结果
+        
+        Returns:
+            Chat格式的消息列表：[system, 最近对话..., user(本次提问)]
+        """
+        remaining = self.token_budget - sum(estimate_token_counts([system_context, question]))
+        
+        system_parts = [system_context]
+        sections = [knowledge_context, f"\n[此前对话摘要]\n{summary}" if summary else None]
+        for section in sections:
+            if not section or remaining <= 0:
+                continue
+            tokens = estimate_token_count(section)
+            if tokens > remaining:
+                section = truncate_to_tokens(section, remaining)
+                tokens = estimate_token_count(section)
+            system_parts.append(section)
+            remaining -= tokens
+        
+        # 从最新的消息开始保留，直到预算用完
+        turns = self._convert_to_chat_format(history or [])
+        counts = estimate_token_counts(msg['content'] or '' for msg in turns)
+        start = len(turns)
+        while start > 0 and counts[start - 1] <= remaining:
+            start -= 1
+            remaining -= counts[start]
+        kept = turns[start:]
+        # 不以AI回复开头（对应的提问已被裁剪）
+        while kept and kept[0]['role'] == 'assistant':
+            kept.pop(0)
+        
+        return (
+            [{"role": "system", "content": "\n".join(system_parts)}]
+            + kept
+            + [{"role": "user", "content": question}]
+        )
     
     def optimize_history(self, messages) -> List[Dict[str, str]]:
         """
@@ -132,19 +192,16 @@ class ConversationHistoryOptimizer:
                 'save_percentage': 0
             }
         
-        # 简单估算：1个汉字≈2 tokens，1个英文单词≈1.3 tokens
-        # 这里用字符数 * 1.5 作为粗略估算
-        
-        original_tokens = 0
-        for msg in messages:
-            content = msg.content if hasattr(msg, 'content') else msg.get('content', '')
-            original_tokens += len(content) * 1.5
+        # 与文档切分使用同一套Token估算（中文1字≈1 token，其余4字符≈1 token）
+        original_tokens = sum(estimate_token_counts(
+            (msg.content if hasattr(msg, 'content') else msg.get('content', '')) or ''
+            for msg in messages
+        ))
         
         optimized_messages = self.optimize_history(messages)
-        optimized_tokens = sum(
-            len(msg['content']) * 1.5 
-            for msg in optimized_messages
-        )
+        optimized_tokens = sum(estimate_token_counts(
+            msg['content'] or '' for msg in optimized_messages
+        ))
         
         saved_tokens = original_tokens - optimized_tokens
         save_percentage = round((saved_tokens / original_tokens) * 100, 1) if original_tokens > 0 else 0
@@ -168,6 +225,17 @@ class ConversationHistoryOptimizer:
 
 from app.services.learning_assistant_history_optimizer import ConversationHistoryOptimizer
 
+# 组装提示词（摘要 + 最近对话 + 知识库参考，受token预算限制）
+optimizer = ConversationHistoryOptimizer(token_budget=6000)
+messages = optimizer.build_messages(
+    system_context=system_prompt,
+    question=message,
+    history=recent_messages,          # 摘要之后的消息
+    summary=conversation.summary,
+    knowledge_context=knowledge_text
+)
+
+# 旧策略：只保留最近N个用户问题
 # 1. 创建优化器
 optimizer = ConversationHistoryOptimizer(
     recent_user_questions=5  # 保留最近5个用户问题
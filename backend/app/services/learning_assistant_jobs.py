@@ -0,0 +1,501 @@
+"""
+AI学习助手后台任务
+对话回合提交后执行的后处理：生成会话标题、更新对话摘要、更新学生档案、记录审核日志
+
+- 每个任务使用独立的数据库会话，失败后按间隔重试，不影响已返回的对话结果
+- LEARNING_ASSISTANT_JOB_QUEUE=local（默认）：在backend进程内的线程池中执行。
+  重试由定时器重新提交，等待期间不占用线程；审核日志使用单独的线程池，不被LLM任务阻塞；
+  未完成的任务数（含等待重试的）超过上限时丢弃新任务并计数
+- LEARNING_ASSISTANT_JOB_QUEUE=celery：提交到Celery队列（service/celery-service 中的同名任务），
+  提交失败时回退到本地执行
+- 任务参数均可JSON序列化，两种方式共用同一套处理函数
+"""
+from typing import Any, Callable, Dict, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import logging
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.learning_assistant import (
+    LearningAssistantConversation,
+    LearningAssistantMessage,
+    StudentLearningProfile,
+    ContentModerationLog
+)
+from app.utils.token_counter import truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# 任务名称（与 Celery 任务名一致）
+TASK_GENERATE_TITLE = 'learning_assistant_generate_title'
+TASK_UPDATE_PROFILE = 'learning_assistant_update_profile'
+TASK_UPDATE_SUMMARY = 'learning_assistant_update_summary'
+TASK_LOG_MODERATION = 'learning_assistant_log_moderation'
+
+# 会话默认标题
+DEFAULT_CONVERSATION_TITLE = '新的对话'
+
+# 临时标题的最大长度
+PROVISIONAL_TITLE_LENGTH = 20
+
+# 合并进摘要时每条消息保留的token上限
+SUMMARY_MESSAGE_MAX_TOKENS = 300
+
+# 本地执行的线程池：审核日志单独一个线程，其余任务共用 LEARNING_ASSISTANT_JOB_WORKERS 个线程
+LANE_DEFAULT = 'default'
+LANE_MODERATION = 'moderation'
+MODERATION_LANE_WORKERS = 1
+
+# 每丢弃多少个任务记录一次日志（第一次丢弃总是记录）
+DROP_LOG_EVERY = 100
+
+
+def build_provisional_title(message: str) -> str:
+    """根据首个提问生成临时标题（后台生成智能标题前使用）"""
+    title = ' '.join(message.split())
+    if len(title) > PROVISIONAL_TITLE_LENGTH:
+        title = title[:PROVISIONAL_TITLE_LENGTH]
+    return title or DEFAULT_CONVERSATION_TITLE
+
+
+# ----------------------------------------------------------------------
+# 任务处理函数
+# ----------------------------------------------------------------------
+
+def _clean_title(title: str) -> Optional[str]:
+    """清理LLM返回的标题"""
+    title = title.strip()
+
+    # 1. 移除常见的前缀
+    for prefix in ['标题：', '标题:', '会话标题：', '会话标题:', '标题为：', '标题为:']:
+        if title.startswith(prefix):
+            title = title[len(prefix):].strip()
+
+    # 2. 去除引号、换行、省略号等
+    title = title.replace('"', '').replace("'", '').replace('「', '').replace('」', '')
+    title = title.replace('\n', ' ').replace('\r', '').strip()
+    title = title.rstrip('.')  # 移除末尾的句号
+    title = title.rstrip('。')  # 移除末尾的中文句号
+    title = title.rstrip('…')  # 移除末尾的省略号
+    title = title.strip()
+
+    # 3. 限制长度
+    if len(title) > 20:
+        title = title[:20]
+
+    # 验证标题有效性
+    if not title or len(title) < 2:
+        return None
+    return title
+
+
+def generate_conversation_title(
+    conversation_id: int,
+    user_message: str,
+    provisional_title: str
+) -> Optional[str]:
+    """
+    根据首次提问让AI生成会话标题，替换临时标题
+
+    用户已手动重命名（标题不再是临时标题）时不覆盖。
+
+    Returns:
+        生成的标题；未生成或未替换时返回None
+
+    Raises:
+        Exception: LLM调用失败（由任务队列重试）
+    """
+    from app.services.ai_config_registry import ai_config_registry
+    from app.services.llm_service import create_llm_service
+
+    title_prompt = f"""请为以下对话生成一个简短标题（5-15个汉字）。
+
+用户提问：{user_message[:100]}
+
+要求：
+1. 只返回标题，不要任何其他内容
+2. 不要引号、标点
+3. 直接概括主题
+
+标题："""
+
+    # 调用LLM生成标题（使用默认模型）
+    llm_model = ai_config_registry.get_default_llm_model()
+    if not llm_model:
+        logger.warning("⚠️ 未找到默认LLM模型，无法生成标题")
+        return None
+
+    llm_service = create_llm_service(llm_model)
+    response = llm_service.chat([{"role": "user", "content": title_prompt}])
+
+    # 尝试多个可能的键
+    raw_title = response.get('response') or response.get('content') or response.get('text') or ''
+    title = _clean_title(raw_title)
+    if not title:
+        logger.warning(f"⚠️ 标题无效: '{raw_title}'")
+        return None
+
+    db = SessionLocal()
+    try:
+        # 只替换仍为临时标题的会话
+        updated = db.query(LearningAssistantConversation).filter(
+            LearningAssistantConversation.id == conversation_id,
+            LearningAssistantConversation.title == provisional_title
+        ).update({LearningAssistantConversation.title: title}, synchronize_session=False)
+        db.commit()
+
+        if updated:
+            logger.info(f"✅ 自动生成会话标题: {title}")
+            return title
+        return None
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def update_conversation_summary(conversation_id: int) -> Optional[str]:
+    """
+    把摘要之后、最近几轮之前的对话合并进会话的滚动摘要
+
+    未摘要的消息超过 最近轮数 + 合并批次轮数 时才调用LLM，每次只处理新增的一批消息和上一版摘要，
+    调用成本不随对话变长而增长。摘要在其他任务已更新时不覆盖。
+
+    Returns:
+        新的摘要；未更新时返回None
+
+    Raises:
+        Exception: LLM调用失败（由任务队列重试）
+    """
+    from app.services.ai_config_registry import ai_config_registry
+    from app.services.llm_service import create_llm_service
+
+    keep = settings.learning_assistant_recent_turns * 2
+    threshold = keep + settings.learning_assistant_summary_batch_turns * 2
+
+    db = SessionLocal()
+    try:
+        conversation = db.query(LearningAssistantConversation).filter(
+            LearningAssistantConversation.id == conversation_id
+        ).first()
+        if not conversation:
+            return None
+        previous_summary = conversation.summary
+        previous_message_id = conversation.summary_message_id
+
+        query = db.query(LearningAssistantMessage).filter(
+            LearningAssistantMessage.conversation_id == conversation_id
+        )
+        if previous_message_id:
+            query = query.filter(LearningAssistantMessage.id > previous_message_id)
+        messages = query.order_by(
+            LearningAssistantMessage.created_at.asc(),
+            LearningAssistantMessage.id.asc()
+        ).all()
+    finally:
+        db.close()
+
+    if len(messages) < threshold:
+        return None
+
+    # 最近几轮保留原文，其余合并进摘要
+    folded = messages[:-keep] if keep else messages
+    dialogue = "\n".join(
+        f"{'学生' if m.role == 'user' else 'AI助手'}：{truncate_to_tokens(m.content or '', SUMMARY_MESSAGE_MAX_TOKENS)}"
+        for m in folded
+        if m.role in ('user', 'assistant')
+    )
+    max_tokens = settings.learning_assistant_summary_max_tokens
+    summary_prompt = f"""请把学生与AI学习助手的对话整理为一份简洁的学习记录摘要，供后续对话参考。
+
+已有摘要：
+{previous_summary or '（无）'}
+
+新增对话：
+{dialogue}
+
+要求：
+1. 合并已有摘要和新增对话，保留学生问过的知识点、遇到的困难和已得到的结论
+2. 不超过{max_tokens}字，只返回摘要内容
+
+摘要："""
+
+    llm_model = ai_config_registry.get_default_llm_model()
+    if not llm_model:
+        logger.warning("⚠️ 未找到默认LLM模型，无法更新对话摘要")
+        return None
+
+    llm_service = create_llm_service(llm_model)
+    response = llm_service.chat([{"role": "user", "content": summary_prompt}])
+    summary = (response.get('response') or response.get('content') or response.get('text') or '').strip()
+    if not summary:
+        logger.warning(f"⚠️ 对话摘要为空: conversation={conversation_id}")
+        return None
+    summary = truncate_to_tokens(summary, max_tokens)
+
+    db = SessionLocal()
+    try:
+        # 只在摘要位置未被其他任务推进时写入
+        C = LearningAssistantConversation
+        position = (
+            C.summary_message_id.is_(None) if previous_message_id is None
+            else C.summary_message_id == previous_message_id
+        )
+        updated = db.query(C).filter(C.id == conversation_id, position).update({
+            C.summary: summary,
+            C.summary_message_id: folded[-1].id,
+            C.summary_updated_at: datetime.now()
+        }, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if updated:
+        logger.info(f"✅ 对话摘要已更新: conversation={conversation_id}, 合并 {len(folded)} 条消息")
+        return summary
+    return None
+
+
+def update_student_profile(user_id: int, context: Dict[str, Any]) -> None:
+    """
+    更新学生档案（提问数、最近学习的课程和单元）
+
+    Args:
+        user_id: 用户ID
+        context: 学习上下文（course_uuid、course_name、unit_uuid）
+    """
+    db = SessionLocal()
+    try:
+        profile = db.query(StudentLearningProfile).filter(
+            StudentLearningProfile.user_id == user_id
+        ).with_for_update().first()
+
+        if not profile:
+            profile = StudentLearningProfile(
+                user_id=user_id,
+                total_conversations=0,
+                total_messages=0,
+                total_questions=0
+            )
+            db.add(profile)
+
+        # 更新统计
+        profile.total_messages = (profile.total_messages or 0) + 1
+        profile.total_questions = (profile.total_questions or 0) + 1
+        profile.last_active_at = datetime.now()
+
+        # 更新学习课程列表
+        if context.get('course_uuid'):
+            courses = list(profile.courses_learned or [])
+            course_ids = [c.get('uuid') for c in courses if isinstance(c, dict)]
+
+            if context['course_uuid'] not in course_ids:
+                courses.append({
+                    'uuid': context['course_uuid'],
+                    'name': context.get('course_name'),
+                    'last_active': datetime.now().isoformat()
+                })
+                profile.courses_learned = courses
+
+            profile.last_course_uuid = context['course_uuid']
+
+        if context.get('unit_uuid'):
+            profile.last_unit_uuid = context['unit_uuid']
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def log_moderation(
+    user_id: int,
+    conversation_id: Optional[int],
+    message_id: Optional[int],
+    content_type: str,
+    content: str,
+    result: Dict[str, Any]
+) -> None:
+    """记录内容审核日志"""
+    db = SessionLocal()
+    try:
+        db.add(ContentModerationLog(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message_id=message_id,
+            content_type=content_type,
+            original_content=content,
+            status=result['status'],
+            flags=result['flags'],
+            risk_score=result['risk_score'],
+            sensitive_words=result.get('sensitive_words_found'),
+            moderation_service='local'
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+JOB_HANDLERS: Dict[str, Callable[..., Any]] = {
+    TASK_GENERATE_TITLE: generate_conversation_title,
+    TASK_UPDATE_PROFILE: update_student_profile,
+    TASK_UPDATE_SUMMARY: update_conversation_summary,
+    TASK_LOG_MODERATION: log_moderation,
+}
+
+
+# ----------------------------------------------------------------------
+# 任务队列
+# ----------------------------------------------------------------------
+
+class LearningAssistantJobQueue:
+    """学习助手后台任务队列"""
+
+    def __init__(self):
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._timers: Set[threading.Timer] = set()
+        self._lock = threading.Lock()
+        self._pending = 0  # 已提交未完成的任务数（含等待重试的）
+        self.submitted = 0
+        self.sent_to_celery = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _lane(name: str) -> str:
+        return LANE_MODERATION if name == TASK_LOG_MODERATION else LANE_DEFAULT
+
+    def _get_executor(self, lane: str) -> ThreadPoolExecutor:
+        executor = self._executors.get(lane)
+        if executor is None:
+            with self._lock:
+                executor = self._executors.get(lane)
+                if executor is None:
+                    executor = ThreadPoolExecutor(
+                        max_workers=(
+                            MODERATION_LANE_WORKERS if lane == LANE_MODERATION
+                            else settings.learning_assistant_job_workers
+                        ),
+                        thread_name_prefix=f"learning-assistant-{lane}"
+                    )
+                    self._executors[lane] = executor
+        return executor
+
+    def _finish(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _retry(self, timer: threading.Timer, name: str, args: tuple, attempt: int) -> None:
+        """定时器到期：把任务重新提交到线程池"""
+        with self._lock:
+            self._timers.discard(timer)
+        try:
+            self._get_executor(self._lane(name)).submit(self._run_local, name, args, attempt)
+        except RuntimeError:  # 线程池已关闭
+            self.failed += 1
+            self._finish()
+
+    def _run_local(self, name: str, args: tuple, attempt: int = 0) -> None:
+        """在本进程内执行任务，失败后按指数间隔定时重新提交"""
+        handler = JOB_HANDLERS[name]
+        max_retries = settings.learning_assistant_job_max_retries
+        try:
+            handler(*args)
+        except Exception as e:
+            if attempt >= max_retries:
+                self.failed += 1
+                self._finish()
+                logger.error(f"学习助手后台任务失败: {name}, 已重试 {max_retries} 次: {e}", exc_info=True)
+                return
+            delay = settings.learning_assistant_job_retry_delay * (2 ** attempt)
+            logger.warning(f"学习助手后台任务失败: {name}, {delay:.0f} 秒后重试: {e}")
+            timer = threading.Timer(delay, lambda: self._retry(timer, name, args, attempt + 1))
+            timer.daemon = True
+            with self._lock:
+                self._timers.add(timer)
+            timer.start()
+            return
+        self.succeeded += 1
+        self._finish()
+
+    def _dispatch(self, name: str, args: tuple) -> None:
+        if settings.learning_assistant_job_queue == 'celery':
+            try:
+                from app.core.celery_app import celery_app
+                celery_app.send_task(name, args=list(args))
+                self.sent_to_celery += 1
+                self._finish()
+                return
+            except Exception as e:
+                logger.warning(f"提交Celery任务失败，改为本地执行: {name}, {e}")
+        self._run_local(name, args)
+
+    def enqueue(self, name: str, *args) -> bool:
+        """
+        提交后台任务（立即返回，不阻塞事件循环）
+
+        Args:
+            name: 任务名称（TASK_* 常量）
+            args: 任务参数（需可JSON序列化）
+
+        Returns:
+            是否已提交；未完成的任务数已达上限时丢弃任务并返回False
+        """
+        if name not in JOB_HANDLERS:
+            raise ValueError(f"未知的学习助手任务: {name}")
+        with self._lock:
+            if self._pending >= settings.learning_assistant_job_max_pending:
+                self.dropped += 1
+                dropped = self.dropped
+            else:
+                self._pending += 1
+                dropped = 0
+        if dropped:
+            if (dropped - 1) % DROP_LOG_EVERY == 0:
+                logger.warning(
+                    f"学习助手后台任务积压已达上限 {settings.learning_assistant_job_max_pending}，"
+                    f"丢弃任务（累计 {dropped} 个）: {name}"
+                )
+            return False
+        self.submitted += 1
+        self._get_executor(self._lane(name)).submit(self._dispatch, name, args)
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池（等待已提交的任务完成，取消等待中的重试）"""
+        with self._lock:
+            executors, self._executors = self._executors, {}
+            timers, self._timers = self._timers, set()
+            self._pending -= len(timers)
+        for timer in timers:
+            timer.cancel()
+        self.failed += len(timers)
+        if timers:
+            logger.warning(f"学习助手后台任务队列关闭，取消 {len(timers)} 个等待重试的任务")
+        for executor in executors.values():
+            executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "submitted": self.submitted,
+            "pending": self._pending,
+            "sent_to_celery": self.sent_to_celery,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "dropped": self.dropped
+        }
+
+
+learning_assistant_jobs = LearningAssistantJobQueue()
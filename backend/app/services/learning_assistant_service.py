@@ -1,7 +1,8 @@
 """
 AI学习助手核心服务
 """
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, func, update
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import uuid as uuid_lib
@@ -11,15 +12,29 @@ import logging
 from app.models.learning_assistant import (
     LearningAssistantConversation,
     LearningAssistantMessage,
-    StudentLearningProfile,
-    ContentModerationLog
+    StudentLearningProfile
 )
 from app.models.pbl import PBLCourse, PBLUnit
+from app.core.config import settings
+from app.services.ai_config_registry import ai_config_registry
+from app.services.learning_assistant_jobs import (
+    learning_assistant_jobs,
+    build_provisional_title,
+    DEFAULT_CONVERSATION_TITLE,
+    TASK_GENERATE_TITLE,
+    TASK_UPDATE_PROFILE,
+    TASK_UPDATE_SUMMARY,
+    TASK_LOG_MODERATION
+)
 from app.services.content_moderation_service import ContentModerationService
 from app.services.learning_assistant_history_optimizer import ConversationHistoryOptimizer
+from app.utils.token_counter import estimate_token_counts
 
 logger = logging.getLogger(__name__)
 
+# 系统学习助手智能体UUID
+SYSTEM_AGENT_UUID = 'system-learning-assistant'
+
 
 class LearningAssistantService:
     """学习助手核心服务"""
@@ -27,9 +42,9 @@ class LearningAssistantService:
     def __init__(self, db: Session):
         self.db = db
         self.moderator = ContentModerationService(db)
-        # 初始化对话历史优化器：只保留最近5个用户问题
+        # 初始化对话历史优化器：摘要 + 最近几轮原文 + 知识库参考，受token预算限制
         self.history_optimizer = ConversationHistoryOptimizer(
-            recent_user_questions=5  # 可根据实际效果调整为3-8
+            token_budget=settings.learning_assistant_prompt_token_budget
         )
     
     async def chat(
@@ -42,6 +57,9 @@ class LearningAssistantService:
         """
         核心对话方法
         
+        一个对话回合只提交一次：会话、用户消息、AI回复和会话统计在同一事务中写入。
+        标题生成、学生档案更新和审核日志在提交后交给后台任务处理。
+        
         Args:
             user_id: 用户ID
             message: 用户消息
@@ -51,6 +69,7 @@ class LearningAssistantService:
         Returns:
             AI回复及相关信息
         """
+        received_at = datetime.now()
         
         # 1. 内容安全审核（用户输入）
         moderation_result = await self.moderator.check(
@@ -61,30 +80,30 @@ class LearningAssistantService:
         if moderation_result['status'] == 'blocked':
             # ✅ 即便拦截了，也要保存这条违规消息，以便管理员后续审计
             try:
-                # 3.1 获取或创建会话
-                conversation = await self._get_or_create_conversation(
+                conversation, _ = self._get_or_create_conversation(
                     user_id=user_id,
                     conversation_id=conversation_id,
                     context=context
                 )
-                # 3.2 保存违规消息
-                user_message = await self._save_message(
-                    conversation_id=conversation.id,
+                user_message = self._add_message(
+                    conversation=conversation,
                     role='user',
                     content=message,
+                    created_at=received_at,
                     context_snapshot=context,
                     moderation_result=moderation_result
                 )
-                # 3.3 记录审计日志
-                await self._log_moderation(
-                    user_id=user_id,
-                    conversation_id=conversation.id,
-                    message_id=user_message.id,
-                    content_type='user_message',
-                    content=message,
-                    result=moderation_result
+                self._update_conversation_stats(conversation, user_messages=1)
+                self.db.commit()
+                conversation_id = conversation.uuid
+                
+                # 审计日志交给后台任务
+                learning_assistant_jobs.enqueue(
+                    TASK_LOG_MODERATION, user_id, conversation.id, user_message.id,
+                    'user_message', message, moderation_result
                 )
             except Exception as e:
+                self.db.rollback()
                 logger.error(f"保存违规消息失败: {str(e)}")
 
             return {
@@ -94,50 +113,37 @@ class LearningAssistantService:
                 'conversation_id': conversation_id # 尽可能返回ID
             }
         
-        # 2. 获取或创建会话
-        conversation = await self._get_or_create_conversation(
+        # 2. 获取会话（新会话在回复生成后与消息一起写入）
+        conversation, is_new = self._get_or_create_conversation(
             user_id=user_id,
             conversation_id=conversation_id,
             context=context
         )
         
-        # 3. 保存用户消息
-        user_message = await self._save_message(
-            conversation_id=conversation.id,
-            role='user',
-            content=message,
-            context_snapshot=context,
-            moderation_result=moderation_result
-        )
-        
-        # 4. 记录审核日志（如果有警告或拦截）
-        if moderation_result['status'] in ['warning', 'blocked']:
-            await self._log_moderation(
-                user_id=user_id,
-                conversation_id=conversation.id,
-                message_id=user_message.id,
-                content_type='user_message',
-                content=message,
-                result=moderation_result
-            )
-        
-        # 5. 构建完整上下文
+        # 3. 构建完整上下文
         full_context = await self._build_full_context(
             user_id=user_id,
             conversation=conversation,
             current_context=context
         )
         
-        # 6. 调用LLM生成回复
+        # 4. 调用LLM生成回复（不持有写事务）
+        # 较早的对话已合并进摘要，只读取摘要之后的消息（数量有上限，由后台任务持续合并）
+        history = [] if is_new else await self._get_recent_messages(
+            conversation.id,
+            limit=2 * (settings.learning_assistant_recent_turns + settings.learning_assistant_summary_batch_turns),
+            after_id=conversation.summary_message_id
+        )
         start_time = datetime.now()
         llm_response = await self._call_llm(
             message=message,
             context=full_context,
-            conversation_history=await self._get_recent_messages(conversation.id, limit=10)
+            conversation_history=history,
+            summary=conversation.summary
         )
         response_time = int((datetime.now() - start_time).total_seconds() * 1000)
         
-        # 7. 内容安全审核（AI回复）
+        # 5. 内容安全审核（AI回复）
         # ⚠️ 临时禁用AI回复审核，避免误判技术内容
         # TODO: 优化敏感词表后重新启用
         ai_moderation = await self.moderator.check(
@@ -149,64 +155,85 @@ class LearningAssistantService:
         # if ai_moderation['status'] == 'blocked':
         #     llm_response['content'] = '抱歉，我无法回答这个问题。建议你向老师请教。'
         
-        # 8. 保存AI回复
-        ai_message = await self._save_message(
-            conversation_id=conversation.id,
-            role='assistant',
-            content=llm_response['content'],
-            knowledge_sources=llm_response.get('knowledge_sources'),
-            token_usage=llm_response.get('token_usage'),
-            model_used=llm_response.get('model'),
-            response_time_ms=response_time,
-            moderation_result=ai_moderation
-        )
-        
-        # 9. 更新会话统计
-        await self._update_conversation_stats(conversation.id)
-        
-        # 10. 刷新conversation对象以获取最新的message_count
-        self.db.refresh(conversation)
-        
-        # 11. 如果是首次对话，生成智能标题
-        suggested_title = None
-        if conversation.message_count == 2:  # 2条消息 = 用户首次提问 + AI首次回复
-            try:
-                suggested_title = await self._generate_conversation_title(
-                    user_message=message,
-                    ai_response=llm_response['content']
-                )
-                if suggested_title:
-                    conversation.title = suggested_title
-                    self.db.commit()
-                    logger.info(f"✅ 自动生成会话标题: {suggested_title}")
-                else:
-                    logger.warning(f"⚠️ 标题生成返回为空")
-            except Exception as e:
-                logger.error(f"❌ 生成会话标题失败: {str(e)}", exc_info=True)
-        
-        # 11. 异步更新学生档案
+        # 6. 在同一事务中写入会话、用户消息、AI回复和会话统计
         try:
-            await self._update_student_profile(user_id, message, context)
-        except Exception as e:
-            logger.error(f"更新学生档案失败: {str(e)}")
+            user_message = self._add_message(
+                conversation=conversation,
+                role='user',
+                content=message,
+                created_at=received_at,
+                context_snapshot=context,
+                moderation_result=moderation_result
+            )
+            ai_message = self._add_message(
+                conversation=conversation,
+                role='assistant',
+                content=llm_response['content'],
+                created_at=datetime.now(),
+                knowledge_sources=llm_response.get('knowledge_sources'),
+                token_usage=llm_response.get('token_usage'),
+                model_used=llm_response.get('model'),
+                response_time_ms=response_time,
+                moderation_result=ai_moderation
+            )
+            
+            # 首次回复时先用提问作为临时标题，智能标题由后台任务生成
+            suggested_title = None
+            if not conversation.ai_message_count:
+                suggested_title = build_provisional_title(message)
+                conversation.title = suggested_title
+            
+            self._update_conversation_stats(
+                conversation, user_messages=1, ai_response_time=response_time
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        
+        # 7. 后处理交给后台任务（失败重试，不影响本次回复）
+        if suggested_title:
+            learning_assistant_jobs.enqueue(
+                TASK_GENERATE_TITLE, conversation.id, message, suggested_title
+            )
+        if moderation_result['status'] == 'warning':
+            learning_assistant_jobs.enqueue(
+                TASK_LOG_MODERATION, user_id, conversation.id, user_message.id,
+                'user_message', message, moderation_result
+            )
+        learning_assistant_jobs.enqueue(TASK_UPDATE_SUMMARY, conversation.id)
+        learning_assistant_jobs.enqueue(
+            TASK_UPDATE_PROFILE, user_id, {
+                'course_uuid': context.get('course_uuid'),
+                'course_name': context.get('course_name'),
+                'unit_uuid': context.get('unit_uuid')
+            }
+        )
         
         return {
             'response': llm_response['content'],
             'conversation_id': conversation.uuid,
             'message_id': ai_message.uuid,
-            'suggested_title': suggested_title,  # 返回建议的标题
+            'suggested_title': suggested_title,  # 返回建议的标题（临时标题，后台生成智能标题后替换）
             'knowledge_sources': llm_response.get('knowledge_sources'),
             'token_usage': llm_response.get('token_usage'),
             'blocked': False
         }
     
-    async def _get_or_create_conversation(
+    def _get_or_create_conversation(
         self,
         user_id: int,
         conversation_id: Optional[str],
         context: Dict
-    ) -> LearningAssistantConversation:
-        """获取或创建会话"""
+    ) -> Tuple[LearningAssistantConversation, bool]:
+        """
+        获取或创建会话（不提交）
+        
+        新会话只创建对象，首次写入消息时随消息一起加入会话
+        
+        Returns:
+            (会话, 是否为新会话)
+        """
         
         if conversation_id:
             # 查找已存在的活跃会话
@@ -217,7 +244,7 @@ class LearningAssistantService:
             ).first()
             
             if conversation:
-                return conversation
+                return conversation, False
         
         # 创建新会话
         course_uuid = context.get('course_uuid')
@@ -239,12 +266,15 @@ class LearningAssistantService:
         conversation = LearningAssistantConversation(
             uuid=str(uuid_lib.uuid4()),
             user_id=user_id,
-            title='新的对话',
+            title=DEFAULT_CONVERSATION_TITLE,
             course_uuid=course_uuid,
             course_name=course_name,
             unit_uuid=unit_uuid,
             unit_name=unit_name,
-            source='course_learning' if course_uuid else 'manual'
+            source='course_learning' if course_uuid else 'manual',
+            message_count=0,
+            user_message_count=0,
+            ai_message_count=0
         )
         
         # 处理当前资源信息
@@ -254,11 +284,7 @@ class LearningAssistantService:
             conversation.current_resource_type = resource.get('type')
             conversation.current_resource_title = resource.get('title')
         
-        self.db.add(conversation)
-        self.db.commit()
-        self.db.refresh(conversation)
-        
-        return conversation
+        return conversation, True
 
     def clear_all_conversations(self, user_id: int) -> int:
         """清空所有会话（软删除）"""
@@ -271,11 +297,12 @@ class LearningAssistantService:
         self.db.commit()
         return result
     
-    async def _save_message(
+    def _add_message(
         self,
-        conversation_id: int,
+        conversation: LearningAssistantConversation,
         role: str,
         content: str,
+        created_at: datetime,
         context_snapshot: Dict = None,
         knowledge_sources: List = None,
         token_usage: Dict = None,
@@ -283,7 +310,11 @@ class LearningAssistantService:
         response_time_ms: int = None,
         moderation_result: Dict = None
     ) -> LearningAssistantMessage:
-        """保存消息"""
+        """添加消息（不提交，新会话随消息一起写入）"""
+        
+        if conversation.id is None:
+            self.db.add(conversation)
+            self.db.flush()
         
         # 计算内容哈希
         content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
@@ -295,7 +326,7 @@ class LearningAssistantService:
             
         message = LearningAssistantMessage(
             uuid=str(uuid_lib.uuid4()),
-            conversation_id=conversation_id,
+            conversation_id=conversation.id,
             role=role,
             content=content,
             content_hash=content_hash,
@@ -305,12 +336,12 @@ class LearningAssistantService:
             model_used=model_used,
             response_time_ms=response_time_ms,
             moderation_result=moderation_result,
-            was_blocked=was_blocked  # ✅ 显式设置拦截状态
+            was_blocked=was_blocked,  # ✅ 显式设置拦截状态
+            created_at=created_at
         )
         
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
+        self.db.flush()
         
         return message
     
@@ -323,10 +354,7 @@ class LearningAssistantService:
         """构建完整的个性化上下文（严格约束版）"""
         
         # 1. 优先获取数据库中定义的严格系统提示词
-        from app.models.agent import Agent
-        system_agent = self.db.query(Agent).filter(
-            Agent.uuid == 'system-learning-assistant'
-        ).first()
+        system_agent = ai_config_registry.get_agent(SYSTEM_AGENT_UUID)
         
         # 如果数据库有值，直接用数据库的；否则用代码里的强力兜底
         base_prompt = system_agent.system_prompt if (system_agent and system_agent.system_prompt) else self._get_base_system_prompt()
@@ -394,26 +422,20 @@ class LearningAssistantService:
         Returns:
             List[Dict]: 检索结果列表
         """
-        from app.models.agent import Agent
-        from app.models.knowledge_base import AgentKnowledgeBase, KnowledgeBase
+        from app.models.knowledge_base import KnowledgeBase
         from app.models.document import DocumentChunk
         from app.services.embedding_service import get_embedding_service
         import numpy as np
         
         try:
             # 1. 获取学习助手关联的知识库
-            system_agent = self.db.query(Agent).filter(
-                Agent.uuid == 'system-learning-assistant'
-            ).first()
+            system_agent = ai_config_registry.get_agent(SYSTEM_AGENT_UUID)
             
             if not system_agent:
                 logger.warning("未找到系统学习助手智能体")
                 return []
             
-            kb_associations = self.db.query(AgentKnowledgeBase).filter(
-                AgentKnowledgeBase.agent_id == system_agent.id,
-                AgentKnowledgeBase.is_enabled == 1
-            ).order_by(AgentKnowledgeBase.priority.desc()).all()
+            kb_associations = system_agent.knowledge_bases  # 已按优先级降序
             
             if not kb_associations:
                 logger.info("学习助手未关联任何知识库")
@@ -496,35 +518,25 @@ class LearningAssistantService:
         self,
         message: str,
         context: str,
-        conversation_history: List[LearningAssistantMessage]
+        conversation_history: List[LearningAssistantMessage],
+        summary: Optional[str] = None
     ) -> Dict:
         """
         调用LLM生成回复（集成RAG检索）
+        
+        Args:
+            message: 本次提问
+            context: 系统提示词（含学生状态和学习场景）
+            conversation_history: 摘要之后的最近消息（按时间升序）
+            summary: 较早对话的滚动摘要
         """
-        from app.models.llm_model import LLMModel
         from app.services.llm_service import create_llm_service
         
         # 1. 获取系统学习助手的LLM模型配置
-        from app.models.agent import Agent
-        
-        system_agent = self.db.query(Agent).filter(
-            Agent.uuid == 'system-learning-assistant'
-        ).first()
+        system_agent = ai_config_registry.get_agent(SYSTEM_AGENT_UUID)
         
         # 2. 获取LLM模型（优先使用智能体配置的，否则使用默认模型）
-        llm_model = None
-        if system_agent and system_agent.llm_model_id:
-            llm_model = self.db.query(LLMModel).filter(
-                LLMModel.id == system_agent.llm_model_id,
-                LLMModel.is_active == 1
-            ).first()
-        
-        # 如果没有配置，使用默认模型
-        if not llm_model:
-            llm_model = self.db.query(LLMModel).filter(
-                LLMModel.is_default == 1,
-                LLMModel.is_active == 1
-            ).first()
+        llm_model = ai_config_registry.resolve_agent_llm_model(system_agent)
         
         if not llm_model:
             logger.error("未找到可用的LLM模型")
@@ -538,8 +550,8 @@ class LearningAssistantService:
         # 3. 【RAG检索】从知识库中检索相关内容
         knowledge_results = await self._retrieve_knowledge(message, top_k=3)
         
-        # 4. 构建增强后的上下文
-        enhanced_context = context
+        # 4. 构建知识库参考内容
+        knowledge_text = None
         
         if knowledge_results:
             logger.info(f"检索到 {len(knowledge_results)} 条相关知识")
@@ -553,30 +565,25 @@ class LearningAssistantService:
                 knowledge_text += f"{result['content']}\n\n"
             
             knowledge_text += "---\n请基于以上参考资料，结合你的知识，为学生提供准确的回答。"
-            
-            enhanced_context = f"{context}\n{knowledge_text}"
         else:
             logger.info("未检索到相关知识，使用通用知识回答")
         
-        # 5. 构建消息列表
-        messages = [
-            {"role": "system", "content": enhanced_context}
-        ]
+        # 5. 构建消息列表：系统提示 + 知识库参考 + 对话摘要 + 最近对话 + 本次提问（受token预算限制）
+        # 本次提问在回复生成后才写入数据库，单独传入
+        messages = self.history_optimizer.build_messages(
+            system_context=context,
+            question=message,
+            history=conversation_history,
+            summary=summary,
+            knowledge_context=knowledge_text
+        )
         
-        # 【优化】使用智能历史优化器：只保留最近5个用户问题
-        # 优点：节省85% Token，知识库权重从20%提升到64%
-        optimized_history = self.history_optimizer.optimize_history(conversation_history)
-        messages.extend(optimized_history)
-        
-        # 记录优化效果
-        if conversation_history:
-            token_stats = self.history_optimizer.get_token_estimate(conversation_history)
-            logger.info(
-                f"💰 对话历史优化: "
-                f"{token_stats['original_count']}条 → {token_stats['optimized_count']}条 | "
-                f"Token: {token_stats['original_tokens']} → {token_stats['optimized_tokens']} "
-                f"(节省{token_stats['save_percentage']}%)"
-            )
+        # 记录提示词规模
+        prompt_tokens = sum(estimate_token_counts(m['content'] or '' for m in messages))
+        logger.info(
+            f"💰 提示词组装: 最近对话{len(messages) - 2}条 | "
+            f"摘要{'有' if summary else '无'} | 估算Token: {prompt_tokens}"
+        )
         
         # 6. 调用LLM服务
         try:
@@ -616,214 +623,75 @@ class LearningAssistantService:
     async def _get_recent_messages(
         self,
         conversation_id: int,
-        limit: int = 10
+        limit: int = 10,
+        after_id: Optional[int] = None
     ) -> List[LearningAssistantMessage]:
-        """获取最近的消息历史（按时间升序返回）"""
-        messages = self.db.query(LearningAssistantMessage).filter(
-            LearningAssistantMessage.conversation_id == conversation_id
-        ).order_by(
-            LearningAssistantMessage.created_at.asc()  # 升序，最早的在前
-        ).all()
-        
-        # 如果消息数量超过限制，只返回最近的limit条
-        if len(messages) > limit:
-            return messages[-limit:]
-        return messages
-    
-    async def _update_conversation_stats(self, conversation_id: int):
-        """更新会话统计信息"""
-        conversation = self.db.query(LearningAssistantConversation).get(conversation_id)
-        
-        if not conversation:
-            return
+        """
+        获取最近的消息历史（按时间升序返回）
         
-        # 统计消息数
-        messages = self.db.query(LearningAssistantMessage).filter(
+        Args:
+            conversation_id: 会话ID
+            limit: 最多返回的条数
+            after_id: 只返回ID大于该值的消息（摘要已覆盖的消息不再读取）
+        """
+        query = self.db.query(LearningAssistantMessage).filter(
             LearningAssistantMessage.conversation_id == conversation_id
-        ).all()
-        
-        conversation.message_count = len(messages)
-        conversation.user_message_count = sum(1 for m in messages if m.role == 'user')
-        conversation.ai_message_count = sum(1 for m in messages if m.role == 'assistant')
-        conversation.last_message_at = datetime.now()
-        
-        # 计算平均响应时间
-        response_times = [m.response_time_ms for m in messages if m.response_time_ms]
-        if response_times:
-            conversation.avg_response_time = int(sum(response_times) / len(response_times))
-        
-        self.db.commit()
-    
-    async def _get_student_profile(self, user_id: int) -> Optional[StudentLearningProfile]:
-        """获取学生档案"""
-        profile = self.db.query(StudentLearningProfile).filter(
-            StudentLearningProfile.user_id == user_id
-        ).first()
-        
-        if not profile:
-            # 创建默认档案
-            profile = StudentLearningProfile(
-                user_id=user_id,
-                total_conversations=0,
-                total_messages=0,
-                total_questions=0
-            )
-            self.db.add(profile)
-            self.db.commit()
-            self.db.refresh(profile)
-        
-        return profile
-    
-    async def _update_student_profile(
-        self,
-        user_id: int,
-        message: str,
-        context: Dict
-    ):
-        """更新学生档案"""
-        profile = await self._get_student_profile(user_id)
-        
-        # 更新统计
-        profile.total_messages += 1
-        profile.total_questions += 1
-        profile.last_active_at = datetime.now()
-        
-        # 更新学习课程列表
-        if context.get('course_uuid'):
-            courses = profile.courses_learned or []
-            course_ids = [c.get('uuid') for c in courses if isinstance(c, dict)]
-            
-            if context['course_uuid'] not in course_ids:
-                courses.append({
-                    'uuid': context['course_uuid'],
-                    'name': context.get('course_name'),
-                    'last_active': datetime.now().isoformat()
-                })
-                profile.courses_learned = courses
-            
-            profile.last_course_uuid = context['course_uuid']
+        )
+        if after_id:
+            query = query.filter(LearningAssistantMessage.id > after_id)
         
-        if context.get('unit_uuid'):
-            profile.last_unit_uuid = context['unit_uuid']
+        # 倒序取最近limit条（走 idx_conv_created 索引），再翻转为升序
+        messages = query.order_by(
+            LearningAssistantMessage.created_at.desc(),
+            LearningAssistantMessage.id.desc()
+        ).limit(limit).all()
         
-        self.db.commit()
+        messages.reverse()  # 升序，最早的在前
+        return messages
     
-    async def _log_moderation(
+    def _update_conversation_stats(
         self,
-        user_id: int,
-        conversation_id: int,
-        message_id: int,
-        content_type: str,
-        content: str,
-        result: Dict
+        conversation: LearningAssistantConversation,
+        user_messages: int = 0,
+        ai_response_time: Optional[int] = None
     ):
-        """记录审核日志"""
-        log = ContentModerationLog(
-            user_id=user_id,
-            conversation_id=conversation_id,
-            message_id=message_id,
-            content_type=content_type,
-            original_content=content,
-            status=result['status'],
-            flags=result['flags'],
-            risk_score=result['risk_score'],
-            sensitive_words=result.get('sensitive_words_found'),
-            moderation_service='local'
-        )
-        
-        self.db.add(log)
-        self.db.commit()
-    
-    async def _generate_conversation_title(
-        self,
-        user_message: str,
-        ai_response: str
-    ) -> Optional[str]:
         """
-        根据首次对话内容，让AI生成一个简短的会话标题
+        增量更新会话统计信息（不提交，随消息一起提交）
+        
+        使用一条原子UPDATE累加计数，平均响应时间按AI回复数滚动计算
         
         Args:
-            user_message: 用户的首次提问
-            ai_response: AI的首次回复
-            
-        Returns:
-            生成的标题（不超过20字），如果失败则返回None
+            conversation: 会话
+            user_messages: 本次新增的用户消息数
+            ai_response_time: 本次AI回复的响应时间（毫秒），为None表示没有AI回复
         """
-        try:
-            logger.info(f"🏷️ 开始生成会话标题...")
-            logger.debug(f"用户消息: {user_message[:50]}...")
-            
-            # 构造标题生成提示词（更简洁明确）
-            title_prompt = f"""请为以下对话生成一个简短标题（5-15个汉字）。
-
-用户提问：{user_message[:100]}
-
-要求：
-1. 只返回标题，不要任何其他内容
-2. 不要引号、标点
-3. 直接概括主题
-
-标题："""
-
-            messages = [
-                {"role": "user", "content": title_prompt}
-            ]
-            
-            # 调用LLM生成标题（使用默认模型）
-            from app.models.llm_model import LLMModel
-            llm_model = self.db.query(LLMModel).filter(
-                LLMModel.is_default == 1,
-                LLMModel.is_active == 1
-            ).first()
-            
-            if not llm_model:
-                logger.warning("⚠️ 未找到默认LLM模型，无法生成标题")
-                return None
-            
-            logger.info(f"📡 使用模型: {llm_model.display_name} ({llm_model.name})")
-            
-            from app.services.llm_service import create_llm_service
-            llm_service = create_llm_service(llm_model)
-            
-            response = llm_service.chat(messages)  # ✅ 移除await，chat不是异步方法
-            logger.debug(f"LLM返回: {response}")
-            
-            # 尝试多个可能的键
-            title = response.get('response') or response.get('content') or response.get('text') or ''
-            title = title.strip()
-            
-            logger.info(f"🔍 原始标题: '{title}'")
-            
-            # 清理标题
-            # 1. 移除常见的前缀
-            for prefix in ['标题：', '标题:', '会话标题：', '会话标题:', '标题为：', '标题为:']:
-                if title.startswith(prefix):
-                    title = title[len(prefix):].strip()
-            
-            # 2. 去除引号、换行、省略号等
-            title = title.replace('"', '').replace("'", '').replace('「', '').replace('」', '')
-            title = title.replace('\n', ' ').replace('\r', '').strip()
-            title = title.rstrip('.')  # 移除末尾的句号
-            title = title.rstrip('。')  # 移除末尾的中文句号
-            title = title.rstrip('…')  # 移除末尾的省略号
-            title = title.rstrip('...')  # 移除末尾的三个点
-            title = title.strip()
-            
-            # 3. 限制长度
-            if len(title) > 20:
-                title = title[:20]
-            
-            logger.info(f"✨ 清理后标题: '{title}'")
-            
-            # 验证标题有效性
-            if not title or len(title) < 2:
-                logger.warning(f"⚠️ 标题无效（长度: {len(title)}）")
-                return None
-            
-            logger.info(f"✅ 成功生成标题: '{title}'")
-            return title
-            
-        except Exception as e:
-            logger.error(f"❌ 生成会话标题时出错: {str(e)}", exc_info=True)
-            return None
-
+        C = LearningAssistantConversation
+        ai_messages = 0 if ai_response_time is None else 1
+        values = []
+        if ai_messages:
+            # MySQL 按顺序求值赋值表达式：先用旧的 ai_message_count 计算平均值
+            previous_count = func.coalesce(C.ai_message_count, 0)
+            values.append((C.avg_response_time, case(
+                (C.avg_response_time.is_(None), ai_response_time),
+                else_=(C.avg_response_time * previous_count + ai_response_time) / (previous_count + 1)
+            )))
+        values += [
+            (C.message_count, func.coalesce(C.message_count, 0) + user_messages + ai_messages),
+            (C.user_message_count, func.coalesce(C.user_message_count, 0) + user_messages),
+            (C.ai_message_count, func.coalesce(C.ai_message_count, 0) + ai_messages),
+            (C.last_message_at, datetime.now())
+        ]
+        self.db.execute(
+            update(C).where(C.id == conversation.id).ordered_values(*values)
+        )
+        # 内存中的计数已过期，下次访问时重新读取
+        self.db.expire(conversation, [
+            'message_count', 'user_message_count', 'ai_message_count',
+            'avg_response_time', 'last_message_at'
+        ])
+    
+    async def _get_student_profile(self, user_id: int) -> Optional[StudentLearningProfile]:
+        """获取学生档案（只读，档案由后台任务创建和更新）"""
+        return self.db.query(StudentLearningProfile).filter(
+            StudentLearningProfile.user_id == user_id
+        ).first()
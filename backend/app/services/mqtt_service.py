@@ -12,6 +12,7 @@ from app.core.database import SessionLocal
 from app.models.device import Device
 from app.models.product import Product
 from app.models.device_sensor import DeviceSensor
+from app.services.sensor_latest_store import sensor_latest_store
 # from app.models.interaction_log import InteractionLog  # 已删除，改为更新设备表
 from app.core.config import settings
 from datetime import datetime, timezone, timedelta
@@ -261,6 +262,9 @@ class MQTTService:
                 device.last_heartbeat = get_beijing_now()
                 
             db.commit()
+            if message_type == "data":
+                # 直接写入了 device_sensors 表，删除传感器最新值，下次读取时从数据库补全
+                sensor_latest_store.invalidate(device_uuid)
             
         except Exception as e:
             logger.error(f"❌ 处理设备消息时出错: {e}")
@@ -1,31 +1,103 @@
 """
 阿里云视频点播(VOD)服务
 用于获取视频播放凭证、上传视频等操作
+
+- 视频信息长时间缓存；播放凭证按 AuthInfoTimeout 的一定比例缓存，
+  保证返回给前端的凭证至少还有剩余比例的有效期（凭证与用户无关，同一视频可共享）
+- 同一视频的并发未命中只调用一次VOD接口（一个班级同时打开同一课时视频时只请求一次）
+- VOD接口调用在独立的有界线程池中执行，并设置等待超时，阿里云响应慢时不会占满请求线程
+- 配置 ALIYUN_VOD_FAKE_CLIENT=true 时使用本地模拟客户端（测试和开发环境，不发起网络请求）
 """
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Callable, Hashable
 import logging
 import json
+import threading
+import time
 
 from aliyunsdkcore.client import AcsClient
 from aliyunsdkcore.request import CommonRequest
 from aliyunsdkvod.request.v20170321 import GetVideoPlayAuthRequest
 
+from app.core.cache import TTLCache, MISSING, SingleFlight
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 播放凭证缓存（按 视频ID + 凭证有效期）
+play_auth_cache = TTLCache("vod_play_auth", ttl=settings.aliyun_vod_play_auth_timeout, maxsize=5000)
+
+# 视频信息缓存（按视频ID）
+video_info_cache = TTLCache("vod_video_info", ttl=settings.aliyun_vod_video_info_cache_ttl, maxsize=5000)
+
+
+class FakeVODClient:
+    """
+    本地模拟的VOD客户端
+    
+    与 AcsClient 接口一致，根据请求的 Action 返回固定格式的数据，不发起网络请求
+    """
+    
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: 模拟的接口耗时（秒）
+        """
+        self.latency = latency
+        self.call_count = 0
+        self._lock = threading.Lock()
+    
+    def do_action_with_exception(self, request) -> bytes:
+        with self._lock:
+            self.call_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        
+        video_id = request.get_query_params().get('VideoId')
+        meta = {
+            "VideoId": video_id,
+            "Title": f"测试视频 {video_id}",
+            "CoverURL": f"https://vod.example.com/{video_id}/cover.jpg",
+            "Duration": 600.0,
+            "Status": "Normal"
+        }
+        action = request.get_action_name()
+        if action == 'GetVideoPlayAuth':
+            data = {"PlayAuth": f"fake-play-auth-{video_id}-{int(time.time())}", "VideoMeta": meta}
+        elif action == 'GetVideoInfo':
+            data = {"Video": dict(meta, CreationTime="2025-01-01T00:00:00Z", Size=1024 * 1024)}
+        else:
+            raise Exception(f"模拟客户端不支持的操作: {action}")
+        return json.dumps(data).encode()
+
 
 class AliyunVODService:
     """阿里云VOD服务类"""
     
-    def __init__(self):
-        """初始化阿里云VOD客户端"""
+    def __init__(self, client=None):
+        """
+        初始化阿里云VOD客户端
+        
+        Args:
+            client: 自定义客户端（如 FakeVODClient），默认按配置创建 AcsClient
+        """
         self.access_key_id = settings.aliyun_access_key_id
         self.access_key_secret = settings.aliyun_access_key_secret
         self.region_id = settings.aliyun_vod_region_id
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.aliyun_vod_max_workers,
+            thread_name_prefix="aliyun-vod"
+        )
+        self._single_flight = SingleFlight()
+        
+        if client is None and settings.aliyun_vod_fake_client:
+            client = FakeVODClient()
+            logger.warning("⚠️ 阿里云VOD使用本地模拟客户端，返回的播放凭证不可用于真实播放")
         
         # 检查配置是否完整
-        if not self.access_key_id or not self.access_key_secret:
+        if client is not None:
+            self._client = client
+        elif not self.access_key_id or not self.access_key_secret:
             logger.warning("⚠️ 阿里云VOD配置未设置，视频播放功能将不可用")
             self._client = None
         else:
@@ -43,13 +115,51 @@ class AliyunVODService:
         """检查阿里云VOD是否已配置"""
         return self._client is not None
     
-    def get_video_play_auth(self, video_id: str, auth_timeout: int = 3000) -> Optional[dict]:
+    def _call_cached(
+        self,
+        cache: TTLCache,
+        key: Hashable,
+        ttl: float,
+        fetch: Callable[[], dict],
+        error_prefix: str
+    ) -> dict:
+        """
+        读取缓存，未命中时在VOD线程池中调用接口（同一key并发未命中只调用一次）
+        
+        等待超时后接口调用仍会继续，完成后结果照常写入缓存
         """
-        获取视频播放凭证
+        value = cache.get(key)
+        if value is not MISSING:
+            return value
+        
+        def fetch_and_cache() -> dict:
+            result = fetch()
+            cache.set(key, result, ttl=ttl)
+            return result
+        
+        def load() -> dict:
+            # 等待期间其他请求可能已完成加载
+            cached = cache.get(key)
+            if cached is not MISSING:
+                return cached
+            return self._executor.submit(fetch_and_cache).result(settings.aliyun_vod_request_timeout)
+        
+        try:
+            return self._single_flight.do(key, load, timeout=settings.aliyun_vod_request_timeout)
+        except FutureTimeoutError:
+            logger.error(f"❌ {error_prefix}超时: key={key}")
+            raise Exception(f"{error_prefix}超时，请稍后重试")
+    
+    def get_video_play_auth(self, video_id: str, auth_timeout: Optional[int] = None) -> Optional[dict]:
+        """
+        获取视频播放凭证（缓存）
+        
+        凭证缓存 auth_timeout * ALIYUN_VOD_PLAY_AUTH_CACHE_RATIO 秒，
+        返回的凭证剩余有效期不少于 auth_timeout * (1 - ALIYUN_VOD_PLAY_AUTH_CACHE_RATIO)
         
         Args:
             video_id: 视频ID（阿里云VOD的VideoId）
-            auth_timeout: 凭证过期时间（秒），默认3000秒（50分钟）
+            auth_timeout: 凭证过期时间（秒），默认 ALIYUN_VOD_PLAY_AUTH_TIMEOUT（3000秒，50分钟）
         
         Returns:
             包含播放凭证的字典，包含以下字段：
@@ -62,6 +172,17 @@ class AliyunVODService:
         if not self.is_configured():
             raise Exception("阿里云VOD未配置，无法获取播放凭证")
         
+        auth_timeout = auth_timeout or settings.aliyun_vod_play_auth_timeout
+        return self._call_cached(
+            play_auth_cache,
+            (video_id, auth_timeout),
+            auth_timeout * settings.aliyun_vod_play_auth_cache_ratio,
+            lambda: self._request_play_auth(video_id, auth_timeout),
+            "获取视频播放凭证"
+        )
+    
+    def _request_play_auth(self, video_id: str, auth_timeout: int) -> dict:
+        """调用 GetVideoPlayAuth 接口"""
         try:
             # 使用CommonRequest来完全控制endpoint和参数
             request = CommonRequest()
@@ -101,7 +222,7 @@ class AliyunVODService:
     
     def get_video_info(self, video_id: str) -> Optional[dict]:
         """
-        获取视频信息
+        获取视频信息（缓存 ALIYUN_VOD_VIDEO_INFO_CACHE_TTL 秒）
         
         Args:
             video_id: 视频ID
@@ -112,6 +233,16 @@ class AliyunVODService:
         if not self.is_configured():
             raise Exception("阿里云VOD未配置")
         
+        return self._call_cached(
+            video_info_cache,
+            video_id,
+            settings.aliyun_vod_video_info_cache_ttl,
+            lambda: self._request_video_info(video_id),
+            "获取视频信息"
+        )
+    
+    def _request_video_info(self, video_id: str) -> dict:
+        """调用 GetVideoInfo 接口"""
         try:
             request = CommonRequest()
             request.set_accept_format('json')
@@ -145,5 +276,6 @@ class AliyunVODService:
             raise Exception(f"获取视频信息失败: {str(e)}")
 
 
+
 # 创建全局单例
 aliyun_vod_service = AliyunVODService()
@@ -0,0 +1,291 @@
+"""
+AI对话问题聚类服务
+对学生提问计算SimHash指纹，增量维护每个单元的相似问题聚类计数
+
+- “传感器怎么接线”与“传感器怎么接线？”归一化后指纹相同，计入同一聚类
+- 指纹按16位切成4段，汉明距离不超过3的两个指纹至少有一段完全相同，
+  因此只需按段查出少量候选聚类即可完成近似匹配，无需扫描历史消息
+- 热门问题直接按 (unit_uuid, ask_count) 索引读取聚类表
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, desc
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+import hashlib
+import re
+import unicodedata
+import logging
+
+from app.models.ai_chat import AIChatMessage, AIChatQuestionCluster
+
+logger = logging.getLogger(__name__)
+
+# 指纹位数与分段
+FINGERPRINT_BITS = 64
+BAND_BITS = 16
+BAND_COUNT = FINGERPRINT_BITS // BAND_BITS
+BAND_MASK = (1 << BAND_BITS) - 1
+FINGERPRINT_MASK = (1 << FINGERPRINT_BITS) - 1
+
+# 汉明距离不超过该值视为同一问题
+MAX_HAMMING_DISTANCE = 3
+
+# 参与聚类的最短问题长度（与原热门问题统计保持一致：长度大于5）
+MIN_QUESTION_LENGTH = 6
+
+# 单次匹配最多比较的候选聚类数
+MAX_CANDIDATES = 50
+
+# 标点、空白等非文字字符
+_NON_WORD_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_question(text: str) -> str:
+    """归一化问题文本：全角转半角、转小写、去掉标点和空白"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _NON_WORD_PATTERN.sub("", text)
+
+
+def _feature_hash(feature: str) -> int:
+    """计算特征的64位稳定哈希（不受进程哈希随机化影响）"""
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def compute_simhash(normalized: str) -> int:
+    """以字符二元组为特征计算64位SimHash"""
+    if len(normalized) < 2:
+        features = [normalized]
+    else:
+        features = [normalized[i:i + 2] for i in range(len(normalized) - 1)]
+
+    weights = [0] * FINGERPRINT_BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def split_bands(fingerprint: int) -> List[int]:
+    """把64位指纹切分为4个16位段"""
+    return [(fingerprint >> (i * BAND_BITS)) & BAND_MASK for i in range(BAND_COUNT)]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """计算两个指纹的汉明距离"""
+    return bin((a ^ b) & FINGERPRINT_MASK).count("1")
+
+
+def _to_signed(fingerprint: int) -> int:
+    """转换为有符号64位整数（MySQL BIGINT）"""
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint >= (1 << (FINGERPRINT_BITS - 1)) else fingerprint
+
+
+def _to_unsigned(value: int) -> int:
+    return value & FINGERPRINT_MASK
+
+
+class QuestionClusterService:
+    """问题聚类服务类"""
+
+    @staticmethod
+    def _find_cluster(
+        db: Session,
+        unit_uuid: str,
+        fingerprint: int,
+        bands: List[int]
+    ) -> Optional[AIChatQuestionCluster]:
+        """按指纹分段查找最接近的已有聚类"""
+        candidates = db.query(AIChatQuestionCluster).filter(
+            AIChatQuestionCluster.unit_uuid == unit_uuid,
+            or_(
+                AIChatQuestionCluster.band_0 == bands[0],
+                AIChatQuestionCluster.band_1 == bands[1],
+                AIChatQuestionCluster.band_2 == bands[2],
+                AIChatQuestionCluster.band_3 == bands[3]
+            )
+        ).limit(MAX_CANDIDATES).all()
+
+        best = None
+        best_distance = MAX_HAMMING_DISTANCE + 1
+        for cluster in candidates:
+            distance = hamming_distance(_to_unsigned(cluster.fingerprint), fingerprint)
+            if distance < best_distance:
+                best, best_distance = cluster, distance
+        return best
+
+    @staticmethod
+    def record_question(
+        db: Session,
+        unit_uuid: Optional[str],
+        content: Optional[str],
+        asked_at: Optional[datetime] = None
+    ) -> Optional[AIChatQuestionCluster]:
+        """
+        记录一条学生提问，更新所属聚类的计数
+
+        在调用方的事务中执行，不提交；由调用方与消息一起提交。
+
+        Args:
+            db: 数据库会话
+            unit_uuid: 单元UUID
+            content: 提问原文
+            asked_at: 提问时间
+
+        Returns:
+            所属聚类；不参与聚类的消息返回None
+        """
+        if not unit_uuid or not content or len(content) < MIN_QUESTION_LENGTH:
+            return None
+
+        normalized = normalize_question(content)
+        if not normalized:
+            return None
+
+        fingerprint = compute_simhash(normalized)
+        bands = split_bands(fingerprint)
+        asked_at = asked_at or datetime.now()
+
+        cluster = QuestionClusterService._find_cluster(db, unit_uuid, fingerprint, bands)
+        if cluster:
+            # 原子自增，避免并发提问时计数丢失
+            db.query(AIChatQuestionCluster).filter(
+                AIChatQuestionCluster.id == cluster.id
+            ).update({
+                AIChatQuestionCluster.ask_count: AIChatQuestionCluster.ask_count + 1,
+                AIChatQuestionCluster.last_asked_at: asked_at
+            }, synchronize_session=False)
+            return cluster
+
+        cluster = AIChatQuestionCluster(
+            unit_uuid=unit_uuid,
+            fingerprint=_to_signed(fingerprint),
+            band_0=bands[0],
+            band_1=bands[1],
+            band_2=bands[2],
+            band_3=bands[3],
+            representative_question=content,
+            ask_count=1,
+            last_asked_at=asked_at
+        )
+        db.add(cluster)
+        # 立即写入，使同一事务中的后续提问能匹配到该聚类
+        db.flush()
+        return cluster
+
+    @staticmethod
+    def rebuild_unit_clusters(db: Session, unit_uuid: str, batch_size: int = 1000) -> int:
+        """
+        根据历史消息重建单元的问题聚类（用于首次上线或数据修复）
+
+        Args:
+            db: 数据库会话
+            unit_uuid: 单元UUID
+            batch_size: 每批读取的消息数
+
+        Returns:
+            处理的提问数量
+        """
+        db.query(AIChatQuestionCluster).filter(
+            AIChatQuestionCluster.unit_uuid == unit_uuid
+        ).delete(synchronize_session=False)
+
+        # 先在内存中聚类，最后一次性写入
+        clusters: List[Dict[str, Any]] = []
+        band_index: List[Dict[int, List[int]]] = [{} for _ in range(BAND_COUNT)]
+        processed = 0
+
+        messages = db.query(
+            AIChatMessage.content, AIChatMessage.sent_at
+        ).filter(
+            AIChatMessage.unit_uuid == unit_uuid,
+            AIChatMessage.message_type == 'user',
+            AIChatMessage.content_length >= MIN_QUESTION_LENGTH
+        ).order_by(AIChatMessage.id).yield_per(batch_size)
+
+        for content, sent_at in messages:
+            normalized = normalize_question(content)
+            if not normalized:
+                continue
+            fingerprint = compute_simhash(normalized)
+            bands = split_bands(fingerprint)
+            processed += 1
+
+            best, best_distance = None, MAX_HAMMING_DISTANCE + 1
+            for i, band in enumerate(bands):
+                for idx in band_index[i].get(band, ()):
+                    distance = hamming_distance(clusters[idx]["fingerprint"], fingerprint)
+                    if distance < best_distance:
+                        best, best_distance = idx, distance
+
+            if best is not None:
+                clusters[best]["ask_count"] += 1
+                if sent_at and (clusters[best]["last_asked_at"] is None or sent_at > clusters[best]["last_asked_at"]):
+                    clusters[best]["last_asked_at"] = sent_at
+                continue
+
+            for i, band in enumerate(bands):
+                band_index[i].setdefault(band, []).append(len(clusters))
+            clusters.append({
+                "fingerprint": fingerprint,
+                "bands": bands,
+                "question": content,
+                "ask_count": 1,
+                "last_asked_at": sent_at
+            })
+
+        db.bulk_save_objects([
+            AIChatQuestionCluster(
+                unit_uuid=unit_uuid,
+                fingerprint=_to_signed(c["fingerprint"]),
+                band_0=c["bands"][0],
+                band_1=c["bands"][1],
+                band_2=c["bands"][2],
+                band_3=c["bands"][3],
+                representative_question=c["question"],
+                ask_count=c["ask_count"],
+                last_asked_at=c["last_asked_at"]
+            )
+            for c in clusters
+        ])
+        db.commit()
+
+        logger.info(f"单元 {unit_uuid} 问题聚类重建完成: {processed} 条提问, {len(clusters)} 个聚类")
+        return processed
+
+    @staticmethod
+    def get_popular_questions(
+        db: Session,
+        unit_uuid: str,
+        limit: int = 10,
+        min_count: int = 2
+    ) -> List[Dict[str, Any]]:
+        """
+        获取单元热门问题（按聚类提问次数排序）
+
+        只读取聚类表；历史提问的聚类由 scripts/rebuild_question_clusters.py 一次性生成。
+        """
+        clusters = db.query(
+            AIChatQuestionCluster.representative_question,
+            AIChatQuestionCluster.ask_count
+        ).filter(
+            AIChatQuestionCluster.unit_uuid == unit_uuid,
+            AIChatQuestionCluster.ask_count >= min_count
+        ).order_by(
+            desc(AIChatQuestionCluster.ask_count)
+        ).limit(limit).all()
+
+        return [
+            {
+                "question": question,
+                "ask_count": ask_count
+            }
+            for question, ask_count in clusters
+        ]
@@ -0,0 +1,463 @@
+"""
+视频播放进度写缓冲
+播放器每隔几秒上报一次进度，进度先更新内存中的会话状态，由后台线程定时批量写入数据库
+
+- 同一会话在一个刷新周期内的多次上报合并为一次 UPDATE，所有会话的更新和事件
+  分别用一次批量 UPDATE / INSERT 写入
+- 会话首次上报时从数据库加载一次状态，之后的计算都在内存中完成
+- 暂停、播放结束时立即写入该会话，服务关闭时写入全部未写数据
+- 会话状态只保存在本进程内存中：部署多个进程时需要按会话保持路由
+- 已观看时间段以 IntervalSet 保存，写入 watched_intervals 二进制列
+- 写入会话时在同一事务中更新观看统计汇总行（见 video_stats_service）
+- 批量写入因数据错误失败时逐个会话重写，只丢弃出错的会话；数据库不可用时放回缓冲，下个周期重试。
+  待写事件和内存会话数都有上限，超出时丢弃最早的并计数
+"""
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+import json
+import threading
+import time
+import logging
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.pbl import PBLVideoPlayProgress, PBLVideoPlayEvent
+from app.services.pbl.video_stats_service import (
+    VideoStatsService, WatchStatsValues, SessionStatsChange
+)
+from app.utils.interval_set import IntervalSet
+
+logger = logging.getLogger(__name__)
+
+# 需要立即写入数据库的事件
+FORCE_FLUSH_EVENTS = ('pause', 'ended')
+
+
+def is_connection_error(error: Exception) -> bool:
+    """数据库不可用（连接失败、连接断开），而不是数据本身的问题"""
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+def load_watched_intervals(data: Optional[bytes], legacy_ranges: Optional[str] = None) -> IntervalSet:
+    """
+    读取已观看时间段
+
+    Args:
+        data: watched_intervals 列的值
+        legacy_ranges: watched_ranges 列的值（旧的JSON格式，二进制列为空时使用）
+    """
+    if data:
+        try:
+            return IntervalSet.from_bytes(data)
+        except ValueError as e:
+            logger.warning(f"已观看时间段无法解析: {e}")
+            return IntervalSet()
+    try:
+        return IntervalSet(json.loads(legacy_ranges or '[]'))
+    except (TypeError, ValueError):
+        return IntervalSet()
+
+
+@dataclass
+class VideoSessionState:
+    """内存中的播放会话状态（字段与 PBLVideoPlayProgress 同名）"""
+    id: int
+    session_id: str
+    resource_id: int
+    user_id: int
+    duration: int
+    current_position: int
+    status: str
+    start_time: Optional[datetime]
+    last_event: Optional[str]
+    last_event_time: Optional[datetime]
+    seek_count: int
+    pause_count: int
+    watched_intervals: IntervalSet
+    play_duration: int
+    real_watch_duration: int
+    completion_rate: float
+    is_completed: int
+    end_time: Optional[datetime]
+    stats_baseline: Optional[WatchStatsValues] = None  # 上次计入统计汇总的值
+    dirty: bool = False
+    touched_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def from_model(cls, progress: PBLVideoPlayProgress) -> "VideoSessionState":
+        """根据数据库记录创建会话状态（数据库中的值已计入统计汇总）"""
+        state = cls(
+            id=progress.id,
+            session_id=progress.session_id,
+            resource_id=progress.resource_id,
+            user_id=progress.user_id,
+            duration=progress.duration or 0,
+            current_position=progress.current_position or 0,
+            status=progress.status,
+            start_time=progress.start_time,
+            last_event=progress.last_event,
+            last_event_time=progress.last_event_time,
+            seek_count=progress.seek_count or 0,
+            pause_count=progress.pause_count or 0,
+            watched_intervals=load_watched_intervals(progress.watched_intervals, progress.watched_ranges),
+            play_duration=progress.play_duration or 0,
+            real_watch_duration=progress.real_watch_duration or 0,
+            completion_rate=float(progress.completion_rate or 0),
+            is_completed=progress.is_completed or 0,
+            end_time=progress.end_time
+        )
+        state.stats_baseline = state.stats_values()
+        return state
+
+    def stats_values(self) -> WatchStatsValues:
+        """计入统计汇总的当前值"""
+        return WatchStatsValues(
+            play_duration=self.play_duration,
+            real_watch_duration=self.real_watch_duration,
+            completion_rate=self.completion_rate,
+            is_completed=self.is_completed,
+            seek_count=self.seek_count,
+            pause_count=self.pause_count
+        )
+
+    def stats_change(self, current: WatchStatsValues) -> SessionStatsChange:
+        return SessionStatsChange(
+            resource_id=self.resource_id,
+            user_id=self.user_id,
+            previous=self.stats_baseline,
+            current=current,
+            position=self.current_position,
+            start_time=self.start_time,
+            watch_time=self.last_event_time or self.start_time
+        )
+
+    def to_mapping(self) -> Dict[str, Any]:
+        """生成批量 UPDATE 的参数"""
+        return {
+            "id": self.id,
+            "current_position": self.current_position,
+            "status": self.status,
+            "last_event": self.last_event,
+            "last_event_time": self.last_event_time,
+            "seek_count": self.seek_count,
+            "pause_count": self.pause_count,
+            "watched_intervals": self.watched_intervals.to_bytes(),
+            "play_duration": self.play_duration,
+            "real_watch_duration": self.real_watch_duration,
+            "completion_rate": self.completion_rate,
+            "is_completed": self.is_completed,
+            "end_time": self.end_time,
+            "updated_at": self.last_event_time or self.start_time
+        }
+
+
+class VideoProgressBuffer:
+    """视频播放进度写缓冲"""
+
+    def __init__(self, flush_interval: float, max_sessions: int, idle_timeout: float, max_pending_events: int):
+        self.flush_interval = flush_interval
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_pending_events = max_pending_events
+        self._states: "OrderedDict[str, VideoSessionState]" = OrderedDict()
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # 保证批次按顺序写入
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed_updates = 0
+        self.flushed_events = 0
+        self.dropped_sessions = 0  # 未写入就被淘汰或写入失败丢弃的会话更新
+        self.dropped_events = 0
+
+    # ------------------------------------------------------------------
+    # 会话状态
+    # ------------------------------------------------------------------
+
+    def register(self, progress: PBLVideoPlayProgress) -> VideoSessionState:
+        """登记新建的会话（避免首次上报时再查询数据库），会话已在创建事务中计入统计汇总"""
+        state = VideoSessionState.from_model(progress)
+        with self._lock:
+            self._states[state.session_id] = state
+            self._evict_if_full()
+        return state
+
+    def _evict_if_full(self) -> None:
+        """超过会话上限时淘汰最久未上报的会话：先淘汰已写入的，仍超出时丢弃最早的待写会话"""
+        if len(self._states) <= self.max_sessions:
+            return
+        # 不淘汰刚放入的会话（最后一个）
+        for session_id in list(self._states)[:-1]:
+            if len(self._states) <= self.max_sessions:
+                return
+            if not self._states[session_id].dirty:
+                del self._states[session_id]
+        while len(self._states) > self.max_sessions:
+            session_id, _ = self._states.popitem(last=False)
+            self.dropped_sessions += 1
+            logger.warning(f"播放会话数超过上限 {self.max_sessions}，丢弃未写入的会话 {session_id}")
+
+    def _trim_events(self) -> None:
+        """待写事件超过上限时丢弃最早的（调用方持有锁）"""
+        overflow = len(self._events) - self.max_pending_events
+        if overflow > 0:
+            del self._events[:overflow]
+            self.dropped_events += overflow
+            logger.warning(f"待写播放事件超过上限 {self.max_pending_events}，丢弃最早的 {overflow} 条")
+
+    def get_state(self, db: Session, session_id: str) -> Optional[VideoSessionState]:
+        """获取会话状态，不在内存中时从数据库加载"""
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is not None:
+                self._states.move_to_end(session_id)
+                return state
+
+        # 等待进行中的写入完成，避免读到写入前的旧值作为统计基准
+        with self._flush_lock:
+            progress = db.query(PBLVideoPlayProgress).filter(
+                PBLVideoPlayProgress.session_id == session_id
+            ).populate_existing().first()
+            if not progress:
+                return None
+
+            with self._lock:
+                # 加载期间其他请求可能已登记该会话
+                state = self._states.get(session_id)
+                if state is None:
+                    state = VideoSessionState.from_model(progress)
+                    self._states[session_id] = state
+                    self._evict_if_full()
+                return state
+
+    def peek(self, session_id: str) -> Optional[VideoSessionState]:
+        """获取内存中的会话状态（不加载数据库）"""
+        with self._lock:
+            return self._states.get(session_id)
+
+    def lock(self) -> threading.RLock:
+        """修改会话状态时持有的锁"""
+        return self._lock
+
+    def attach(self, state: VideoSessionState) -> VideoSessionState:
+        """
+        返回内存中该会话的当前状态（调用方持有锁，修改返回的对象）
+
+        get_state 返回后到调用方加锁之间，后台线程可能已把会话移出内存：
+        此时重新放回；其他请求已重新加载该会话时使用新加载的对象。
+        """
+        current = self._states.get(state.session_id)
+        if current is None:
+            self._states[state.session_id] = state
+            current = state
+        else:
+            self._states.move_to_end(state.session_id)
+        current.touched_at = time.monotonic()
+        return current
+
+    def mark_dirty(self, state: VideoSessionState) -> None:
+        """标记会话状态待写入（调用方持有锁）"""
+        state.dirty = True
+        state.touched_at = time.monotonic()
+
+    def add_event(
+        self,
+        state: VideoSessionState,
+        event_type: str,
+        position: int,
+        event_data: Optional[str] = None,
+        timestamp: Optional[datetime] = None
+    ) -> None:
+        """登记待写入的播放事件（调用方持有锁）"""
+        self._events.append({
+            "session_id": state.session_id,
+            "resource_id": state.resource_id,
+            "user_id": state.user_id,
+            "event_type": event_type,
+            "position": position,
+            "event_data": event_data,
+            "timestamp": timestamp or state.last_event_time
+        })
+        self._trim_events()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def flush(self, session_id: Optional[str] = None) -> int:
+        """
+        把待写数据写入数据库
+
+        Args:
+            session_id: 只写入指定会话（及其事件）；为空时写入全部
+
+        Returns:
+            写入的会话数
+        """
+        with self._flush_lock:
+            with self._lock:
+                if session_id is None:
+                    states = [s for s in self._states.values() if s.dirty]
+                    events, self._events = self._events, []
+                else:
+                    state = self._states.get(session_id)
+                    states = [state] if state is not None and state.dirty else []
+                    events = [e for e in self._events if e["session_id"] == session_id]
+                    if events:
+                        self._events = [e for e in self._events if e["session_id"] != session_id]
+                mappings = [s.to_mapping() for s in states]
+                stats_values = [s.stats_values() for s in states]
+                stats_changes = [s.stats_change(v) for s, v in zip(states, stats_values)]
+                for s in states:
+                    s.dirty = False
+
+            if not mappings and not events:
+                return 0
+
+            try:
+                self._write(mappings, events, stats_changes)
+            except Exception as e:
+                if is_connection_error(e):
+                    # 数据库不可用：恢复待写标记和事件，下个周期重试（受事件上限约束）
+                    with self._lock:
+                        for st in states:
+                            st.dirty = True
+                        self._events[:0] = events
+                        self._trim_events()
+                    raise
+                logger.warning(f"批量写入视频播放进度失败，逐个会话重试: {e}")
+                return self._write_each(states, mappings, stats_values, stats_changes, events)
+
+            with self._lock:
+                for st, values in zip(states, stats_values):
+                    st.stats_baseline = values
+
+            self.flushed_updates += len(mappings)
+            self.flushed_events += len(events)
+            return len(mappings)
+
+    @staticmethod
+    def _write(
+        mappings: List[Dict[str, Any]],
+        events: List[Dict[str, Any]],
+        stats_changes: List[SessionStatsChange]
+    ) -> None:
+        """在一个事务中写入会话进度、事件和统计汇总"""
+        db = SessionLocal()
+        try:
+            if mappings:
+                db.bulk_update_mappings(PBLVideoPlayProgress, mappings)
+            if events:
+                db.bulk_insert_mappings(PBLVideoPlayEvent, events)
+            VideoStatsService.apply_session_changes(db, stats_changes)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_each(
+        self,
+        states: List[VideoSessionState],
+        mappings: List[Dict[str, Any]],
+        stats_values: List[WatchStatsValues],
+        stats_changes: List[SessionStatsChange],
+        events: List[Dict[str, Any]]
+    ) -> int:
+        """逐个会话写入（会话进度、统计和该会话的事件在同一事务），丢弃写入失败的会话"""
+        events_by_session: Dict[str, List[Dict[str, Any]]] = {}
+        for event in events:
+            events_by_session.setdefault(event["session_id"], []).append(event)
+
+        units = [
+            (st.session_id, st, [mapping], [values], [change])
+            for st, mapping, values, change in zip(states, mappings, stats_values, stats_changes)
+        ]
+        state_ids = {st.session_id for st in states}
+        units += [(sid, None, [], [], []) for sid in events_by_session if sid not in state_ids]
+
+        written = 0
+        for session_id, st, unit_mappings, unit_values, unit_changes in units:
+            unit_events = events_by_session.get(session_id, [])
+            try:
+                self._write(unit_mappings, unit_events, unit_changes)
+            except Exception as e:
+                if is_connection_error(e):
+                    raise
+                # 丢弃本次更新；会话统计基准不变，下次更新时重新计算差值
+                self.dropped_sessions += 1 if unit_mappings else 0
+                self.dropped_events += len(unit_events)
+                logger.error(f"写入播放会话 {session_id} 失败，丢弃本次更新和 {len(unit_events)} 条事件: {e}")
+                continue
+            if st is not None:
+                with self._lock:
+                    st.stats_baseline = unit_values[0]
+            written += len(unit_mappings)
+            self.flushed_updates += len(unit_mappings)
+            self.flushed_events += len(unit_events)
+        return written
+
+    def _evict_idle(self) -> None:
+        """清理已结束或长时间未上报的已写入会话"""
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for session_id in list(self._states):
+                state = self._states[session_id]
+                if not state.dirty and (state.status == 'ended' or state.touched_at < deadline):
+                    del self._states[session_id]
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                self._evict_idle()
+            except Exception as e:
+                logger.error(f"写入视频播放进度失败: {e}", exc_info=True)
+
+    def start(self) -> None:
+        """启动后台写入线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="video-progress-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"视频播放进度写缓冲已启动: 间隔 {self.flush_interval} 秒")
+
+    def stop(self) -> None:
+        """停止后台线程并写入剩余数据"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"关闭时写入视频播放进度失败: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._states),
+                "dirty_sessions": sum(1 for s in self._states.values() if s.dirty),
+                "pending_events": len(self._events),
+                "flushed_updates": self.flushed_updates,
+                "flushed_events": self.flushed_events,
+                "dropped_sessions": self.dropped_sessions,
+                "dropped_events": self.dropped_events
+            }
+
+
+video_progress_buffer = VideoProgressBuffer(
+    flush_interval=settings.video_progress_flush_interval,
+    max_sessions=settings.video_progress_max_sessions,
+    idle_timeout=settings.video_progress_session_idle_timeout,
+    max_pending_events=settings.video_progress_max_pending_events
+)
@@ -7,9 +7,13 @@
 - 学生只能查看自己的基础统计（不包括详细播放行为数据）
 - 平台管理员可以查看所有用户的详细统计和播放行为数据
 - 学校管理员和教师无法查看学生的详细播放记录
+
+进度上报、拖动、暂停、结束先更新内存中的会话状态（见 video_progress_buffer），
+由后台线程批量写入；暂停和结束立即写入，统计查询可能滞后一个刷新周期
+观看统计和排行榜读取写入时增量维护的汇总表（见 video_stats_service）
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import and_, or_
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from app.utils.timezone import get_beijing_time_naive
@@ -20,8 +24,24 @@ from app.models.pbl import (
     PBLResource, 
     PBLVideoPlayProgress, 
     PBLVideoPlayEvent,
-    PBLVideoWatchRecord
+    PBLVideoWatchRecord,
+    PBLVideoUserStats,
+    PBLClassMember
+)
+from app.services.pbl.video_progress_buffer import (
+    video_progress_buffer, VideoSessionState, FORCE_FLUSH_EVENTS, load_watched_intervals
 )
+from app.services.pbl.video_stats_service import (
+    VideoStatsService, WatchStatsValues, SessionStatsChange
+)
+from app.utils.interval_set import IntervalSet, coverage_histogram
+
+# 两次上报之间的位置差不超过该值（秒）时视为连续播放，计入已观看时间段
+# 前端每10秒上报一次，留出倍速播放和网络延迟的余量
+MAX_CONTINUOUS_SECONDS = 30
+
+# 流失点统计把视频时长分成的段数
+DROP_OFF_SEGMENTS = 10
 
 
 class VideoProgressService:
@@ -70,19 +90,31 @@ class VideoProgressService:
         )
         
         db.add(progress)
-        db.commit()
-        db.refresh(progress)
         
-        # 记录播放事件
-        VideoProgressService.record_event(
-            db=db,
+        # 记录播放事件（与会话在同一事务中写入）
+        db.add(PBLVideoPlayEvent(
             session_id=session_id,
             resource_id=resource_id,
             user_id=user_id,
             event_type='play',
             position=0
-        )
+        ))
+        db.flush()
         
+        # 会话数在创建事务中计入统计汇总，之后的写入只累加变化量
+        VideoStatsService.apply_session_changes(db, [SessionStatsChange(
+            resource_id=resource_id,
+            user_id=user_id,
+            previous=None,
+            current=WatchStatsValues(0, 0, 0.0, 0, 0, 0),
+            position=0,
+            start_time=progress.start_time,
+            watch_time=progress.last_event_time
+        )])
+        db.commit()
+        db.refresh(progress)
+        
+        video_progress_buffer.register(progress)
         return progress
     
     @staticmethod
@@ -92,9 +124,9 @@ class VideoProgressService:
         current_position: int,
         status: str = 'playing',
         event_type: str = 'progress'
-    ) -> Optional[PBLVideoPlayProgress]:
+    ) -> Optional[VideoSessionState]:
         """
-        更新播放进度
+        更新播放进度（写入缓冲，暂停/结束事件立即写入）
         
         Args:
             db: 数据库会话
@@ -104,50 +136,39 @@ class VideoProgressService:
             event_type: 事件类型
             
         Returns:
-            更新后的播放进度对象
+            更新后的播放会话状态
         """
-        progress = db.query(PBLVideoPlayProgress).filter(
-            PBLVideoPlayProgress.session_id == session_id
-        ).first()
-        
-        if not progress:
+        state = video_progress_buffer.get_state(db, session_id)
+        if not state:
             return None
         
-        # 更新播放位置和状态
-        progress.current_position = current_position
-        progress.status = status
-        progress.last_event = event_type
-        progress.last_event_time = get_beijing_time_naive()
-        
-        # 计算完成率
-        if progress.duration > 0:
-            progress.completion_rate = round((current_position / progress.duration) * 100, 2)
+        with video_progress_buffer.lock():
+            state = video_progress_buffer.attach(state)
+            # 更新观看时间段（上次位置到当前位置）
+            VideoProgressService._record_watched(state, state.current_position, current_position)
             
-            # 判断是否完成（观看90%以上视为完成）
-            if progress.completion_rate >= 90:
-                progress.is_completed = 1
-        
-        # 更新观看时间段
-        VideoProgressService._update_watched_ranges(progress, current_position)
-        
-        # 计算真实观看时长
-        progress.real_watch_duration = VideoProgressService._calculate_real_duration(progress)
-        
-        db.commit()
-        db.refresh(progress)
-        
-        # 记录事件
-        if event_type != 'progress':  # 避免记录太多progress事件
-            VideoProgressService.record_event(
-                db=db,
-                session_id=session_id,
-                resource_id=progress.resource_id,
-                user_id=progress.user_id,
-                event_type=event_type,
-                position=current_position
-            )
-        
-        return progress
+            # 更新播放位置和状态
+            state.current_position = current_position
+            state.status = status
+            state.last_event = event_type
+            state.last_event_time = get_beijing_time_naive()
+            
+            # 计算完成率
+            if state.duration > 0:
+                state.completion_rate = round((current_position / state.duration) * 100, 2)
+                
+                # 判断是否完成（观看90%以上视为完成）
+                if state.completion_rate >= 90:
+                    state.is_completed = 1
+            
+            # 记录事件
+            if event_type != 'progress':  # 避免记录太多progress事件
+                video_progress_buffer.add_event(state, event_type, current_position)
+            video_progress_buffer.mark_dirty(state)
+        
+        if event_type in FORCE_FLUSH_EVENTS:
+            video_progress_buffer.flush(session_id)
+        return state
     
     @staticmethod
     def record_seek(
@@ -155,9 +176,9 @@ class VideoProgressService:
         session_id: str,
         from_position: int,
         to_position: int
-    ) -> Optional[PBLVideoPlayProgress]:
+    ) -> Optional[VideoSessionState]:
         """
-        记录拖动事件
+        记录拖动事件（写入缓冲）
         
         Args:
             db: 数据库会话
@@ -166,45 +187,40 @@ class VideoProgressService:
             to_position: 拖动后的位置（秒）
             
         Returns:
-            更新后的播放进度对象
+            更新后的播放会话状态
         """
-        progress = db.query(PBLVideoPlayProgress).filter(
-            PBLVideoPlayProgress.session_id == session_id
-        ).first()
-        
-        if not progress:
+        state = video_progress_buffer.get_state(db, session_id)
+        if not state:
             return None
         
-        # 更新拖动次数和位置
-        progress.seek_count += 1
-        progress.current_position = to_position
-        progress.last_event = 'seek'
-        progress.last_event_time = get_beijing_time_naive()
-        
-        db.commit()
-        db.refresh(progress)
-        
-        # 记录拖动事件
-        VideoProgressService.record_event(
-            db=db,
-            session_id=session_id,
-            resource_id=progress.resource_id,
-            user_id=progress.user_id,
-            event_type='seek',
-            position=to_position,
-            event_data=json.dumps({'from': from_position, 'to': to_position})
-        )
+        with video_progress_buffer.lock():
+            state = video_progress_buffer.attach(state)
+            # 拖动前最后一段连续播放
+            VideoProgressService._record_watched(state, state.current_position, from_position)
+            
+            # 更新拖动次数和位置
+            state.seek_count += 1
+            state.current_position = to_position
+            state.last_event = 'seek'
+            state.last_event_time = get_beijing_time_naive()
+            
+            # 记录拖动事件
+            video_progress_buffer.add_event(
+                state, 'seek', to_position,
+                event_data=json.dumps({'from': from_position, 'to': to_position})
+            )
+            video_progress_buffer.mark_dirty(state)
         
-        return progress
+        return state
     
     @staticmethod
     def record_pause(
         db: Session,
         session_id: str,
         position: int
-    ) -> Optional[PBLVideoPlayProgress]:
+    ) -> Optional[VideoSessionState]:
         """
-        记录暂停事件
+        记录暂停事件（立即写入）
         
         Args:
             db: 数据库会话
@@ -212,44 +228,36 @@ class VideoProgressService:
             position: 暂停位置（秒）
             
         Returns:
-            更新后的播放进度对象
+            更新后的播放会话状态
         """
-        progress = db.query(PBLVideoPlayProgress).filter(
-            PBLVideoPlayProgress.session_id == session_id
-        ).first()
-        
-        if not progress:
+        state = video_progress_buffer.get_state(db, session_id)
+        if not state:
             return None
         
-        progress.pause_count += 1
-        progress.current_position = position
-        progress.status = 'paused'
-        progress.last_event = 'pause'
-        progress.last_event_time = get_beijing_time_naive()
-        
-        db.commit()
-        db.refresh(progress)
-        
-        # 记录暂停事件
-        VideoProgressService.record_event(
-            db=db,
-            session_id=session_id,
-            resource_id=progress.resource_id,
-            user_id=progress.user_id,
-            event_type='pause',
-            position=position
-        )
+        with video_progress_buffer.lock():
+            state = video_progress_buffer.attach(state)
+            VideoProgressService._record_watched(state, state.current_position, position)
+            state.pause_count += 1
+            state.current_position = position
+            state.status = 'paused'
+            state.last_event = 'pause'
+            state.last_event_time = get_beijing_time_naive()
+            
+            # 记录暂停事件
+            video_progress_buffer.add_event(state, 'pause', position)
+            video_progress_buffer.mark_dirty(state)
         
-        return progress
+        video_progress_buffer.flush(session_id)
+        return state
     
     @staticmethod
     def record_ended(
         db: Session,
         session_id: str,
         position: int
-    ) -> Optional[PBLVideoPlayProgress]:
+    ) -> Optional[VideoSessionState]:
         """
-        记录播放结束事件
+        记录播放结束事件（立即写入）
         
         Args:
             db: 数据库会话
@@ -257,41 +265,34 @@ class VideoProgressService:
             position: 结束位置（秒）
             
         Returns:
-            更新后的播放进度对象
+            更新后的播放会话状态
         """
-        progress = db.query(PBLVideoPlayProgress).filter(
-            PBLVideoPlayProgress.session_id == session_id
-        ).first()
-        
-        if not progress:
+        state = video_progress_buffer.get_state(db, session_id)
+        if not state:
             return None
         
-        progress.current_position = position
-        progress.status = 'ended'
-        progress.last_event = 'ended'
-        progress.last_event_time = get_beijing_time_naive()
-        progress.end_time = get_beijing_time_naive()
-        
-        # 如果播放到90%以上，标记为完成
-        if progress.duration > 0:
-            completion_rate = (position / progress.duration) * 100
-            if completion_rate >= 90:
-                progress.is_completed = 1
-        
-        db.commit()
-        db.refresh(progress)
-        
-        # 记录结束事件
-        VideoProgressService.record_event(
-            db=db,
-            session_id=session_id,
-            resource_id=progress.resource_id,
-            user_id=progress.user_id,
-            event_type='ended',
-            position=position
-        )
+        with video_progress_buffer.lock():
+            state = video_progress_buffer.attach(state)
+            VideoProgressService._record_watched(state, state.current_position, position)
+            now = get_beijing_time_naive()
+            state.current_position = position
+            state.status = 'ended'
+            state.last_event = 'ended'
+            state.last_event_time = now
+            state.end_time = now
+            
+            # 如果播放到90%以上，标记为完成
+            if state.duration > 0:
+                completion_rate = (position / state.duration) * 100
+                if completion_rate >= 90:
+                    state.is_completed = 1
+            
+            # 记录结束事件
+            video_progress_buffer.add_event(state, 'ended', position)
+            video_progress_buffer.mark_dirty(state)
         
-        return progress
+        video_progress_buffer.flush(session_id)
+        return state
     
     @staticmethod
     def record_event(
@@ -339,7 +340,7 @@ class VideoProgressService:
         session_id: str
     ) -> Optional[PBLVideoPlayProgress]:
         """
-        获取播放会话
+        获取播放会话（先写入该会话缓冲中的进度）
         
         Args:
             db: 数据库会话
@@ -348,6 +349,7 @@ class VideoProgressService:
         Returns:
             播放进度对象
         """
+        video_progress_buffer.flush(session_id)
         return db.query(PBLVideoPlayProgress).filter(
             PBLVideoPlayProgress.session_id == session_id
         ).first()
@@ -389,6 +391,17 @@ class VideoProgressService:
                 "last_watch_time": None
             }
         
+        # 最近的会话可能还有未写入的进度
+        state = video_progress_buffer.peek(progress.session_id)
+        if state is not None and state.dirty:
+            return {
+                "has_progress": True,
+                "session_id": state.session_id,
+                "position": state.current_position,
+                "completion_rate": state.completion_rate,
+                "last_watch_time": state.last_event_time
+            }
+        
         return {
             "has_progress": True,
             "session_id": progress.session_id,
@@ -404,7 +417,7 @@ class VideoProgressService:
         user_id: int
     ) -> Dict[str, Any]:
         """
-        获取用户对某个视频的观看统计
+        获取用户对某个视频的观看统计（读取汇总行）
         
         Args:
             db: 数据库会话
@@ -414,13 +427,12 @@ class VideoProgressService:
         Returns:
             观看统计信息
         """
-        # 查询所有会话
-        sessions = db.query(PBLVideoPlayProgress).filter(
-            PBLVideoPlayProgress.resource_id == resource_id,
-            PBLVideoPlayProgress.user_id == user_id
-        ).all()
+        stats = db.query(PBLVideoUserStats).filter(
+            PBLVideoUserStats.resource_id == resource_id,
+            PBLVideoUserStats.user_id == user_id
+        ).first()
         
-        if not sessions:
+        if not stats or not stats.session_count:
             return {
                 "session_count": 0,
                 "total_play_duration": 0,
@@ -435,39 +447,59 @@ class VideoProgressService:
             }
         
         return {
-            "session_count": len(sessions),
-            "total_play_duration": sum(s.play_duration for s in sessions),
-            "total_real_watch_duration": sum(s.real_watch_duration for s in sessions),
-            "avg_completion_rate": round(sum(float(s.completion_rate or 0) for s in sessions) / len(sessions), 2),
-            "max_completion_rate": max(float(s.completion_rate or 0) for s in sessions),
-            "total_seek_count": sum(s.seek_count for s in sessions),
-            "total_pause_count": sum(s.pause_count for s in sessions),
-            "completed_count": sum(1 for s in sessions if s.is_completed == 1),
-            "first_watch_time": min(s.start_time for s in sessions),
-            "last_watch_time": max(s.updated_at for s in sessions)
+            "session_count": stats.session_count,
+            "total_play_duration": stats.total_play_duration,
+            "total_real_watch_duration": stats.total_real_watch_duration,
+            "avg_completion_rate": round(float(stats.total_completion_rate or 0) / stats.session_count, 2),
+            "max_completion_rate": float(stats.max_completion_rate or 0),
+            "total_seek_count": stats.total_seek_count,
+            "total_pause_count": stats.total_pause_count,
+            "completed_count": stats.completed_count,
+            "first_watch_time": stats.first_watch_time,
+            "last_watch_time": stats.last_watch_time
         }
     
+    @staticmethod
+    def _class_member_ids(db: Session, class_id: int):
+        """班级在读学生ID子查询"""
+        return db.query(PBLClassMember.student_id).filter(
+            PBLClassMember.class_id == class_id,
+            PBLClassMember.is_active == 1
+        )
+    
+    @staticmethod
+    def _stats_query(db: Session, resource_id: int, class_id: Optional[int] = None):
+        """查询视频的汇总行（可限定班级成员）"""
+        query = db.query(PBLVideoUserStats).filter(
+            PBLVideoUserStats.resource_id == resource_id
+        )
+        if class_id is not None:
+            member_ids = VideoProgressService._class_member_ids(db, class_id)
+            query = query.filter(PBLVideoUserStats.user_id.in_(member_ids))
+        return query
+    
     @staticmethod
     def get_video_watch_stats(
         db: Session,
-        resource_id: int
+        resource_id: int,
+        class_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
-        获取某个视频的整体观看统计（所有学生）
+        获取某个视频的整体观看统计（所有学生或某个班级，读取汇总行）
         
         Args:
             db: 数据库会话
             resource_id: 资源ID
+            class_id: 班级ID（只统计该班级的学生），为空时统计所有学生
             
         Returns:
-            视频观看统计信息
+            视频观看统计信息，drop_off 为未看完的学生最近停止位置的分布（按视频时长10等分）
         """
-        # 查询所有会话
-        sessions = db.query(PBLVideoPlayProgress).filter(
-            PBLVideoPlayProgress.resource_id == resource_id
+        rows = VideoProgressService._stats_query(db, resource_id, class_id).filter(
+            PBLVideoUserStats.session_count > 0
         ).all()
         
-        if not sessions:
+        if not rows:
             return {
                 "total_students": 0,
                 "total_sessions": 0,
@@ -476,133 +508,182 @@ class VideoProgressService:
                 "avg_completion_rate": 0,
                 "completed_count": 0,
                 "avg_seek_count": 0,
-                "avg_pause_count": 0
+                "avg_pause_count": 0,
+                "drop_off": []
             }
         
-        # 统计不同的用户数
-        unique_users = set(s.user_id for s in sessions)
+        total_sessions = sum(r.session_count for r in rows)
+        
+        # 流失点：未看完的学生最近一次停在哪里
+        duration = db.query(PBLResource.duration).filter(PBLResource.id == resource_id).scalar() or 0
+        drop_off = []
+        if duration > 0:
+            segment = duration / DROP_OFF_SEGMENTS
+            counts = [0] * DROP_OFF_SEGMENTS
+            for r in rows:
+                if r.completed_count == 0:
+                    index = min(int((r.last_position or 0) / segment), DROP_OFF_SEGMENTS - 1)
+                    counts[index] += 1
+            drop_off = [
+                {
+                    "start": int(i * segment),
+                    "end": int((i + 1) * segment) if i < DROP_OFF_SEGMENTS - 1 else duration,
+                    "students": count
+                }
+                for i, count in enumerate(counts)
+            ]
         
         return {
-            "total_students": len(unique_users),
-            "total_sessions": len(sessions),
-            "total_play_duration": sum(s.play_duration for s in sessions),
-            "total_real_watch_duration": sum(s.real_watch_duration for s in sessions),
-            "avg_completion_rate": round(sum(float(s.completion_rate or 0) for s in sessions) / len(sessions), 2),
-            "completed_count": sum(1 for s in sessions if s.is_completed == 1),
-            "avg_seek_count": round(sum(s.seek_count for s in sessions) / len(sessions), 2),
-            "avg_pause_count": round(sum(s.pause_count for s in sessions) / len(sessions), 2)
+            "total_students": len(rows),
+            "total_sessions": total_sessions,
+            "total_play_duration": sum(r.total_play_duration for r in rows),
+            "total_real_watch_duration": sum(r.total_real_watch_duration for r in rows),
+            "avg_completion_rate": round(sum(float(r.total_completion_rate or 0) for r in rows) / total_sessions, 2),
+            "completed_count": sum(r.completed_count for r in rows),
+            "avg_seek_count": round(sum(r.total_seek_count for r in rows) / total_sessions, 2),
+            "avg_pause_count": round(sum(r.total_pause_count for r in rows) / total_sessions, 2),
+            "drop_off": drop_off
         }
     
     @staticmethod
     def get_students_ranking(
         db: Session,
         resource_id: int,
-        limit: int = 20
+        limit: int = 20,
+        class_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
-        获取学生观看排行榜（按真实观看时长排序）
+        获取学生观看排行榜（按真实观看时长排序，读取汇总行）
         
         Args:
             db: 数据库会话
             resource_id: 资源ID
             limit: 返回数量
+            class_id: 班级ID（只统计该班级的学生），为空时统计所有学生
             
         Returns:
             学生排行榜列表
         """
         from app.models.user import User
         
-        # 查询并分组统计
-        result = db.query(
-            PBLVideoPlayProgress.user_id,
-            func.sum(PBLVideoPlayProgress.real_watch_duration).label('total_duration'),
-            func.max(PBLVideoPlayProgress.completion_rate).label('max_completion'),
-            func.count(PBLVideoPlayProgress.id).label('session_count')
-        ).filter(
-            PBLVideoPlayProgress.resource_id == resource_id
-        ).group_by(
-            PBLVideoPlayProgress.user_id
+        result = VideoProgressService._stats_query(db, resource_id, class_id).filter(
+            PBLVideoUserStats.session_count > 0
+        ).outerjoin(
+            User, User.id == PBLVideoUserStats.user_id
+        ).with_entities(
+            PBLVideoUserStats, User.username, User.real_name
         ).order_by(
-            func.sum(PBLVideoPlayProgress.real_watch_duration).desc()
+            PBLVideoUserStats.total_real_watch_duration.desc()
         ).limit(limit).all()
         
-        # 获取用户信息
         ranking = []
-        for idx, row in enumerate(result, 1):
-            user = db.query(User).filter(User.id == row.user_id).first()
+        for idx, (stats, username, real_name) in enumerate(result, 1):
             ranking.append({
                 "rank": idx,
-                "user_id": row.user_id,
-                "username": user.username if user else "Unknown",
-                "real_name": user.real_name if user else "Unknown",
-                "total_watch_duration": row.total_duration,
-                "max_completion_rate": float(row.max_completion or 0),
-                "session_count": row.session_count
+                "user_id": stats.user_id,
+                "username": username or "Unknown",
+                "real_name": real_name or "Unknown",
+                "total_watch_duration": stats.total_real_watch_duration,
+                "max_completion_rate": float(stats.max_completion_rate or 0),
+                "session_count": stats.session_count
             })
         
         return ranking
     
     @staticmethod
-    def _update_watched_ranges(progress: PBLVideoPlayProgress, current_position: int):
+    def get_video_heatmap(
+        db: Session,
+        resource_id: int,
+        bucket_size: int = 10,
+        class_id: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
-        更新已观看的时间段
+        获取视频观看热力图（每个时间段有多少学生看过）
         
-        内部方法，用于维护 watched_ranges 字段
+        同一学生的多个会话先合并，再按秒累加所有学生的已观看时间段
+        
+        Args:
+            db: 数据库会话
+            resource_id: 资源ID
+            bucket_size: 时间段宽度（秒）
+            class_id: 班级ID（只统计该班级的学生），为空时统计所有学生
+            
+        Returns:
+            {
+                "duration": 视频时长,
+                "bucket_size": 时间段宽度,
+                "student_count": 学生数,
+                "buckets": [{"start": 起始秒, "end": 结束秒, "viewers": 平均观看人数}]
+            }
         """
-        try:
-            watched_ranges = json.loads(progress.watched_ranges or '[]')
-        except:
-            watched_ranges = []
-        
-        # 简化处理：记录当前位置附近的时间段
-        # 实际应用中可以实现更复杂的时间段合并逻辑
-        range_size = 10  # 每10秒记录一个时间段
-        range_start = (current_position // range_size) * range_size
-        range_end = range_start + range_size
-        
-        # 检查是否已存在该时间段
-        range_exists = False
-        for r in watched_ranges:
-            if len(r) == 2 and r[0] <= range_start < r[1]:
-                range_exists = True
-                # 扩展现有时间段
-                r[1] = max(r[1], range_end)
-                break
-        
-        if not range_exists:
-            watched_ranges.append([range_start, range_end])
-        
-        # 排序并合并重叠的时间段
-        watched_ranges.sort(key=lambda x: x[0])
-        merged_ranges = []
-        for r in watched_ranges:
-            if not merged_ranges or merged_ranges[-1][1] < r[0]:
-                merged_ranges.append(r)
+        # 热力图需要最新的已观看时间段
+        video_progress_buffer.flush()
+        
+        query = db.query(
+            PBLVideoPlayProgress.user_id,
+            PBLVideoPlayProgress.duration,
+            PBLVideoPlayProgress.watched_intervals,
+            PBLVideoPlayProgress.watched_ranges
+        ).filter(
+            PBLVideoPlayProgress.resource_id == resource_id
+        )
+        if class_id is not None:
+            member_ids = VideoProgressService._class_member_ids(db, class_id)
+            query = query.filter(PBLVideoPlayProgress.user_id.in_(member_ids))
+        
+        per_user: Dict[int, IntervalSet] = {}
+        duration = 0
+        for user_id, session_duration, data, legacy_ranges in query.all():
+            duration = max(duration, session_duration or 0)
+            watched = load_watched_intervals(data, legacy_ranges)
+            if user_id in per_user:
+                per_user[user_id].update(watched)
             else:
-                merged_ranges[-1][1] = max(merged_ranges[-1][1], r[1])
+                per_user[user_id] = watched
+        
+        resource_duration = db.query(PBLResource.duration).filter(
+            PBLResource.id == resource_id
+        ).scalar()
+        if resource_duration:
+            duration = resource_duration
+        
+        bucket_size = max(1, bucket_size)
+        totals = coverage_histogram(per_user.values(), duration, bucket_size)
+        buckets = []
+        for index, total in enumerate(totals):
+            start = index * bucket_size
+            end = min(start + bucket_size, duration)
+            buckets.append({
+                "start": start,
+                "end": end,
+                "viewers": round(total / (end - start), 2)
+            })
         
-        progress.watched_ranges = json.dumps(merged_ranges)
+        return {
+            "duration": duration,
+            "bucket_size": bucket_size,
+            "student_count": len(per_user),
+            "buckets": buckets
+        }
     
     @staticmethod
-    def _calculate_real_duration(progress: PBLVideoPlayProgress) -> int:
+    def _record_watched(state: VideoSessionState, from_position: int, to_position: int):
         """
-        计算真实观看时长（基于观看时间段）
+        记录一段连续播放，并更新播放时长和真实观看时长
         
-        内部方法，根据 watched_ranges 计算不重复的观看时长
+        内部方法：只有位置前进且不超过 MAX_CONTINUOUS_SECONDS 时才视为连续播放，
+        拖动、长时间未上报等跳跃不计入
         """
-        try:
-            watched_ranges = json.loads(progress.watched_ranges or '[]')
-        except:
-            return 0
-        
-        # 计算所有时间段的总长度
-        total_duration = 0
-        for r in watched_ranges:
-            if len(r) == 2:
-                total_duration += (r[1] - r[0])
-        
-        return total_duration
-
+        if not 0 < to_position - from_position <= MAX_CONTINUOUS_SECONDS:
+            return
+        if state.duration > 0:
+            to_position = min(to_position, state.duration)
+            if to_position <= from_position:
+                return
+        from_position = max(from_position, 0)
+        state.play_duration += to_position - from_position
+        state.watched_intervals.add(from_position, to_position)
+        state.real_watch_duration = state.watched_intervals.covered
 
 # 创建全局服务实例
 video_progress_service = VideoProgressService()
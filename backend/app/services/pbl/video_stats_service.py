@@ -0,0 +1,192 @@
+"""
+视频观看统计维护服务
+按（视频, 学生）汇总播放会话，写入 pbl_video_user_stats，统计和排行榜接口直接读取汇总行
+
+- 播放进度写缓冲每次写入会话时，把会话自上次写入以来的变化量累加到汇总行（同一事务）
+- 汇总行只由写缓冲更新（单进程，写入串行），因此在内存中计算新值后整行写回
+- 班级统计按班级成员读取汇总行再聚合，班级成员变动无需维护额外数据
+- 上线前的历史会话通过 rebuild_resource_stats 重建（scripts/rebuild_video_watch_stats.py）
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.pbl import PBLVideoPlayProgress, PBLVideoUserStats
+
+
+class WatchStatsValues(NamedTuple):
+    """单个会话计入汇总的统计值"""
+    play_duration: int
+    real_watch_duration: int
+    completion_rate: float
+    is_completed: int
+    seek_count: int
+    pause_count: int
+
+
+class SessionStatsChange(NamedTuple):
+    """一次写入中单个会话的统计变化"""
+    resource_id: int
+    user_id: int
+    previous: Optional[WatchStatsValues]  # 上次写入时的值；为None表示新会话，尚未计入
+    current: WatchStatsValues
+    position: int
+    start_time: Optional[datetime]
+    watch_time: Optional[datetime]
+
+
+def _new_stats_row(resource_id: int, user_id: int) -> PBLVideoUserStats:
+    return PBLVideoUserStats(
+        resource_id=resource_id,
+        user_id=user_id,
+        session_count=0,
+        completed_count=0,
+        total_play_duration=0,
+        total_real_watch_duration=0,
+        total_completion_rate=Decimal("0"),
+        max_completion_rate=Decimal("0"),
+        total_seek_count=0,
+        total_pause_count=0,
+        last_position=0
+    )
+
+
+def _to_decimal(value: float) -> Decimal:
+    return Decimal(str(round(float(value or 0), 2)))
+
+
+class VideoStatsService:
+    """视频观看统计维护服务类"""
+
+    @staticmethod
+    def _load_rows(
+        db: Session,
+        keys: Iterable[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], PBLVideoUserStats]:
+        keys = set(keys)
+        resource_ids = {resource_id for resource_id, _ in keys}
+        user_ids = {user_id for _, user_id in keys}
+        rows = db.query(PBLVideoUserStats).filter(
+            PBLVideoUserStats.resource_id.in_(resource_ids),
+            PBLVideoUserStats.user_id.in_(user_ids)
+        ).all()
+        return {
+            (row.resource_id, row.user_id): row
+            for row in rows
+            if (row.resource_id, row.user_id) in keys
+        }
+
+    @staticmethod
+    def apply_session_changes(db: Session, changes: List[SessionStatsChange]) -> int:
+        """
+        把会话的统计变化累加到汇总行
+
+        在调用方的事务中执行，不提交；由写缓冲与会话进度一起提交。
+
+        Args:
+            db: 数据库会话
+            changes: 会话统计变化（同一学生可有多个会话）
+
+        Returns:
+            更新的汇总行数
+        """
+        if not changes:
+            return 0
+
+        rows = VideoStatsService._load_rows(db, ((c.resource_id, c.user_id) for c in changes))
+        for change in changes:
+            key = (change.resource_id, change.user_id)
+            row = rows.get(key)
+            if row is None:
+                row = _new_stats_row(*key)
+                db.add(row)
+                rows[key] = row
+
+            current, previous = change.current, change.previous
+            if previous is None:
+                row.session_count += 1
+                previous = WatchStatsValues(0, 0, 0.0, 0, 0, 0)
+
+            row.total_play_duration += current.play_duration - previous.play_duration
+            row.total_real_watch_duration += current.real_watch_duration - previous.real_watch_duration
+            row.total_completion_rate = (
+                Decimal(row.total_completion_rate or 0)
+                + _to_decimal(current.completion_rate) - _to_decimal(previous.completion_rate)
+            )
+            row.max_completion_rate = max(
+                Decimal(row.max_completion_rate or 0), _to_decimal(current.completion_rate)
+            )
+            row.completed_count += current.is_completed - previous.is_completed
+            row.total_seek_count += current.seek_count - previous.seek_count
+            row.total_pause_count += current.pause_count - previous.pause_count
+
+            if change.start_time and (row.first_watch_time is None or change.start_time < row.first_watch_time):
+                row.first_watch_time = change.start_time
+            if change.watch_time and (row.last_watch_time is None or change.watch_time >= row.last_watch_time):
+                row.last_watch_time = change.watch_time
+                row.last_position = change.position
+
+        return len(rows)
+
+    @staticmethod
+    def rebuild_resource_stats(db: Session, resource_id: int) -> int:
+        """
+        根据播放会话重建某个视频的汇总行
+
+        Args:
+            db: 数据库会话
+            resource_id: 资源ID
+
+        Returns:
+            重建的汇总行数
+        """
+        P = PBLVideoPlayProgress
+        aggregates = db.query(
+            P.user_id,
+            func.count(P.id),
+            func.sum(P.is_completed),
+            func.sum(P.play_duration),
+            func.sum(P.real_watch_duration),
+            func.sum(P.completion_rate),
+            func.max(P.completion_rate),
+            func.sum(P.seek_count),
+            func.sum(P.pause_count),
+            func.min(P.start_time),
+            func.max(P.updated_at)
+        ).filter(
+            P.resource_id == resource_id
+        ).group_by(P.user_id).all()
+
+        # 最近一次会话的播放位置
+        last_positions: Dict[int, int] = {}
+        for user_id, position in db.query(P.user_id, P.current_position).filter(
+            P.resource_id == resource_id
+        ).order_by(P.updated_at, P.id):
+            last_positions[user_id] = position or 0
+
+        db.query(PBLVideoUserStats).filter(
+            PBLVideoUserStats.resource_id == resource_id
+        ).delete(synchronize_session=False)
+
+        for (user_id, session_count, completed, play, real, completion_sum,
+             completion_max, seeks, pauses, first_time, last_time) in aggregates:
+            db.add(PBLVideoUserStats(
+                resource_id=resource_id,
+                user_id=user_id,
+                session_count=session_count,
+                completed_count=int(completed or 0),
+                total_play_duration=int(play or 0),
+                total_real_watch_duration=int(real or 0),
+                total_completion_rate=_to_decimal(completion_sum),
+                max_completion_rate=_to_decimal(completion_max),
+                total_seek_count=int(seeks or 0),
+                total_pause_count=int(pauses or 0),
+                last_position=last_positions.get(user_id, 0),
+                first_watch_time=first_time,
+                last_watch_time=last_time
+            ))
+        db.commit()
+        return len(aggregates)
@@ -0,0 +1,276 @@
+"""
+传感器最新值存储
+设备每个传感器的最新值保存在 Redis，读取接口直接读取，只在冷启动未命中时查询 device_sensors 表
+
+Redis 数据结构（mqtt-service、plugin-backend-service 使用同样的结构，修改时需保持一致）：
+- 每台设备一个哈希 device:sensors:{device_uuid}
+  - 字段为传感器名称，值为 JSON：{"value", "unit", "sensor_type", "timestamp"}（与 device_sensors 表的列一致）
+  - 字段 __device__：设备名称和最后在线时间 {"name", "last_seen"}
+  - 字段 __complete__：哈希已包含该设备的全部传感器（从数据库补全过）
+- mqtt-service 写入数据库并提交后，把本次上报的传感器写入哈希（HSET）并刷新过期时间
+- 哈希不存在或没有 __complete__ 时视为未命中：查询数据库后用 HSETNX 补全，
+  不会覆盖补全期间 mqtt-service 写入的更新值
+- Redis 不可用时改用进程内缓存（很短的过期时间），暂停访问 Redis 一段时间后再重试
+"""
+from typing import Any, Dict, List, NamedTuple, Optional
+from datetime import datetime
+import json
+import time
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import MISSING, TTLCache
+from app.core.config import settings
+from app.models.device_sensor import DeviceSensor
+
+logger = logging.getLogger(__name__)
+
+# 哈希键前缀
+SENSOR_KEY_PREFIX = "device:sensors:"
+
+# 保留字段
+DEVICE_FIELD = "__device__"
+COMPLETE_FIELD = "__complete__"
+
+# Redis 访问失败后暂停访问的时间（秒）
+REDIS_RETRY_INTERVAL = 30
+
+# 按产品缓存的已解析传感器配置（产品修改后 updated_at 变化，自然失效）
+product_sensor_types_cache = TTLCache("product_sensor_types", ttl=3600, maxsize=1000)
+
+
+class SensorReading(NamedTuple):
+    """传感器最新值（字段与 DeviceSensor 同名）"""
+    sensor_name: str
+    sensor_value: str
+    sensor_unit: str
+    sensor_type: str
+    timestamp: Optional[datetime]
+
+
+def sensor_key(device_uuid: str) -> str:
+    return f"{SENSOR_KEY_PREFIX}{device_uuid}"
+
+
+def build_device_info(device) -> Dict[str, Any]:
+    """哈希中 __device__ 字段的内容"""
+    return {
+        "name": device.name,
+        "last_seen": device.last_seen.isoformat() if device.last_seen else None
+    }
+
+
+def parse_sensor_value(value: Optional[str]) -> Any:
+    """尝试将字符串转成数字/布尔，便于前端展示"""
+    if value is None:
+        return None
+    v = str(value).strip()
+    if v.lower() in ["true", "false"]:
+        return v.lower() == "true"
+    try:
+        if "." in v:
+            return float(v)
+        return int(v)
+    except ValueError:
+        return value
+
+
+def get_product_sensor_types(product) -> Dict[str, Any]:
+    """获取产品的传感器配置（sensor_types 可能是 JSON 字符串），按产品ID和更新时间缓存解析结果"""
+    if product is None or not product.sensor_types:
+        return {}
+    key = (product.id, product.updated_at)
+    sensor_types = product_sensor_types_cache.get(key)
+    if sensor_types is MISSING:
+        sensor_types = product.sensor_types
+        if isinstance(sensor_types, str):
+            try:
+                sensor_types = json.loads(sensor_types)
+            except Exception as e:
+                logger.error(f"❌ 解析产品传感器配置失败: {e}")
+                sensor_types = {}
+        product_sensor_types_cache.set(key, sensor_types)
+    return sensor_types
+
+
+def _encode(reading: SensorReading) -> str:
+    return json.dumps({
+        "value": reading.sensor_value,
+        "unit": reading.sensor_unit,
+        "sensor_type": reading.sensor_type,
+        "timestamp": reading.timestamp.isoformat() if reading.timestamp else None
+    }, ensure_ascii=False)
+
+
+def _decode(sensor_name: str, raw: str) -> SensorReading:
+    data = json.loads(raw)
+    timestamp = data.get("timestamp")
+    if timestamp:
+        timestamp = datetime.fromisoformat(timestamp).replace(tzinfo=None)
+    return SensorReading(
+        sensor_name=sensor_name,
+        sensor_value=data.get("value"),
+        sensor_unit=data.get("unit") or "",
+        sensor_type=data.get("sensor_type") or "",
+        timestamp=timestamp or None
+    )
+
+
+class SensorLatestStore:
+    """传感器最新值存储"""
+
+    def __init__(self, ttl: int, local_ttl: float):
+        """
+        Args:
+            ttl: Redis 哈希的过期时间（秒），每次写入时刷新
+            local_ttl: Redis 不可用时进程内缓存的过期时间（秒）
+        """
+        self.ttl = ttl
+        self._redis = None
+        self._retry_at = 0.0
+        self._local = TTLCache("sensor_latest_local", ttl=local_ttl, maxsize=10000)
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # Redis（可选）
+    # ------------------------------------------------------------------
+
+    def _get_redis(self):
+        """获取 Redis 客户端，最近访问失败时返回None"""
+        if time.monotonic() < self._retry_at:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.redis_url,
+                decode_responses=True,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5
+            )
+        return self._redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        logger.warning(f"传感器最新值 Redis 不可用，{REDIS_RETRY_INTERVAL} 秒内使用进程内缓存: {e}")
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def get_latest(
+        self,
+        db: Session,
+        device_uuid: str,
+        device_info: Optional[Dict[str, Any]] = None
+    ) -> List[SensorReading]:
+        """
+        获取设备全部传感器的最新值（按上报时间倒序）
+
+        Args:
+            db: 数据库会话（未命中时查询 device_sensors 表）
+            device_uuid: 设备UUID
+            device_info: 设备名称和最后在线时间 {"name", "last_seen"}，补全时一并写入
+        """
+        client = self._get_redis()
+        if client is not None:
+            try:
+                raw = client.hgetall(sensor_key(device_uuid))
+            except Exception as e:
+                self._redis_failed(e)
+                client = None
+            else:
+                if raw.get(COMPLETE_FIELD):
+                    self.hits += 1
+                    return self._decode_all(raw)
+        if client is None:
+            readings = self._local.get(device_uuid)
+            if readings is not MISSING:
+                return readings
+
+        self.misses += 1
+        readings = self._load(db, device_uuid)
+        if client is not None:
+            return self._backfill(client, device_uuid, readings, device_info)
+        self._local.set(device_uuid, readings)
+        return readings
+
+    @staticmethod
+    def _decode_all(raw: Dict[str, str]) -> List[SensorReading]:
+        readings = [
+            _decode(name, value) for name, value in raw.items()
+            if name not in (DEVICE_FIELD, COMPLETE_FIELD)
+        ]
+        return sorted(readings, key=lambda r: r.timestamp or datetime.min, reverse=True)
+
+    @staticmethod
+    def _load(db: Session, device_uuid: str) -> List[SensorReading]:
+        rows = db.query(DeviceSensor).filter(
+            DeviceSensor.device_uuid == device_uuid
+        ).order_by(DeviceSensor.timestamp.desc()).all()
+        return [
+            SensorReading(
+                sensor_name=row.sensor_name,
+                sensor_value=row.sensor_value,
+                sensor_unit=row.sensor_unit or "",
+                sensor_type=row.sensor_type or "",
+                timestamp=row.timestamp
+            )
+            for row in rows
+        ]
+
+    def _backfill(
+        self,
+        client,
+        device_uuid: str,
+        readings: List[SensorReading],
+        device_info: Optional[Dict[str, Any]]
+    ) -> List[SensorReading]:
+        """把数据库中的最新值补全到 Redis（不覆盖已有字段），返回补全后的全部最新值"""
+        key = sensor_key(device_uuid)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for reading in readings:
+                pipe.hsetnx(key, reading.sensor_name, _encode(reading))
+            if device_info:
+                pipe.hsetnx(key, DEVICE_FIELD, json.dumps(device_info, ensure_ascii=False))
+            pipe.hset(key, COMPLETE_FIELD, "1")
+            pipe.expire(key, self.ttl)
+            pipe.hgetall(key)
+            raw = pipe.execute()[-1]
+        except Exception as e:
+            self._redis_failed(e)
+            return readings
+        return self._decode_all(raw)
+
+    # ------------------------------------------------------------------
+    # 失效
+    # ------------------------------------------------------------------
+
+    def invalidate(self, device_uuid: str) -> None:
+        """删除设备的最新值（绕过 mqtt-service 直接写 device_sensors 表后调用）"""
+        self._local.invalidate(device_uuid)
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            client.delete(sensor_key(device_uuid))
+        except Exception as e:
+            self._redis_failed(e)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "redis_available": time.monotonic() >= self._retry_at,
+            "local": self._local.stats()
+        }
+
+
+sensor_latest_store = SensorLatestStore(
+    ttl=settings.sensor_latest_cache_ttl,
+    local_ttl=settings.sensor_latest_local_ttl
+)
@@ -4,9 +4,10 @@ LLM节点执行器
 """
 import logging
 import asyncio
+import dataclasses
 from typing import Dict, Any, Callable, Optional
 from sqlalchemy.orm import Session
-from app.models.llm_model import LLMModel
+from app.services.ai_config_registry import ai_config_registry
 from app.services.llm_service import LLMService
 
 logger = logging.getLogger(__name__)
@@ -40,9 +41,6 @@ async def execute_llm_node(
             - response: 生成的文本
             - usage: Token使用量（如果有）
     """
-    if not db_session:
-        raise ValueError("LLM节点执行需要数据库会话")
-    
     # 1. 获取并替换提示词
     system_prompt = node_data.get("systemPrompt", "")
     user_prompt = node_data.get("userPrompt", "")
@@ -61,26 +59,15 @@ async def execute_llm_node(
     llm_model = None
     if llm_model_name:
         # 指定了模型，查询特定模型
-        llm_model = db_session.query(LLMModel).filter(
-            (LLMModel.name == llm_model_name) | (LLMModel.uuid == llm_model_name)
-        ).first()
+        llm_model = ai_config_registry.find_llm_model(llm_model_name)
         
         if not llm_model:
              raise ValueError(f"未找到指定的模型配置: {llm_model_name}，请确保在系统模型配置中已添加该模型")
     else:
         # 未指定模型，尝试使用系统默认模型
         logger.info("LLM节点未指定模型，尝试使用系统默认模型")
-        # 1. 尝试获取设置了 is_default=1 的模型
-        llm_model = db_session.query(LLMModel).filter(
-            LLMModel.is_default == 1,
-            LLMModel.is_active == 1
-        ).first()
-        
-        # 2. 如果没有默认模型，获取第一个激活的模型作为兜底
-        if not llm_model:
-            llm_model = db_session.query(LLMModel).filter(
-                LLMModel.is_active == 1
-            ).order_by(LLMModel.sort_order.asc()).first()
+        # 优先使用设置了 is_default=1 的模型，没有时使用第一个激活的模型作为兜底
+        llm_model = ai_config_registry.get_fallback_llm_model()
             
         if not llm_model:
             raise ValueError("LLM节点未配置模型，且系统中无可用默认模型")
@@ -94,17 +81,20 @@ async def execute_llm_node(
     messages.append({"role": "user", "content": user_prompt})
     
     # 4. 准备调用参数 (覆盖模型默认参数)
-    # 优先使用节点配置的参数，其次使用模型默认参数
+    # 优先使用节点配置的参数，其次使用模型默认参数（模型配置为共享快照，覆盖时生成副本）
     temp_temperature = node_data.get("temperature")
     temp_max_tokens = node_data.get("maxTokens")
     temp_top_p = node_data.get("topP")
     
+    overrides = {}
     if temp_temperature is not None:
-        llm_model.temperature = float(temp_temperature)
+        overrides["temperature"] = float(temp_temperature)
     if temp_max_tokens is not None:
-        llm_model.max_tokens = int(temp_max_tokens)
+        overrides["max_tokens"] = int(temp_max_tokens)
     if temp_top_p is not None:
-        llm_model.top_p = float(temp_top_p)
+        overrides["top_p"] = float(temp_top_p)
+    if overrides:
+        llm_model = dataclasses.replace(llm_model, **overrides)
         
     # 5. 创建服务并调用
     llm_service = LLMService(llm_model)
@@ -2,14 +2,97 @@
 文档解析器
 支持TXT和Markdown格式的文档解析和文本切分
 """
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
+from pathlib import Path
+import codecs
 import re
 import chardet
+import logging
+
+from app.utils.token_counter import TokenCountIndex, estimate_token_count, get_token_index
+
+logger = logging.getLogger(__name__)
+
+# 编码检测采样大小（字节）：只对文件开头的样本做检测，避免对整个文件运行 chardet
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# 流式读取文件的块大小（字节）
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# 候选编码（检测结果无法解码样本时依次尝试）
+FALLBACK_ENCODINGS = ['utf-8', 'gbk', 'gb18030', 'big5', 'latin-1']
+
+# 乱码字符比例上限
+MAX_INVALID_CHAR_RATIO = 0.1
+
+
+def iter_file_blocks(file_path, block_size: int = STREAM_BLOCK_SIZE) -> Iterator[bytes]:
+    """按块读取文件内容"""
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+class TextNormalizer:
+    """
+    流式文本规范化
+    
+    逐块处理解码后的文本，输出与整体处理完全一致的结果：
+    - 统一换行符（跨块的 \r\n 也能正确处理）
+    - 去除 BOM 和首尾空白
+    - 可选：把3个以上连续换行压缩为2个
+    """
+    
+    _MULTI_NEWLINE_PATTERN = re.compile(r'\n{3,}')
+    
+    def __init__(self, collapse_blank_lines: bool = False):
+        self.collapse_blank_lines = collapse_blank_lines
+        self._pending_cr = False
+        self._pending_ws = ''
+        self._started = False
+    
+    def feed(self, block: str, final: bool = False) -> str:
+        """处理一块文本，返回可以确定输出的部分"""
+        if self._pending_cr:
+            block = '\r' + block
+            self._pending_cr = False
+        if block.endswith('\r') and not final:
+            # 可能是跨块的 \r\n，留到下一块处理
+            block = block[:-1]
+            self._pending_cr = True
+        block = block.replace('\r\n', '\n').replace('\r', '\n')
+        
+        if not self._started:
+            if block.startswith('\ufeff'):
+                block = block[1:]
+            block = block.lstrip()
+            if not block:
+                return ''
+            self._started = True
+        
+        # 结尾的空白先保留，等后续出现非空白字符时再输出（保证整体 strip 的效果）
+        text = self._pending_ws + block
+        stripped = text.rstrip()
+        self._pending_ws = text[len(stripped):]
+        
+        if self.collapse_blank_lines:
+            stripped = self._MULTI_NEWLINE_PATTERN.sub('\n\n', stripped)
+        return stripped
 
 
 class DocumentParser:
     """文档解析器基类"""
     
+    # 是否压缩多余空行
+    collapse_blank_lines = False
+    # 是否优先按 UTF-8 解码
+    prefer_utf8 = False
+    # 乱码过多时的提示
+    encoding_error_hint = "请确保文件使用 UTF-8、GBK 或 GB2312 编码"
+    
     def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
         """
         Args:
@@ -28,8 +111,148 @@ class DocumentParser:
         
         Returns:
             str: 解析后的文本
+        
+        Raises:
+            ValueError: 如果文件包含过多乱码
+        """
+        return ''.join(self.iter_text([content]))
+    
+    def parse_file(self, file_path) -> str:
+        """
+        从磁盘分块读取并解析文档
+        
+        Args:
+            file_path: 文件路径
+        
+        Returns:
+            str: 解析后的文本
+        """
+        return ''.join(self.iter_text(iter_file_blocks(file_path)))
+    
+    def resolve_encoding(self, sample: bytes, is_complete: bool) -> Tuple[str, float]:
+        """
+        根据样本确定文件编码
+        
+        Args:
+            sample: 文件开头的样本
+            is_complete: 样本是否就是完整文件
+        
+        Returns:
+            tuple: (编码名称, 置信度)
+        """
+        if self.prefer_utf8 and self._can_decode(sample, 'utf-8', is_complete):
+            return 'utf-8', 1.0
+        
+        encoding, confidence = self.detect_encoding(sample, return_confidence=True)
+        if self._can_decode(sample, encoding, is_complete):
+            return encoding, confidence
+        
+        logger.warning(f"使用 {encoding} 无法解码样本，尝试其他编码")
+        for fallback_enc in FALLBACK_ENCODINGS:
+            if fallback_enc != encoding and self._can_decode(sample, fallback_enc, is_complete):
+                logger.info(f"回退使用 {fallback_enc} 编码")
+                return fallback_enc, confidence
+        
+        logger.warning("所有编码尝试失败，使用 UTF-8 并忽略错误字符")
+        return 'utf-8', 0.0
+    
+    @staticmethod
+    def _can_decode(sample: bytes, encoding: str, is_complete: bool) -> bool:
+        """样本能否用指定编码解码（样本不完整时允许末尾截断的多字节字符）"""
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=is_complete)
+            return True
+        except (UnicodeDecodeError, LookupError):
+            return False
+    
+    def iter_text(self, byte_blocks: Iterable[bytes]) -> Iterator[str]:
+        """
+        流式解码并规范化文本
+        
+        只用开头的样本检测编码，之后逐块增量解码，内存占用与文件大小无关。
+        
+        Args:
+            byte_blocks: 按顺序排列的字节块
+        
+        Yields:
+            str: 规范化后的文本片段（拼接后即为完整文本）
+        
+        Raises:
+            ValueError: 如果文件包含过多乱码
         """
-        raise NotImplementedError
+        blocks = iter(byte_blocks)
+        
+        # 读取编码检测样本
+        sample_parts = []
+        sample_size = 0
+        exhausted = False
+        while sample_size < ENCODING_SAMPLE_SIZE:
+            block = next(blocks, None)
+            if block is None:
+                exhausted = True
+                break
+            sample_parts.append(block)
+            sample_size += len(block)
+        
+        encoding, confidence = self.resolve_encoding(b''.join(sample_parts)[:ENCODING_SAMPLE_SIZE], exhausted)
+        logger.info(f"检测到文件编码: {encoding} (置信度: {confidence:.2%})")
+        
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        normalizer = TextNormalizer(collapse_blank_lines=self.collapse_blank_lines)
+        total_chars = 0
+        invalid_chars = 0
+        
+        def decode(block: bytes, final: bool) -> str:
+            nonlocal total_chars, invalid_chars
+            text = decoder.decode(block, final=final)
+            total_chars += len(text)
+            if '\ufffd' in text:
+                invalid_chars += text.count('\ufffd')
+                # 替换掉乱码字符
+                text = text.replace('\ufffd', '')
+            return normalizer.feed(text, final=final)
+        
+        for block in sample_parts:
+            output = decode(block, final=False)
+            if output:
+                yield output
+        
+        if not exhausted:
+            for block in blocks:
+                output = decode(block, final=False)
+                if output:
+                    yield output
+        
+        output = decode(b'', final=True)
+        if output:
+            yield output
+        
+        # 检查是否有过多的乱码字符（可能编码错误）
+        invalid_ratio = invalid_chars / total_chars if total_chars else 0
+        if invalid_ratio > MAX_INVALID_CHAR_RATIO:
+            logger.error(f"文件包含过多乱码字符 ({invalid_ratio:.1%})，可能编码识别错误")
+            raise ValueError(f"文件编码错误，包含 {invalid_ratio:.1%} 的乱码字符。{self.encoding_error_hint}")
+        if invalid_chars:
+            logger.warning(f"文件中有 {invalid_chars} 个无法解码的字符已被忽略")
+    
+    def iter_chunks(self, text_blocks: Iterable[str], mode: str = 'fixed') -> Iterator[Dict[str, Any]]:
+        """
+        流式切分文本
+        
+        fixed/custom 模式边读边切，产生一块输出一块；其他模式需要完整文本，
+        会先拼接再切分。
+        
+        Args:
+            text_blocks: 文本片段
+            mode: 切分模式
+        
+        Yields:
+            Dict: 文本块
+        """
+        if mode in ('fixed', 'custom'):
+            yield from self._iter_fixed_size_chunks(text_blocks)
+        else:
+            yield from self.split_into_chunks(''.join(text_blocks), mode=mode)
     
     def split_into_chunks(self, text: str, mode: str = 'fixed') -> List[Dict[str, Any]]:
         """
@@ -57,97 +280,85 @@ class DocumentParser:
             return self._split_by_fixed_size(text)
     
     def _split_by_fixed_size(self, text: str) -> List[Dict[str, Any]]:
+        """按固定大小切分"""
+        # 全文已在内存中：用前缀计数索引估算各块token，重叠部分不重复扫描
+        chunks = list(self._iter_fixed_size_chunks([text], token_index=get_token_index(text)))
+        logger.info(f"切分完成，共生成 {len(chunks)} 个文本块")
+        return chunks
+    
+    def _iter_fixed_size_chunks(
+        self,
+        text_blocks: Iterable[str],
+        token_index: Optional[TokenCountIndex] = None
+    ) -> Iterator[Dict[str, Any]]:
         """
-        按固定大小切分（简化安全版本）
+        按固定大小流式切分
         
         核心原则：
-        1. 永远确保 start 向前移动
-        2. 严格限制迭代次数
-        3. 避免复杂的边界判断
+        1. 永远确保 start 向前移动（至少前进 chunk_size 的 1/4）
+        2. 只缓存当前块和重叠部分，内存占用与文本总长度无关
+        3. 不限制块数量，长文档不会被截断
         """
-        import logging
-        logger = logging.getLogger(__name__)
+        chunk_size = max(1, self.chunk_size)
+        min_step = max(1, chunk_size // 4)
         
-        chunks = []
-        chunk_index = 0
+        buffer = ''
+        offset = 0  # buffer[0] 在全文中的位置
         start = 0
-        text_length = len(text)
-        
-        # 🚨 严格的迭代限制：最多文本长度的2倍，绝对不超过1000次
-        max_iterations = min((text_length // max(1, self.chunk_size)) * 2 + 10, 1000)
-        iteration = 0
-        
-        logger.info(f"开始按固定大小切分，文本长度: {text_length}, chunk_size: {self.chunk_size}, overlap: {self.chunk_overlap}, max_iter: {max_iterations}")
+        chunk_index = 0
+        finished = False
+        blocks = iter(text_blocks)
         
-        while start < text_length and iteration < max_iterations:
-            iteration += 1
-            
-            # 🚨 每10次迭代输出进度
-            if iteration % 10 == 0:
-                logger.info(f"切分进度: 迭代 {iteration}/{max_iterations}, start={start}/{text_length} ({start*100//text_length}%)")
-            
-            # 确定当前块的结束位置（简单直接）
-            end = min(start + self.chunk_size, text_length)
-            
-            # 🚨 严格检查：end 必须大于 start
-            if end <= start:
-                logger.error(f"检测到异常：end({end}) <= start({start})，强制终止！")
-                break
-            
-            # 提取文本块（不使用strip，保持原始长度）
-            chunk_text = text[start:end]
-            chunk_length = len(chunk_text.strip())
-            
-            # 🚨 优化：避免产生过小的尾块（仅处理已经有前一块的情况）
-            # 当满足以下条件时，将尾块合并到前一块：
-            # 1. 已经到达文档末尾（end == text_length）
-            # 2. 当前块太小（小于等于overlap）
-            # 3. 已经有前一块存在
-            # 原理：这种情况下的小尾块通常完全在前一块的重叠范围内，属于重复内容
-            if end == text_length and chunk_length > 0 and chunk_length <= self.chunk_overlap and len(chunks) > 0:
-                logger.info(f"检测到尾块过小({chunk_length}字符 <= {self.chunk_overlap}字符)，跳过（内容已在前一块重叠部分中）")
-                break  # 跳过这个小尾块，直接结束
+        while not finished:
+            block = next(blocks, None)
+            if block is None:
+                finished = True
+            else:
+                buffer += block
+            available_end = offset + len(buffer)
             
-            # 只过滤完全空白的块
-            if chunk_text and chunk_text.strip():
-                chunks.append({
-                    'content': chunk_text.strip(),
-                    'chunk_index': chunk_index,
-                    'char_count': len(chunk_text.strip()),
-                    'token_count': self.estimate_token_count(chunk_text),
-                    'metadata': {
-                        'start_position': start,
-                        'end_position': end,
-                        'split_mode': 'fixed'
+            while start < available_end:
+                end = start + chunk_size
+                # 未读完时，必须确认 end 之后还有内容，才能判断是否为尾块
+                if not finished and end >= available_end:
+                    break
+                end = min(end, available_end)
+                
+                # 提取文本块（不使用strip，保持原始长度）
+                chunk_text = buffer[start - offset:end - offset]
+                stripped = chunk_text.strip()
+                
+                # 避免产生过小的尾块：到达末尾且尾块不超过overlap时，内容已在前一块的重叠部分中
+                if end == available_end and finished and 0 < len(stripped) <= self.chunk_overlap and chunk_index > 0:
+                    logger.info(f"检测到尾块过小({len(stripped)}字符 <= {self.chunk_overlap}字符)，跳过（内容已在前一块重叠部分中）")
+                    return
+                
+                # 只过滤完全空白的块
+                if stripped:
+                    yield {
+                        'content': stripped,
+                        'chunk_index': chunk_index,
+                        'char_count': len(stripped),
+                        'token_count': token_index.estimate(start, end) if token_index else self.estimate_token_count(chunk_text),
+                        'metadata': {
+                            'start_position': start,
+                            'end_position': end,
+                            'split_mode': 'fixed'
+                        }
                     }
-                })
-                chunk_index += 1
-            
-            # 🚨 安全的位置移动：确保至少前进 1 个字符
-            # 优先使用 overlap，但如果 overlap 太大，至少前进 chunk_size 的 1/4
-            min_step = max(1, self.chunk_size // 4)
-            next_start = end - self.chunk_overlap
-            
-            if next_start <= start:
-                # 强制至少前进 min_step
-                next_start = start + min_step
-                logger.warning(f"检测到位置未前进，强制前进 {min_step} 个字符 (start={start} -> {next_start})")
-            
-            # 🚨 最终检查：如果 next_start 仍然没有前进，直接跳到 end
-            if next_start <= start:
-                next_start = end
-                logger.error(f"严重错误：位置仍未前进，强制跳到 end={end}")
+                    chunk_index += 1
+                
+                # 优先使用 overlap，但如果 overlap 太大，至少前进 min_step
+                next_start = end - self.chunk_overlap
+                if next_start <= start:
+                    next_start = start + min_step
+                start = next_start
             
-            start = next_start
-        
-        # 🚨 检查是否因为迭代限制而终止
-        if iteration >= max_iterations and start < text_length:
-            logger.error(f"切分因迭代次数限制而终止！已迭代 {iteration} 次，start={start}, text_length={text_length}")
-            logger.error(f"剩余文本长度: {text_length - start} 字符，已生成 {len(chunks)} 个块")
-        else:
-            logger.info(f"切分完成，共生成 {len(chunks)} 个文本块，迭代 {iteration} 次")
-        
-        return chunks
+            # 丢弃已经切分完、不再需要的文本
+            if start > offset:
+                consumed = min(start - offset, len(buffer))
+                buffer = buffer[consumed:]
+                offset += consumed
     
     def _split_by_paragraph(self, text: str) -> List[Dict[str, Any]]:
         """按段落切分（使用单换行符）- 每个换行分隔的内容就是一个独立的块"""
@@ -376,20 +587,8 @@ class DocumentParser:
         """
         估算token数量
         中文按1个字符=1个token，英文按4个字符=1个token估算
-        优化版：避免使用正则表达式，直接遍历字符
         """
-        if not text:
-            return 0
-        
-        chinese_chars = 0
-        # ✅ 直接遍历，比正则快很多
-        for char in text:
-            # 判断是否为中文字符（包括中日韩统一表意文字）
-            if '\u4e00' <= char <= '\u9fff':
-                chinese_chars += 1
-        
-        other_chars = len(text) - chinese_chars
-        return chinese_chars + (other_chars // 4)
+        return estimate_token_count(text)
     
     @staticmethod
     def detect_encoding(content: bytes, return_confidence: bool = False) -> str:
@@ -404,9 +603,11 @@ class DocumentParser:
             str: 检测到的编码名称（如'utf-8', 'gbk', 'gb2312'等）
             或 tuple: (编码名称, 置信度) if return_confidence=True
         """
-        # 使用 chardet 检测编码
-        detected = chardet.detect(content)
-        encoding = detected.get('encoding', 'utf-8')
+        # 只对开头的样本运行 chardet（大文件整体检测非常耗时）
+        is_complete = len(content) <= ENCODING_SAMPLE_SIZE
+        sample = content[:ENCODING_SAMPLE_SIZE]
+        detected = chardet.detect(sample)
+        encoding = detected.get('encoding') or 'utf-8'
         confidence = detected.get('confidence', 0.0)
         
         # 如果置信度太低，尝试常见编码
@@ -415,13 +616,10 @@ class DocumentParser:
             common_encodings = ['utf-8', 'gbk', 'gb2312', 'gb18030', 'big5']
             
             for enc in common_encodings:
-                try:
-                    content.decode(enc)
+                if DocumentParser._can_decode(sample, enc, is_complete):
                     encoding = enc
                     confidence = 0.99  # 手动设置高置信度
                     break
-                except (UnicodeDecodeError, LookupError):
-                    continue
         
         # 编码名称标准化
         if encoding:
@@ -438,146 +636,22 @@ class DocumentParser:
 
 
 class TxtParser(DocumentParser):
-    """纯文本文档解析器"""
+    """纯文本文档解析器
     
-    def parse(self, content: bytes) -> str:
-        """
-        解析TXT文件，智能处理编码
-        
-        Args:
-            content: 文件内容（bytes）
-        
-        Returns:
-            str: 解析后的文本
-        
-        Raises:
-            ValueError: 如果文件无法解码
-        """
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        # 自动检测编码
-        encoding, confidence = self.detect_encoding(content, return_confidence=True)
-        logger.info(f"检测到文件编码: {encoding} (置信度: {confidence:.2%})")
-        
-        # 尝试使用检测到的编码
-        text = None
-        try:
-            text = content.decode(encoding)
-            logger.info(f"成功使用 {encoding} 编码解析文件")
-        except (UnicodeDecodeError, LookupError) as e:
-            logger.warning(f"使用 {encoding} 解码失败: {str(e)}")
-            
-            # 尝试常见编码
-            fallback_encodings = ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin-1', 'cp1252']
-            for fallback_enc in fallback_encodings:
-                if fallback_enc == encoding:
-                    continue  # 跳过已经尝试过的
-                try:
-                    text = content.decode(fallback_enc)
-                    logger.info(f"回退使用 {fallback_enc} 编码成功")
-                    break
-                except (UnicodeDecodeError, LookupError):
-                    continue
-            
-            # 如果所有编码都失败，使用 UTF-8 并忽略错误
-            if text is None:
-                logger.warning("所有编码尝试失败，使用 UTF-8 并忽略错误字符")
-                text = content.decode('utf-8', errors='replace')
-                # 替换掉乱码字符
-                text = text.replace('�', '')
-        
-        # 检查是否有过多的乱码字符（可能编码错误）
-        if text:
-            invalid_ratio = text.count('�') / len(text) if len(text) > 0 else 0
-            if invalid_ratio > 0.1:  # 超过10%是乱码
-                logger.error(f"文件包含过多乱码字符 ({invalid_ratio:.1%})，可能编码识别错误")
-                raise ValueError(f"文件编码错误，包含 {invalid_ratio:.1%} 的乱码字符。请确保文件使用 UTF-8、GBK 或 GB2312 编码")
-        
-        # 规范化换行符
-        text = text.replace('\r\n', '\n').replace('\r', '\n')
-        
-        # 去除多余的空行（保留一个）
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        
-        # 去除 BOM 标记
-        if text.startswith('\ufeff'):
-            text = text[1:]
-        
-        return text.strip()
+    自动检测编码，统一换行符，并去除多余的空行（保留一个）
+    """
+    
+    collapse_blank_lines = True
 
 
 class MarkdownParser(DocumentParser):
-    """Markdown文档解析器"""
+    """Markdown文档解析器
     
-    def parse(self, content: bytes) -> str:
-        """
-        解析Markdown文件，智能处理编码
-        
-        Args:
-            content: 文件内容（bytes）
-        
-        Returns:
-            str: 解析后的文本
-        
-        Raises:
-            ValueError: 如果文件无法解码
-        """
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        text = None
-        
-        # Markdown通常是UTF-8编码，优先尝试
-        try:
-            text = content.decode('utf-8')
-            logger.info("成功使用 UTF-8 编码解析 Markdown 文件")
-        except UnicodeDecodeError:
-            logger.warning("UTF-8 解码失败，尝试自动检测编码")
-            
-            # 回退到自动检测
-            encoding, confidence = self.detect_encoding(content, return_confidence=True)
-            logger.info(f"检测到文件编码: {encoding} (置信度: {confidence:.2%})")
-            
-            try:
-                text = content.decode(encoding)
-                logger.info(f"成功使用 {encoding} 编码解析文件")
-            except (UnicodeDecodeError, LookupError):
-                logger.warning(f"使用 {encoding} 解码失败，尝试其他编码")
-                
-                # 尝试其他常见编码
-                fallback_encodings = ['gbk', 'gb2312', 'gb18030', 'latin-1']
-                for fallback_enc in fallback_encodings:
-                    if fallback_enc == encoding:
-                        continue
-                    try:
-                        text = content.decode(fallback_enc)
-                        logger.info(f"回退使用 {fallback_enc} 编码成功")
-                        break
-                    except (UnicodeDecodeError, LookupError):
-                        continue
-                
-                # 最后的回退：UTF-8 with replace
-                if text is None:
-                    logger.warning("所有编码尝试失败，使用 UTF-8 并替换错误字符")
-                    text = content.decode('utf-8', errors='replace')
-                    text = text.replace('�', '')
-        
-        # 检查乱码比例
-        if text:
-            invalid_ratio = text.count('�') / len(text) if len(text) > 0 else 0
-            if invalid_ratio > 0.1:
-                logger.error(f"Markdown 文件包含过多乱码字符 ({invalid_ratio:.1%})")
-                raise ValueError(f"文件编码错误，包含 {invalid_ratio:.1%} 的乱码字符。建议使用 UTF-8 编码保存 Markdown 文件")
-        
-        # 规范化换行符
-        text = text.replace('\r\n', '\n').replace('\r', '\n')
-        
-        # 去除 BOM 标记
-        if text.startswith('\ufeff'):
-            text = text[1:]
-        
-        return text.strip()
+    Markdown通常是UTF-8编码，优先尝试UTF-8，失败后再自动检测
+    """
+    
+    prefer_utf8 = True
+    encoding_error_hint = "建议使用 UTF-8 编码保存 Markdown 文件"
     
     def split_into_chunks(self, text: str, mode: str = 'fixed') -> List[Dict[str, Any]]:
         """
@@ -606,6 +680,13 @@ class MarkdownParser(DocumentParser):
         
         return chunks
     
+    def iter_chunks(self, text_blocks: Iterable[str], mode: str = 'fixed') -> Iterator[Dict[str, Any]]:
+        """Markdown的 fixed 模式需要先按标题切分，因此使用完整文本"""
+        if mode == 'fixed':
+            yield from self.split_into_chunks(''.join(text_blocks), mode=mode)
+        else:
+            yield from super().iter_chunks(text_blocks, mode=mode)
+    
     def _split_by_headers(self, text: str) -> List[Dict[str, Any]]:
         """按Markdown标题切分"""
         # 匹配Markdown标题（# ## ### 等）
@@ -694,3 +775,30 @@ def parse_and_split_document(
     chunks = parser.split_into_chunks(text, mode=split_mode)
     return text, chunks
 
+
+
+def iter_document_chunks(
+    file_path,
+    file_type: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    split_mode: str = 'fixed'
+) -> Iterator[Dict[str, Any]]:
+    """
+    从磁盘流式解析并切分文档（生成器）
+    
+    文件按块读取、增量解码，fixed 模式下边读边切，产生的文本块可以直接送入向量化流程。
+    
+    Args:
+        file_path: 文件路径
+        file_type: 文件类型（txt/md）
+        chunk_size: 文本块大小
+        chunk_overlap: 文本块重叠大小
+        split_mode: 切分模式
+    
+    Yields:
+        Dict: 文本块
+    """
+    parser = get_parser(file_type, chunk_size, chunk_overlap)
+    text_blocks = parser.iter_text(iter_file_blocks(Path(file_path)))
+    yield from parser.iter_chunks(text_blocks, mode=split_mode)
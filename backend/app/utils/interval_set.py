@@ -0,0 +1,165 @@
+"""
+整数区间集合
+用两个有序数组保存互不相交的半开区间 [start, end)，用于记录视频已观看的时间段（秒）
+
+- 插入时二分定位，只合并与新区间重叠或相邻的区间；顺序播放时只延长最后一个区间
+- 覆盖总长度随插入增量维护，读取为 O(1)
+- 序列化为紧凑的二进制格式：版本字节 + 每个区间的（与上一区间的间隔, 长度）varint 编码，
+  两小时视频的每个区间通常只占 2~4 个字节
+"""
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from bisect import bisect_left, bisect_right
+
+# 二进制格式版本
+FORMAT_VERSION = 1
+
+
+def _write_varint(buf: bytearray, value: int) -> None:
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("区间数据不完整")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class IntervalSet:
+    """互不相交的整数半开区间集合"""
+
+    __slots__ = ("_starts", "_ends", "_covered")
+
+    def __init__(self, intervals: Optional[Iterable[Sequence[int]]] = None):
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._covered = 0
+        if intervals:
+            for interval in intervals:
+                if len(interval) == 2:
+                    self.add(int(interval[0]), int(interval[1]))
+
+    @property
+    def covered(self) -> int:
+        """覆盖的总长度"""
+        return self._covered
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return zip(self._starts, self._ends)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __repr__(self) -> str:
+        return f"IntervalSet({list(self)})"
+
+    def to_list(self) -> List[List[int]]:
+        return [[s, e] for s, e in self]
+
+    def add(self, start: int, end: int) -> None:
+        """加入区间 [start, end)，与重叠或相邻的区间合并"""
+        if end <= start:
+            return
+        # 与新区间重叠或相邻的区间为 [i, j)
+        i = bisect_left(self._ends, start)
+        j = bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+            for k in range(i, j):
+                self._covered -= self._ends[k] - self._starts[k]
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+        self._covered += end - start
+
+    def update(self, other: "IntervalSet") -> None:
+        """并入另一个集合"""
+        for start, end in other:
+            self.add(start, end)
+
+    def __contains__(self, point: int) -> bool:
+        i = bisect_right(self._starts, point) - 1
+        return i >= 0 and point < self._ends[i]
+
+    def to_bytes(self) -> bytes:
+        """序列化为二进制"""
+        buf = bytearray([FORMAT_VERSION])
+        previous_end = 0
+        for start, end in self:
+            _write_varint(buf, start - previous_end)
+            _write_varint(buf, end - start)
+            previous_end = end
+        return bytes(buf)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "IntervalSet":
+        """
+        从二进制反序列化
+
+        Raises:
+            ValueError: 格式版本不支持或数据不完整
+        """
+        result = cls()
+        if not data:
+            return result
+        if data[0] != FORMAT_VERSION:
+            raise ValueError(f"不支持的区间格式版本: {data[0]}")
+        pos = 1
+        previous_end = 0
+        while pos < len(data):
+            gap, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            start = previous_end + gap
+            previous_end = start + length
+            # 编码时区间已有序且不相交，直接追加
+            result._starts.append(start)
+            result._ends.append(previous_end)
+            result._covered += length
+        return result
+
+
+def coverage_histogram(sets: Iterable[IntervalSet], length: int, bucket_size: int = 1) -> List[int]:
+    """
+    统计每个时间段被多少个集合覆盖（按秒累加后再按桶求和）
+
+    Args:
+        sets: 区间集合（如每个学生的已观看时间段）
+        length: 统计范围 [0, length)
+        bucket_size: 桶宽度（秒）
+
+    Returns:
+        每个桶内各秒覆盖数之和，桶数为 ceil(length / bucket_size)
+    """
+    if length <= 0:
+        return []
+    # 差分数组：O(区间总数 + length)
+    diff = [0] * (length + 1)
+    for interval_set in sets:
+        for start, end in interval_set:
+            start = max(start, 0)
+            end = min(end, length)
+            if start < end:
+                diff[start] += 1
+                diff[end] -= 1
+
+    buckets = [0] * ((length + bucket_size - 1) // bucket_size)
+    current = 0
+    for second in range(length):
+        current += diff[second]
+        buckets[second // bucket_size] += current
+    return buckets
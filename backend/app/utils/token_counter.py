@@ -0,0 +1,181 @@
+"""
+Token估算工具
+中文按1个字符=1个token，其余字符按4个字符=1个token估算
+
+- 用正则按“连续中文片段”计数，由正则引擎在C层面扫描，比逐字符的Python循环快数倍
+- 同一文档可建立前缀计数索引，任意区间的估算只需扫描区间两端的零头，
+  重叠部分不会被重复扫描；索引按内容哈希缓存，调整重叠参数重新切分时直接复用
+- 配置 TOKEN_COUNTER_ENCODING 且安装了 tiktoken 时，改用真实分词器计数
+"""
+from typing import Iterable, List
+import hashlib
+import re
+import logging
+
+from app.core.cache import TTLCache, MISSING
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 连续的中日韩统一表意文字（与原逐字符判断的范围一致）
+_CJK_RUN_PATTERN = re.compile(r'[一-鿿]+')
+
+# 前缀计数索引的分段长度（字符数）
+INDEX_BLOCK_SIZE = 256
+
+# 文档前缀计数索引缓存（按内容哈希）
+token_index_cache = TTLCache(
+    "token_index",
+    ttl=settings.token_index_cache_ttl,
+    maxsize=settings.token_index_cache_max_size
+)
+
+_tokenizer = MISSING
+
+
+def _get_tokenizer():
+    """加载可选的真实分词器（未配置或未安装时返回None）"""
+    global _tokenizer
+    if _tokenizer is not MISSING:
+        return _tokenizer
+
+    _tokenizer = None
+    encoding_name = settings.token_counter_encoding
+    if encoding_name:
+        try:
+            import tiktoken
+            _tokenizer = tiktoken.get_encoding(encoding_name)
+            logger.info(f"Token计数使用分词器: {encoding_name}")
+        except ImportError:
+            logger.warning("未安装 tiktoken，Token计数回退为字符估算")
+        except Exception as e:
+            logger.warning(f"加载分词器 {encoding_name} 失败，Token计数回退为字符估算: {e}")
+    return _tokenizer
+
+
+def count_cjk_chars(text: str) -> int:
+    """统计中文字符数量"""
+    if not text:
+        return 0
+    return sum(map(len, _CJK_RUN_PATTERN.findall(text)))
+
+
+def _estimate_from_counts(total_chars: int, cjk_chars: int) -> int:
+    return cjk_chars + (total_chars - cjk_chars) // 4
+
+
+def estimate_token_count(text: str) -> int:
+    """
+    估算单段文本的token数量
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        token数量
+    """
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, disallowed_special=()))
+    return _estimate_from_counts(len(text), count_cjk_chars(text))
+
+
+def estimate_token_counts(texts: Iterable[str]) -> List[int]:
+    """批量估算多段文本的token数量"""
+    tokenizer = _get_tokenizer()
+    texts = list(texts)
+    if tokenizer is not None:
+        return [len(tokens) for tokens in tokenizer.encode_batch(texts, disallowed_special=())]
+    return [
+        _estimate_from_counts(len(text), count_cjk_chars(text)) if text else 0
+        for text in texts
+    ]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    截断文本，使估算的token数量不超过 max_tokens
+
+    Args:
+        text: 文本内容
+        max_tokens: 最大token数
+
+    Returns:
+        截断后的文本（未超出时原样返回）
+    """
+    if not text or max_tokens <= 0:
+        return ''
+    if estimate_token_count(text) <= max_tokens:
+        return text
+    # 二分查找满足预算的最长前缀
+    index = TokenCountIndex(text)
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if index.estimate(0, mid) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+class TokenCountIndex:
+    """
+    文档前缀计数索引
+
+    按 INDEX_BLOCK_SIZE 分段记录中文字符的前缀计数，
+    估算 text[start:end] 时只需扫描首尾两段不完整的部分
+    """
+
+    def __init__(self, text: str, block_size: int = INDEX_BLOCK_SIZE):
+        self.text = text
+        self.block_size = block_size
+
+        prefix = [0]
+        total = 0
+        for i in range(0, len(text), block_size):
+            total += count_cjk_chars(text[i:i + block_size])
+            prefix.append(total)
+        self._prefix = prefix
+
+    def count_cjk(self, start: int, end: int) -> int:
+        """统计 text[start:end] 中的中文字符数量"""
+        start = max(0, start)
+        end = min(len(self.text), end)
+        if start >= end:
+            return 0
+
+        size = self.block_size
+        first_block = -(-start // size)  # 第一个完整分段
+        last_block = end // size         # 最后一个完整分段之后
+        if first_block >= last_block:
+            return count_cjk_chars(self.text[start:end])
+
+        return (
+            count_cjk_chars(self.text[start:first_block * size])
+            + self._prefix[last_block] - self._prefix[first_block]
+            + count_cjk_chars(self.text[last_block * size:end])
+        )
+
+    def estimate(self, start: int, end: int) -> int:
+        """估算 text[start:end] 的token数量"""
+        if _get_tokenizer() is not None:
+            return estimate_token_count(self.text[start:end])
+        start = max(0, start)
+        end = min(len(self.text), end)
+        if start >= end:
+            return 0
+        return _estimate_from_counts(end - start, self.count_cjk(start, end))
+
+
+def get_token_index(text: str) -> TokenCountIndex:
+    """获取文档的前缀计数索引（按内容哈希缓存）"""
+    key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    index = token_index_cache.get(key)
+    if index is MISSING:
+        index = TokenCountIndex(text)
+        token_index_cache.set(key, index)
+    return index
+
@@ -75,10 +75,32 @@ async def lifespan(app: FastAPI):
     # MQTT服务已独立部署，不再在backend启动
     # mqtt_service.start()
     
+    # 启动设备在线状态巡检
+    from app.services.device_liveness_service import device_liveness_sweeper
+    device_liveness_sweeper.start()
+    
+    # 启动设备实时数据推送（订阅 Redis 频道）
+    from app.services.device_telemetry_hub import device_telemetry_hub
+    device_telemetry_hub.start()
+    
+    # 启动视频播放进度写缓冲
+    from app.services.pbl.video_progress_buffer import video_progress_buffer
+    video_progress_buffer.start()
+    
+    # 启动设备配置变更通知（导入时注册 Device 的 mapper 事件）
+    from app.services.device_config_events import device_config_publisher
+    device_config_publisher.start()
+    
     yield
     
     # 应用关闭时
     logger.info("🛑 关闭物联网设备服务系统")
+    device_liveness_sweeper.stop()
+    device_telemetry_hub.stop()
+    video_progress_buffer.stop()
+    device_config_publisher.stop()
+    from app.services.learning_assistant_jobs import learning_assistant_jobs
+    learning_assistant_jobs.shutdown()
     # mqtt_service.stop()
 
 app = FastAPI(
@@ -97,6 +119,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 # 统一响应格式中间件
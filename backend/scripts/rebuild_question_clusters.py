@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+重建AI对话问题聚类脚本
+上线问题聚类功能后运行一次，根据历史提问为所有单元生成聚类数据
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import SessionLocal
+from app.models.ai_chat import AIChatMessage
+from app.services.pbl.question_cluster_service import QuestionClusterService
+
+
+def main():
+    """为所有有提问记录的单元重建问题聚类"""
+    db = SessionLocal()
+    try:
+        unit_uuids = [
+            unit_uuid for unit_uuid, in db.query(AIChatMessage.unit_uuid).filter(
+                AIChatMessage.unit_uuid.isnot(None),
+                AIChatMessage.message_type == 'user'
+            ).distinct().all()
+        ]
+        
+        if not unit_uuids:
+            print("✅ 没有需要处理的单元")
+            return
+        
+        print(f"\n📋 找到 {len(unit_uuids)} 个单元，开始重建问题聚类...\n")
+        for i, unit_uuid in enumerate(unit_uuids, 1):
+            count = QuestionClusterService.rebuild_unit_clusters(db, unit_uuid)
+            print(f"{i}. ✅ {unit_uuid}: {count} 条提问")
+        
+        print("\n✅ 问题聚类重建完成")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+重建视频观看统计汇总脚本
+上线观看统计汇总表后运行一次（在启动backend之前），根据历史播放会话为所有视频生成汇总行
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db.session import SessionLocal
+from app.models.pbl import PBLVideoPlayProgress
+from app.services.pbl.video_stats_service import VideoStatsService
+
+
+def main():
+    """为所有有播放记录的视频重建观看统计汇总"""
+    db = SessionLocal()
+    try:
+        resource_ids = [
+            resource_id for resource_id, in db.query(PBLVideoPlayProgress.resource_id).distinct().all()
+        ]
+
+        if not resource_ids:
+            print("✅ 没有需要处理的视频")
+            return
+
+        print(f"\n📋 找到 {len(resource_ids)} 个视频，开始重建观看统计...\n")
+        for i, resource_id in enumerate(resource_ids, 1):
+            count = VideoStatsService.rebuild_resource_stats(db, resource_id)
+            print(f"{i}. ✅ 视频 {resource_id}: {count} 名学生")
+
+        print("\n✅ 观看统计重建完成")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,8 @@ celery_app = Celery(
     backend=settings.REDIS_URL,
     include=[
         'tasks.embedding_tasks',
-        'tasks.preset_tasks'
+        'tasks.preset_tasks',
+        'tasks.learning_assistant_tasks'
     ]  # 从当前目录导入tasks
 )
 
@@ -3,9 +3,19 @@ Celery 任务模块
 """
 from .embedding_tasks import embed_document_task
 from .preset_tasks import execute_preset_sequence_task
+from .learning_assistant_tasks import (
+    generate_conversation_title_task,
+    update_conversation_summary_task,
+    update_student_profile_task,
+    log_moderation_task
+)
 
 __all__ = [
     'embed_document_task',
-    'execute_preset_sequence_task'
+    'execute_preset_sequence_task',
+    'generate_conversation_title_task',
+    'update_conversation_summary_task',
+    'update_student_profile_task',
+    'log_moderation_task'
 ]
 
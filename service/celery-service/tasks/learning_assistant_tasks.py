@@ -0,0 +1,88 @@
+"""
+AI学习助手后台任务
+backend 在 LEARNING_ASSISTANT_JOB_QUEUE=celery 时提交，处理逻辑与 backend 本地执行共用
+（app.services.learning_assistant_jobs）
+"""
+import sys
+from pathlib import Path
+import logging
+
+# 确保可以导入backend模块
+backend_dir = Path(__file__).parent.parent.parent / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(
+    name='learning_assistant_generate_title',
+    bind=True,
+    max_retries=3,
+    default_retry_delay=10
+)
+def generate_conversation_title_task(self, conversation_id: int, user_message: str, provisional_title: str):
+    """根据首次提问生成会话标题，替换临时标题"""
+    from app.services.learning_assistant_jobs import generate_conversation_title
+    try:
+        return generate_conversation_title(conversation_id, user_message, provisional_title)
+    except Exception as e:
+        logger.error(f"生成会话标题失败: conversation={conversation_id}, {e}")
+        raise self.retry(exc=e)
+
+
+@celery_app.task(
+    name='learning_assistant_update_summary',
+    bind=True,
+    max_retries=3,
+    default_retry_delay=10
+)
+def update_conversation_summary_task(self, conversation_id: int):
+    """把较早的对话合并进会话的滚动摘要"""
+    from app.services.learning_assistant_jobs import update_conversation_summary
+    try:
+        return update_conversation_summary(conversation_id)
+    except Exception as e:
+        logger.error(f"更新对话摘要失败: conversation={conversation_id}, {e}")
+        raise self.retry(exc=e)
+
+
+@celery_app.task(
+    name='learning_assistant_update_profile',
+    bind=True,
+    max_retries=3,
+    default_retry_delay=5
+)
+def update_student_profile_task(self, user_id: int, context: dict):
+    """更新学生档案"""
+    from app.services.learning_assistant_jobs import update_student_profile
+    try:
+        update_student_profile(user_id, context)
+    except Exception as e:
+        logger.error(f"更新学生档案失败: user={user_id}, {e}")
+        raise self.retry(exc=e)
+
+
+@celery_app.task(
+    name='learning_assistant_log_moderation',
+    bind=True,
+    max_retries=3,
+    default_retry_delay=5
+)
+def log_moderation_task(
+    self,
+    user_id: int,
+    conversation_id: int,
+    message_id: int,
+    content_type: str,
+    content: str,
+    result: dict
+):
+    """记录内容审核日志"""
+    from app.services.learning_assistant_jobs import log_moderation
+    try:
+        log_moderation(user_id, conversation_id, message_id, content_type, content, result)
+    except Exception as e:
+        logger.error(f"记录审核日志失败: message={message_id}, {e}")
+        raise self.retry(exc=e)
@@ -0,0 +1,155 @@
+"""
+设备集中开机（启动风暴）压测脚本
+
+模拟一所学校的设备同时上电：每台设备调用一次 GET /device/info，
+统计响应状态和延迟分布，并输出服务端缓存命中率。
+
+只依赖标准库，可在任意机器上运行：
+
+    # 使用已注册设备的MAC列表（每行一个MAC）
+    python loadtest_boot_storm.py --url http://localhost:8001 --macs-file macs.txt
+
+    # 随机生成300个MAC（未注册设备，压测404路径）
+    python loadtest_boot_storm.py --url http://localhost:8001 --devices 300
+
+    # 同一批设备在10秒内分3轮重启（验证缓存命中）
+    python loadtest_boot_storm.py --macs-file macs.txt --rounds 3 --ramp 10
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+
+def load_macs(args) -> List[str]:
+    """读取或生成设备MAC地址"""
+    if args.macs_file:
+        with open(args.macs_file, encoding="utf-8") as f:
+            macs = [line.strip() for line in f if line.strip()]
+        return macs[:args.devices] if args.devices else macs
+
+    count = args.devices or 300
+    rng = random.Random(args.seed)
+    return [
+        ":".join(f"{rng.randint(0, 255):02X}" for _ in range(6))
+        for _ in range(count)
+    ]
+
+
+def boot_device(base_url: str, mac: str, product_id: str, firmware_version: str,
+                delay: float, timeout: float) -> Tuple[int, float]:
+    """模拟一台设备上电后请求配置，返回 (状态码, 耗时秒)"""
+    if delay > 0:
+        time.sleep(delay)
+
+    query = urllib.parse.urlencode({
+        "mac": mac,
+        "product_id": product_id,
+        "firmware_version": firmware_version
+    })
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f"{base_url}/device/info?{query}", timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0  # 连接失败或超时
+    return status, time.perf_counter() - start
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def fetch_stats(base_url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return {}
+
+
+def run_round(args, macs: List[str], round_index: int) -> List[Tuple[int, float]]:
+    rng = random.Random(args.seed + round_index)
+    # 设备在 ramp 秒内随机上电
+    delays = [rng.uniform(0, args.ramp) for _ in macs]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(boot_device, args.url, mac, args.product_id, args.firmware_version, delay, args.timeout)
+            for mac, delay in zip(macs, delays)
+        ]
+        return [f.result() for f in futures]
+
+
+def report(title: str, results: List[Tuple[int, float]], elapsed: float) -> None:
+    statuses = Counter(status for status, _ in results)
+    latencies = [latency * 1000 for _, latency in results]
+    print(f"\n=== {title} ===")
+    print(f"  请求数: {len(results)}  总耗时: {elapsed:.2f}s  吞吐: {len(results) / elapsed:.1f} req/s")
+    print("  状态码: " + ", ".join(f"{code or '连接失败'}={n}" for code, n in sorted(statuses.items())))
+    if latencies:
+        print(
+            f"  延迟(ms): 平均 {statistics.mean(latencies):.1f}  "
+            f"p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+            f"p99 {percentile(latencies, 99):.1f}  最大 {max(latencies):.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="设备配置服务启动风暴压测")
+    parser.add_argument("--url", default="http://localhost:8001", help="配置服务地址")
+    parser.add_argument("--macs-file", help="设备MAC列表文件（每行一个）")
+    parser.add_argument("--devices", type=int, default=0, help="设备数量（未指定MAC文件时默认300）")
+    parser.add_argument("--product-id", default="ESP32-S3-Dev-01", help="上报的产品标识符")
+    parser.add_argument("--firmware-version", default="1.0.0", help="上报的固件版本")
+    parser.add_argument("--ramp", type=float, default=2.0, help="所有设备在多少秒内上电")
+    parser.add_argument("--rounds", type=int, default=1, help="重复开机的轮数")
+    parser.add_argument("--concurrency", type=int, default=300, help="最大并发连接数")
+    parser.add_argument("--timeout", type=float, default=10.0, help="单个请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+
+    args.url = args.url.rstrip("/")
+    macs = load_macs(args)
+    if not macs:
+        print("没有可用的MAC地址")
+        sys.exit(1)
+
+    print(f"目标: {args.url}  设备数: {len(macs)}  上电窗口: {args.ramp}s  轮数: {args.rounds}")
+
+    all_results: List[Tuple[int, float]] = []
+    for i in range(args.rounds):
+        start = time.perf_counter()
+        results = run_round(args, macs, i)
+        report(f"第 {i + 1} 轮", results, time.perf_counter() - start)
+        all_results.extend(results)
+
+    stats = fetch_stats(args.url)
+    if stats:
+        print("\n=== 服务端统计 ===")
+        for cache in stats.get("caches", []):
+            print(f"  缓存 {cache['name']}: 命中 {cache['hits']}  未命中 {cache['misses']}  命中率 {cache['hit_ratio']:.2%}")
+        writer = stats.get("access_writer", {})
+        if writer:
+            print(f"  待写入日志: {writer.get('pending_logs')}  丢弃日志: {writer.get('dropped_logs')}")
+
+    failed = sum(1 for status, _ in all_results if status in (0, 500, 502, 503, 504))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
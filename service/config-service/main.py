@@ -9,18 +9,23 @@
 4. 提供设备初始化所需的所有配置
 """
 
-from fastapi import FastAPI, HTTPException, Request, Depends, Query
+from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List, Hashable, Deque
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
+import threading
 import time
 import hashlib
 from datetime import datetime
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Boolean, JSON
+from sqlalchemy import create_engine, Column, String, Integer, DateTime, Boolean, JSON, bindparam
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
 # 加载 .env 文件
@@ -55,6 +60,24 @@ OTA_SERVER = os.getenv("OTA_SERVER", "http://ota.example.com")
 # 速率限制配置
 RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "10"))
 RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # 内存中最多跟踪的IP/MAC组合数
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory 或 redis（多实例共享限额）
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+RATE_LIMIT_REDIS_RETRY = float(os.getenv("RATE_LIMIT_REDIS_RETRY", "30"))  # Redis故障后重试间隔（秒）
+
+# 缓存配置（设备集中开机时避免每个请求都查询数据库）
+DEVICE_CACHE_TTL = int(os.getenv("DEVICE_CACHE_TTL", "300"))  # 设备信息缓存时间（秒）
+DEVICE_MISS_CACHE_TTL = int(os.getenv("DEVICE_MISS_CACHE_TTL", "30"))  # 未注册MAC的缓存时间（秒）
+FIRMWARE_CACHE_TTL = int(os.getenv("FIRMWARE_CACHE_TTL", "60"))  # 产品最新固件缓存时间（秒）
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "20000"))
+
+# 访问日志 / last_seen 批量写入配置
+ACCESS_LOG_FLUSH_INTERVAL = float(os.getenv("ACCESS_LOG_FLUSH_INTERVAL", "2"))  # 刷新间隔（秒）
+ACCESS_LOG_BATCH_SIZE = int(os.getenv("ACCESS_LOG_BATCH_SIZE", "500"))  # 达到该数量立即刷新
+ACCESS_LOG_MAX_PENDING = ACCESS_LOG_BATCH_SIZE * 20  # 数据库不可用时缓冲的最大日志数
+
+# 未注册设备的最小响应时间（秒），防止时序攻击
+NOT_FOUND_MIN_DELAY = 0.1
 
 # ==================== 数据库模型 ====================
 Base = declarative_base()
@@ -115,14 +138,275 @@ class AccessLog(Base):
 # Base.metadata.create_all(bind=engine)
 
 
-# ==================== 依赖注入 ====================
-def get_db():
-    """获取数据库会话"""
-    db = SessionLocal()
+# ==================== 读穿缓存 ====================
+class ReadThroughCache:
+    """
+    带TTL的读穿缓存
+    
+    - 未命中时在线程池中执行 loader 查询数据库，不阻塞事件循环
+    - 同一个key并发未命中时只执行一次 loader，其余请求等待同一结果
+    - loader 返回 None（记录不存在）时按 miss_ttl 缓存，避免反复查询未注册设备
+    """
+    
+    def __init__(self, name: str, ttl: float, miss_ttl: float = 0, maxsize: int = 10000):
+        self.name = name
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """读取缓存，未命中时调用 loader 加载"""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await run_in_threadpool(loader)
+            ttl = self.ttl if value is not None else self.miss_ttl
+            if ttl > 0:
+                self._data[key] = (time.monotonic() + ttl, value)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 标记异常已读取，避免无人等待时输出警告
+            raise
+        finally:
+            self._pending.pop(key, None)
+    
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+device_cache = ReadThroughCache("device", DEVICE_CACHE_TTL, DEVICE_MISS_CACHE_TTL, CACHE_MAX_SIZE)
+# 最新固件索引：整个索引作为一个缓存条目，每 FIRMWARE_CACHE_TTL 秒用一次查询重建
+firmware_cache = ReadThroughCache("latest_firmware", FIRMWARE_CACHE_TTL, FIRMWARE_CACHE_TTL, 1)
+FIRMWARE_INDEX_KEY = "all"
+
+
+def _load_device(mac_address: str) -> Optional[Dict[str, Any]]:
+    """按MAC地址查询设备（返回与会话无关的字典，可安全缓存）"""
+    with SessionLocal() as db:
+        device = db.query(DeviceRecord).filter(
+            DeviceRecord.mac_address == mac_address
+        ).first()
+        if not device:
+            return None
+        return {
+            "id": device.id,
+            "device_id": device.device_id,
+            "uuid": device.uuid,
+            "device_secret": device.device_secret,
+            "mac_address": device.mac_address,
+            "product_id": device.product_id,
+            "is_active": device.is_active
+        }
+
+
+def parse_version(version: Optional[str]) -> tuple:
+    """
+    解析版本号为比较键：(数字段元组，格式不正确时为None, 原始版本号)
+    
+    "1.2" 与 "1.2.0" 的数字段相同（去掉末尾的0）
+    """
+    version = version or ""
     try:
-        yield db
-    finally:
-        db.close()
+        parts = [int(x) for x in version.split('.')]
+    except ValueError:
+        return None, version
+    while parts and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts), version
+
+
+def is_newer_version(latest_key: tuple, current_key: tuple) -> bool:
+    """两个版本号都是数字格式时按数字段比较，否则按原始字符串比较"""
+    if latest_key[0] is not None and current_key[0] is not None:
+        return latest_key[0] > current_key[0]
+    return latest_key[1] > current_key[1]
+
+
+def _load_firmware_index() -> Dict[Optional[str], Dict[str, Any]]:
+    """一次查询所有可用固件，构建 产品编码 -> 最新固件 的索引（版本号预先解析）"""
+    with SessionLocal() as db:
+        rows = db.query(
+            FirmwareVersion.product_code,
+            FirmwareVersion.version,
+            FirmwareVersion.firmware_url,
+            FirmwareVersion.file_size,
+            FirmwareVersion.file_hash,
+            FirmwareVersion.release_notes
+        ).filter(
+            FirmwareVersion.is_active == True
+        ).order_by(FirmwareVersion.created_at.desc(), FirmwareVersion.id.desc()).all()
+    
+    index: Dict[Optional[str], Dict[str, Any]] = {}
+    for product_code, version, firmware_url, file_size, file_hash, release_notes in rows:
+        if product_code in index:
+            continue  # 已有更新的版本
+        index[product_code] = {
+            "version": version,
+            "version_key": parse_version(version),
+            "firmware_url": firmware_url,
+            "file_size": file_size,
+            "file_hash": file_hash,
+            "release_notes": release_notes
+        }
+    return index
+
+
+async def get_cached_device(mac_address: str) -> Optional[Dict[str, Any]]:
+    return await device_cache.get(mac_address, lambda: _load_device(mac_address))
+
+
+async def get_cached_latest_firmware(product_code: Optional[str]) -> Optional[Dict[str, Any]]:
+    index = await firmware_cache.get(FIRMWARE_INDEX_KEY, _load_firmware_index)
+    return index.get(product_code)
+
+
+# ==================== 批量写入 ====================
+class AccessWriteBuffer:
+    """
+    访问日志与设备在线时间的批量写入缓冲
+    
+    请求只把待写数据放入内存，由后台任务定时（或缓冲达到批量大小时）
+    一次性插入 AccessLog、批量更新 last_seen，同一设备在一个批次内的多次更新只写最后一次
+    """
+    
+    def __init__(self, flush_interval: float, batch_size: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._logs: Deque[Dict[str, Any]] = deque(maxlen=max_pending)
+        self._devices: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+    
+    def add_log(self, ip_address: str, endpoint: str, mac_address: str, success: bool, user_agent: str) -> None:
+        """记录一条访问日志"""
+        with self._lock:
+            if len(self._logs) >= self.max_pending:
+                self.dropped += 1  # deque 已满，追加时丢弃最早的一条
+            self._logs.append({
+                "ip_address": ip_address,
+                "endpoint": endpoint,
+                "mac_address": mac_address,
+                "success": success,
+                "timestamp": datetime.utcnow(),
+                "user_agent": user_agent[:256] if user_agent else user_agent
+            })
+            should_flush = len(self._logs) >= self.batch_size
+        if should_flush and self._wakeup is not None:
+            self._wakeup.set()
+    
+    def touch_device(self, device_id: int, firmware_version: Optional[str]) -> None:
+        """记录设备在线时间和当前固件版本"""
+        values = {"id": device_id, "last_seen": datetime.utcnow()}
+        if firmware_version:
+            values["firmware_version"] = firmware_version
+        with self._lock:
+            self._devices.setdefault(device_id, {}).update(values)
+    
+    def flush(self) -> None:
+        """把缓冲的数据写入数据库（同步，在线程池中执行）"""
+        with self._lock:
+            logs, self._logs = list(self._logs), deque(maxlen=self.max_pending)
+            devices, self._devices = self._devices, {}
+        if not logs and not devices:
+            return
+        
+        try:
+            with SessionLocal() as db:
+                if logs:
+                    db.bulk_insert_mappings(AccessLog, logs)
+                if devices:
+                    self._update_devices(db, devices.values())
+                db.commit()
+            logger.debug(f"批量写入: {len(logs)} 条访问日志, {len(devices)} 台设备在线时间")
+        except Exception as e:
+            logger.error(f"批量写入访问日志失败（{len(logs)} 条日志, {len(devices)} 台设备），下个周期重试: {e}")
+            self._restore(logs, devices)
+    
+    @staticmethod
+    def _update_devices(db, rows) -> None:
+        """按主键批量更新设备（Core executemany，已删除的设备匹配 0 行，不影响同批其他数据）"""
+        table = DeviceRecord.__table__
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(k for k in row if k != "id")), []).append(row)
+        for columns, group in groups.items():
+            stmt = table.update().where(table.c.id == bindparam("_id")).values(
+                {column: bindparam(column) for column in columns}
+            )
+            db.execute(stmt, [{"_id": row["id"], **{c: row[c] for c in columns}} for row in group])
+    
+    def _restore(self, logs: List[Dict[str, Any]], devices: Dict[int, Dict[str, Any]]) -> None:
+        """写入失败时放回缓冲：日志排在新日志之前，总数超过 max_pending 时丢弃最早的；设备以新数据为准"""
+        with self._lock:
+            pending = logs + list(self._logs)
+            overflow = max(len(pending) - self.max_pending, 0)
+            self.dropped += overflow
+            self._logs = deque(pending[overflow:], maxlen=self.max_pending)
+            for device_id, values in devices.items():
+                values.update(self._devices.get(device_id, {}))
+                self._devices[device_id] = values
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await run_in_threadpool(self.flush)
+    
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.flush)
+
+
+access_writer = AccessWriteBuffer(ACCESS_LOG_FLUSH_INTERVAL, ACCESS_LOG_BATCH_SIZE, ACCESS_LOG_MAX_PENDING)
 
 
 # ==================== 请求/响应模型 ====================
@@ -175,15 +459,41 @@ class HealthResponse(BaseModel):
 
 
 # ==================== 速率限制 ====================
-class SimpleRateLimiter:
-    """简单的内存速率限制器"""
+# 基于Redis的滑动窗口计数：当前窗口与上一窗口各一个计数器，检查并自增在脚本内原子完成
+_SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[1]) + current >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class SlidingWindowRateLimiter:
+    """
+    内存滑动窗口计数速率限制器
+    
+    - 每个key只保存 [窗口编号, 当前窗口计数, 上一窗口计数, 窗口长度]，
+      按上一窗口剩余时间的比例加权估算滑动窗口内的请求数，每次检查 O(1)
+    - 跟踪的key数量有上限（LRU淘汰最久未访问的key），大量IP/MAC扫描时内存不会无限增长
+    - 被拒绝的请求不计数，与原实现一致
+    """
     
-    def __init__(self):
-        self.requests: Dict[str, list] = {}
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
     
-    def _get_key(self, ip: str, identifier: str = "") -> str:
-        """生成速率限制key"""
-        return hashlib.md5(f"{ip}:{identifier}".encode()).hexdigest()
+    @staticmethod
+    def _get_key(ip: str, identifier: str, window: int) -> str:
+        """生成速率限制key（固定长度，不受标识符长度影响）"""
+        return hashlib.md5(f"{ip}:{identifier}:{window}".encode()).hexdigest()
     
     def check(self, ip: str, identifier: str = "", max_requests: int = 10, window: int = 60) -> bool:
         """
@@ -199,40 +509,157 @@ class SimpleRateLimiter:
             True: 允许请求
             False: 超过限制
         """
-        key = self._get_key(ip, identifier)
+        key = self._get_key(ip, identifier, window)
         now = time.time()
+        index = int(now // window)
         
-        # 清理过期记录
-        if key in self.requests:
-            self.requests[key] = [t for t in self.requests[key] if now - t < window]
-        else:
-            self.requests[key] = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [index, 0, 0, window]
+                self._entries[key] = entry
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._entries.move_to_end(key)
+                if entry[0] != index:
+                    # 进入新窗口：当前计数变为上一窗口计数（中间隔了整个窗口则清零）
+                    entry[2] = entry[1] if entry[0] == index - 1 else 0
+                    entry[1] = 0
+                    entry[0] = index
+            
+            weight = 1 - (now - index * window) / window
+            if entry[2] * weight + entry[1] >= max_requests:
+                self.rejected += 1
+                return False
+            
+            entry[1] += 1
+            self.allowed += 1
+            return True
+    
+    async def check_async(self, ip: str, identifier: str = "", max_requests: int = 10, window: int = 60) -> bool:
+        """异步接口（与 RedisRateLimiter 一致），内存检查不阻塞，直接执行"""
+        return self.check(ip, identifier, max_requests, window)
+    
+    def cleanup(self):
+        """清理过期记录（从最久未访问的一端开始，遇到未过期的key即停止）"""
+        now = time.time()
+        with self._lock:
+            while self._entries:
+                key, entry = next(iter(self._entries.items()))
+                # 最后访问的窗口结束已超过一个窗口长度，计数不再影响结果
+                if (entry[0] + 2) * entry[3] > now:
+                    break
+                del self._entries[key]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "tracked_keys": len(self._entries),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted_keys": self.evicted
+        }
+
+
+class RedisRateLimiter:
+    """
+    Redis滑动窗口计数速率限制器（多实例部署时共享限额）
+    
+    - 每个key对应两个带过期时间的计数器，检查由Lua脚本原子完成，每次检查一次往返
+    - 使用 redis.asyncio，等待Redis时不阻塞事件循环
+    - Redis不可用时回退到本进程的内存限制器，并在 RATE_LIMIT_REDIS_RETRY 秒后重试
+    """
+    
+    KEY_PREFIX = "config-service:ratelimit"
+    
+    def __init__(self, redis_url: str, fallback: SlidingWindowRateLimiter, retry_interval: float = 30):
+        import redis.asyncio as aioredis  # 仅在启用Redis后端时需要
+        self._client = aioredis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(_SLIDING_WINDOW_SCRIPT)
+        self._fallback = fallback
+        self._retry_interval = retry_interval
+        self._disabled_until = 0.0
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+    
+    async def check_async(self, ip: str, identifier: str = "", max_requests: int = 10, window: int = 60) -> bool:
+        """检查速率限制（参数与返回值同 SlidingWindowRateLimiter.check）"""
+        now = time.time()
+        if now < self._disabled_until:
+            return self._fallback.check(ip, identifier, max_requests, window)
         
-        # 检查是否超过限制
-        if len(self.requests[key]) >= max_requests:
-            return False
+        key = SlidingWindowRateLimiter._get_key(ip, identifier, window)
+        index = int(now // window)
+        weight = 1 - (now - index * window) / window
+        try:
+            allowed = bool(await self._script(
+                keys=[f"{self.KEY_PREFIX}:{key}:{index}", f"{self.KEY_PREFIX}:{key}:{index - 1}"],
+                args=[weight, max_requests, window * 2]
+            ))
+        except Exception as e:
+            self.errors += 1
+            self._disabled_until = now + self._retry_interval
+            logger.warning(f"Redis速率限制不可用，{self._retry_interval:.0f}秒内使用内存限制: {e}")
+            return self._fallback.check(ip, identifier, max_requests, window)
         
-        # 记录本次请求
-        self.requests[key].append(now)
-        return True
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return allowed
     
     def cleanup(self):
-        """清理过期记录"""
-        now = time.time()
-        for key in list(self.requests.keys()):
-            self.requests[key] = [t for t in self.requests[key] if now - t < 3600]
-            if not self.requests[key]:
-                del self.requests[key]
+        """Redis计数器自动过期，只清理回退用的内存记录"""
+        self._fallback.cleanup()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "fallback": self._fallback.stats()
+        }
 
 
-rate_limiter = SimpleRateLimiter()
+def create_rate_limiter():
+    """根据 RATE_LIMIT_BACKEND 创建速率限制器"""
+    memory_limiter = SlidingWindowRateLimiter(RATE_LIMIT_MAX_KEYS)
+    if RATE_LIMIT_BACKEND != "redis":
+        return memory_limiter
+    if not RATE_LIMIT_REDIS_URL:
+        logger.warning("RATE_LIMIT_BACKEND=redis 但未配置 RATE_LIMIT_REDIS_URL，使用内存速率限制")
+        return memory_limiter
+    try:
+        limiter = RedisRateLimiter(RATE_LIMIT_REDIS_URL, memory_limiter, RATE_LIMIT_REDIS_RETRY)
+    except ImportError:
+        logger.warning("未安装 redis，使用内存速率限制")
+        return memory_limiter
+    logger.info("速率限制使用Redis后端")
+    return limiter
+
+
+rate_limiter = create_rate_limiter()
 
 
 # ==================== FastAPI应用 ====================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动批量写入任务
+    access_writer.start()
+    yield
+    # 关闭前写入剩余数据
+    await access_writer.stop()
+
+
 app = FastAPI(
     title="设备配置服务",
     description="为物联网设备提供配置信息的轻量级服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS配置
@@ -257,100 +684,78 @@ async def health_check():
     )
 
 
-def _get_device_info_impl(
+async def _get_device_info_impl(
     mac_address: str,
     product_id: str,
     firmware_version: str,
     client_ip: str,
-    user_agent: str,
-    db: Session
+    user_agent: str
 ) -> DeviceInfoResponse:
     """
     获取设备配置的内部实现（供GET和POST共用）
     
+    设备和固件信息优先从缓存读取；访问日志与 last_seen 由后台批量写入，
+    请求本身不写数据库。
+    
     Args:
         mac_address: 设备MAC地址
         product_id: 产品标识符（必需，如：ESP32-S3-Dev-01）
         firmware_version: 固件版本（必需，用于OTA检查和设备管理）
         client_ip: 客户端IP
         user_agent: User Agent
-        db: 数据库会话
     """
-    start_time = time.time()
+    start_time = time.monotonic()
     
     # 速率限制检查
-    if not rate_limiter.check(client_ip, mac_address, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW):
+    if not await rate_limiter.check_async(client_ip, mac_address, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW):
         logger.warning(f"速率限制: IP={client_ip}, MAC={mac_address}")
         raise HTTPException(status_code=429, detail="请求过于频繁，请稍后重试")
     
     # 查询设备
-    device = db.query(DeviceRecord).filter(
-        DeviceRecord.mac_address == mac_address
-    ).first()
+    device = await get_cached_device(mac_address)
     
     if not device:
         # 记录失败日志
-        log = AccessLog(
-            ip_address=client_ip,
-            endpoint="/device/info",
-            mac_address=mac_address,
-            success=False,
-            user_agent=user_agent
-        )
-        db.add(log)
-        db.commit()
+        access_writer.add_log(client_ip, "/device/info", mac_address, False, user_agent)
         
         logger.warning(f"设备未找到: MAC={mac_address}, IP={client_ip}")
         
-        # 固定延迟，防止时序攻击
-        elapsed = time.time() - start_time
-        if elapsed < 0.1:
-            time.sleep(0.1 - elapsed)
+        # 固定延迟，防止时序攻击（异步等待，不阻塞其他请求）
+        elapsed = time.monotonic() - start_time
+        if elapsed < NOT_FOUND_MIN_DELAY:
+            await asyncio.sleep(NOT_FOUND_MIN_DELAY - elapsed)
         
         raise HTTPException(status_code=404, detail="设备未注册")
     
-    if not device.is_active:
+    if not device["is_active"]:
         raise HTTPException(status_code=403, detail="设备已被禁用")
     
-    # 更新设备信息
-    device.last_seen = datetime.utcnow()
-    if firmware_version:
-        device.firmware_version = firmware_version
+    # 更新设备信息（批量写入）
     # product_id 是设备的固定属性，不需要更新
+    access_writer.touch_device(device["id"], firmware_version)
     
     # 检查固件更新
     firmware_update = None
     if firmware_version:
-        latest_firmware = db.query(FirmwareVersion).filter(
-            FirmwareVersion.is_active == True,
-            FirmwareVersion.product_code == device.product_id
-        ).order_by(FirmwareVersion.created_at.desc()).first()
+        latest_firmware = await get_cached_latest_firmware(device["product_id"])
         
-        if latest_firmware and latest_firmware.version != firmware_version:
+        if latest_firmware and is_newer_version(latest_firmware["version_key"], parse_version(firmware_version)):
             firmware_update = {
                 "available": True,
-                "version": latest_firmware.version,
-                "download_url": latest_firmware.firmware_url,  # 使用正确的字段名
-                "file_size": latest_firmware.file_size,
-                "checksum": latest_firmware.file_hash,  # 使用正确的字段名
-                "changelog": latest_firmware.release_notes  # 使用正确的字段名
+                "version": latest_firmware["version"],
+                "download_url": latest_firmware["firmware_url"],  # 使用正确的字段名
+                "file_size": latest_firmware["file_size"],
+                "checksum": latest_firmware["file_hash"],  # 使用正确的字段名
+                "changelog": latest_firmware["release_notes"]  # 使用正确的字段名
             }
     
     # 记录成功日志
-    log = AccessLog(
-        ip_address=client_ip,
-        endpoint="/device/info",
-        mac_address=mac_address,
-        success=True,
-        user_agent=user_agent
-    )
-    db.add(log)
-    db.commit()
+    access_writer.add_log(client_ip, "/device/info", mac_address, True, user_agent)
     
     logger.info(
         f"设备配置查询成功: "
         f"MAC={mac_address}, "
-        f"DeviceID={device.device_id}, "
+        f"DeviceID={device['device_id']}, "
         f"IP={client_ip}"
     )
     
@@ -358,25 +763,25 @@ def _get_device_info_impl(
     mqtt_config = {
         "broker": MQTT_BROKER,
         "port": MQTT_PORT,
-        "username": device.device_id,
-        "password": device.device_secret,  # device_secret在这里使用，不需要单独返回
+        "username": device["device_id"],
+        "password": device["device_secret"],  # device_secret在这里使用，不需要单独返回
         "use_ssl": MQTT_USE_SSL,
         "topics": {
-            "data": f"devices/{device.uuid}/data",
-            "control": f"devices/{device.uuid}/control",
-            "status": f"devices/{device.uuid}/status",
-            "heartbeat": f"devices/{device.uuid}/heartbeat"
+            "data": f"devices/{device['uuid']}/data",
+            "control": f"devices/{device['uuid']}/control",
+            "status": f"devices/{device['uuid']}/status",
+            "heartbeat": f"devices/{device['uuid']}/heartbeat"
         }
     }
     
     # 构建响应数据（精简版，只返回固件实际需要的字段）
     # 注意：product_id 可能是整数或字符串，统一转换为字符串
-    product_id_str = str(device.product_id) if device.product_id is not None else None
+    product_id_str = str(device["product_id"]) if device["product_id"] is not None else None
     
     response_data = {
-        "device_id": device.device_id,
-        "device_uuid": device.uuid,
-        "mac_address": device.mac_address,
+        "device_id": device["device_id"],
+        "device_uuid": device["uuid"],
+        "mac_address": device["mac_address"],
         "product_id": product_id_str,
         "mqtt_config": mqtt_config,
         "firmware_update": firmware_update
@@ -403,8 +808,7 @@ async def get_device_info_by_get(
     mac: str = Query(..., description="设备MAC地址", regex=r"^([0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}$"),
     product_id: str = Query(..., description="产品标识符/产品编码（如：ESP32-S3-Dev-01）", min_length=1, max_length=64),
     firmware_version: str = Query(..., description="当前固件版本", min_length=1),
-    request: Request = None,
-    db: Session = Depends(get_db)
+    request: Request = None
 ):
     """
     获取设备完整配置信息 (GET方式 - 推荐)
@@ -427,21 +831,19 @@ async def get_device_info_by_get(
     client_ip = request.client.host if request.client else "unknown"
     user_agent = request.headers.get("User-Agent", "Unknown")
     
-    return _get_device_info_impl(
+    return await _get_device_info_impl(
         mac_address=mac,
         product_id=product_id,
         firmware_version=firmware_version,
         client_ip=client_ip,
-        user_agent=user_agent,
-        db=db
+        user_agent=user_agent
     )
 
 
 @app.post("/device/info", response_model=DeviceInfoResponse)
 async def get_device_info_by_post(
     request: Request,
-    device_req: DeviceInfoRequest,
-    db: Session = Depends(get_db)
+    device_req: DeviceInfoRequest
 ):
     """
     获取设备完整配置信息 (POST方式 - 兼容)
@@ -462,21 +864,19 @@ async def get_device_info_by_post(
     client_ip = request.client.host if request.client else "unknown"
     user_agent = request.headers.get("User-Agent", "Unknown")
     
-    return _get_device_info_impl(
+    return await _get_device_info_impl(
         mac_address=device_req.mac_address,
         product_id=device_req.product_id,
         firmware_version=device_req.firmware_version,
         client_ip=client_ip,
-        user_agent=user_agent,
-        db=db
+        user_agent=user_agent
     )
 
 
 @app.post("/firmware/check", response_model=FirmwareCheckResponse)
 async def check_firmware_update(
     request: Request,
-    firmware_req: FirmwareCheckRequest,
-    db: Session = Depends(get_db)
+    firmware_req: FirmwareCheckRequest
 ):
     """
     检查固件更新
@@ -486,23 +886,18 @@ async def check_firmware_update(
     client_ip = request.client.host if request.client else "unknown"
     
     # 速率限制
-    if not rate_limiter.check(client_ip, f"fw_{firmware_req.mac_address}", 5, 300):
+    if not await rate_limiter.check_async(client_ip, f"fw_{firmware_req.mac_address}", 5, 300):
         raise HTTPException(status_code=429, detail="请求过于频繁")
     
     # 查询设备
-    device = db.query(DeviceRecord).filter(
-        DeviceRecord.mac_address == firmware_req.mac_address
-    ).first()
+    device = await get_cached_device(firmware_req.mac_address)
     
     if not device:
         raise HTTPException(status_code=404, detail="设备未注册")
     
     # 查询最新固件
-    product_id = firmware_req.product_id or device.product_id
-    latest_firmware = db.query(FirmwareVersion).filter(
-        FirmwareVersion.is_active == True,
-        FirmwareVersion.product_code == product_id
-    ).order_by(FirmwareVersion.created_at.desc()).first()
+    product_id = firmware_req.product_id or device["product_id"]
+    latest_firmware = await get_cached_latest_firmware(product_id)
     
     if not latest_firmware:
         return FirmwareCheckResponse(
@@ -511,28 +906,42 @@ async def check_firmware_update(
             message="暂无可用固件"
         )
     
-    # 比较版本
-    update_available = latest_firmware.version != firmware_req.current_version
+    # 比较版本（索引中的最新版本已预先解析）
+    update_available = is_newer_version(latest_firmware["version_key"], parse_version(firmware_req.current_version))
     
     logger.info(
         f"固件检查: MAC={firmware_req.mac_address}, "
         f"当前={firmware_req.current_version}, "
-        f"最新={latest_firmware.version}, "
+        f"最新={latest_firmware['version']}, "
         f"需更新={update_available}"
     )
     
     return FirmwareCheckResponse(
         update_available=update_available,
         current_version=firmware_req.current_version,
-        latest_version=latest_firmware.version if update_available else None,
-        download_url=latest_firmware.firmware_url if update_available else None,  # 使用正确的字段名
-        file_size=latest_firmware.file_size if update_available else None,
-        checksum=latest_firmware.file_hash if update_available else None,  # 使用正确的字段名
-        changelog=latest_firmware.release_notes if update_available else None,  # 使用正确的字段名
+        latest_version=latest_firmware["version"] if update_available else None,
+        download_url=latest_firmware["firmware_url"] if update_available else None,  # 使用正确的字段名
+        file_size=latest_firmware["file_size"] if update_available else None,
+        checksum=latest_firmware["file_hash"] if update_available else None,  # 使用正确的字段名
+        changelog=latest_firmware["release_notes"] if update_available else None,  # 使用正确的字段名
         message="有新版本可用" if update_available else "已是最新版本"
     )
 
 
+@app.get("/stats")
+async def service_stats():
+    """缓存命中率、速率限制与批量写入统计（用于压测和监控）"""
+    return {
+        "caches": [device_cache.stats(), firmware_cache.stats()],
+        "rate_limiter": rate_limiter.stats(),
+        "access_writer": {
+            "pending_logs": len(access_writer._logs),
+            "pending_devices": len(access_writer._devices),
+            "dropped_logs": access_writer.dropped
+        }
+    }
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -544,7 +953,8 @@ async def root():
             "health": "GET /health",
             "device_info_get": "GET /device/info?mac=AA:BB:CC:DD:EE:FF (推荐)",
             "device_info_post": "POST /device/info (兼容)",
-            "firmware_check": "POST /firmware/check"
+            "firmware_check": "POST /firmware/check",
+            "stats": "GET /stats"
         },
         "example": "curl http://localhost:8001/device/info?mac=AA:BB:CC:DD:EE:FF"
     }
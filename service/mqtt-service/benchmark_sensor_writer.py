@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+传感器数据写入微基准
+
+模拟设备消息写入 device_sensors 表，比较两种方式每秒写入的行数：
+- 逐行：每个传感器一条 UPSERT 语句（原实现）
+- 批量：每条消息一条多行 UPSERT 语句（sensor_writer）
+每条消息提交一次事务，与服务处理消息时一致。同时比较传感器名称校验的耗时。
+
+    # 使用 .env 中配置的 MySQL（写入 device_uuid 以 bench- 开头的行，结束后删除）
+    python benchmark_sensor_writer.py --messages 1000 --sensors 10
+
+    # 不依赖 MySQL，使用临时 SQLite 数据库
+    python benchmark_sensor_writer.py --database-url sqlite:///bench.db
+"""
+import argparse
+import random
+import time
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import DeviceSensor
+from sensor_writer import SensorBatchWriter, build_reading, validate_sensor_name
+
+BENCH_UUID_PREFIX = "bench-"
+
+
+def make_messages(messages: int, sensors: int, devices: int, seed: int):
+    """生成模拟消息：每条消息包含一台设备的 sensors 个传感器"""
+    rng = random.Random(seed)
+    names = [f"sensor_{i}" for i in range(sensors)]
+    return [
+        (f"{BENCH_UUID_PREFIX}{rng.randrange(devices)}", {name: round(rng.uniform(0, 100), 2) for name in names})
+        for _ in range(messages)
+    ]
+
+
+def run(session_factory, messages, batch: bool):
+    """写入全部消息，返回 (耗时秒, 行数, 语句数)"""
+    writer = SensorBatchWriter()
+    db = session_factory()
+    try:
+        start = time.perf_counter()
+        for device_uuid, values in messages:
+            readings = [
+                build_reading(device_uuid, name, value, "", "BENCH", None)
+                for name, value in values.items()
+            ]
+            if batch:
+                writer.write(db, readings)
+            else:
+                for reading in readings:
+                    writer.write(db, [reading])
+            db.commit()
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+    return elapsed, writer.rows, writer.statements
+
+
+def cleanup(engine):
+    with engine.begin() as conn:
+        conn.execute(DeviceSensor.__table__.delete().where(
+            DeviceSensor.device_uuid.like(f"{BENCH_UUID_PREFIX}%")
+        ))
+
+
+def bench_validation(rounds: int):
+    """比较每次调用 re.match 与预编译正则的传感器名称校验耗时"""
+    name = "dht11_temperature"
+
+    def per_call():
+        import re as _re
+        return bool(_re.match(r'^[a-z_][a-z0-9_]*$', name))
+
+    old = timeit.timeit(per_call, number=rounds)
+    new = timeit.timeit(lambda: validate_sensor_name(name), number=rounds)
+    print(f"\n=== 传感器名称校验（{rounds} 次）===")
+    print(f"  re.match: {old / rounds * 1e9:.0f} ns/次  预编译: {new / rounds * 1e9:.0f} ns/次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="传感器数据写入微基准")
+    parser.add_argument("--database-url", help="数据库地址，默认使用 .env 中的 MySQL 配置")
+    parser.add_argument("--messages", type=int, default=1000, help="消息数")
+    parser.add_argument("--sensors", type=int, default=10, help="每条消息的传感器数")
+    parser.add_argument("--devices", type=int, default=50, help="设备数")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        from config import settings
+        database_url = settings.DATABASE_URL
+    engine = create_engine(database_url, pool_pre_ping=True)
+    if engine.dialect.name == "sqlite":
+        DeviceSensor.__table__.create(engine, checkfirst=True)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+
+    messages = make_messages(args.messages, args.sensors, args.devices, args.seed)
+    print(f"数据库: {engine.dialect.name}  消息数: {args.messages}  每条传感器数: {args.sensors}  设备数: {args.devices}")
+
+    try:
+        for label, batch in (("逐行", False), ("批量", True)):
+            cleanup(engine)
+            elapsed, rows, statements = run(session_factory, messages, batch)
+            print(f"\n=== {label} ===")
+            print(f"  行数: {rows}  语句数: {statements}  耗时: {elapsed:.2f}s")
+            print(f"  吞吐: {rows / elapsed:.0f} 行/s  {len(messages) / elapsed:.0f} 消息/s")
+    finally:
+        cleanup(engine)
+
+    bench_validation(100000)
+
+
+if __name__ == "__main__":
+    main()
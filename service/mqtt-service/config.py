@@ -17,6 +17,10 @@ class Settings:
     MQTT_USERNAME: str = os.getenv("MQTT_SERVICE_USERNAME", "")
     MQTT_PASSWORD: str = os.getenv("MQTT_SERVICE_PASSWORD", "")
     
+    # 消息处理工作进程数（1 表示在接收线程中直接处理；大于 1 时按设备UUID分发到多个进程，同一设备的消息保持顺序）
+    MQTT_WORKERS: int = max(1, int(os.getenv("MQTT_WORKERS", "1")))
+    MQTT_WORKER_QUEUE_SIZE: int = int(os.getenv("MQTT_WORKER_QUEUE_SIZE", "10000"))  # 每个工作进程的待处理消息上限，满时等待 1 秒仍无空位则丢弃消息
+    
     # 数据库配置
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
     DB_PORT: int = int(os.getenv("DB_PORT", "3306"))
@@ -24,6 +28,10 @@ class Settings:
     DB_USER: str = os.getenv("DB_USER", "root")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "")
     
+    # Redis配置（传感器最新值，与 backend 共用）
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    SENSOR_CACHE_TTL: int = int(os.getenv("SENSOR_CACHE_TTL", "86400"))  # 传感器最新值保留时间（秒），每次上报时刷新
+    
     # 数据库URL
     @property
     def DATABASE_URL(self) -> str:
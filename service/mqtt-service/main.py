@@ -7,13 +7,16 @@ import logging
 import sys
 import time
 from datetime import datetime, timezone, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import paho.mqtt.client as mqtt
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from database import SessionLocal, engine
 from models import Device, Product, Base
 from config import settings
+from sensor_cache import sensor_cache
+from sensor_writer import sensor_writer, build_reading, validate_sensor_name
+from workers import IngestWorkerPool
 
 # 配置日志
 logging.basicConfig(
@@ -47,6 +50,7 @@ class MQTTService:
         self.is_connected = False
         self.reconnect_count = 0
         self.max_reconnect_delay = 300  # 最大重连延迟（秒）
+        self.worker_pool: Optional[IngestWorkerPool] = None  # MQTT_WORKERS > 1 时由 start() 创建
         
         # 统计信息
         self.stats = {
@@ -112,9 +116,16 @@ class MQTTService:
         self.stats["total_messages"] += 1
         self.stats["last_message_time"] = get_beijing_now()
         
+        if self.worker_pool:
+            # 多工作进程：按设备UUID分发，由工作进程解析和写入
+            self.worker_pool.submit(msg.topic, msg.payload)
+        else:
+            self.handle_message(msg.topic, msg.payload)
+    
+    def handle_message(self, topic: str, payload_bytes: bytes) -> bool:
+        """解析并处理一条MQTT消息，返回是否处理成功"""
         try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8')
+            payload = payload_bytes.decode('utf-8')
             
             logger.info(f"📨 收到MQTT消息 - 主题: {topic}")
             
@@ -130,6 +141,7 @@ class MQTTService:
                     data = json.loads(payload)
                     self.process_device_message(device_uuid, message_type, data)
                     self.stats["success_messages"] += 1
+                    return True
                 except json.JSONDecodeError as e:
                     self.stats["failed_messages"] += 1
                     logger.error(f"❌ JSON解析失败: {e}, payload: {payload[:100]}")
@@ -143,6 +155,7 @@ class MQTTService:
         except Exception as e:
             self.stats["failed_messages"] += 1
             logger.error(f"❌ 处理MQTT消息时出错: {e}", exc_info=True)
+        return False
     
     def process_device_message(self, device_uuid: str, message_type: str, data: Dict[str, Any]):
         """处理设备消息"""
@@ -159,6 +172,9 @@ class MQTTService:
             
             logger.info(f"✅ 找到设备: {device.name} (ID: {device.device_id})")
             
+            # 本次写入的传感器（提交后写入传感器最新值）
+            readings = []
+            
             # 根据消息类型处理
             if message_type == "data":
                 # 传感器数据上报
@@ -170,10 +186,10 @@ class MQTTService:
                 
                 if "sensors" in data:
                     # HTTP API 格式 - 转换为标准存储格式
-                    self._process_http_format_data(db, device_uuid, data)
+                    readings = self._process_http_format_data(db, device_uuid, data)
                 else:
                     # MQTT 简单格式 - 直接存储
-                    self._process_mqtt_format_data(db, device_uuid, data)
+                    readings = self._process_mqtt_format_data(db, device_uuid, data)
                 
                 device.last_seen = get_beijing_now()
                 device.is_online = True
@@ -215,19 +231,25 @@ class MQTTService:
             db.commit()
             logger.info(f"✅ 设备数据已更新: {device.name}")
             
-        except Exception as e:
-            logger.error(f"❌ 处理设备消息失败: {e}", exc_info=True)
+            sensor_cache.write(device_uuid, readings, {
+                "name": device.name,
+                "last_seen": device.last_seen.isoformat() if device.last_seen else None
+            })
+            
+        except Exception:
+            # 回滚后交给 handle_message 记录日志并计入失败
             db.rollback()
+            raise
         finally:
             db.close()
     
-    def _process_http_format_data(self, db: Session, device_uuid: str, data: Dict[str, Any]):
-        """处理 HTTP API 格式的传感器数据，直接写入 device_sensors 表"""
+    def _process_http_format_data(self, db: Session, device_uuid: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """处理 HTTP API 格式的传感器数据，一条语句写入 device_sensors 表，返回写入的传感器"""
         now = get_beijing_now()
         
         # 处理传感器数据列表
         sensors_list = data.get("sensors", [])
-        valid_count = 0
+        readings = []
         
         for sensor in sensors_list:
             sensor_name = sensor.get("sensor_name")
@@ -239,7 +261,7 @@ class MQTTService:
                 continue
             
             # 验证传感器名称格式
-            if not self._validate_sensor_name(sensor_name):
+            if not validate_sensor_name(sensor_name):
                 logger.warning(f"⚠️ 传感器名称格式不正确，跳过: {sensor_name}")
                 continue
             
@@ -249,18 +271,19 @@ class MQTTService:
                 continue
             sensor_unit = sensor.get("unit", "")
             timestamp_str = sensor.get("timestamp", now.isoformat())
-            self._upsert_sensor(db, device_uuid, sensor_name, sensor_value, sensor_unit, sensor.get("sensor_type", ""), timestamp_str)
-            valid_count += 1
+            readings.append(build_reading(device_uuid, sensor_name, sensor_value, sensor_unit, sensor.get("sensor_type", ""), timestamp_str))
             logger.debug(f"  - {sensor_name}: {sensor_value} {sensor_unit}")
         
-        logger.info(f"✅ 成功处理 {valid_count} 个传感器数据")
+        readings = sensor_writer.write(db, readings)
+        logger.info(f"✅ 成功处理 {len(readings)} 个传感器数据")
+        return readings
     
-    def _process_mqtt_format_data(self, db: Session, device_uuid: str, data: Dict[str, Any]):
-        """处理 MQTT 简单格式的传感器数据，直接写入 device_sensors 表"""
+    def _process_mqtt_format_data(self, db: Session, device_uuid: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """处理 MQTT 简单格式的传感器数据，一条语句写入 device_sensors 表，返回写入的传感器"""
         now = get_beijing_now()
         
         # 将简单键值对转换为标准格式
-        valid_count = 0
+        readings = []
         sensor_type = data.get("sensor", "").upper()
         
         # 特殊处理：雨水传感器旧格式 {"sensor":"RAIN_SENSOR","is_raining":false,"level":1}
@@ -268,15 +291,14 @@ class MQTTService:
             rain_value = data.get("is_raining")
             rain_level = data.get("level")
             if rain_value is not None:
-                self._upsert_sensor(db, device_uuid, "rain", rain_value, "", sensor_type, data.get("timestamp", now.isoformat()))
-                valid_count += 1
+                readings.append(build_reading(device_uuid, "rain", rain_value, "", sensor_type, data.get("timestamp", now.isoformat())))
                 logger.debug(f"  - rain: {rain_value}")
             if isinstance(rain_level, (int, float)):
-                self._upsert_sensor(db, device_uuid, "rain_level", rain_level, "", sensor_type, data.get("timestamp", now.isoformat()))
-                valid_count += 1
+                readings.append(build_reading(device_uuid, "rain_level", rain_level, "", sensor_type, data.get("timestamp", now.isoformat())))
                 logger.debug(f"  - rain_level: {rain_level}")
-            logger.info(f"✅ 成功处理 {valid_count} 个传感器数据")
-            return
+            readings = sensor_writer.write(db, readings)
+            logger.info(f"✅ 成功处理 {len(readings)} 个传感器数据")
+            return readings
         
         for key, value in data.items():
             # 跳过特殊字段
@@ -284,31 +306,19 @@ class MQTTService:
                 continue
             
             # 验证传感器名称
-            if not self._validate_sensor_name(key):
+            if not validate_sensor_name(key):
                 logger.warning(f"⚠️ 传感器名称格式不正确，跳过: {key}")
                 continue
             
             # 只处理数值类型的传感器数据
             if isinstance(value, (int, float)):
                 timestamp_str = data.get("timestamp", now.isoformat())
-                self._upsert_sensor(db, device_uuid, key, value, "", data.get("sensor", ""), timestamp_str)
-                valid_count += 1
+                readings.append(build_reading(device_uuid, key, value, "", data.get("sensor", ""), timestamp_str))
                 logger.debug(f"  - {key}: {value}")
         
-        logger.info(f"✅ 成功处理 {valid_count} 个传感器数据")
-    
-    def _validate_sensor_name(self, name: str) -> bool:
-        """验证传感器名称格式
-        
-        规则：
-        - 只能包含小写字母、数字、下划线
-        - 长度在 1-50 之间
-        - 不能以数字开头
-        """
-        import re
-        if not name or len(name) > 50:
-            return False
-        return bool(re.match(r'^[a-z_][a-z0-9_]*$', name))
+        readings = sensor_writer.write(db, readings)
+        logger.info(f"✅ 成功处理 {len(readings)} 个传感器数据")
+        return readings
     
     def _validate_location(self, location: Dict[str, Any]) -> bool:
         """验证位置信息格式
@@ -332,43 +342,14 @@ class MQTTService:
         except (ValueError, TypeError):
             return False
     
-    def _upsert_sensor(self, db: Session, device_uuid: str, sensor_name: str, sensor_value: Any, sensor_unit: str, sensor_type: str, timestamp_str: str):
-        """将单个传感器数据写入 device_sensors 表（使用 device_uuid，UPSERT）"""
-        try:
-            # 解析时间戳
-            try:
-                if isinstance(timestamp_str, str):
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                else:
-                    timestamp = get_beijing_now()
-            except Exception:
-                timestamp = get_beijing_now()
-            
-            sql = text("""
-                INSERT INTO device_sensors 
-                (device_uuid, sensor_name, sensor_value, sensor_unit, sensor_type, timestamp)
-                VALUES (:device_uuid, :sensor_name, :sensor_value, :sensor_unit, :sensor_type, :timestamp)
-                ON DUPLICATE KEY UPDATE
-                    sensor_value = VALUES(sensor_value),
-                    sensor_unit = VALUES(sensor_unit),
-                    sensor_type = VALUES(sensor_type),
-                    timestamp = VALUES(timestamp)
-            """)
-            
-            db.execute(sql, {
-                "device_uuid": device_uuid,
-                "sensor_name": sensor_name,
-                "sensor_value": str(sensor_value),
-                "sensor_unit": sensor_unit or "",
-                "sensor_type": sensor_type or "",
-                "timestamp": timestamp
-            })
-        except Exception as e:
-            logger.error(f"❌ 写入 device_sensors 失败: {e}", exc_info=True)
-    
     def start(self):
         """启动MQTT服务"""
         try:
+            # 先启动工作进程，再连接Broker接收消息
+            if settings.MQTT_WORKERS > 1:
+                self.worker_pool = IngestWorkerPool(settings.MQTT_WORKERS, settings.MQTT_WORKER_QUEUE_SIZE)
+                self.worker_pool.start()
+            
             # 创建MQTT客户端
             self.client = mqtt.Client(
                 client_id=f"mqtt_service_{int(time.time())}",
@@ -405,6 +386,8 @@ class MQTTService:
             self.stop()
         except Exception as e:
             logger.error(f"❌ MQTT服务启动失败: {e}", exc_info=True)
+            if self.worker_pool:
+                self.worker_pool.stop()
             sys.exit(1)
     
     def _start_stats_timer(self):
@@ -422,9 +405,16 @@ class MQTTService:
     def _print_stats(self):
         """打印统计信息"""
         uptime = get_beijing_now() - self.stats["start_time"]
+        success_messages = self.stats["success_messages"]
+        failed_messages = self.stats["failed_messages"]
+        worker_stats = []
+        if self.worker_pool:
+            worker_stats = self.worker_pool.stats()
+            success_messages = sum(w["processed"] for w in worker_stats)
+            failed_messages = sum(w["failed"] for w in worker_stats)
         success_rate = 0
         if self.stats["total_messages"] > 0:
-            success_rate = (self.stats["success_messages"] / self.stats["total_messages"]) * 100
+            success_rate = (success_messages / self.stats["total_messages"]) * 100
         
         logger.info("=" * 70)
         logger.info("📊 MQTT服务统计信息")
@@ -432,9 +422,18 @@ class MQTTService:
         logger.info(f"  运行时间: {uptime}")
         logger.info(f"  连接状态: {'✅ 已连接' if self.is_connected else '❌ 未连接'}")
         logger.info(f"  总消息数: {self.stats['total_messages']}")
-        logger.info(f"  成功处理: {self.stats['success_messages']}")
-        logger.info(f"  处理失败: {self.stats['failed_messages']}")
+        logger.info(f"  成功处理: {success_messages}")
+        logger.info(f"  处理失败: {failed_messages}")
         logger.info(f"  成功率: {success_rate:.2f}%")
+        if worker_stats:
+            for w in worker_stats:
+                logger.info(
+                    f"  工作进程 {w['worker']} (PID {w['pid']}{'' if w['alive'] else '，已退出'}): "
+                    f"成功 {w['processed']} / 失败 {w['failed']} / 丢弃 {w['dropped']}，吞吐 {w['rate']:.1f} 条/秒，"
+                    f"排队 {w['queued']}，重启 {w['restarts']} 次"
+                )
+        else:
+            logger.info(f"  传感器写入: {sensor_writer.rows} 行 / {sensor_writer.statements} 条语句，跳过 {sensor_writer.skipped} 行")
         if self.stats["last_message_time"]:
             logger.info(f"  最后消息: {self.stats['last_message_time']}")
         logger.info("=" * 70)
@@ -445,7 +444,9 @@ class MQTTService:
             logger.info("🛑 正在断开MQTT连接...")
             self.client.disconnect()
             self.client.loop_stop()
-            logger.info("✅ MQTT服务已停止")
+        if self.worker_pool:
+            self.worker_pool.stop()
+        logger.info("✅ MQTT服务已停止")
 
 
 def main():
@@ -456,6 +457,7 @@ def main():
     logger.info(f"📊 配置信息:")
     logger.info(f"  - MQTT Broker: {settings.MQTT_BROKER}:{settings.MQTT_PORT}")
     logger.info(f"  - 数据库: {settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}")
+    logger.info(f"  - 工作进程: {settings.MQTT_WORKERS}")
     logger.info("=" * 70)
     
     # 创建数据库表（已禁用，直接在数据库中初始化）
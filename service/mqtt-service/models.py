@@ -1,7 +1,7 @@
 """
 数据库模型（简化版，只包含MQTT服务需要的模型）
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -44,3 +44,19 @@ class Product(Base):
     # 关系
     devices = relationship("Device", back_populates="product")
 
+
+class DeviceSensor(Base):
+    """设备传感器最新值（device_uuid + sensor_name 唯一，由 sensor_writer 批量写入）"""
+    __tablename__ = "device_sensors"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    device_uuid = Column(String(36), nullable=False)
+    sensor_name = Column(String(50), nullable=False)
+    sensor_value = Column(String(255), nullable=False)
+    sensor_unit = Column(String(20), default="")
+    sensor_type = Column(String(50), default="")
+    timestamp = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index('uk_device_sensor', 'device_uuid', 'sensor_name', unique=True),
+    )
@@ -0,0 +1,139 @@
+"""
+传感器最新值写入和发布（Redis）
+传感器数据写入 device_sensors 表并提交后，同时写入 Redis，backend 和 plugin-backend-service 的读取接口直接读取
+
+数据结构与 backend/app/services/sensor_latest_store.py 一致，修改时需保持一致：
+- 每台设备一个哈希 device:sensors:{device_uuid}
+  - 字段为传感器名称，值为 JSON：{"value", "unit", "sensor_type", "timestamp"}
+  - 字段 __device__：设备名称和最后在线时间 {"name", "last_seen"}
+  - 字段 __complete__：由读取方从数据库补全后设置，本服务不设置
+- 每次写入刷新哈希的过期时间
+- 同时把本次写入的传感器发布到频道 device:telemetry（backend 的实时数据推送订阅该频道）：
+  {"device_uuid", "sensors": {传感器名称: {"value", "unit", "sensor_type", "timestamp"}}, "is_online", "last_seen"}
+
+Redis 不可用时只写数据库；期间有写入的设备在 Redis 恢复后删除其哈希，读取方下次从数据库补全
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# 哈希键前缀
+SENSOR_KEY_PREFIX = "device:sensors:"
+
+# 保留字段
+DEVICE_FIELD = "__device__"
+
+# 传感器数据发布频道（与 backend/app/services/device_telemetry_hub.py 一致）
+TELEMETRY_CHANNEL = "device:telemetry"
+
+# Redis 访问失败后暂停访问的时间（秒）
+REDIS_RETRY_INTERVAL = 30
+
+# Redis 不可用期间最多记录的设备数（超过后恢复时清空全部哈希）
+MAX_STALE_DEVICES = 10000
+
+
+class SensorCache:
+    """传感器最新值写入"""
+
+    def __init__(self, redis_url: str, ttl: int):
+        self.redis_url = redis_url
+        self.ttl = ttl
+        self._redis = None
+        self._retry_at = 0.0
+        self._stale: Set[str] = set()  # Redis 不可用期间有写入的设备
+        self._stale_overflow = False
+
+    def _get_redis(self):
+        if time.monotonic() < self._retry_at:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                self.redis_url,
+                decode_responses=True,
+                socket_timeout=1,
+                socket_connect_timeout=1
+            )
+        return self._redis
+
+    def _mark_stale(self, device_uuid: str) -> None:
+        if len(self._stale) >= MAX_STALE_DEVICES:
+            self._stale_overflow = True
+        else:
+            self._stale.add(device_uuid)
+
+    def _clear_stale(self, client) -> None:
+        """删除 Redis 不可用期间漏写的设备哈希"""
+        if self._stale_overflow:
+            keys = list(client.scan_iter(match=f"{SENSOR_KEY_PREFIX}*", count=1000))
+        else:
+            keys = [f"{SENSOR_KEY_PREFIX}{device_uuid}" for device_uuid in self._stale]
+        for i in range(0, len(keys), 500):
+            client.delete(*keys[i:i + 500])
+        logger.info(f"Redis 已恢复，删除 {len(keys)} 台设备的传感器最新值")
+        self._stale = set()
+        self._stale_overflow = False
+
+    def write(
+        self,
+        device_uuid: str,
+        readings: List[Dict[str, Any]],
+        device_info: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        写入设备的传感器最新值（数据库提交后调用）
+
+        Args:
+            device_uuid: 设备UUID
+            readings: 本次写入的传感器，每项包含 sensor_name、sensor_value、sensor_unit、sensor_type、timestamp
+            device_info: 设备名称和最后在线时间 {"name", "last_seen"}
+        """
+        if not readings and not device_info:
+            return
+        client = self._get_redis()
+        if client is None:
+            self._mark_stale(device_uuid)
+            return
+
+        key = f"{SENSOR_KEY_PREFIX}{device_uuid}"
+        sensors = {
+            reading["sensor_name"]: {
+                "value": reading["sensor_value"],
+                "unit": reading["sensor_unit"],
+                "sensor_type": reading["sensor_type"],
+                # 与数据库 DATETIME 列一致：保存不带时区的时间
+                "timestamp": reading["timestamp"].replace(tzinfo=None).isoformat() if reading["timestamp"] else None
+            }
+            for reading in readings
+        }
+        mapping = {name: json.dumps(sensor, ensure_ascii=False) for name, sensor in sensors.items()}
+        if device_info:
+            mapping[DEVICE_FIELD] = json.dumps(device_info, ensure_ascii=False)
+        event = json.dumps({
+            "device_uuid": device_uuid,
+            "sensors": sensors,
+            "is_online": True,
+            "last_seen": device_info.get("last_seen") if device_info else None
+        }, ensure_ascii=False)
+
+        try:
+            if self._stale or self._stale_overflow:
+                self._clear_stale(client)
+            pipe = client.pipeline(transaction=False)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            pipe.publish(TELEMETRY_CHANNEL, event)
+            pipe.execute()
+        except Exception as e:
+            self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            self._mark_stale(device_uuid)
+            logger.warning(f"⚠️ 写入传感器最新值失败，{REDIS_RETRY_INTERVAL} 秒内只写数据库: {e}")
+
+
+sensor_cache = SensorCache(settings.REDIS_URL, settings.SENSOR_CACHE_TTL)
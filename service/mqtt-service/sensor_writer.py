@@ -0,0 +1,178 @@
+"""
+传感器数据批量写入（device_sensors 表）
+一条消息的全部传感器用一条多行 UPSERT 写入，不再每个传感器执行一条语句
+
+- device_sensors 表 device_uuid + sensor_name 唯一，每个传感器只保留最新值
+- MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE；SQLite 使用 ON CONFLICT DO UPDATE（用于本地压测）
+- 按行数缓存语句对象，相同行数的消息复用同一语句（SQLAlchemy 编译缓存命中），只有参数不同
+- 传感器名称用预编译的正则校验；超过列长度的值在写入前跳过，不影响同一消息的其他传感器
+- 批量语句因数据错误失败时逐行重试，只跳过出错的行；连接断开等数据库错误直接抛出，由调用方回滚
+"""
+import logging
+import re
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 传感器名称：只能包含小写字母、数字、下划线，不能以数字开头，长度 1-50
+SENSOR_NAME_PATTERN = re.compile(r'^[a-z_][a-z0-9_]*$')
+MAX_SENSOR_NAME_LENGTH = 50
+
+# 单条语句最多写入的行数
+MAX_ROWS_PER_STATEMENT = 500
+
+# 写入的列和冲突时更新的列
+INSERT_COLUMNS = ("device_uuid", "sensor_name", "sensor_value", "sensor_unit", "sensor_type", "timestamp")
+UPDATE_COLUMNS = ("sensor_value", "sensor_unit", "sensor_type", "timestamp")
+
+# 列长度限制（与 device_sensors 表一致）
+COLUMN_LIMITS = {"device_uuid": 36, "sensor_name": 50, "sensor_value": 255, "sensor_unit": 20, "sensor_type": 50}
+
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+def validate_sensor_name(name: str) -> bool:
+    """验证传感器名称格式"""
+    if not name or len(name) > MAX_SENSOR_NAME_LENGTH:
+        return False
+    return SENSOR_NAME_PATTERN.match(name) is not None
+
+
+def build_reading(
+    device_uuid: str,
+    sensor_name: str,
+    sensor_value: Any,
+    sensor_unit: str,
+    sensor_type: str,
+    timestamp_str: Any
+) -> Dict[str, Any]:
+    """构造一行传感器数据（时间戳无法解析时使用当前北京时间）"""
+    try:
+        if isinstance(timestamp_str, str):
+            timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+        else:
+            timestamp = datetime.now(BEIJING_TZ).replace(tzinfo=None)
+    except ValueError:
+        timestamp = datetime.now(BEIJING_TZ).replace(tzinfo=None)
+    return {
+        "device_uuid": device_uuid,
+        "sensor_name": sensor_name,
+        "sensor_value": str(sensor_value),
+        "sensor_unit": sensor_unit or "",
+        "sensor_type": sensor_type or "",
+        "timestamp": timestamp
+    }
+
+
+@lru_cache(maxsize=64)
+def _upsert_statement(dialect_name: str, row_count: int):
+    """row_count 行的 UPSERT 语句，参数名为 列名_行号"""
+    values = ", ".join(
+        "(" + ", ".join(f":{column}_{i}" for column in INSERT_COLUMNS) + ")"
+        for i in range(row_count)
+    )
+    sql = f"INSERT INTO device_sensors ({', '.join(INSERT_COLUMNS)}) VALUES {values}"
+    if dialect_name == "sqlite":
+        updates = ", ".join(f"{column} = excluded.{column}" for column in UPDATE_COLUMNS)
+        return text(f"{sql} ON CONFLICT (device_uuid, sensor_name) DO UPDATE SET {updates}")
+    updates = ", ".join(f"{column} = VALUES({column})" for column in UPDATE_COLUMNS)
+    return text(f"{sql} ON DUPLICATE KEY UPDATE {updates}")
+
+
+def _oversized_column(row: Dict[str, Any]) -> Optional[str]:
+    """超过列长度的第一个字段名，全部合法时返回 None"""
+    for column, limit in COLUMN_LIMITS.items():
+        value = row[column]
+        if isinstance(value, str) and len(value) > limit:
+            return column
+    return None
+
+
+def is_connection_error(error: Exception) -> bool:
+    """数据库不可用（连接失败、连接断开），而不是某一行数据的问题"""
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+def _statement_params(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {f"{column}_{i}": row[column] for i, row in enumerate(rows) for column in INSERT_COLUMNS}
+
+
+class SensorBatchWriter:
+    """传感器数据批量写入"""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.skipped = 0
+
+    def write(self, db: Session, readings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        写入一条消息的全部传感器（不提交，由调用方提交）
+
+        Args:
+            db: 数据库会话
+            readings: build_reading 构造的行
+
+        Returns:
+            写入的行（同一传感器出现多次时只保留最后一次，不含跳过的行）
+
+        Raises:
+            数据库连接错误（OperationalError、连接已失效）时抛出，由调用方回滚；数据错误只跳过出错的行
+        """
+        rows = []
+        # 同一条语句中不能重复更新同一行
+        for row in {(r["device_uuid"], r["sensor_name"]): r for r in readings}.values():
+            column = _oversized_column(row)
+            if column:
+                self.skipped += 1
+                logger.warning(
+                    f"⚠️ {column} 超过 {COLUMN_LIMITS[column]} 个字符，跳过: "
+                    f"{row['device_uuid']}/{row['sensor_name']}"
+                )
+                continue
+            rows.append(row)
+        if not rows:
+            return []
+        dialect_name = db.get_bind().dialect.name
+        written = []
+        for i in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+            chunk = rows[i:i + MAX_ROWS_PER_STATEMENT]
+            if len(chunk) > 1:
+                try:
+                    db.execute(_upsert_statement(dialect_name, len(chunk)), _statement_params(chunk))
+                    self.statements += 1
+                    written.extend(chunk)
+                    continue
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    logger.warning(f"⚠️ 批量写入 device_sensors 失败，逐行重试 {len(chunk)} 行: {e}")
+            written.extend(self._write_rows(db, dialect_name, chunk))
+        self.rows += len(written)
+        return written
+
+    def _write_rows(self, db: Session, dialect_name: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """逐行写入（失败的语句只回滚自身），跳过数据错误的行，连接错误直接抛出"""
+        written = []
+        for row in rows:
+            try:
+                db.execute(_upsert_statement(dialect_name, 1), _statement_params([row]))
+                self.statements += 1
+                written.append(row)
+            except Exception as e:
+                if is_connection_error(e):
+                    raise
+                self.skipped += 1
+                logger.error(f"❌ 写入 device_sensors 失败，跳过 {row['device_uuid']}/{row['sensor_name']}: {e}")
+        return written
+
+
+sensor_writer = SensorBatchWriter()
@@ -0,0 +1,177 @@
+"""
+MQTT消息处理工作进程
+MQTT_WORKERS > 1 时，接收消息的客户端只负责按设备UUID分发，消息解析和数据库写入由多个工作进程并行完成
+
+- 按设备UUID的稳定哈希（crc32）选择工作进程，同一设备的消息始终由同一进程按接收顺序处理
+- 每个工作进程一个有界队列；队列满时接收线程最多等待 SUBMIT_TIMEOUT 秒，仍满则丢弃该消息并计数。
+  接收线程同时负责MQTT心跳，不能无限阻塞，否则 Broker 在 1.5 倍 keepalive 后断开连接
+- 工作进程使用 spawn 方式启动，各自创建数据库连接池和 Redis 连接
+- 工作进程意外退出时自动重启，队列中未处理的消息由新进程继续处理
+- 各工作进程的处理数、失败数写入共享计数器，由主进程汇总为每个进程的吞吐统计
+"""
+import logging
+import multiprocessing
+import queue as queue_module
+import signal
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 工作进程存活检查间隔（秒）
+MONITOR_INTERVAL = 5
+
+# 队列满时分发一条消息的最长等待时间（秒），需远小于MQTT keepalive
+SUBMIT_TIMEOUT = 1.0
+
+# 每丢弃多少条消息记录一次日志（第一次丢弃总是记录）
+DROP_LOG_EVERY = 1000
+
+# 每个工作进程在共享计数器中占用的槽位：处理成功数、处理失败数
+_PROCESSED = 0
+_FAILED = 1
+_SLOTS = 2
+
+
+def worker_index(device_uuid: str, workers: int) -> int:
+    """设备UUID对应的工作进程序号（跨进程、跨重启稳定，不使用 hash()）"""
+    return zlib.crc32(device_uuid.encode("utf-8")) % workers
+
+
+def _worker_main(index: int, queue, counters) -> None:
+    """工作进程入口：按顺序处理队列中的消息，收到 None 时退出"""
+    # Ctrl+C 由主进程处理，工作进程处理完队列中的消息后退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from main import MQTTService
+
+    service = MQTTService()
+    logger.info(f"👷 工作进程 {index} 已启动")
+    base = index * _SLOTS
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        topic, payload = item
+        # 每个槽位只有本进程写入，不需要加锁
+        counters[base + (_PROCESSED if service.handle_message(topic, payload) else _FAILED)] += 1
+    logger.info(f"👷 工作进程 {index} 已退出")
+
+
+class IngestWorkerPool:
+    """MQTT消息处理工作进程池"""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._counters = self._ctx.RawArray("q", workers * _SLOTS)
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._restarts = [0] * workers
+        self._dropped = [0] * workers  # 只在接收线程中修改
+        self._stopping = threading.Event()
+        # 上次统计时每个进程的处理数（用于计算区间吞吐）
+        self._last_snapshot = ([0] * workers, time.monotonic())
+
+    def _spawn(self, index: int) -> None:
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self._queues[index], self._counters),
+            name=f"mqtt-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self) -> None:
+        """启动全部工作进程和存活检查线程"""
+        for index in range(self.workers):
+            self._spawn(index)
+        threading.Thread(target=self._monitor, name="mqtt-worker-monitor", daemon=True).start()
+        logger.info(f"👷 已启动 {self.workers} 个消息处理工作进程")
+
+    def _monitor(self) -> None:
+        """重启意外退出的工作进程"""
+        while not self._stopping.wait(MONITOR_INTERVAL):
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive() and not self._stopping.is_set():
+                    self._restarts[index] += 1
+                    logger.error(
+                        f"❌ 工作进程 {index} 意外退出（退出码 {process.exitcode}），正在重启（第{self._restarts[index]}次）"
+                    )
+                    self._spawn(index)
+
+    def submit(self, topic: str, payload: bytes) -> bool:
+        """按主题中的设备UUID分发消息，队列持续已满时丢弃并返回 False"""
+        parts = topic.split("/")
+        device_uuid = parts[1] if len(parts) >= 3 else topic
+        index = worker_index(device_uuid, self.workers)
+        try:
+            self._queues[index].put((topic, payload), timeout=SUBMIT_TIMEOUT)
+            return True
+        except queue_module.Full:
+            self._dropped[index] += 1
+            if (self._dropped[index] - 1) % DROP_LOG_EVERY == 0:
+                logger.warning(
+                    f"⚠️ 工作进程 {index} 队列已满，丢弃消息（累计 {self._dropped[index]} 条）: {topic}"
+                )
+            return False
+
+    def totals(self) -> Dict[str, int]:
+        """全部工作进程的处理成功数、失败数和因队列满丢弃的消息数"""
+        counters = self._counters[:]
+        return {
+            "processed": sum(counters[_PROCESSED::_SLOTS]),
+            "failed": sum(counters[_FAILED::_SLOTS]),
+            "dropped": sum(self._dropped)
+        }
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """每个工作进程的统计信息，吞吐为距上次调用的平均值（消息/秒）"""
+        counters = self._counters[:]
+        last_done, last_time = self._last_snapshot
+        now = time.monotonic()
+        elapsed = max(now - last_time, 1e-6)
+        result = []
+        done = []
+        for index, process in enumerate(self._processes):
+            processed = counters[index * _SLOTS + _PROCESSED]
+            failed = counters[index * _SLOTS + _FAILED]
+            done.append(processed + failed)
+            try:
+                queued = self._queues[index].qsize()
+            except NotImplementedError:  # macOS 不支持 qsize
+                queued = -1
+            result.append({
+                "worker": index,
+                "pid": process.pid if process else None,
+                "alive": bool(process and process.is_alive()),
+                "processed": processed,
+                "failed": failed,
+                "dropped": self._dropped[index],
+                "queued": queued,
+                "restarts": self._restarts[index],
+                "rate": (done[-1] - last_done[index]) / elapsed
+            })
+        self._last_snapshot = (done, now)
+        return result
+
+    def stop(self, timeout: float = 20) -> None:
+        """通知工作进程处理完已分发的消息后退出，超时未退出的强制结束"""
+        self._stopping.set()
+        for queue in self._queues:
+            try:
+                queue.put(None, timeout=1)
+            except Exception:
+                pass
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning(f"⚠️ 工作进程 {process.name} 未在 {timeout} 秒内退出，强制结束")
+                process.terminate()
+        logger.info("👷 工作进程已全部停止")
@@ -0,0 +1,143 @@
+"""
+插件后端服务数据库并发压测脚本
+
+并发请求 GET /api/sensor-data，同时每隔一段时间探测 GET /health，
+统计请求吞吐、延迟分布，以及压测期间健康检查的延迟（反映事件循环是否被数据库操作阻塞）。
+
+默认使用随机生成的未注册设备UUID：Redis 中没有这些设备，每个请求都会查询数据库后返回404，
+压测的是数据库路径。只依赖标准库，可在任意机器上运行：
+
+    # 500个请求，并发50
+    python loadtest_db_concurrency.py --url http://localhost:9002 --requests 500 --concurrency 50
+
+    # 使用已注册设备的UUID列表（每行一个UUID，压测传感器最新值命中路径）
+    python loadtest_db_concurrency.py --uuids-file uuids.txt --sensor temperature
+
+修改 DB_POOL_SIZE / DB_MAX_OVERFLOW 后重新运行，比较吞吐和健康检查延迟
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+
+def load_uuids(args) -> List[str]:
+    """读取或生成设备UUID"""
+    if args.uuids_file:
+        with open(args.uuids_file, encoding="utf-8") as f:
+            uuids = [line.strip() for line in f if line.strip()]
+        return [uuids[i % len(uuids)] for i in range(args.requests)] if uuids else []
+    return [str(uuid.uuid4()) for _ in range(args.requests)]
+
+
+def get(url: str, timeout: float) -> Tuple[int, float]:
+    """发送GET请求，返回 (状态码, 耗时秒)"""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0  # 连接失败或超时
+    return status, time.perf_counter() - start
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def probe_health(base_url: str, interval: float, stop: threading.Event, latencies: List[float]) -> None:
+    """压测期间定期请求健康检查（不访问数据库），记录延迟"""
+    while not stop.is_set():
+        _, latency = get(f"{base_url}/health", timeout=30)
+        latencies.append(latency)
+        stop.wait(interval)
+
+
+def report_latency(label: str, latencies: List[float]) -> None:
+    latencies = [latency * 1000 for latency in latencies]
+    if not latencies:
+        return
+    print(
+        f"  {label}(ms): 平均 {statistics.mean(latencies):.1f}  "
+        f"p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+        f"p99 {percentile(latencies, 99):.1f}  最大 {max(latencies):.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="插件后端服务数据库并发压测")
+    parser.add_argument("--url", default="http://localhost:9002", help="插件后端服务地址")
+    parser.add_argument("--uuids-file", help="设备UUID列表文件（每行一个），不指定时使用随机的未注册UUID")
+    parser.add_argument("--sensor", default="temperature", help="查询的传感器名称")
+    parser.add_argument("--requests", type=int, default=500, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发数")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单个请求超时（秒）")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="健康检查探测间隔（秒）")
+    args = parser.parse_args()
+
+    args.url = args.url.rstrip("/")
+    uuids = load_uuids(args)
+    if not uuids:
+        print("没有可用的设备UUID")
+        sys.exit(1)
+
+    print(f"目标: {args.url}  请求数: {len(uuids)}  并发: {args.concurrency}")
+
+    urls = [
+        f"{args.url}/api/sensor-data?" + urllib.parse.urlencode({"device_uuid": u, "sensor": args.sensor})
+        for u in uuids
+    ]
+    health_latencies: List[float] = []
+    stop = threading.Event()
+    prober = threading.Thread(
+        target=probe_health, args=(args.url, args.probe_interval, stop, health_latencies), daemon=True
+    )
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda url: get(url, args.timeout), urls))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    statuses = Counter(status for status, _ in results)
+    print("\n=== 传感器数据请求 ===")
+    print(f"  请求数: {len(results)}  总耗时: {elapsed:.2f}s  吞吐: {len(results) / elapsed:.1f} req/s")
+    print("  状态码: " + ", ".join(f"{code or '连接失败'}={n}" for code, n in sorted(statuses.items())))
+    report_latency("延迟", [latency for _, latency in results])
+
+    print("\n=== 压测期间健康检查 ===")
+    print(f"  探测次数: {len(health_latencies)}")
+    report_latency("延迟", health_latencies)
+
+    try:
+        with urllib.request.urlopen(f"{args.url}/health", timeout=5) as resp:
+            pool_stats = json.loads(resp.read()).get("db_pool")
+        if pool_stats:
+            print(f"\n  连接池: {pool_stats['size']} + 溢出 {pool_stats['max_overflow']}")
+    except Exception:
+        pass
+
+    failed = sum(1 for status, _ in results if status in (0, 500, 502, 503, 504))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,8 @@ import logging
 import asyncio
 from datetime import datetime
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine, desc, Column, Integer, String, DateTime, Boolean, Text, JSON, text
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 import paho.mqtt.client as mqtt
@@ -63,12 +65,22 @@ if not DATABASE_URL:
     # 构建 DATABASE_URL
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# 数据库连接池配置
+# 数据库操作在专用线程池中执行（线程数 = DB_POOL_SIZE + DB_MAX_OVERFLOW），不阻塞处理请求的事件循环
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+
 # MQTT配置
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
 MQTT_USERNAME = os.getenv("MQTT_USERNAME", "")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD", "")
 
+# Redis配置（传感器最新值，由 mqtt-service 写入）
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+SENSOR_CACHE_TTL = int(os.getenv("SENSOR_CACHE_TTL", "86400"))
+
 # 服务配置
 SERVICE_PORT = int(os.getenv("SERVICE_PORT", "9002"))  # 默认 9002（9001 被 MQTT WebSocket 占用）
 SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
@@ -112,8 +124,10 @@ if '@' in DATABASE_URL:
     logger.info(f"    连接地址: {db_user}@{db_info}")
 else:
     logger.info("    状态: 未配置")
+logger.info(f"    连接池: {DB_POOL_SIZE} + 溢出 {DB_MAX_OVERFLOW}，获取连接超时 {DB_POOL_TIMEOUT}s")
 
 logger.info("")
+logger.info(f"  🗄️  Redis配置: {REDIS_URL.split('@')[-1]}")
 logger.info(f"  📡 MQTT配置: {MQTT_BROKER}:{MQTT_PORT}")
 if MQTT_USERNAME:
     logger.info(f"    认证模式: 用户名密码")
@@ -161,7 +175,15 @@ class DeviceSensor(Base):
 
 logger.info("🔄 正在连接数据库...")
 try:
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True, pool_recycle=3600, echo=False)
+    engine = create_engine(
+        DATABASE_URL,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        echo=False
+    )
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     
     # 测试连接
@@ -203,6 +225,194 @@ def get_db():
     finally:
         db.close()
 
+# 数据库操作专用线程池：线程数与连接池容量一致，线程不会因等待连接而阻塞，
+# 超出的请求在线程池中排队，不占用事件循环
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_POOL_SIZE + DB_MAX_OVERFLOW,
+    thread_name_prefix="plugin-db"
+)
+
+
+async def run_db(func, *args):
+    """在数据库线程池中执行同步的数据库操作（func 内自行创建和关闭会话）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, func, *args)
+
+# ============================================================
+# 传感器最新值（Redis）
+# ============================================================
+# 数据结构与 backend/app/services/sensor_latest_store.py 一致，修改时需保持一致：
+# - 每台设备一个哈希 device:sensors:{device_uuid}
+#   - 字段为传感器名称，值为 JSON：{"value", "unit", "sensor_type", "timestamp"}
+#   - 字段 __device__：设备名称和最后在线时间 {"name", "last_seen"}
+#   - 字段 __complete__：哈希已包含该设备的全部传感器（从数据库补全过）
+# - mqtt-service 提交数据库后写入；未命中时查询数据库，用 HSETNX 补全（不覆盖更新的值）
+# - Redis 不可用时改用进程内缓存（几秒过期），暂停访问 Redis 一段时间后再重试
+
+SENSOR_KEY_PREFIX = "device:sensors:"
+DEVICE_FIELD = "__device__"
+COMPLETE_FIELD = "__complete__"
+REDIS_RETRY_INTERVAL = 30
+LOCAL_CACHE_TTL = 2
+LOCAL_CACHE_MAX_SIZE = 10000
+
+
+class LatestSensorStore:
+    """传感器最新值读取"""
+
+    def __init__(self):
+        self._redis = None
+        self._retry_at = 0.0
+        self._local: Dict[str, tuple] = {}  # device_uuid -> (过期时间, 传感器, 设备信息)
+
+    def _get_redis(self):
+        if time.monotonic() < self._retry_at:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                REDIS_URL,
+                decode_responses=True,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5
+            )
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        logger.warning(f"⚠️ 传感器最新值 Redis 不可用，{REDIS_RETRY_INTERVAL} 秒内使用进程内缓存: {e}")
+
+    def get(self, device_uuid: str, sensor_name: str) -> Optional[Dict[str, Any]]:
+        """
+        读取单个传感器的最新值
+
+        Returns:
+            {"sensor": 传感器（不存在为None）, "device": 设备信息（可能为None）, "available": 该设备全部传感器名称}；
+            未命中返回None（需查询数据库）
+        """
+        client = self._get_redis()
+        if client is None:
+            entry = self._local.get(device_uuid)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            _, sensors, device = entry
+            return {"sensor": sensors.get(sensor_name), "device": device, "available": list(sensors)}
+
+        key = f"{SENSOR_KEY_PREFIX}{device_uuid}"
+        try:
+            raw_sensor, raw_device, complete = client.hmget(key, sensor_name, DEVICE_FIELD, COMPLETE_FIELD)
+            available = None
+            if raw_sensor is None and complete:
+                available = [f for f in client.hkeys(key) if f not in (DEVICE_FIELD, COMPLETE_FIELD)]
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+
+        # 传感器字段由 mqtt-service 写入的即为最新值；不存在时只有补全过的哈希才能确定没有该传感器
+        if raw_sensor is None and not complete:
+            return None
+        sensor = None
+        if raw_sensor is not None:
+            data = json.loads(raw_sensor)
+            sensor = {
+                "sensor_name": sensor_name,
+                "sensor_value": data.get("value"),
+                "sensor_unit": data.get("unit") or "",
+                "sensor_type": data.get("sensor_type") or "",
+                "timestamp": data.get("timestamp")
+            }
+        device = json.loads(raw_device) if raw_device else None
+        return {"sensor": sensor, "device": device, "available": available or []}
+
+    def fill(self, device_uuid: str, sensors: Dict[str, Dict[str, Any]], device: Optional[Dict[str, Any]]):
+        """用数据库中的全部传感器补全（不覆盖 mqtt-service 写入的更新值）"""
+        client = self._get_redis()
+        if client is None:
+            if len(self._local) >= LOCAL_CACHE_MAX_SIZE:
+                self._local.clear()
+            self._local[device_uuid] = (time.monotonic() + LOCAL_CACHE_TTL, sensors, device)
+            return
+
+        key = f"{SENSOR_KEY_PREFIX}{device_uuid}"
+        try:
+            pipe = client.pipeline(transaction=False)
+            for name, sensor in sensors.items():
+                pipe.hsetnx(key, name, json.dumps({
+                    "value": sensor["sensor_value"],
+                    "unit": sensor["sensor_unit"],
+                    "sensor_type": sensor["sensor_type"],
+                    "timestamp": sensor["timestamp"]
+                }, ensure_ascii=False))
+            if device:
+                pipe.hsetnx(key, DEVICE_FIELD, json.dumps(device, ensure_ascii=False))
+            pipe.hset(key, COMPLETE_FIELD, "1")
+            pipe.expire(key, SENSOR_CACHE_TTL)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+
+def load_latest_sensors(db: Session, device_uuid: str):
+    """从数据库读取设备的全部传感器最新值和设备信息"""
+    sensors = {
+        row.sensor_name: {
+            "sensor_name": row.sensor_name,
+            "sensor_value": row.sensor_value,
+            "sensor_unit": row.sensor_unit or "",
+            "sensor_type": row.sensor_type or "",
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None
+        }
+        for row in db.query(DeviceSensor).filter(DeviceSensor.device_uuid == device_uuid).all()
+    }
+    return sensors, load_device_info(db, device_uuid)
+
+
+def load_device_info(db: Session, device_uuid: str) -> Optional[Dict[str, Any]]:
+    """从数据库读取设备名称和最后在线时间，设备不存在返回None"""
+    row = db.query(Device.name, Device.last_seen).filter(Device.uuid == device_uuid).first()
+    if not row:
+        return None
+    return {
+        "name": row.name,
+        "last_seen": row.last_seen.isoformat() if row.last_seen else None
+    }
+
+
+latest_sensor_store = LatestSensorStore()
+
+
+def lookup_sensor(device_uuid: str, sensor_name: str) -> Dict[str, Any]:
+    """
+    读取单个传感器的最新值，未命中时查询 device_sensors 表并补全（在数据库线程池中执行）
+
+    Returns:
+        {"sensor": 传感器（不存在为None）, "device": 设备信息（设备不存在为None）, "available": 该设备全部传感器名称}
+    """
+    cached = latest_sensor_store.get(device_uuid, sensor_name)
+    if cached is None:
+        if SessionLocal is None:
+            raise HTTPException(status_code=500, detail="数据库未连接")
+        with SessionLocal() as db:
+            sensors, device = load_latest_sensors(db, device_uuid)
+        if device is not None:
+            latest_sensor_store.fill(device_uuid, sensors, device)
+        return {"sensor": sensors.get(sensor_name), "device": device, "available": list(sensors)}
+
+    # 设备信息（用于返回设备名称），最新值中没有时查询数据库
+    if cached["sensor"] and cached["device"] is None and SessionLocal is not None:
+        with SessionLocal() as db:
+            cached["device"] = load_device_info(db, device_uuid)
+    return cached
+
+
+def load_device(device_uuid: str, *columns):
+    """按UUID查询设备的指定列（在数据库线程池中执行），设备不存在返回None
+
+    返回的行在会话关闭后仍可使用，执行预设的延时期间不占用数据库连接
+    """
+    with SessionLocal() as db:
+        return db.query(*columns).filter(Device.uuid == device_uuid).first()
+
 # ============================================================
 # MQTT 客户端
 # ============================================================
@@ -277,6 +487,9 @@ async def lifespan(app: FastAPI):
     if mqtt_client.client:
         mqtt_client.client.loop_stop()
         mqtt_client.client.disconnect()
+    db_executor.shutdown(wait=False, cancel_futures=True)
+    if SessionLocal is not None:
+        engine.dispose()
 
 # ============================================================
 # FastAPI 应用
@@ -342,12 +555,17 @@ async def health_check():
     return {
         "status": "healthy",
         "database": SessionLocal is not None,
+        "db_pool": {
+            "size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": engine.pool.checkedout()
+        } if SessionLocal is not None else None,
         "mqtt": mqtt_client.connected
     }
 
 @app.get("/api/sensor-data")
 async def get_sensor_data(device_uuid: str, sensor: str):
-    """获取传感器数据（从 device_sensors 表查询，简单高效）
+    """获取传感器数据（优先读取 Redis 中的传感器最新值，未命中时查询 device_sensors 表）
     
     Args:
         device_uuid: 设备UUID
@@ -355,10 +573,6 @@ async def get_sensor_data(device_uuid: str, sensor: str):
     """
     logger.info(f"📊 查询传感器数据: device_uuid={device_uuid}, sensor={sensor}")
     
-    if SessionLocal is None:
-        raise HTTPException(status_code=500, detail="数据库未连接")
-    
-    db = SessionLocal()
     try:
         # 映射传感器名称（支持中文和英文）
         sensor_map = {
@@ -373,19 +587,12 @@ async def get_sensor_data(device_uuid: str, sensor: str):
         actual_sensor_name = sensor_map.get(sensor, sensor.lower())
         logger.info(f"🔍 传感器名称映射: {sensor} → {actual_sensor_name}")
         
-        # 直接从 device_sensors 表查询（使用 device_uuid，无需JOIN）
-        sensor_data = db.query(DeviceSensor).filter(
-            DeviceSensor.device_uuid == device_uuid,
-            DeviceSensor.sensor_name == actual_sensor_name
-        ).first()
+        # 先读取传感器最新值，未命中时查询 device_sensors 表并补全
+        cached = await run_db(lookup_sensor, device_uuid, actual_sensor_name)
         
+        sensor_data = cached["sensor"]
         if not sensor_data:
-            # 查询该设备的所有传感器
-            all_sensors = db.query(DeviceSensor).filter(
-                DeviceSensor.device_uuid == device_uuid
-            ).all()
-            
-            available_sensors = [s.sensor_name for s in all_sensors]
+            available_sensors = cached["available"]
             if available_sensors:
                 available = ", ".join(available_sensors)
                 raise HTTPException(
@@ -395,21 +602,20 @@ async def get_sensor_data(device_uuid: str, sensor: str):
             else:
                 raise HTTPException(status_code=404, detail="设备尚未上报任何传感器数据")
         
-        # 查询设备信息（用于返回设备名称）
-        device = db.query(Device).filter(Device.uuid == device_uuid).first()
-        device_name = device.name if device else "未知设备"
-        last_seen = device.last_seen if device else None
+        device = cached["device"]
+        device_name = device["name"] if device else "未知设备"
+        last_seen = device["last_seen"] if device else None
         
         # 转换 value 为数字类型（Coze要求返回number类型）
         try:
-            numeric_value = float(sensor_data.sensor_value)
+            numeric_value = float(sensor_data["sensor_value"])
         except (ValueError, TypeError):
             # 如果无法转换为数字，保留原值（可能是布尔值或其他类型）
-            numeric_value = sensor_data.sensor_value
-            logger.warning(f"⚠️  传感器值无法转换为数字: {sensor_data.sensor_value}")
+            numeric_value = sensor_data["sensor_value"]
+            logger.warning(f"⚠️  传感器值无法转换为数字: {sensor_data['sensor_value']}")
         
         # 🔧 如果数据库中 sensor_unit 为空，根据传感器类型给出默认单位
-        sensor_unit = sensor_data.sensor_unit
+        sensor_unit = sensor_data["sensor_unit"]
         if not sensor_unit or sensor_unit.strip() == "":
             # 默认单位映射
             default_units = {
@@ -432,7 +638,7 @@ async def get_sensor_data(device_uuid: str, sensor: str):
             if sensor_unit:
                 logger.info(f"💡 使用默认单位: {actual_sensor_name} → {sensor_unit}")
         
-        logger.info(f"✅ 传感器数据: {sensor_data.sensor_name} = {numeric_value} {sensor_unit}")
+        logger.info(f"✅ 传感器数据: {sensor_data['sensor_name']} = {numeric_value} {sensor_unit}")
         
         return StandardResponse(
             code=200,
@@ -440,11 +646,11 @@ async def get_sensor_data(device_uuid: str, sensor: str):
             data={
                 "value": numeric_value,  # 转换为数字类型
                 "unit": sensor_unit,     # 使用默认单位（如果数据库为空）
-                "sensor_name": sensor_data.sensor_name,
-                "sensor_type": sensor_data.sensor_type or "",
-                "timestamp": sensor_data.timestamp.isoformat() if sensor_data.timestamp else None,
+                "sensor_name": sensor_data["sensor_name"],
+                "sensor_type": sensor_data["sensor_type"],
+                "timestamp": sensor_data["timestamp"],
                 "device_name": device_name,
-                "last_seen": last_seen.isoformat() if last_seen else None
+                "last_seen": last_seen
             }
         )
         
@@ -453,8 +659,6 @@ async def get_sensor_data(device_uuid: str, sensor: str):
     except Exception as e:
         logger.error(f"❌ 查询传感器数据失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
 
 @app.post("/api/control")
 async def control_device(request: ControlRequest):
@@ -471,10 +675,12 @@ async def control_device(request: ControlRequest):
     if not mqtt_client.connected:
         raise HTTPException(status_code=500, detail="MQTT未连接")
     
-    db = SessionLocal()
     try:
         # 查询设备
-        device = db.query(Device).filter(Device.uuid == request.device_uuid).first()
+        device = await run_db(
+            load_device, request.device_uuid,
+            Device.uuid, Device.device_id, Device.name, Device.is_online
+        )
         if not device:
             raise HTTPException(status_code=404, detail="设备不存在")
         
@@ -542,8 +748,6 @@ async def control_device(request: ControlRequest):
     except Exception as e:
         logger.error(f"❌ 控制设备失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
 
 @app.post("/api/preset")
 async def execute_preset(request: PresetRequest):
@@ -560,10 +764,12 @@ async def execute_preset(request: PresetRequest):
     if not mqtt_client.connected:
         raise HTTPException(status_code=500, detail="MQTT未连接")
     
-    db = SessionLocal()
     try:
         # 查询设备
-        device = db.query(Device).filter(Device.uuid == request.device_uuid).first()
+        device = await run_db(
+            load_device, request.device_uuid,
+            Device.uuid, Device.device_id, Device.name, Device.is_online, Device.device_settings
+        )
         if not device:
             raise HTTPException(status_code=404, detail="设备不存在")
         
@@ -713,8 +919,6 @@ async def execute_preset(request: PresetRequest):
     except Exception as e:
         logger.error(f"❌ 执行预设失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -46,6 +46,18 @@ class Config:
     # 后端API密钥（可选）
     BACKEND_API_KEY: Optional[str] = os.getenv("BACKEND_API_KEY")
     
+    # 连接池：最大连接数和保持长连接的空闲连接数（所有请求共用一个客户端）
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    
+    # ==================== 缓存配置 ====================
+    
+    # 设备别名缓存时间（秒），设备配置修改后通过 Redis 通知立即失效；Redis 不可用时最多延迟这么久
+    ALIAS_CACHE_TTL: int = int(os.getenv("ALIAS_CACHE_TTL", "60"))
+    
+    # Redis 地址（订阅设备配置变更通知）
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    
     # ==================== 安全配置 ====================
     
     # 是否启用CORS
@@ -70,6 +82,7 @@ class Config:
         print("=" * 60)
         print(f"  服务地址: http://{cls.HOST}:{cls.PORT}")
         print(f"  插件后端: {cls.PLUGIN_BACKEND_URL}")
+        print(f"  别名缓存: {cls.ALIAS_CACHE_TTL} 秒")
         print(f"  日志级别: {cls.LOG_LEVEL}")
         print(f"  自动重载: {'启用' if cls.RELOAD else '禁用'}")
         print(f"  CORS: {'启用' if cls.CORS_ENABLED else '禁用'}")
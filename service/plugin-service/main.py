@@ -8,9 +8,13 @@ from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from contextlib import asynccontextmanager
+import asyncio
 import httpx
+import json
 import logging
+import time
 from datetime import datetime
 from config import config
 
@@ -34,12 +38,170 @@ def is_test_mode(uuid: str) -> bool:
     """判断是否为测试模式"""
     return uuid.lower() == TEST_UUID
 
+# ============================================================
+# 共享 HTTP 客户端与设备别名缓存
+# ============================================================
+# 所有接口共用一个 HTTP 客户端（连接池 + 长连接），避免每个请求重新建立 TCP/TLS 连接
+http_client: Optional[httpx.AsyncClient] = None
+
+# 设备配置变更频道（backend 在设备配置修改并提交后发布，见 backend/app/services/device_config_events.py）
+DEVICE_CONFIG_CHANNEL = "device:config"
+
+# Redis 订阅断开后的重连间隔（秒）
+REDIS_RECONNECT_DELAY = 5
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的 HTTP 客户端（各接口调用时通过 timeout 参数指定自己的超时）"""
+    if http_client is None:
+        raise RuntimeError("HTTP 客户端未初始化")
+    return http_client
+
+
+class DeviceAliasCache:
+    """设备别名缓存
+
+    - 按设备UUID缓存别名映射，ALIAS_CACHE_TTL 秒后过期
+    - 设备配置修改后 backend 发布 device:config 通知，收到后立即删除对应设备的缓存
+    - 同一设备并发未命中时只请求一次后端
+    - 请求后端期间收到失效通知时不写入缓存，避免写入修改前的配置
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, device_uuid: str, loader) -> Dict[str, Any]:
+        """获取设备别名，未命中时调用 loader(device_uuid) 从后端获取"""
+        entry = self._entries.get(device_uuid)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        task = self._loading.get(device_uuid)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(device_uuid, loader))
+            self._loading[device_uuid] = task
+
+            def _done(t, device_uuid=device_uuid):
+                if self._loading.get(device_uuid) is t:
+                    del self._loading[device_uuid]
+
+            task.add_done_callback(_done)
+        # 某个请求被取消时不影响其他等待同一结果的请求
+        return await asyncio.shield(task)
+
+    async def _load(self, device_uuid: str, loader) -> Dict[str, Any]:
+        aliases = await loader(device_uuid)
+        # 请求期间收到失效通知时 invalidate 已移除本次加载，结果只返回给已在等待的请求
+        if self._loading.get(device_uuid) is asyncio.current_task():
+            if len(self._entries) >= self.maxsize:
+                self._evict()
+            self._entries[device_uuid] = (time.monotonic() + self.ttl, aliases)
+        return aliases
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        while len(self._entries) >= self.maxsize:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, device_uuid: str) -> None:
+        self._entries.pop(device_uuid, None)
+        # 之后的请求重新获取，不再等待失效前发起的请求
+        self._loading.pop(device_uuid, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+alias_cache = DeviceAliasCache(ttl=config.ALIAS_CACHE_TTL)
+
+
+async def listen_device_config_changes():
+    """订阅设备配置变更通知，失效对应设备的别名缓存（Redis 不可用时缓存按过期时间失效）"""
+    try:
+        import redis.asyncio as aioredis
+    except ImportError:
+        logger.warning("⚠️  未安装 redis，设备别名缓存只按过期时间失效")
+        return
+
+    while True:
+        client = aioredis.Redis.from_url(config.REDIS_URL, decode_responses=True)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(DEVICE_CONFIG_CHANNEL)
+            # 断开期间可能漏掉通知，重新订阅后清空缓存
+            alias_cache.clear()
+            logger.info(f"✅ 已订阅设备配置变更通知: {DEVICE_CONFIG_CHANNEL}")
+            async for message in pubsub.listen():
+                try:
+                    device_uuid = json.loads(message["data"]).get("device_uuid")
+                except (TypeError, ValueError, AttributeError):
+                    continue
+                if device_uuid:
+                    alias_cache.invalidate(device_uuid)
+                    logger.debug(f"设备配置已变更，清除别名缓存: {device_uuid}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️  设备配置变更订阅中断，{REDIS_RECONNECT_DELAY} 秒后重连: {e}")
+        finally:
+            try:
+                await pubsub.reset()
+                await client.close()
+            except Exception:
+                pass
+        await asyncio.sleep(REDIS_RECONNECT_DELAY)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时创建共享 HTTP 客户端和配置变更订阅，关闭时释放"""
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=config.REQUEST_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+    listener = asyncio.create_task(listen_device_config_changes())
+    try:
+        yield
+    finally:
+        listener.cancel()
+        try:
+            await listener
+        except asyncio.CancelledError:
+            pass
+        await http_client.aclose()
+        http_client = None
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="AIOT 外部插件服务",
     description="简洁的IoT设备控制API，供外部插件调用",
     version="1.0.0",
-    debug=config.DEBUG_MODE
+    debug=config.DEBUG_MODE,
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -190,6 +352,76 @@ def map_sensor_key(sensor_name: str) -> str:
     return sensor_map.get(sensor_name, sensor_name)
 
 
+async def fetch_device_aliases(uuid: str) -> Dict[str, Any]:
+    """调用后端API获取设备配置，提取控制端口别名和预设指令别名"""
+    # 使用内部API密钥
+    headers = get_internal_headers()
+    response = await get_http_client().get(
+        f"{BACKEND_URL}/api/devices/{uuid}/config",
+        headers=headers,
+        timeout=10.0
+    )
+    
+    if response.status_code == 401 or response.status_code == 403:
+        # 认证失败
+        logger.error(f"❌ 后端API认证失败: {response.status_code}")
+        raise HTTPException(
+            status_code=500, 
+            detail="后端API认证失败，请检查BACKEND_API_KEY配置"
+        )
+    
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail="获取设备配置失败")
+    
+    response_data = response.json()
+    
+    # 后端使用统一响应格式，需要提取 data 字段
+    config_data = response_data
+    if isinstance(response_data, dict) and "data" in response_data:
+        config_data = response_data.get("data", {})
+        logger.info(f"📦 从统一响应格式中提取 config data")
+    
+    # 提取控制端口别名（精简返回数据：只保留必要的映射信息）
+    control_aliases = {}
+    device_control_config = config_data.get("device_control_config", {})
+    
+    for port_key, port_config in device_control_config.items():
+        if isinstance(port_config, dict) and port_config.get("alias"):
+            # 解析端口key，如 "led_1" -> {type: "led", id: 1}
+            parts = port_key.split("_")
+            if len(parts) >= 2:
+                port_type = parts[0]
+                try:
+                    port_id = int(parts[1])
+                    alias = port_config["alias"]
+                    
+                    control_aliases[alias] = {
+                        "port_type": port_type,
+                        "port_id": port_id
+                    }
+                except (ValueError, IndexError):
+                    continue
+    
+    # 提取预设指令别名
+    preset_aliases = {}
+    device_preset_commands = config_data.get("device_preset_commands", [])
+    
+    for preset in device_preset_commands:
+        if preset.get("alias"):
+            alias = preset["alias"]
+            preset_aliases[alias] = {
+                "preset_name": preset.get("preset_name", ""),
+                "parameters": preset.get("parameters", {})
+            }
+    
+    logger.info(f"✅ 设备别名配置: {len(control_aliases)}个端口别名, {len(preset_aliases)}个预设别名")
+    
+    return {
+        "control_aliases": control_aliases,
+        "preset_aliases": preset_aliases
+    }
+
+
 # ==================== API接口 ====================
 
 @app.get("/", tags=["健康检查"])
@@ -199,6 +431,7 @@ async def root():
         "service": "AIOT 外部插件服务",
         "version": "1.0.0",
         "status": "running",
+        "alias_cache": alias_cache.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -238,92 +471,14 @@ async def get_device_aliases(
     # 如果设备不存在，后端会返回 404 错误
     
     try:
-        # 调用后端API获取设备配置（使用内部API密钥）
-        headers = get_internal_headers()
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{BACKEND_URL}/api/devices/{uuid}/config",
-                headers=headers
-            )
-            
-            if response.status_code == 401 or response.status_code == 403:
-                # 认证失败
-                logger.error(f"❌ 后端API认证失败: {response.status_code}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail="后端API认证失败，请检查BACKEND_API_KEY配置"
-                )
-            
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail="获取设备配置失败")
-            
-            response_data = response.json()
-            
-            # 后端使用统一响应格式，需要提取 data 字段
-            config_data = response_data
-            if isinstance(response_data, dict) and "data" in response_data:
-                config_data = response_data.get("data", {})
-                logger.info(f"📦 从统一响应格式中提取 config data")
-            
-            # 提取控制端口别名
-            control_aliases = {}
-            device_control_config = config_data.get("device_control_config", {})
-            
-            for port_key, port_config in device_control_config.items():
-                if isinstance(port_config, dict) and port_config.get("alias"):
-                    # 解析端口key，如 "led_1" -> {type: "led", id: 1}
-                    parts = port_key.split("_")
-                    if len(parts) >= 2:
-                        port_type = parts[0]
-                        try:
-                            port_id = int(parts[1])
-                            alias = port_config["alias"]
-                            
-                            control_aliases[alias] = {
-                                "port_type": port_type,
-                                "port_id": port_id
-                            }
-                        except (ValueError, IndexError):
-                            continue
-            
-            # 提取预设指令别名
-            preset_aliases = {}
-            device_preset_commands = config_data.get("device_preset_commands", [])
-            
-            for preset in device_preset_commands:
-                if preset.get("alias"):
-                    alias = preset["alias"]
-                    preset_aliases[alias] = {
-                        "preset_name": preset.get("preset_name", ""),
-                        "parameters": preset.get("parameters", {})
-                    }
-            
-            logger.info(f"✅ 设备别名配置: {len(control_aliases)}个端口别名, {len(preset_aliases)}个预设别名")
-            
-            # 精简返回数据：只保留必要的映射信息
-            simplified_control_aliases = {}
-            for alias, config in control_aliases.items():
-                simplified_control_aliases[alias] = {
-                    "port_type": config["port_type"],
-                    "port_id": config["port_id"]
-                }
-            
-            simplified_preset_aliases = {}
-            for alias, config in preset_aliases.items():
-                simplified_preset_aliases[alias] = {
-                    "preset_name": config["preset_name"],
-                    "parameters": config.get("parameters", {})
-                }
-            
-            return StandardResponse(
-                code=200,
-                msg="成功",
-                data={
-                    "control_aliases": simplified_control_aliases,
-                    "preset_aliases": simplified_preset_aliases
-                }
-            )
-            
+        # 别名映射按设备缓存，设备配置修改后收到通知立即失效
+        aliases = await alias_cache.get(uuid, fetch_device_aliases)
+        return StandardResponse(
+            code=200,
+            msg="成功",
+            data=aliases
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -409,48 +564,48 @@ async def get_sensor_data(
     
     try:
         # 调用插件后端服务获取传感器数据
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                f"{PLUGIN_BACKEND_URL}/api/sensor-data",
-                params={"device_uuid": uuid, "sensor": sensor}
-            )
-            
-            if response.status_code == 404:
-                raise HTTPException(status_code=404, detail="设备不存在或暂无传感器数据")
-            
-            if response.status_code != 200:
-                error_msg = response.text if response.text else "获取传感器数据失败"
-                raise HTTPException(status_code=response.status_code, detail=error_msg)
-            
-            response_data = response.json()
-            
-            # plugin-backend-service 返回格式：
-            # {"code": 200, "msg": "成功", "data": {"value": 30.4, "unit": "°C"}}
-            
-            if not isinstance(response_data, dict):
-                logger.error(f"❌ 未知的响应格式: {type(response_data)}")
-                raise HTTPException(status_code=500, detail="后端返回数据格式错误")
-            
-            # 提取数据
-            data = response_data.get("data", {})
-            value = data.get("value")
-            unit = data.get("unit", "")
-            
-            if value is None:
-                raise HTTPException(status_code=404, detail=f"未找到传感器 '{sensor}' 的数据")
-            
-            logger.info(f"✅ 传感器数据: {sensor}={value}{unit}")
-            
-            # 精简返回：只返回核心数据
-            return StandardResponse(
-                code=200,
-                msg="成功",
-                data={
-                    "value": value,
-                    "unit": unit
-                }
-            )
-            
+        response = await get_http_client().get(
+            f"{PLUGIN_BACKEND_URL}/api/sensor-data",
+            params={"device_uuid": uuid, "sensor": sensor},
+            timeout=5.0
+        )
+        
+        if response.status_code == 404:
+            raise HTTPException(status_code=404, detail="设备不存在或暂无传感器数据")
+        
+        if response.status_code != 200:
+            error_msg = response.text if response.text else "获取传感器数据失败"
+            raise HTTPException(status_code=response.status_code, detail=error_msg)
+        
+        response_data = response.json()
+        
+        # plugin-backend-service 返回格式：
+        # {"code": 200, "msg": "成功", "data": {"value": 30.4, "unit": "°C"}}
+        
+        if not isinstance(response_data, dict):
+            logger.error(f"❌ 未知的响应格式: {type(response_data)}")
+            raise HTTPException(status_code=500, detail="后端返回数据格式错误")
+        
+        # 提取数据
+        data = response_data.get("data", {})
+        value = data.get("value")
+        unit = data.get("unit", "")
+        
+        if value is None:
+            raise HTTPException(status_code=404, detail=f"未找到传感器 '{sensor}' 的数据")
+        
+        logger.info(f"✅ 传感器数据: {sensor}={value}{unit}")
+        
+        # 精简返回：只返回核心数据
+        return StandardResponse(
+            code=200,
+            msg="成功",
+            data={
+                "value": value,
+                "unit": unit
+            }
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -508,34 +663,34 @@ async def control_device(request: ControlRequest, raw_request: Request):
     
     try:
         # 调用插件后端服务控制设备
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{PLUGIN_BACKEND_URL}/api/control",
-                json={
-                    "device_uuid": request.device_uuid,
-                    "port_type": request.port_type,
-                    "port_id": request.port_id,
-                    "action": request.action,
-                    "value": request.value
-                }
-            )
-            
-            if response.status_code == 404:
-                raise HTTPException(status_code=404, detail="设备不存在")
-            
-            if response.status_code != 200:
-                error_detail = response.text if response.text else "控制失败"
-                raise HTTPException(status_code=response.status_code, detail=error_detail)
-            
-            logger.info(f"✅ 控制成功: {request.port_type}{request.port_id} -> {request.action}")
-            
-            # 精简返回：只返回结果
-            return StandardResponse(
-                code=200,
-                msg="成功",
-                data={"result": "success"}
-            )
-            
+        response = await get_http_client().post(
+            f"{PLUGIN_BACKEND_URL}/api/control",
+            json={
+                "device_uuid": request.device_uuid,
+                "port_type": request.port_type,
+                "port_id": request.port_id,
+                "action": request.action,
+                "value": request.value
+            },
+            timeout=10.0
+        )
+        
+        if response.status_code == 404:
+            raise HTTPException(status_code=404, detail="设备不存在")
+        
+        if response.status_code != 200:
+            error_detail = response.text if response.text else "控制失败"
+            raise HTTPException(status_code=response.status_code, detail=error_detail)
+        
+        logger.info(f"✅ 控制成功: {request.port_type}{request.port_id} -> {request.action}")
+        
+        # 精简返回：只返回结果
+        return StandardResponse(
+            code=200,
+            msg="成功",
+            data={"result": "success"}
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -612,65 +767,65 @@ async def execute_preset(request: PresetRequest, raw_request: Request):
         
         # 预设指令可能包含多个步骤和延时，需要更长的超时时间
         # 例如：10个步骤，每步延时5秒 = 50秒
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{PLUGIN_BACKEND_URL}/api/preset",
-                json={
-                    "device_uuid": request.device_uuid,
-                    "preset_key": request.preset_name,  # preset_name其实是preset_key
-                    "parameters": request.parameters or {}
-                }
-            )
-            
-            if response.status_code == 404:
-                logger.error(f"❌ 未找到预设指令: {request.preset_name}")
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"未找到预设指令: {request.preset_name}"
-                )
-            
-            if response.status_code == 400:
-                error_data = response.json() if response.text else {}
-                error_msg = error_data.get("detail", "设备离线或预设格式错误")
-                logger.error(f"❌ 预设执行失败: {error_msg}")
-                raise HTTPException(status_code=400, detail=error_msg)
-            
-            if response.status_code != 200:
-                error_detail = response.json() if response.text else "预设执行失败"
-                logger.error(f"❌ 预设执行失败: {error_detail}")
-                raise HTTPException(status_code=500, detail=error_detail)
-            
-            # 解析响应
-            response_data = response.json()
-            if not isinstance(response_data, dict):
-                logger.error(f"❌ 响应格式错误: {type(response_data)}")
-                raise HTTPException(status_code=500, detail="响应格式错误")
-            
-            data = response_data.get("data", {})
-            
-            # 记录执行结果
-            if isinstance(data, dict):
-                preset_name = data.get("preset_name", request.preset_name)
-                if data.get("success"):
-                    message = data.get("message", "预设执行成功")
-                    logger.info(f"✅ {message}")
-                    
-                    # 如果是序列指令，记录详细信息
-                    if "total_steps" in data:
-                        logger.info(f"📊 总步骤: {data.get('total_steps')}, "
-                                  f"执行步骤: {len(data.get('executed_steps', []))}")
-                        if data.get("errors"):
-                            logger.warning(f"⚠️  部分步骤执行失败: {data.get('errors')}")
-                else:
-                    logger.warning(f"⚠️  预设执行完成但有错误: {data.get('message')}")
-            
-            # 返回详细结果（保持与后端一致）
-            return StandardResponse(
-                code=200,
-                msg="成功",
-                data=data
+        response = await get_http_client().post(
+            f"{PLUGIN_BACKEND_URL}/api/preset",
+            json={
+                "device_uuid": request.device_uuid,
+                "preset_key": request.preset_name,  # preset_name其实是preset_key
+                "parameters": request.parameters or {}
+            },
+            timeout=120.0
+        )
+        
+        if response.status_code == 404:
+            logger.error(f"❌ 未找到预设指令: {request.preset_name}")
+            raise HTTPException(
+                status_code=404,
+                detail=f"未找到预设指令: {request.preset_name}"
             )
-            
+        
+        if response.status_code == 400:
+            error_data = response.json() if response.text else {}
+            error_msg = error_data.get("detail", "设备离线或预设格式错误")
+            logger.error(f"❌ 预设执行失败: {error_msg}")
+            raise HTTPException(status_code=400, detail=error_msg)
+        
+        if response.status_code != 200:
+            error_detail = response.json() if response.text else "预设执行失败"
+            logger.error(f"❌ 预设执行失败: {error_detail}")
+            raise HTTPException(status_code=500, detail=error_detail)
+        
+        # 解析响应
+        response_data = response.json()
+        if not isinstance(response_data, dict):
+            logger.error(f"❌ 响应格式错误: {type(response_data)}")
+            raise HTTPException(status_code=500, detail="响应格式错误")
+        
+        data = response_data.get("data", {})
+        
+        # 记录执行结果
+        if isinstance(data, dict):
+            preset_name = data.get("preset_name", request.preset_name)
+            if data.get("success"):
+                message = data.get("message", "预设执行成功")
+                logger.info(f"✅ {message}")
+                
+                # 如果是序列指令，记录详细信息
+                if "total_steps" in data:
+                    logger.info(f"📊 总步骤: {data.get('total_steps')}, "
+                              f"执行步骤: {len(data.get('executed_steps', []))}")
+                    if data.get("errors"):
+                        logger.warning(f"⚠️  部分步骤执行失败: {data.get('errors')}")
+            else:
+                logger.warning(f"⚠️  预设执行完成但有错误: {data.get('message')}")
+        
+        # 返回详细结果（保持与后端一致）
+        return StandardResponse(
+            code=200,
+            msg="成功",
+            data=data
+        )
+        
     except httpx.TimeoutException as e:
         logger.error(f"❌ 预设执行超时: {e}")
         logger.error(f"💡 提示: 预设可能包含多个步骤，执行时间较长")